@@ -4,7 +4,20 @@ CREATE TABLE IF NOT EXISTS cohorts (
     name TEXT NOT NULL,
     experimenter TEXT,
     description TEXT,
-    date_created TEXT DEFAULT CURRENT_TIMESTAMP
+    date_created TEXT DEFAULT CURRENT_TIMESTAMP,
+    uid TEXT,  -- global id used when syncing between benches
+    row_version INTEGER NOT NULL DEFAULT 1  -- bumped by every update (see versioning.py)
+);
+
+-- Lookup tables; samples reference them by integer id
+CREATE TABLE IF NOT EXISTS sample_types (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT UNIQUE NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS experimenters (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT UNIQUE NOT NULL
 );
 
 -- Samples table
@@ -17,5 +30,490 @@ CREATE TABLE IF NOT EXISTS samples (
     notes TEXT,
     barcode_value TEXT UNIQUE NOT NULL,
     date_added TEXT DEFAULT CURRENT_TIMESTAMP,
+    sample_type_id INTEGER REFERENCES sample_types(id),
+    experimenter_id INTEGER REFERENCES experimenters(id),
+    collection_date TEXT,  -- ISO yyyy-mm-dd
+    time_point TEXT,
+    parent_id INTEGER REFERENCES samples(id) ON DELETE SET NULL,  -- sample this was aliquoted from
+    subject_id INTEGER REFERENCES subjects(id) ON DELETE SET NULL,  -- animal it was drawn from
+    row_version INTEGER NOT NULL DEFAULT 1,  -- bumped by every update (see versioning.py)
     FOREIGN KEY (cohort_id) REFERENCES cohorts(id) ON DELETE CASCADE
 );
+
+-- Lookups match on animal_id; cohort views, filters and group-bys use the
+-- integer id and ISO date columns
+CREATE INDEX IF NOT EXISTS idx_samples_animal_id ON samples(animal_id);
+CREATE INDEX IF NOT EXISTS idx_samples_cohort_id ON samples(cohort_id);
+CREATE INDEX IF NOT EXISTS idx_samples_sample_type ON samples(sample_type_id, collection_date);
+CREATE INDEX IF NOT EXISTS idx_samples_experimenter ON samples(experimenter_id, collection_date);
+CREATE INDEX IF NOT EXISTS idx_samples_collection_date ON samples(collection_date);
+
+-- Reconciliation sessions (scanning a box against an expected cohort)
+CREATE TABLE IF NOT EXISTS reconcile_sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    cohort_id INTEGER,
+    started_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    finished_at TEXT,
+    expected_count INTEGER,
+    missing_count INTEGER,
+    unexpected_count INTEGER,
+    duplicate_count INTEGER,
+    FOREIGN KEY (cohort_id) REFERENCES cohorts(id) ON DELETE SET NULL
+);
+
+CREATE TABLE IF NOT EXISTS reconcile_scans (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id INTEGER NOT NULL,
+    code TEXT NOT NULL,
+    sample_id INTEGER,  -- NULL when the code matched no sample
+    scanned_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (session_id) REFERENCES reconcile_sessions(id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_reconcile_scans_session ON reconcile_scans(session_id);
+
+-- Sample-ID allocation: one counter per prefix, plus reserved/allocated ranges
+CREATE TABLE IF NOT EXISTS id_prefixes (
+    prefix TEXT PRIMARY KEY,
+    next_number INTEGER NOT NULL DEFAULT 0,
+    pad_width INTEGER NOT NULL DEFAULT 0,
+    id_format TEXT NOT NULL DEFAULT '{prefix}{number:0{width}d}'
+);
+
+CREATE TABLE IF NOT EXISTS id_reservations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    prefix TEXT NOT NULL,
+    start_number INTEGER NOT NULL,
+    end_number INTEGER NOT NULL,  -- inclusive
+    kind TEXT NOT NULL,           -- 'reserved' or 'allocated'
+    reserved_by TEXT,
+    reserved_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (prefix) REFERENCES id_prefixes(prefix)
+);
+CREATE INDEX IF NOT EXISTS idx_id_reservations_prefix ON id_reservations(prefix, start_number, end_number);
+-- Allocation only skips manual reservations; this keeps it off the history
+CREATE INDEX IF NOT EXISTS idx_id_reservations_kind ON id_reservations(prefix, kind, start_number);
+
+-- Small key/value store for app state (one-off backfills, sync markers, ...)
+CREATE TABLE IF NOT EXISTS app_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+-- Dashboard rollup: sample counts per type/experimenter/cohort/collection day,
+-- kept current by the triggers below. NULLs are stored as 0/'' so the
+-- primary key matches them.
+CREATE TABLE IF NOT EXISTS sample_rollup (
+    sample_type_id INTEGER NOT NULL,
+    experimenter_id INTEGER NOT NULL,
+    cohort_id INTEGER NOT NULL,
+    collection_date TEXT NOT NULL,
+    sample_count INTEGER NOT NULL,
+    PRIMARY KEY (sample_type_id, experimenter_id, cohort_id, collection_date)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_sample_rollup_date ON sample_rollup(collection_date);
+CREATE INDEX IF NOT EXISTS idx_sample_rollup_cohort ON sample_rollup(cohort_id);
+
+CREATE TRIGGER IF NOT EXISTS trg_sample_rollup_insert AFTER INSERT ON samples
+BEGIN
+    INSERT INTO sample_rollup (sample_type_id, experimenter_id, cohort_id, collection_date, sample_count)
+    VALUES (COALESCE(NEW.sample_type_id, 0), COALESCE(NEW.experimenter_id, 0), COALESCE(NEW.cohort_id, 0), COALESCE(NEW.collection_date, ''), 1)
+    ON CONFLICT (sample_type_id, experimenter_id, cohort_id, collection_date) DO UPDATE SET sample_count = sample_count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_sample_rollup_delete AFTER DELETE ON samples
+BEGIN
+    UPDATE sample_rollup SET sample_count = sample_count - 1
+    WHERE sample_type_id = COALESCE(OLD.sample_type_id, 0) AND experimenter_id = COALESCE(OLD.experimenter_id, 0)
+        AND cohort_id = COALESCE(OLD.cohort_id, 0) AND collection_date = COALESCE(OLD.collection_date, '');
+    DELETE FROM sample_rollup
+    WHERE sample_type_id = COALESCE(OLD.sample_type_id, 0) AND experimenter_id = COALESCE(OLD.experimenter_id, 0)
+        AND cohort_id = COALESCE(OLD.cohort_id, 0) AND collection_date = COALESCE(OLD.collection_date, '')
+        AND sample_count <= 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_sample_rollup_update AFTER UPDATE OF sample_type_id, experimenter_id, cohort_id, collection_date ON samples
+BEGIN
+    UPDATE sample_rollup SET sample_count = sample_count - 1
+    WHERE sample_type_id = COALESCE(OLD.sample_type_id, 0) AND experimenter_id = COALESCE(OLD.experimenter_id, 0)
+        AND cohort_id = COALESCE(OLD.cohort_id, 0) AND collection_date = COALESCE(OLD.collection_date, '');
+    DELETE FROM sample_rollup
+    WHERE sample_type_id = COALESCE(OLD.sample_type_id, 0) AND experimenter_id = COALESCE(OLD.experimenter_id, 0)
+        AND cohort_id = COALESCE(OLD.cohort_id, 0) AND collection_date = COALESCE(OLD.collection_date, '')
+        AND sample_count <= 0;
+    INSERT INTO sample_rollup (sample_type_id, experimenter_id, cohort_id, collection_date, sample_count)
+    VALUES (COALESCE(NEW.sample_type_id, 0), COALESCE(NEW.experimenter_id, 0), COALESCE(NEW.cohort_id, 0), COALESCE(NEW.collection_date, ''), 1)
+    ON CONFLICT (sample_type_id, experimenter_id, cohort_id, collection_date) DO UPDATE SET sample_count = sample_count + 1;
+END;
+
+-- Every cohort gets a random global id
+CREATE UNIQUE INDEX IF NOT EXISTS idx_cohorts_uid ON cohorts(uid);
+CREATE TRIGGER IF NOT EXISTS trg_cohorts_uid AFTER INSERT ON cohorts
+WHEN NEW.uid IS NULL
+BEGIN
+    UPDATE cohorts SET uid = lower(hex(randomblob(16))) WHERE id = NEW.id;
+END;
+
+-- Offline sync (see sync.py). While app_meta.sync_capture is '1', every local
+-- change is queued in sync_outbox by key (sample barcode / cohort uid); the
+-- row itself is read when the change is pushed. sync_versions holds the
+-- central version each local row is based on, for conflict detection.
+CREATE TABLE IF NOT EXISTS sync_outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    entity TEXT NOT NULL,             -- 'cohort' or 'sample'
+    entity_key TEXT NOT NULL,
+    op TEXT NOT NULL,                 -- 'upsert' or 'delete'
+    status TEXT NOT NULL DEFAULT 'pending',  -- 'pending' or 'conflict'
+    message TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_sync_outbox_status ON sync_outbox(status, id);
+CREATE INDEX IF NOT EXISTS idx_sync_outbox_key ON sync_outbox(entity, entity_key);
+
+CREATE TABLE IF NOT EXISTS sync_versions (
+    entity TEXT NOT NULL,
+    entity_key TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    PRIMARY KEY (entity, entity_key)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_sync_cohorts_insert AFTER INSERT ON cohorts
+WHEN NEW.uid IS NOT NULL AND (SELECT value FROM app_meta WHERE key = 'sync_capture') = '1'
+BEGIN
+    INSERT INTO sync_outbox (entity, entity_key, op) VALUES ('cohort', NEW.uid, 'upsert');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_sync_cohorts_update AFTER UPDATE ON cohorts
+WHEN NEW.uid IS NOT NULL AND (SELECT value FROM app_meta WHERE key = 'sync_capture') = '1'
+BEGIN
+    INSERT INTO sync_outbox (entity, entity_key, op) VALUES ('cohort', NEW.uid, 'upsert');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_sync_cohorts_delete AFTER DELETE ON cohorts
+WHEN OLD.uid IS NOT NULL AND (SELECT value FROM app_meta WHERE key = 'sync_capture') = '1'
+BEGIN
+    INSERT INTO sync_outbox (entity, entity_key, op) VALUES ('cohort', OLD.uid, 'delete');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_sync_samples_insert AFTER INSERT ON samples
+WHEN (SELECT value FROM app_meta WHERE key = 'sync_capture') = '1'
+BEGIN
+    INSERT INTO sync_outbox (entity, entity_key, op) VALUES ('sample', NEW.barcode_value, 'upsert');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_sync_samples_update AFTER UPDATE ON samples
+WHEN (SELECT value FROM app_meta WHERE key = 'sync_capture') = '1'
+BEGIN
+    INSERT INTO sync_outbox (entity, entity_key, op)
+    SELECT 'sample', OLD.barcode_value, 'delete' WHERE OLD.barcode_value IS NOT NEW.barcode_value;
+    INSERT INTO sync_outbox (entity, entity_key, op) VALUES ('sample', NEW.barcode_value, 'upsert');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_sync_samples_delete AFTER DELETE ON samples
+WHEN (SELECT value FROM app_meta WHERE key = 'sync_capture') = '1'
+BEGIN
+    INSERT INTO sync_outbox (entity, entity_key, op) VALUES ('sample', OLD.barcode_value, 'delete');
+END;
+
+-- Audit trail (see audit.py, which generates the triggers). Append-only:
+-- events can only be removed while rolling them into a segment file.
+CREATE TABLE IF NOT EXISTS audit_users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT UNIQUE NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS audit_fields (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT UNIQUE NOT NULL  -- 'table.column'
+);
+
+CREATE TABLE IF NOT EXISTS audit_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts INTEGER NOT NULL,       -- unix time
+    user_id INTEGER,
+    table_id INTEGER NOT NULL, -- 1 = samples, 2 = cohorts
+    row_id INTEGER NOT NULL,
+    op TEXT NOT NULL,          -- 'I', 'U' or 'D'
+    diff TEXT                  -- JSON keyed by audit_fields.id
+);
+CREATE INDEX IF NOT EXISTS idx_audit_events_row ON audit_events(table_id, row_id, id);
+CREATE INDEX IF NOT EXISTS idx_audit_events_ts ON audit_events(ts);
+
+CREATE TABLE IF NOT EXISTS audit_segments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT NOT NULL,
+    first_event_id INTEGER NOT NULL,
+    last_event_id INTEGER NOT NULL,
+    first_ts INTEGER NOT NULL,
+    last_ts INTEGER NOT NULL,
+    event_count INTEGER NOT NULL,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_audit_events_no_update BEFORE UPDATE ON audit_events
+BEGIN
+    SELECT RAISE(ABORT, 'audit_events is append-only');
+END;
+
+-- trg_audit_events_no_delete is created by audit.ensure_triggers, since
+-- audit.roll_segment drops and recreates it.
+
+-- Label printing (see print_jobs.py). Samples created in the app get a
+-- sample_print_state row; the partial index only holds labels still to print.
+CREATE TABLE IF NOT EXISTS print_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts INTEGER NOT NULL,       -- unix time
+    printer TEXT,
+    label_count INTEGER NOT NULL,
+    outcome TEXT NOT NULL,     -- 'printed', 'partial' or 'failed'
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_print_jobs_ts ON print_jobs(ts);
+
+CREATE TABLE IF NOT EXISTS print_history (
+    sample_id INTEGER NOT NULL,
+    job_id INTEGER NOT NULL REFERENCES print_jobs(id),
+    outcome TEXT NOT NULL,
+    PRIMARY KEY (sample_id, job_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS sample_print_state (
+    sample_id INTEGER PRIMARY KEY,
+    status TEXT NOT NULL,      -- 'pending', 'printed' or 'failed'
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_job_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_sample_print_state_unprinted ON sample_print_state(sample_id) WHERE status != 'printed';
+
+CREATE VIEW IF NOT EXISTS unprinted_samples AS
+SELECT p.sample_id AS id, s.animal_id, s.cohort_id, p.status, p.attempts, p.last_job_id
+FROM sample_print_state p
+JOIN samples s ON s.id = p.sample_id
+WHERE p.status != 'printed';
+
+CREATE TRIGGER IF NOT EXISTS trg_sample_print_state_delete AFTER DELETE ON samples
+BEGIN
+    DELETE FROM sample_print_state WHERE sample_id = OLD.id;
+END;
+
+-- Printer pool (see printer_pool.py)
+CREATE TABLE IF NOT EXISTS printers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT UNIQUE NOT NULL,
+    address TEXT NOT NULL,     -- Windows printer name or tcp://host:port
+    dpi INTEGER NOT NULL DEFAULT 300,
+    template TEXT,             -- label ZPL; NULL for the built-in template
+    enabled INTEGER NOT NULL DEFAULT 1
+);
+
+CREATE TABLE IF NOT EXISTS printer_stats (
+    printer TEXT PRIMARY KEY,  -- printers.name, or the address when no pool is set up
+    jobs INTEGER NOT NULL DEFAULT 0,
+    labels INTEGER NOT NULL DEFAULT 0,
+    failed_labels INTEGER NOT NULL DEFAULT 0,
+    busy_ms INTEGER NOT NULL DEFAULT 0,
+    last_used INTEGER
+) WITHOUT ROWID;
+
+-- Bulk edits (see bulk_edit.py); the old values are kept for undo
+CREATE TABLE IF NOT EXISTS bulk_edits (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts INTEGER NOT NULL,       -- unix time
+    description TEXT NOT NULL,
+    sample_count INTEGER NOT NULL,
+    undone_at INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS bulk_edit_rows (
+    edit_id INTEGER NOT NULL REFERENCES bulk_edits(id),
+    sample_id INTEGER NOT NULL,
+    old_values TEXT NOT NULL,  -- JSON of the edited columns before the edit
+    row_version INTEGER,       -- samples.row_version right after the edit
+    PRIMARY KEY (edit_id, sample_id)
+) WITHOUT ROWID;
+
+-- Background maintenance (see maintenance.py); one row per task run
+CREATE TABLE IF NOT EXISTS maintenance_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts INTEGER NOT NULL,       -- unix time
+    task TEXT NOT NULL,
+    status TEXT NOT NULL,      -- 'ok', 'partial', 'error' or 'skipped'
+    duration_ms INTEGER NOT NULL,
+    detail TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_maintenance_runs_task ON maintenance_runs(task, id);
+
+-- Aliquot lineage (see lineage.py). samples.parent_id is the edge that is
+-- edited and synced; sample_lineage is its closure (every ancestor /
+-- descendant pair with the distance between them), kept up to date by the
+-- triggers below so whole families are single index range scans.
+CREATE INDEX IF NOT EXISTS idx_samples_parent_id ON samples(parent_id);
+
+CREATE TABLE IF NOT EXISTS sample_lineage (
+    ancestor_id INTEGER NOT NULL REFERENCES samples(id) ON DELETE CASCADE,
+    descendant_id INTEGER NOT NULL REFERENCES samples(id) ON DELETE CASCADE,
+    depth INTEGER NOT NULL,    -- 1 = parent/child
+    PRIMARY KEY (ancestor_id, descendant_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_sample_lineage_descendant ON sample_lineage(descendant_id, depth);
+
+CREATE TRIGGER IF NOT EXISTS trg_sample_lineage_insert AFTER INSERT ON samples
+WHEN NEW.parent_id IS NOT NULL
+BEGIN
+    INSERT INTO sample_lineage (ancestor_id, descendant_id, depth)
+    SELECT ancestor_id, NEW.id, depth + 1 FROM sample_lineage WHERE descendant_id = NEW.parent_id
+    UNION ALL SELECT NEW.parent_id, NEW.id, 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_sample_lineage_no_cycle BEFORE UPDATE OF parent_id ON samples
+WHEN NEW.parent_id = NEW.id
+    OR EXISTS (SELECT 1 FROM sample_lineage WHERE ancestor_id = NEW.id AND descendant_id = NEW.parent_id)
+BEGIN
+    SELECT RAISE(ABORT, 'a sample cannot be derived from itself or its own aliquots');
+END;
+
+-- Re-parenting moves the whole subtree: links from the old ancestors into
+-- it are dropped, then every new ancestor is joined to every subtree member
+CREATE TRIGGER IF NOT EXISTS trg_sample_lineage_update AFTER UPDATE OF parent_id ON samples
+WHEN OLD.parent_id IS NOT NEW.parent_id
+BEGIN
+    DELETE FROM sample_lineage
+    WHERE ancestor_id IN (SELECT ancestor_id FROM sample_lineage WHERE descendant_id = NEW.id)
+        AND descendant_id IN (SELECT descendant_id FROM sample_lineage WHERE ancestor_id = NEW.id UNION ALL SELECT NEW.id);
+    INSERT INTO sample_lineage (ancestor_id, descendant_id, depth)
+    SELECT a.ancestor_id, d.descendant_id, a.depth + d.depth + 1
+    FROM (SELECT ancestor_id, depth FROM sample_lineage WHERE descendant_id = NEW.parent_id
+          UNION ALL SELECT NEW.parent_id, 0) a,
+         (SELECT descendant_id, depth FROM sample_lineage WHERE ancestor_id = NEW.id
+          UNION ALL SELECT NEW.id, 0) d
+    WHERE NEW.parent_id IS NOT NULL;
+END;
+
+-- Freezer storage (see storage.py): freezer -> rack -> box -> position.
+-- Positions are row-major (0 = A1). boxes.occupancy is a bitmap of taken
+-- positions (bit i of byte i // 8); the triggers keep boxes.used exact and
+-- clear the bitmap on any change made outside storage.py, which rebuilds it
+-- from sample_locations when it next allocates in that box.
+CREATE TABLE IF NOT EXISTS freezers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT UNIQUE NOT NULL,
+    description TEXT
+);
+
+CREATE TABLE IF NOT EXISTS racks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    freezer_id INTEGER NOT NULL REFERENCES freezers(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    UNIQUE (freezer_id, name)
+);
+
+CREATE TABLE IF NOT EXISTS boxes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    rack_id INTEGER NOT NULL REFERENCES racks(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    cols INTEGER NOT NULL,
+    capacity INTEGER NOT NULL,  -- rows * cols
+    used INTEGER NOT NULL DEFAULT 0,
+    occupancy BLOB,             -- NULL = rebuild from sample_locations
+    UNIQUE (rack_id, name)
+);
+
+CREATE TABLE IF NOT EXISTS sample_locations (
+    sample_id INTEGER PRIMARY KEY REFERENCES samples(id) ON DELETE CASCADE,
+    box_id INTEGER NOT NULL REFERENCES boxes(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    placed_at INTEGER NOT NULL  -- unix time
+) WITHOUT ROWID;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_sample_locations_slot ON sample_locations(box_id, position);
+
+CREATE TRIGGER IF NOT EXISTS trg_sample_locations_insert AFTER INSERT ON sample_locations
+BEGIN
+    UPDATE boxes SET used = used + 1, occupancy = NULL WHERE id = NEW.box_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_sample_locations_delete AFTER DELETE ON sample_locations
+BEGIN
+    UPDATE boxes SET used = used - 1, occupancy = NULL WHERE id = OLD.box_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_sample_locations_update AFTER UPDATE OF box_id, position ON sample_locations
+BEGIN
+    UPDATE boxes SET used = used - 1, occupancy = NULL WHERE id = OLD.box_id;
+    UPDATE boxes SET used = used + 1, occupancy = NULL WHERE id = NEW.box_id;
+END;
+
+-- Near-match lookup (see fuzzy.py). Every sample ID / barcode is split into
+-- trigrams of '^' || code || '$' (upper case). A trigram's position counts
+-- from the start in the first half of the code and from the end (negative)
+-- in the second, so an inserted or dropped character only misaligns the
+-- trigrams between it and the middle. The triggers keep code_grams in step
+-- with samples; fuzzy_positions just numbers the trigrams of a code. Every
+-- row of a sample has one of its old trigrams and positions, so the deletes
+-- are primary key lookups (separate IN lists; a row-value IN would only use
+-- the gram column).
+CREATE TABLE IF NOT EXISTS fuzzy_positions (i INTEGER PRIMARY KEY);
+INSERT OR IGNORE INTO fuzzy_positions (i)
+WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i < 63) SELECT i FROM n;
+
+CREATE TABLE IF NOT EXISTS code_grams (
+    gram TEXT NOT NULL,
+    pos INTEGER NOT NULL,
+    sample_id INTEGER NOT NULL,
+    PRIMARY KEY (gram, pos, sample_id)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_code_grams_insert AFTER INSERT ON samples
+BEGIN
+    INSERT OR IGNORE INTO code_grams (gram, pos, sample_id)
+    SELECT substr('^' || c.code || '$', p.i + 1, 3),
+        CASE WHEN 2 * p.i < length(c.code) THEN p.i ELSE p.i - length(c.code) END, NEW.id
+    FROM (SELECT upper(NEW.animal_id) AS code UNION SELECT upper(NEW.barcode_value)) c
+    JOIN fuzzy_positions p ON p.i < length(c.code);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_code_grams_delete AFTER DELETE ON samples
+BEGIN
+    DELETE FROM code_grams WHERE sample_id = OLD.id
+        AND gram IN (
+            SELECT substr('^' || c.code || '$', p.i + 1, 3)
+            FROM (SELECT upper(OLD.animal_id) AS code UNION SELECT upper(OLD.barcode_value)) c
+            JOIN fuzzy_positions p ON p.i < length(c.code))
+        AND pos IN (
+            SELECT CASE WHEN 2 * p.i < length(c.code) THEN p.i ELSE p.i - length(c.code) END
+            FROM (SELECT upper(OLD.animal_id) AS code UNION SELECT upper(OLD.barcode_value)) c
+            JOIN fuzzy_positions p ON p.i < length(c.code));
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_code_grams_update AFTER UPDATE OF animal_id, barcode_value ON samples
+BEGIN
+    DELETE FROM code_grams WHERE sample_id = OLD.id
+        AND gram IN (
+            SELECT substr('^' || c.code || '$', p.i + 1, 3)
+            FROM (SELECT upper(OLD.animal_id) AS code UNION SELECT upper(OLD.barcode_value)) c
+            JOIN fuzzy_positions p ON p.i < length(c.code))
+        AND pos IN (
+            SELECT CASE WHEN 2 * p.i < length(c.code) THEN p.i ELSE p.i - length(c.code) END
+            FROM (SELECT upper(OLD.animal_id) AS code UNION SELECT upper(OLD.barcode_value)) c
+            JOIN fuzzy_positions p ON p.i < length(c.code));
+    INSERT OR IGNORE INTO code_grams (gram, pos, sample_id)
+    SELECT substr('^' || c.code || '$', p.i + 1, 3),
+        CASE WHEN 2 * p.i < length(c.code) THEN p.i ELSE p.i - length(c.code) END, NEW.id
+    FROM (SELECT upper(NEW.animal_id) AS code UNION SELECT upper(NEW.barcode_value)) c
+    JOIN fuzzy_positions p ON p.i < length(c.code);
+END;
+
+-- Subjects (see subjects.py): the animals samples are drawn from, so one
+-- animal's draws can be followed across time points and cohorts. A lookup
+-- table like sample_types. The timeline index covers everything a timeline
+-- page reads from samples, in timeline order, so a subject's history (or
+-- any page of it) is one range scan of the index without touching samples.
+CREATE TABLE IF NOT EXISTS subjects (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT UNIQUE NOT NULL,
+    species TEXT,
+    sex TEXT,
+    notes TEXT,
+    date_created TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_samples_subject_timeline
+    ON samples(subject_id, collection_date, time_point, id, animal_id, sample_type_id, cohort_id);
@@ -0,0 +1,297 @@
+import os
+import json
+import zlib
+import sqlite3
+
+# Cold-cohort archive. Finished cohorts are moved out of the live tables into a
+# separate SQLite file: one row per cohort holding its samples as a compressed
+# columnar blob, plus a sorted (WITHOUT ROWID) index of every sample ID and
+# barcode so archived tubes can still be looked up without decoding anything.
+# Freezer locations go with the cohort (archived_locations) and are put back
+# on restore, unless the slot has been reused or the box removed since.
+# Aliquots in other cohorts lose their archived parent (parent_id is SET
+# NULL); the links are kept in archived_links and made again on restore.
+
+ARCHIVE_FILENAME = 'bloodlogger_archive.db'
+
+ARCHIVE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {db}.archived_cohorts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    cohort_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    experimenter TEXT,
+    description TEXT,
+    date_created TEXT,
+    sample_count INTEGER NOT NULL,
+    archived_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    payload BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS {db}.archived_ids (
+    code TEXT NOT NULL,
+    archive_id INTEGER NOT NULL,
+    PRIMARY KEY (code, archive_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS {db}.archived_locations (
+    archive_id INTEGER NOT NULL,
+    sample_id INTEGER NOT NULL,
+    box_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    placed_at INTEGER NOT NULL,
+    PRIMARY KEY (archive_id, sample_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS {db}.archived_links (
+    archive_id INTEGER NOT NULL,
+    sample_id INTEGER NOT NULL,  -- live aliquot outside the cohort
+    parent_id INTEGER NOT NULL,  -- its archived parent
+    PRIMARY KEY (archive_id, sample_id)
+) WITHOUT ROWID;
+"""
+
+
+def get_archive_path(db_path):
+    return os.path.join(os.path.dirname(db_path), ARCHIVE_FILENAME)
+
+
+def attach_archive(conn, archive_path):
+    conn.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+    conn.executescript(ARCHIVE_SCHEMA.format(db='archive'))
+
+
+def detach_archive(conn):
+    conn.execute("DETACH DATABASE archive")
+
+
+def encode_columns(columns, rows):
+    # Store column-by-column so repeated values (type, experimenter, date)
+    # sit next to each other and compress well
+    data = {col: [row[i] for row in rows] for i, col in enumerate(columns)}
+    raw = json.dumps({"columns": columns, "data": data}, separators=(',', ':'))
+    return zlib.compress(raw.encode('utf-8'), 9)
+
+
+def decode_columns(payload):
+    obj = json.loads(zlib.decompress(payload).decode('utf-8'))
+    columns = obj["columns"]
+    data = obj["data"]
+    count = len(data[columns[0]]) if columns else 0
+    return columns, [tuple(data[col][i] for col in columns) for i in range(count)]
+
+
+def _pause_sync_capture(conn):
+    # Archiving and restoring are local housekeeping, not edits: the central
+    # database and the other benches keep the cohort. The sync triggers are
+    # switched off inside the transaction (as sync.pull does) and the saved
+    # value goes back before commit, so other connections never see it off.
+    row = conn.execute("SELECT value FROM main.app_meta WHERE key = 'sync_capture'").fetchone()
+    conn.execute("UPDATE main.app_meta SET value = '0' WHERE key = 'sync_capture'")
+    return row[0] if row else None
+
+
+def _resume_sync_capture(conn, value):
+    if value is not None:
+        conn.execute("UPDATE main.app_meta SET value = ? WHERE key = 'sync_capture'", (value,))
+
+
+def archive_cohort(conn, archive_path, cohort_id):
+    # Moves the cohort and all its samples into the archive in one transaction
+    # (SQLite commits attached databases atomically). Returns the sample count.
+    attach_archive(conn, archive_path)
+    try:
+        try:
+            # Hold the write lock from the read on, so a sample another bench
+            # adds meanwhile cannot be deleted without being archived
+            conn.execute("BEGIN IMMEDIATE")
+            cur = conn.cursor()
+            cur.execute("SELECT id, name, experimenter, description, date_created FROM cohorts WHERE id = ?", (cohort_id,))
+            cohort = cur.fetchone()
+            if not cohort:
+                raise ValueError(f"Cohort {cohort_id} not found.")
+            cur.execute("SELECT * FROM main.samples WHERE cohort_id = ? ORDER BY id", (cohort_id,))
+            columns = [d[0] for d in cur.description]
+            rows = cur.fetchall()
+            capture = _pause_sync_capture(conn)
+            cur.execute(
+                """
+                INSERT INTO archive.archived_cohorts (
+                    cohort_id, name, experimenter, description, date_created, sample_count, payload
+                ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (cohort[0], cohort[1], cohort[2], cohort[3], cohort[4], len(rows), encode_columns(columns, rows))
+            )
+            archive_id = cur.lastrowid
+            codes = set()
+            for row in rows:
+                codes.add(row[columns.index("animal_id")])
+                codes.add(row[columns.index("barcode_value")])
+            cur.executemany(
+                "INSERT OR IGNORE INTO archive.archived_ids (code, archive_id) VALUES (?, ?)",
+                [(code, archive_id) for code in codes if code]
+            )
+            # Deleting the samples cascades to their locations
+            cur.execute(
+                """
+                INSERT INTO archive.archived_locations (archive_id, sample_id, box_id, position, placed_at)
+                SELECT ?, l.sample_id, l.box_id, l.position, l.placed_at
+                FROM main.samples s JOIN main.sample_locations l ON l.sample_id = s.id
+                WHERE s.cohort_id = ?
+                """,
+                (archive_id, cohort_id)
+            )
+            cur.execute(
+                """
+                INSERT INTO archive.archived_links (archive_id, sample_id, parent_id)
+                SELECT ?, c.id, c.parent_id
+                FROM main.samples p JOIN main.samples c ON c.parent_id = p.id
+                WHERE p.cohort_id = ? AND c.cohort_id IS NOT p.cohort_id
+                """,
+                (archive_id, cohort_id)
+            )
+            cur.execute("DELETE FROM main.samples WHERE cohort_id = ?", (cohort_id,))
+            cur.execute("DELETE FROM main.cohorts WHERE id = ?", (cohort_id,))
+            _resume_sync_capture(conn, capture)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return len(rows)
+    finally:
+        detach_archive(conn)
+
+
+def restore_cohort(conn, archive_path, archive_id):
+    # Puts an archived cohort back into the live tables with its original
+    # cohort and sample ids, then drops it from the archive. Returns
+    # (cohort_id, sample IDs whose freezer location could not be put back).
+    attach_archive(conn, archive_path)
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT cohort_id, name, experimenter, description, date_created, payload
+            FROM archive.archived_cohorts WHERE id = ?
+            """,
+            (archive_id,)
+        )
+        archived = cur.fetchone()
+        if not archived:
+            raise ValueError(f"Archived cohort {archive_id} not found.")
+        cohort_id, name, experimenter, description, date_created, payload = archived
+        columns, rows = decode_columns(payload)
+        # The live schema may have gained or lost columns since archiving
+        cur.execute("PRAGMA main.table_info(samples)")
+        live_columns = {r[1] for r in cur.fetchall()}
+        keep = [i for i, col in enumerate(columns) if col in live_columns]
+        col_sql = ", ".join(columns[i] for i in keep)
+        placeholders = ", ".join("?" for _ in keep)
+        links = []
+        if "parent_id" in columns and "parent_id" in live_columns:
+            # Samples go in unlinked and get their parents afterwards, since a
+            # parent may have a higher id than its aliquot. Aliquots of a
+            # sample deleted since archiving stay unlinked.
+            id_col, parent_col = columns.index("id"), columns.index("parent_id")
+            restored_ids = {row[id_col] for row in rows}
+            for row in rows:
+                parent_id = row[parent_col]
+                if parent_id is None:
+                    continue
+                if parent_id in restored_ids or cur.execute("SELECT 1 FROM main.samples WHERE id = ?", (parent_id,)).fetchone():
+                    links.append((parent_id, row[id_col]))
+            rows = [row[:parent_col] + (None,) + row[parent_col + 1:] for row in rows]
+        try:
+            capture = _pause_sync_capture(conn)
+            cur.execute(
+                "INSERT INTO main.cohorts (id, name, experimenter, description, date_created) VALUES (?, ?, ?, ?, ?)",
+                (cohort_id, name, experimenter, description, date_created)
+            )
+            cur.executemany(
+                f"INSERT INTO main.samples ({col_sql}) VALUES ({placeholders})",
+                [tuple(row[i] for i in keep) for row in rows]
+            )
+            cur.executemany("UPDATE main.samples SET parent_id = ? WHERE id = ?", links)
+            # OR IGNORE skips slots taken since; removed boxes are filtered out
+            cur.execute(
+                """
+                INSERT OR IGNORE INTO main.sample_locations (sample_id, box_id, position, placed_at)
+                SELECT a.sample_id, a.box_id, a.position, a.placed_at FROM archive.archived_locations a
+                WHERE a.archive_id = ? AND a.box_id IN (SELECT id FROM main.boxes)
+                """,
+                (archive_id,)
+            )
+            cur.execute(
+                """
+                SELECT s.animal_id FROM archive.archived_locations a JOIN main.samples s ON s.id = a.sample_id
+                WHERE a.archive_id = ? AND NOT EXISTS (SELECT 1 FROM main.sample_locations l WHERE l.sample_id = a.sample_id)
+                ORDER BY s.id
+                """,
+                (archive_id,)
+            )
+            unplaced = [row[0] for row in cur.fetchall()]
+            # Aliquots elsewhere that have not been given another parent since
+            cur.execute(
+                """
+                SELECT a.parent_id, a.sample_id FROM archive.archived_links a
+                JOIN main.samples s ON s.id = a.sample_id
+                WHERE a.archive_id = ? AND s.parent_id IS NULL
+                """,
+                (archive_id,)
+            )
+            cur.executemany("UPDATE main.samples SET parent_id = ? WHERE id = ?", cur.fetchall())
+            cur.execute("DELETE FROM archive.archived_links WHERE archive_id = ?", (archive_id,))
+            cur.execute("DELETE FROM archive.archived_locations WHERE archive_id = ?", (archive_id,))
+            cur.execute("DELETE FROM archive.archived_ids WHERE archive_id = ?", (archive_id,))
+            cur.execute("DELETE FROM archive.archived_cohorts WHERE id = ?", (archive_id,))
+            _resume_sync_capture(conn, capture)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return cohort_id, unplaced
+    finally:
+        detach_archive(conn)
+
+
+def list_archived_cohorts(archive_path):
+    if not os.path.exists(archive_path):
+        return []
+    with sqlite3.connect(archive_path) as conn:
+        conn.executescript(ARCHIVE_SCHEMA.format(db='main'))
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT id, name, experimenter, date_created, sample_count, archived_at, length(payload)
+            FROM archived_cohorts ORDER BY id DESC
+        """)
+        return cur.fetchall()
+
+
+def lookup_archived(archive_path, code):
+    # Returns (cohort info dict, sample dict) for an archived SampleID/barcode,
+    # or None. The sorted index answers misses without touching any payload.
+    if not code or not os.path.exists(archive_path):
+        return None
+    with sqlite3.connect(archive_path) as conn:
+        conn.executescript(ARCHIVE_SCHEMA.format(db='main'))
+        cur = conn.cursor()
+        cur.execute("SELECT archive_id FROM archived_ids WHERE code = ? LIMIT 1", (code,))
+        hit = cur.fetchone()
+        if not hit:
+            return None
+        cur.execute(
+            "SELECT id, name, experimenter, date_created, archived_at, payload FROM archived_cohorts WHERE id = ?",
+            (hit[0],)
+        )
+        archived = cur.fetchone()
+    if not archived:
+        return None
+    columns, rows = decode_columns(archived[5])
+    for row in rows:
+        sample = dict(zip(columns, row))
+        if sample.get("animal_id") == code or sample.get("barcode_value") == code:
+            cohort = {
+                "archive_id": archived[0],
+                "name": archived[1],
+                "experimenter": archived[2],
+                "date_created": archived[3],
+                "archived_at": archived[4],
+            }
+            return cohort, sample
+    return None
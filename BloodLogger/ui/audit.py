@@ -0,0 +1,244 @@
+import os
+import gzip
+import json
+import time
+
+# Append-only audit trail. Triggers on samples and cohorts write one row per
+# insert/update/delete into audit_events. The diff only holds the fields that
+# changed, keyed by interned field ids (audit_fields); the user is interned
+# in audit_users. The triggers are generated from the live column lists by
+# ensure_triggers(), so columns added by later migrations are audited too.
+# Old events can be rolled into gzip'd JSON-lines segment files.
+#
+# The acting user is per connection, not shared in app_meta. The triggers
+# write events with no user; open_session() gives a connection a TEMP table
+# holding its user and a TEMP trigger that stamps its events with it (a
+# main-schema trigger cannot read TEMP tables). Any other client - the
+# sqlite3 shell, a DB browser, a script - still writes normally and its
+# events are simply unattributed. Deleting events is refused for everyone;
+# roll_segment() drops the guard inside its own transaction and puts it
+# back before committing, so no other connection ever sees it missing.
+
+AUDITED_TABLES = {'samples': 1, 'cohorts': 2}
+# Bookkeeping columns that would only add noise to every event
+UNAUDITED_COLUMNS = ('id', 'row_version')
+TABLE_NAMES = {v: k for k, v in AUDITED_TABLES.items()}
+OPS = {'I': 'insert', 'U': 'update', 'D': 'delete'}
+
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})") if row[1] not in UNAUDITED_COLUMNS]
+
+
+def _field_ids(conn, table, columns):
+    conn.executemany(
+        "INSERT OR IGNORE INTO audit_fields (name) VALUES (?)",
+        [(f"{table}.{col}",) for col in columns]
+    )
+    cur = conn.execute("SELECT name, id FROM audit_fields")
+    names = dict(cur.fetchall())
+    return {col: names[f"{table}.{col}"] for col in columns}
+
+
+def _trigger_sql(table, table_id, field_ids):
+    insert_head = (
+        "INSERT INTO audit_events (ts, user_id, table_id, row_id, op, diff) "
+        f"VALUES (CAST(strftime('%s', 'now') AS INTEGER), NULL, {table_id}, "
+    )
+    # Inserts and deletes keep the non-NULL values of the row
+    def row_values(ref):
+        parts = [f"SELECT '{fid}' AS f, {ref}.{col} AS v WHERE {ref}.{col} IS NOT NULL" for col, fid in field_ids.items()]
+        return f"(SELECT json_group_object(f, v) FROM ({' UNION ALL '.join(parts)}))"
+    # Updates keep [old, new] for changed fields only
+    changed = " UNION ALL ".join(
+        f"SELECT '{fid}' AS f, json_array(OLD.{col}, NEW.{col}) AS v WHERE OLD.{col} IS NOT NEW.{col}"
+        for col, fid in field_ids.items()
+    )
+    return [
+        f"""CREATE TRIGGER trg_audit_{table}_insert AFTER INSERT ON {table}
+BEGIN
+    {insert_head}NEW.id, 'I', {row_values('NEW')});
+END""",
+        f"""CREATE TRIGGER trg_audit_{table}_update AFTER UPDATE ON {table}
+WHEN EXISTS ({changed})
+BEGIN
+    {insert_head}NEW.id, 'U', (SELECT json_group_object(f, json(v)) FROM ({changed})));
+END""",
+        f"""CREATE TRIGGER trg_audit_{table}_delete AFTER DELETE ON {table}
+BEGIN
+    {insert_head}OLD.id, 'D', {row_values('OLD')});
+END""",
+    ]
+
+
+NO_DELETE_TRIGGER = """CREATE TRIGGER trg_audit_events_no_delete BEFORE DELETE ON audit_events
+BEGIN
+    SELECT RAISE(ABORT, 'audit_events is append-only');
+END"""
+
+
+def ensure_triggers(conn):
+    # Recreated on every start to follow the current columns
+    conn.execute("DROP TRIGGER IF EXISTS trg_audit_events_no_delete")
+    conn.execute(NO_DELETE_TRIGGER)
+    for table, table_id in AUDITED_TABLES.items():
+        field_ids = _field_ids(conn, table, _columns(conn, table))
+        for op in ('insert', 'update', 'delete'):
+            conn.execute(f"DROP TRIGGER IF EXISTS trg_audit_{table}_{op}")
+        for sql in _trigger_sql(table, table_id, field_ids):
+            conn.execute(sql)
+    conn.commit()
+
+
+def intern_user(conn, name):
+    conn.execute("INSERT OR IGNORE INTO audit_users (name) VALUES (?)", (name,))
+    user_id = conn.execute("SELECT id FROM audit_users WHERE name = ?", (name,)).fetchone()[0]
+    conn.commit()
+    return user_id
+
+
+# Re-inserts an unattributed event with the connection's user and drops the
+# original (RAISE(IGNORE) skips just that row)
+SESSION_TRIGGER = """CREATE TEMP TRIGGER IF NOT EXISTS trg_audit_session_user BEFORE INSERT ON audit_events
+WHEN NEW.user_id IS NULL AND (SELECT user_id FROM temp.audit_session) IS NOT NULL
+BEGIN
+    INSERT INTO audit_events (ts, user_id, table_id, row_id, op, diff)
+    VALUES (NEW.ts, (SELECT user_id FROM temp.audit_session), NEW.table_id, NEW.row_id, NEW.op, NEW.diff);
+    SELECT RAISE(IGNORE);
+END"""
+
+
+def open_session(conn, user_id):
+    # Changes made through conn are recorded as user_id (None: unattributed,
+    # e.g. startup migrations)
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS audit_session (user_id INTEGER)")
+    conn.execute("DELETE FROM temp.audit_session")
+    conn.execute("INSERT INTO temp.audit_session (user_id) VALUES (?)", (user_id,))
+    if user_id is not None:
+        conn.execute(SESSION_TRIGGER)
+    conn.commit()
+
+
+def _decode(conn, rows):
+    # Expands field/user ids into names: [(ts, user, table, row_id, op, {field: value})]
+    fields = dict(conn.execute("SELECT id, name FROM audit_fields").fetchall())
+    users = dict(conn.execute("SELECT id, name FROM audit_users").fetchall())
+    events = []
+    for event_id, ts, user_id, table_id, row_id, op, diff in rows:
+        changes = {}
+        for fid, value in json.loads(diff or "{}").items():
+            name = fields.get(int(fid), fid)
+            changes[name.split(".", 1)[-1]] = value
+        events.append({
+            "id": event_id,
+            "time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts)),
+            "user": users.get(user_id),
+            "table": TABLE_NAMES.get(table_id),
+            "row_id": row_id,
+            "op": OPS.get(op, op),
+            "changes": changes,
+        })
+    return events
+
+
+def history(conn, table, row_id, limit=500):
+    # Newest first; an index range scan on (table_id, row_id, id)
+    cur = conn.execute(
+        """
+        SELECT id, ts, user_id, table_id, row_id, op, diff FROM audit_events
+        WHERE table_id = ? AND row_id = ? ORDER BY id DESC LIMIT ?
+        """,
+        (AUDITED_TABLES[table], row_id, limit)
+    )
+    return _decode(conn, cur.fetchall())
+
+
+def recent(conn, since_ts=None, limit=500):
+    if since_ts is None:
+        cur = conn.execute(
+            "SELECT id, ts, user_id, table_id, row_id, op, diff FROM audit_events ORDER BY id DESC LIMIT ?",
+            (limit,)
+        )
+    else:
+        cur = conn.execute(
+            """
+            SELECT id, ts, user_id, table_id, row_id, op, diff FROM audit_events
+            WHERE ts >= ? ORDER BY ts DESC, id DESC LIMIT ?
+            """,
+            (since_ts, limit)
+        )
+    return _decode(conn, cur.fetchall())
+
+
+def roll_segment(conn, segment_dir, before_ts):
+    # Moves events older than before_ts into a gzip'd JSON-lines file and
+    # records it in audit_segments. Returns the number of events moved.
+    cur = conn.execute(
+        "SELECT MIN(id), MAX(id), COUNT(*), MIN(ts), MAX(ts) FROM audit_events WHERE ts < ?",
+        (before_ts,)
+    )
+    first_id, last_id, count, first_ts, last_ts = cur.fetchone()
+    if not count:
+        return 0
+    os.makedirs(segment_dir, exist_ok=True)
+    path = os.path.join(segment_dir, f"audit_{first_id:010d}_{last_id:010d}.jsonl.gz")
+    fields = dict(conn.execute("SELECT id, name FROM audit_fields").fetchall())
+    users = dict(conn.execute("SELECT id, name FROM audit_users").fetchall())
+    cur = conn.execute(
+        "SELECT id, ts, user_id, table_id, row_id, op, diff FROM audit_events WHERE id BETWEEN ? AND ? AND ts < ? ORDER BY id",
+        (first_id, last_id, before_ts)
+    )
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        # Names are written out so a segment can be read without this database
+        f.write(json.dumps({"fields": fields, "users": users}) + "\n")
+        for row in cur:
+            f.write(json.dumps(row) + "\n")
+    try:
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DROP TRIGGER trg_audit_events_no_delete")
+        conn.execute("DELETE FROM audit_events WHERE id BETWEEN ? AND ? AND ts < ?", (first_id, last_id, before_ts))
+        conn.execute(NO_DELETE_TRIGGER)
+        conn.execute(
+            """
+            INSERT INTO audit_segments (path, first_event_id, last_event_id, first_ts, last_ts, event_count)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (path, first_id, last_id, first_ts, last_ts, count)
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        os.remove(path)
+        raise
+    return count
+
+
+def segment_history(segment_path, table, row_id):
+    # Reads one archived segment; same shape as history()
+    events = []
+    with gzip.open(segment_path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        fields = {int(k): v for k, v in header["fields"].items()}
+        users = {int(k): v for k, v in header["users"].items()}
+        for line in f:
+            event_id, ts, user_id, table_id, event_row_id, op, diff = json.loads(line)
+            if table_id != AUDITED_TABLES[table] or event_row_id != row_id:
+                continue
+            changes = {fields.get(int(fid), fid).split(".", 1)[-1]: value for fid, value in json.loads(diff or "{}").items()}
+            events.append({
+                "id": event_id,
+                "time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts)),
+                "user": users.get(user_id),
+                "table": table,
+                "row_id": event_row_id,
+                "op": OPS.get(op, op),
+                "changes": changes,
+            })
+    return list(reversed(events))
+
+
+def list_segments(conn):
+    return conn.execute(
+        "SELECT path, first_event_id, last_event_id, first_ts, last_ts, event_count FROM audit_segments ORDER BY first_event_id"
+    ).fetchall()
@@ -0,0 +1,180 @@
+import json
+import time
+import lookups
+
+# Set-based edits of many samples at once. The selected row ids go into a
+# temp table; every batch is one UPDATE ... WHERE id IN (SELECT ...) and the
+# whole edit is one transaction. The old values of the changed columns are
+# saved in bulk_edit_rows so the edit can be undone, with each row's
+# row_version after the edit: undo only puts back rows still at that
+# version, so it never overwrites a later save, sync pull or bulk edit
+# (the same check as versioning.save).
+
+BULK_EDIT_BATCH_SIZE = 500
+PREVIEW_LIMIT = 1000
+
+# Field name -> samples column
+FIELDS = {
+    'sample_type': 'sample_type_id',
+    'experimenter': 'experimenter_id',
+    'subject': 'subject_id',
+    'collection_date': 'collection_date',
+    'time_point': 'time_point',
+    'notes': 'notes',
+}
+LOOKUP_FIELDS = {'sample_type': 'sample_types', 'experimenter': 'experimenters', 'subject': 'subjects'}
+# changes may also hold 'date_shift': days added to each collection date
+
+
+def _load_ids(conn, sample_ids):
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS bulk_ids (pos INTEGER PRIMARY KEY, id INTEGER)")
+    conn.execute("DELETE FROM bulk_ids")
+    conn.executemany("INSERT INTO bulk_ids (pos, id) VALUES (?, ?)", list(enumerate(sample_ids)))
+
+
+def _assignments(conn, changes, create_lookups):
+    # [(column, SQL expression, params)] for the SET clause
+    assignments = []
+    for field, value in changes.items():
+        if field == 'date_shift':
+            continue
+        if field not in FIELDS:
+            raise ValueError(f"Unknown field: {field}")
+        if field in LOOKUP_FIELDS:
+            find = lookups.get_or_create_id if create_lookups else lookups.find_id
+            value = find(conn, LOOKUP_FIELDS[field], value)
+        assignments.append((FIELDS[field], "?", (value if value != "" else None,)))
+    if changes.get('date_shift'):
+        if 'collection_date' in changes:
+            raise ValueError("Set the collection date or shift it, not both.")
+        assignments.append(('collection_date', "date(collection_date, ?)", (f"{int(changes['date_shift']):+d} days",)))
+    if not assignments:
+        raise ValueError("No changes given.")
+    return assignments
+
+
+def describe(changes):
+    parts = []
+    for field, value in changes.items():
+        if field == 'date_shift':
+            parts.append(f"collection_date {int(value):+d} day(s)")
+        else:
+            parts.append(f"{field} = {value or '(empty)'}")
+    return ", ".join(parts)
+
+
+def preview(conn, sample_ids, changes, limit=PREVIEW_LIMIT):
+    # [(sample ID, field, old, new)] for rows that would change, at most limit
+    _load_ids(conn, sample_ids)
+    new_date = "date(s.collection_date, ?)" if changes.get('date_shift') else "s.collection_date"
+    params = (f"{int(changes['date_shift']):+d} days",) if changes.get('date_shift') else ()
+    cur = conn.execute(
+        f"""
+        SELECT s.animal_id, t.name, e.name, j.name, s.collection_date, s.time_point, s.notes, {new_date}
+        FROM bulk_ids b
+        JOIN samples s ON s.id = b.id
+        LEFT JOIN sample_types t ON t.id = s.sample_type_id
+        LEFT JOIN experimenters e ON e.id = s.experimenter_id
+        LEFT JOIN subjects j ON j.id = s.subject_id
+        ORDER BY b.pos
+        """,
+        params
+    )
+    rows = []
+    for animal_id, sample_type, experimenter, subject, collection_date, time_point, notes, shifted in cur:
+        old = {
+            'sample_type': sample_type, 'experimenter': experimenter, 'subject': subject,
+            'collection_date': collection_date, 'time_point': time_point, 'notes': notes,
+        }
+        new = {field: (value or None) for field, value in changes.items() if field in FIELDS}
+        if changes.get('date_shift'):
+            new['collection_date'] = shifted
+        for field, value in new.items():
+            if old[field] != value:
+                rows.append((animal_id, field, old[field], value))
+                if len(rows) >= limit:
+                    return rows
+    return rows
+
+
+def apply(conn, sample_ids, changes, batch_size=BULK_EDIT_BATCH_SIZE):
+    # Applies changes to every sample in one transaction. Returns the
+    # bulk_edits id used to undo it.
+    try:
+        assignments = _assignments(conn, changes, create_lookups=True)
+        columns = [column for column, _, _ in assignments]
+        set_sql = ", ".join(f"{column} = {expr}" for column, expr, _ in assignments)
+        set_params = tuple(p for _, _, params in assignments for p in params)
+        old_sql = "json_object(" + ", ".join(f"'{column}', {column}" for column in columns) + ")"
+        _load_ids(conn, sample_ids)
+        cur = conn.execute(
+            "INSERT INTO bulk_edits (ts, description, sample_count) VALUES (?, ?, ?)",
+            (int(time.time()), describe(changes), len(sample_ids))
+        )
+        edit_id = cur.lastrowid
+        for start in range(0, len(sample_ids), batch_size):
+            batch = "SELECT id FROM bulk_ids WHERE pos BETWEEN ? AND ?"
+            bounds = (start, start + batch_size - 1)
+            conn.execute(
+                f"INSERT INTO bulk_edit_rows (edit_id, sample_id, old_values, row_version) "
+                f"SELECT ?, id, {old_sql}, row_version + 1 FROM samples WHERE id IN ({batch})",
+                (edit_id,) + bounds
+            )
+            conn.execute(
+                f"UPDATE samples SET {set_sql}, row_version = row_version + 1 WHERE id IN ({batch})",
+                set_params + bounds
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return edit_id
+
+
+def undo(conn, edit_id):
+    # Puts back the saved values of one edit. Samples changed or deleted
+    # since are skipped. Returns (samples restored, sample IDs of the
+    # changed samples that were skipped).
+    cur = conn.execute("SELECT undone_at FROM bulk_edits WHERE id = ?", (edit_id,))
+    row = cur.fetchone()
+    if not row:
+        raise ValueError(f"Bulk edit {edit_id} not found.")
+    if row[0] is not None:
+        raise ValueError(f"Bulk edit {edit_id} was already undone.")
+    cur = conn.execute("SELECT old_values FROM bulk_edit_rows WHERE edit_id = ? LIMIT 1", (edit_id,))
+    first = cur.fetchone()
+    cur = conn.execute(
+        """
+        SELECT s.animal_id FROM bulk_edit_rows r JOIN samples s ON s.id = r.sample_id
+        WHERE r.edit_id = ? AND s.row_version IS NOT r.row_version ORDER BY s.id
+        """,
+        (edit_id,)
+    )
+    moved = [row[0] for row in cur.fetchall()]
+    restored = 0
+    try:
+        if first:
+            columns = list(json.loads(first[0]))
+            set_sql = ", ".join(
+                f"{column} = (SELECT json_extract(r.old_values, '$.{column}') FROM bulk_edit_rows r "
+                f"WHERE r.edit_id = ? AND r.sample_id = samples.id)"
+                for column in columns
+            )
+            cur = conn.execute(
+                f"UPDATE samples SET {set_sql}, row_version = row_version + 1 "
+                f"WHERE id IN (SELECT r.sample_id FROM bulk_edit_rows r "
+                f"WHERE r.edit_id = ? AND r.row_version = samples.row_version)",
+                (edit_id,) * (len(columns) + 1)
+            )
+            restored = cur.rowcount
+        conn.execute("UPDATE bulk_edits SET undone_at = ? WHERE id = ?", (int(time.time()), edit_id))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return restored, moved
+
+
+def last_undoable(conn):
+    cur = conn.execute("SELECT id, description, sample_count FROM bulk_edits WHERE undone_at IS NULL ORDER BY id DESC LIMIT 1")
+    return cur.fetchone()
@@ -0,0 +1,71 @@
+import os
+import socketserver
+import sqlite3
+import sys
+import threading
+
+import pytest
+
+import audit
+import migrations
+import printer_status
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import zebra_standin  # noqa: E402
+
+# Shared fixtures for the tests next to each module. A database gets the
+# same setup as the app's: migrations, then schema.sql, then the generated
+# audit triggers, on a connection with an audit session and foreign keys on.
+# Network printers are zebra_standin servers running in-process.
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), '..', 'db', 'schema.sql')
+
+
+def open_db(path=":memory:"):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA foreign_keys = ON")
+    audit.open_session(conn, None)
+    migrations.migrate(conn)
+    with open(SCHEMA_PATH) as f:
+        conn.executescript(f.read())
+    audit.ensure_triggers(conn)
+    return conn
+
+
+def add_sample(conn, code, cohort_id=None, **columns):
+    names = ["animal_id", "barcode_value", "cohort_id"] + list(columns)
+    cur = conn.execute(
+        f"INSERT INTO samples ({', '.join(names)}) VALUES ({', '.join('?' for _ in names)})",
+        (code, code, cohort_id) + tuple(columns.values())
+    )
+    conn.commit()
+    return cur.lastrowid
+
+
+@pytest.fixture
+def conn():
+    conn = open_db()
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def standins(monkeypatch):
+    # standins(state) serves a zebra_standin.PrinterState on a free port and
+    # returns its tcp:// address; pacing polls quickly
+    monkeypatch.setattr(printer_status, "POLL_INTERVAL", 0.01)
+    servers = []
+
+    def start(state):
+        threading.Thread(target=state.run_head, daemon=True).start()
+        server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), zebra_standin.RawPortHandler)
+        server.daemon_threads = True
+        server.state = state
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"tcp://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,162 @@
+import string
+
+# Near-match lookup for codes that were misread or mistyped. code_grams
+# (kept in step with samples by the triggers in schema.sql) maps positional
+# trigrams to samples. A lookup reads the postings of the query's selective
+# trigrams only, ranks samples by how many they share, and re-ranks the best
+# of those by edit distance, so it never scans samples.
+#
+# Sequential IDs are dense: one edit destroys three trigrams and the rest
+# are mostly the common prefix ones, so a one-edit neighbour can share as
+# little as one selective trigram with the query. Those are found exactly
+# instead, by probing every one-edit variant of the query against the
+# sample ID / barcode indexes (about a thousand lookups for an 8-character
+# code).
+
+FUZZY_BUILT_KEY = 'code_grams_built'
+STOP_POSTINGS = 4000       # trigrams on more samples than this are skipped
+CANDIDATE_LIMIT = 500      # samples re-ranked by edit distance
+MAX_DISTANCE = 2
+SUGGESTION_LIMIT = 10
+VARIANT_ALPHABET = string.digits + string.ascii_uppercase + "-_"
+
+GRAMS_SQL = """
+    SELECT substr('^' || c.code || '$', p.i + 1, 3),
+        CASE WHEN 2 * p.i < length(c.code) THEN p.i ELSE p.i - length(c.code) END, c.id
+    FROM (SELECT id, upper(animal_id) AS code FROM samples
+          UNION ALL SELECT id, upper(barcode_value) FROM samples WHERE barcode_value != animal_id) c
+    JOIN fuzzy_positions p ON p.i < length(c.code)
+"""
+
+
+def rebuild_index(conn):
+    conn.execute("DELETE FROM code_grams")
+    conn.execute(f"INSERT OR IGNORE INTO code_grams (gram, pos, sample_id) {GRAMS_SQL}")
+    conn.execute("INSERT OR REPLACE INTO app_meta (key, value) VALUES (?, '1')", (FUZZY_BUILT_KEY,))
+    conn.commit()
+
+
+def ensure_index(conn):
+    # Backfill once for databases that had samples before the triggers existed
+    cur = conn.execute("SELECT value FROM app_meta WHERE key = ?", (FUZZY_BUILT_KEY,))
+    if not cur.fetchone():
+        rebuild_index(conn)
+
+
+def grams(code, both_anchors_near_middle=False):
+    # [(trigram, position)] as stored in code_grams. Codes one character
+    # longer or shorter split one trigram further along, so a query also
+    # tries the trigrams next to the middle anchored from the other end.
+    code = code.upper()
+    padded = f"^{code}$"
+    n = len(code)
+    result = []
+    for i in range(min(n, 64)):
+        forward = 2 * i < n
+        result.append((padded[i:i + 3], i if forward else i - n))
+        if both_anchors_near_middle and abs(2 * i - n) <= 2:
+            result.append((padded[i:i + 3], i - n if forward else i))
+    return result
+
+
+def edit_distance(a, b, limit=MAX_DISTANCE):
+    # Levenshtein distance counting an adjacent swap as one edit (optimal
+    # string alignment); anything over limit comes back as limit + 1
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+
+def one_edit_variants(code):
+    # Every string one substitution, insertion, deletion or adjacent swap
+    # away from code
+    alphabet = set(VARIANT_ALPHABET) | set(code.upper()) | set(code)
+    variants = set()
+    for i in range(len(code) + 1):
+        for ch in alphabet:
+            variants.add(code[:i] + ch + code[i:])
+            if i < len(code):
+                variants.add(code[:i] + ch + code[i + 1:])
+        if i < len(code):
+            variants.add(code[:i] + code[i + 1:])
+        if i < len(code) - 1:
+            variants.add(code[:i] + code[i + 1] + code[i] + code[i + 2:])
+    variants.discard(code)
+    return variants
+
+
+def _variant_matches(conn, code):
+    # [(sample ID, barcode)] of samples one edit away, by exact index probes
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS fuzzy_variants (code TEXT PRIMARY KEY)")
+    conn.execute("DELETE FROM fuzzy_variants")
+    conn.executemany("INSERT OR IGNORE INTO fuzzy_variants (code) VALUES (?)", [(v,) for v in one_edit_variants(code)])
+    cur = conn.execute(
+        """
+        SELECT s.animal_id, s.barcode_value FROM fuzzy_variants v CROSS JOIN samples s ON s.barcode_value = v.code
+        UNION
+        SELECT s.animal_id, s.barcode_value FROM fuzzy_variants v CROSS JOIN samples s ON s.animal_id = v.code
+        """
+    )
+    rows = cur.fetchall()
+    conn.execute("DELETE FROM fuzzy_variants")
+    return rows
+
+
+def near_matches(conn, code, limit=SUGGESTION_LIMIT, max_distance=MAX_DISTANCE):
+    # [(sample ID, barcode, distance)] of samples within max_distance edits
+    # of code, closest first
+    code = code.strip()
+    if not code:
+        return []
+    # sample ID -> (barcode, trigrams shared with the query)
+    candidates = {}
+    for animal_id, barcode_value in _variant_matches(conn, code):
+        candidates[animal_id] = (barcode_value, 0)
+    selective = []
+    for gram, pos in set(grams(code, both_anchors_near_middle=True)):
+        cur = conn.execute(
+            "SELECT COUNT(*) FROM (SELECT 1 FROM code_grams WHERE gram = ? AND pos = ? LIMIT ?)",
+            (gram, pos, STOP_POSTINGS + 1)
+        )
+        if cur.fetchone()[0] <= STOP_POSTINGS:
+            selective.append((gram, pos))
+    if selective:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS fuzzy_query (gram TEXT, pos INTEGER, PRIMARY KEY (gram, pos))")
+        conn.execute("DELETE FROM fuzzy_query")
+        conn.executemany("INSERT INTO fuzzy_query (gram, pos) VALUES (?, ?)", selective)
+        # CROSS JOIN keeps the few query trigrams as the outer loop
+        cur = conn.execute(
+            """
+            SELECT s.animal_id, s.barcode_value, m.shared FROM (
+                SELECT g.sample_id, COUNT(*) AS shared FROM fuzzy_query q
+                CROSS JOIN code_grams g ON g.gram = q.gram AND g.pos = q.pos
+                GROUP BY g.sample_id ORDER BY shared DESC LIMIT ?
+            ) m JOIN samples s ON s.id = m.sample_id
+            """,
+            (CANDIDATE_LIMIT,)
+        )
+        for animal_id, barcode_value, shared in cur.fetchall():
+            candidates[animal_id] = (barcode_value, shared)
+        conn.execute("DELETE FROM fuzzy_query")
+    upper = code.upper()
+    matches = []
+    for animal_id, (barcode_value, shared) in candidates.items():
+        distance = edit_distance(upper, animal_id.upper(), max_distance)
+        if barcode_value != animal_id:
+            distance = min(distance, edit_distance(upper, barcode_value.upper(), max_distance))
+        if distance <= max_distance:
+            matches.append((distance, -shared, animal_id, barcode_value))
+    matches.sort()
+    return [(animal_id, barcode_value, distance) for distance, _, animal_id, barcode_value in matches[:limit]]
@@ -0,0 +1,183 @@
+import re
+
+# Sample-ID allocation. Each prefix has a counter row in id_prefixes; handing
+# out N IDs is a read of that row plus one UPDATE, inside a write-locked
+# transaction so two benches can never get overlapping blocks. Ranges in
+# id_reservations (manual reservations and past allocations) are skipped.
+
+DEFAULT_ID_FORMAT = "{prefix}{number:0{width}d}"
+COLLISION_CHECK_CHUNK = 500
+
+
+class AllocationError(Exception):
+    pass
+
+
+def format_id(prefix, number, pad_width=0, id_format=DEFAULT_ID_FORMAT):
+    return id_format.format(prefix=prefix, number=number, width=pad_width)
+
+
+def _begin_immediate(conn):
+    # Take the write lock before reading the counter. The caller commits, so
+    # the IDs and the rows that use them land in the same transaction.
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+
+
+def _existing_max_number(cur, prefix):
+    # One-off seed for a prefix used before the allocator existed: an index
+    # range scan over barcodes starting with the prefix
+    cur.execute(
+        "SELECT barcode_value FROM samples WHERE barcode_value >= ? AND barcode_value < ?",
+        (prefix, prefix + "\U0010ffff")
+    )
+    pattern = re.compile(re.escape(prefix) + r"(\d+)$")
+    best = -1
+    for (value,) in cur.fetchall():
+        match = pattern.match(value)
+        if match:
+            best = max(best, int(match.group(1)))
+    return best
+
+
+def _get_prefix(cur, prefix, create=False):
+    cur.execute("SELECT next_number, pad_width, id_format FROM id_prefixes WHERE prefix = ?", (prefix,))
+    row = cur.fetchone()
+    if row or not create:
+        return row
+    next_number = _existing_max_number(cur, prefix) + 1
+    cur.execute("INSERT INTO id_prefixes (prefix, next_number) VALUES (?, ?)", (prefix, next_number))
+    return (next_number, 0, DEFAULT_ID_FORMAT)
+
+
+def _skip_reserved(cur, prefix, start, count):
+    # Moves start past any reserved range overlapping [start, start+count-1].
+    # Allocated blocks all lie below next_number, so only manual reservations
+    # (a handful per prefix) can be in the way.
+    while True:
+        cur.execute(
+            """
+            SELECT MAX(end_number) FROM id_reservations
+            WHERE prefix = ? AND kind = 'reserved' AND start_number <= ? AND end_number >= ?
+            """,
+            (prefix, start + count - 1, start)
+        )
+        end = cur.fetchone()[0]
+        if end is None:
+            return start
+        start = end + 1
+
+
+def _colliding_numbers(cur, prefix, start, count, pad_width, id_format):
+    ids = {format_id(prefix, n, pad_width, id_format): n for n in range(start, start + count)}
+    values = list(ids)
+    found = []
+    for i in range(0, len(values), COLLISION_CHECK_CHUNK):
+        chunk = values[i:i + COLLISION_CHECK_CHUNK]
+        placeholders = ", ".join("?" for _ in chunk)
+        cur.execute(
+            f"SELECT barcode_value FROM samples WHERE barcode_value IN ({placeholders}) "
+            f"UNION SELECT animal_id FROM samples WHERE animal_id IN ({placeholders})",
+            chunk + chunk
+        )
+        found.extend(ids[v] for (v,) in cur.fetchall())
+    return found
+
+
+def _free_block(cur, prefix, start, count, pad_width, id_format):
+    # First start >= start whose block is clear of reservations and of IDs
+    # already in use
+    while True:
+        start = _skip_reserved(cur, prefix, start, count)
+        # IDs entered by hand may already use numbers past the counter
+        collisions = _colliding_numbers(cur, prefix, start, count, pad_width, id_format)
+        if not collisions:
+            return start
+        start = max(collisions) + 1
+
+
+def peek_next(conn, prefix, count=1, seeds=None):
+    # Read-only preview of the block allocate() would hand out right now.
+    # seeds ({prefix: next number}) caches the one-off scan for prefixes
+    # with no counter yet, so a preview redrawn as the user edits scans each
+    # prefix once.
+    cur = conn.cursor()
+    row = _get_prefix(cur, prefix)
+    if row is None:
+        seeds = {} if seeds is None else seeds
+        if prefix not in seeds:
+            seeds[prefix] = _existing_max_number(cur, prefix) + 1
+        next_number, pad_width, id_format = seeds[prefix], 0, DEFAULT_ID_FORMAT
+    else:
+        next_number, pad_width, id_format = row
+    start = _free_block(cur, prefix, next_number, count, pad_width, id_format)
+    return [format_id(prefix, n, pad_width, id_format) for n in range(start, start + count)]
+
+
+def allocate(conn, prefix, count, reserved_by=None):
+    # Returns a list of `count` new, contiguous, non-colliding IDs. Does not
+    # commit.
+    if not prefix:
+        raise AllocationError("Prefix is required.")
+    if count < 1:
+        raise AllocationError("Count must be at least 1.")
+    _begin_immediate(conn)
+    cur = conn.cursor()
+    next_number, pad_width, id_format = _get_prefix(cur, prefix, create=True)
+    start = _free_block(cur, prefix, next_number, count, pad_width, id_format)
+    end = start + count - 1
+    cur.execute("UPDATE id_prefixes SET next_number = ? WHERE prefix = ?", (end + 1, prefix))
+    cur.execute(
+        "INSERT INTO id_reservations (prefix, start_number, end_number, kind, reserved_by) VALUES (?, ?, ?, 'allocated', ?)",
+        (prefix, start, end, reserved_by)
+    )
+    return [format_id(prefix, n, pad_width, id_format) for n in range(start, end + 1)]
+
+
+def reserve_range(conn, prefix, start, end, reserved_by=None):
+    # Holds back [start, end] so allocate() never hands those numbers out
+    if end < start:
+        raise AllocationError("End of range is before its start.")
+    _begin_immediate(conn)
+    cur = conn.cursor()
+    next_number = _get_prefix(cur, prefix, create=True)[0]
+    cur.execute(
+        "SELECT start_number, end_number FROM id_reservations WHERE prefix = ? AND start_number <= ? AND end_number >= ?",
+        (prefix, end, start)
+    )
+    overlap = cur.fetchone()
+    if overlap:
+        raise AllocationError(f"Range overlaps {prefix} {overlap[0]}-{overlap[1]}, which is already reserved or allocated.")
+    if start < next_number:
+        raise AllocationError(f"Numbers below {next_number} may already be in use for {prefix}.")
+    cur.execute(
+        "INSERT INTO id_reservations (prefix, start_number, end_number, kind, reserved_by) VALUES (?, ?, ?, 'reserved', ?)",
+        (prefix, start, end, reserved_by)
+    )
+
+
+def set_prefix_format(conn, prefix, pad_width, id_format=DEFAULT_ID_FORMAT):
+    # Validate the format before storing it
+    try:
+        first, second = (format_id(prefix, n, pad_width, id_format) for n in (1, 2))
+    except (KeyError, IndexError, AttributeError, TypeError, ValueError) as e:
+        raise ValueError(f"{id_format!r} is not a valid ID format ({type(e).__name__}: {e})")
+    if first == second:
+        raise ValueError("The ID format must include {number}.")
+    _begin_immediate(conn)
+    cur = conn.cursor()
+    _get_prefix(cur, prefix, create=True)
+    cur.execute(
+        "UPDATE id_prefixes SET pad_width = ?, id_format = ? WHERE prefix = ?",
+        (pad_width, id_format, prefix)
+    )
+
+
+def list_prefixes(conn):
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT p.prefix, p.next_number, p.pad_width, p.id_format,
+            (SELECT COUNT(*) FROM id_reservations r WHERE r.prefix = p.prefix AND r.kind = 'reserved')
+        FROM id_prefixes p ORDER BY p.prefix
+    """)
+    return cur.fetchall()
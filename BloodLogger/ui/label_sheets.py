@@ -0,0 +1,335 @@
+import io
+import os
+import zlib
+import functools
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:  # Pillow is only needed for PNG output
+    Image = None
+
+# Label sheets for sites without a thermal printer: Code128 labels laid out
+# on standard multi-up sheets, written as a PDF (no extra dependencies) or as
+# one PNG per page (needs Pillow). Pages are written to disk as they are
+# rendered, so memory stays flat however many labels there are. PDF pages
+# are a few vector operators each and render in-process; PNG pages are
+# rasterised and compressed at 300 dpi, so those go to a process pool with
+# only a few pages in flight. The pool always spawns its workers (as Windows
+# and the frozen build do), so a worker never inherits the UI's threads and
+# open connections; a spawned worker re-imports the main module, which
+# therefore does no work at import time (see main_window.init_db). The bar
+# pattern of each sample ID is cached per process.
+
+POINTS_PER_INCH = 72.0
+MM = POINTS_PER_INCH / 25.4
+
+# name -> page size, grid, label size and pitch, all in points
+SHEET_FORMATS = {
+    "Avery 5167 (Letter, 80 per sheet)": {
+        "page": (612, 792), "columns": 4, "rows": 20,
+        "label": (126, 36), "origin": (21.6, 36), "pitch": (147.6, 36),
+    },
+    "Avery 5160 (Letter, 30 per sheet)": {
+        "page": (612, 792), "columns": 3, "rows": 10,
+        "label": (189, 72), "origin": (13.5, 36), "pitch": (198, 72),
+    },
+    "Avery L7651 (A4, 65 per sheet)": {
+        "page": (210 * MM, 297 * MM), "columns": 5, "rows": 13,
+        "label": (38.1 * MM, 21.2 * MM), "origin": (4.65 * MM, 10.7 * MM), "pitch": (40.6 * MM, 21.2 * MM),
+    },
+}
+DEFAULT_SHEET = "Avery 5167 (Letter, 80 per sheet)"
+RASTER_DPI = 300
+# Tried in order for PNG text; Pillow also looks in the system font folders
+TRUETYPE_FONTS = {
+    "regular": ("arial.ttf", "DejaVuSans.ttf", "LiberationSans-Regular.ttf", "Helvetica.ttc"),
+    "bold": ("arialbd.ttf", "DejaVuSans-Bold.ttf", "LiberationSans-Bold.ttf", "Helvetica.ttc"),
+}
+PAGES_IN_FLIGHT_PER_WORKER = 2
+MIN_PAGES_FOR_POOL = 4
+
+# Code128 bar/space widths for symbol values 0-106 (106 is the stop symbol)
+CODE128_PATTERNS = (
+    "212222 222122 222221 121223 121322 131222 122213 122312 132212 221213 "
+    "221312 231212 112232 122132 122231 113222 123122 123221 223211 221132 "
+    "221231 213212 223112 312131 311222 321122 321221 312212 322112 322211 "
+    "212123 212321 232121 111323 131123 131321 112313 132113 132311 211313 "
+    "231113 231311 112133 112331 132131 113123 113321 133121 313121 211331 "
+    "231131 213113 213311 213131 311123 311321 331121 312113 312311 332111 "
+    "314111 221411 431111 111224 111422 121124 121421 141122 141221 112214 "
+    "112412 122114 122411 142112 142211 241211 221114 413111 241112 134111 "
+    "111242 121142 121241 114212 124112 124211 411212 421112 421211 212141 "
+    "214121 412121 111143 111341 131141 114113 114311 411113 411311 113141 "
+    "114131 311141 411131 211412 211214 211232 2331112"
+).split()
+CODE128_START_B = 104
+CODE128_STOP = 106
+QUIET_ZONE_MODULES = 10
+
+
+@functools.lru_cache(maxsize=4096)
+def code128_modules(text):
+    # Code set B symbol for text as a tuple of alternating bar/space widths
+    # in modules, starting with a bar
+    values = [CODE128_START_B]
+    for char in text:
+        code = ord(char)
+        if not 32 <= code <= 127:
+            raise ValueError(f"Cannot encode {char!r} in Code128 set B")
+        values.append(code - 32)
+    checksum = (CODE128_START_B + sum(i * v for i, v in enumerate(values[1:], 1))) % 103
+    values += [checksum, CODE128_STOP]
+    return tuple(int(width) for v in values for width in CODE128_PATTERNS[v])
+
+
+def _label_cells(sheet):
+    # (x, y from the top) of every label on a page, row by row
+    fmt = SHEET_FORMATS[sheet]
+    (x0, y0), (dx, dy) = fmt["origin"], fmt["pitch"]
+    return [(x0 + col * dx, y0 + row * dy) for row in range(fmt["rows"]) for col in range(fmt["columns"])]
+
+
+def _layout(sheet):
+    # Barcode and text geometry inside one label, in points from its top-left
+    width, height = SHEET_FORMATS[sheet]["label"]
+    pad = max(2.0, height * 0.06)
+    font_size = min(7.0, height * 0.16)
+    text_height = font_size * 2.3
+    return {
+        "pad": pad,
+        "font_size": font_size,
+        "bar_width": width - 2 * pad,
+        "bar_height": max(6.0, height - 2 * pad - text_height),
+        "text_top": height - pad - text_height,
+    }
+
+
+def _caption(sample_type, date):
+    return "  ".join(part for part in (sample_type, date) if part)
+
+
+# --- PDF ---
+
+def _pdf_text(value):
+    value = value.encode("latin-1", errors="replace").decode("latin-1")
+    return value.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+@functools.lru_cache(maxsize=4096)
+def _pdf_bars(sample_id, bar_width, bar_height):
+    # Content stream fragment drawing the symbol at the origin
+    modules = code128_modules(sample_id)
+    module = bar_width / (sum(modules) + 2 * QUIET_ZONE_MODULES)
+    x = QUIET_ZONE_MODULES * module
+    parts = []
+    for i, width in enumerate(modules):
+        if i % 2 == 0:
+            parts.append(f"{x:.3f} 0 {width * module:.3f} {bar_height:.3f} re")
+        x += width * module
+    return " ".join(parts) + " f"
+
+
+def render_pdf_page(sheet, labels):
+    # Compressed content stream for one page of (sample_id, type, date)
+    page_height = SHEET_FORMATS[sheet]["page"][1]
+    label_height = SHEET_FORMATS[sheet]["label"][1]
+    geo = _layout(sheet)
+    fs = geo["font_size"]
+    ops = ["0 g"]
+    for (x, y), (sample_id, sample_type, date) in zip(_label_cells(sheet), labels):
+        bottom = page_height - y - label_height
+        bar_y = bottom + label_height - geo["pad"] - geo["bar_height"]
+        ops.append(f"q 1 0 0 1 {x + geo['pad']:.3f} {bar_y:.3f} cm {_pdf_bars(sample_id, geo['bar_width'], geo['bar_height'])} Q")
+        text_x = x + geo["pad"]
+        first_line = page_height - y - geo["text_top"] - fs
+        ops.append(f"BT /F2 {fs:.2f} Tf {text_x:.3f} {first_line:.3f} Td ({_pdf_text(sample_id)}) Tj ET")
+        caption = _caption(sample_type, date)
+        if caption:
+            ops.append(f"BT /F1 {fs * 0.9:.2f} Tf {text_x:.3f} {first_line - fs * 1.15:.3f} Td ({_pdf_text(caption)}) Tj ET")
+    return zlib.compress("\n".join(ops).encode("latin-1"))
+
+
+class PdfWriter:
+    # Writes a PDF one page at a time; only object offsets are kept in memory.
+    # Objects 1-4 are the catalog, page tree and the two fonts.
+    def __init__(self, path, page_size):
+        self.file = open(path, "wb")
+        self.page_size = page_size
+        self.offsets = {}
+        self.page_ids = []
+        self.pages = 0
+        self.next_id = 5
+        self.file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._object(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+        self._object(4, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>")
+
+    def _object(self, obj_id, body):
+        self.offsets[obj_id] = self.file.tell()
+        self.file.write(f"{obj_id} 0 obj\n".encode() + body + b"\nendobj\n")
+
+    def add_page(self, content):
+        page_id, content_id = self.next_id, self.next_id + 1
+        self.next_id += 2
+        self._object(content_id, f"<< /Length {len(content)} /Filter /FlateDecode >>\nstream\n".encode() + content + b"\nendstream")
+        width, height = self.page_size
+        self._object(page_id, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width:.2f} {height:.2f}] "
+            f"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode())
+        self.page_ids.append(page_id)
+        self.pages += 1
+
+    def close(self):
+        kids = " ".join(f"{page_id} 0 R" for page_id in self.page_ids)
+        self._object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.page_ids)} >>".encode())
+        self._object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        xref = self.file.tell()
+        self.file.write(f"xref\n0 {self.next_id}\n0000000000 65535 f \n".encode())
+        for obj_id in range(1, self.next_id):
+            self.file.write(f"{self.offsets[obj_id]:010d} 00000 n \n".encode())
+        self.file.write(f"trailer\n<< /Size {self.next_id} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+        self.file.close()
+
+
+# --- PNG ---
+
+@functools.lru_cache(maxsize=4096)
+def _symbol_bitmap(sample_id, bar_width, bar_height):
+    # 1-bit image of the symbol; module widths are whole pixels for crisp bars
+    modules = code128_modules(sample_id)
+    total = sum(modules) + 2 * QUIET_ZONE_MODULES
+    module = max(1, bar_width // total)
+    image = Image.new("1", (total * module, bar_height), 1)
+    draw = ImageDraw.Draw(image)
+    x = QUIET_ZONE_MODULES * module
+    for i, width in enumerate(modules):
+        if i % 2 == 0:
+            draw.rectangle([x, 0, x + width * module - 1, bar_height - 1], fill=0)
+        x += width * module
+    return image
+
+
+@functools.lru_cache(maxsize=16)
+def _font(weight, pixels):
+    # A TrueType font pixels tall, like the PDF's Helvetica; Pillow's own
+    # scalable default (Pillow 10.1+) when no system font is found
+    for name in TRUETYPE_FONTS[weight]:
+        try:
+            return ImageFont.truetype(name, pixels)
+        except OSError:
+            continue
+    try:
+        return ImageFont.load_default(size=pixels)
+    except TypeError:
+        return ImageFont.load_default()
+
+
+def render_png_page(sheet, labels, dpi=RASTER_DPI):
+    # PNG bytes for one page
+    scale = dpi / POINTS_PER_INCH
+    fmt = SHEET_FORMATS[sheet]
+    geo = _layout(sheet)
+    page = Image.new("1", (round(fmt["page"][0] * scale), round(fmt["page"][1] * scale)), 1)
+    draw = ImageDraw.Draw(page)
+    # Same sizes as the PDF: the ID in bold, the caption at 90%
+    id_font = _font("bold", max(1, round(geo["font_size"] * scale)))
+    caption_font = _font("regular", max(1, round(geo["font_size"] * 0.9 * scale)))
+    for (x, y), (sample_id, sample_type, date) in zip(_label_cells(sheet), labels):
+        left, top = round((x + geo["pad"]) * scale), round((y + geo["pad"]) * scale)
+        page.paste(_symbol_bitmap(sample_id, round(geo["bar_width"] * scale), round(geo["bar_height"] * scale)), (left, top))
+        text_top = round((y + geo["text_top"]) * scale)
+        draw.text((left, text_top), sample_id, fill=0, font=id_font)
+        caption = _caption(sample_type, date)
+        if caption:
+            draw.text((left, text_top + round(geo["font_size"] * 1.15 * scale)), caption, fill=0, font=caption_font)
+    out = io.BytesIO()
+    page.save(out, "PNG", dpi=(dpi, dpi))
+    return out.getvalue()
+
+
+class PngWriter:
+    # One file per page: <base>_0001.png, <base>_0002.png, ...
+    def __init__(self, path):
+        self.base = os.path.splitext(path)[0]
+        self.pages = 0
+
+    def add_page(self, content):
+        self.pages += 1
+        with open(f"{self.base}_{self.pages:04d}.png", "wb") as f:
+            f.write(content)
+
+    def close(self):
+        pass
+
+
+# --- rendering ---
+
+def _pages(labels, per_page):
+    labels = iter(labels)
+    while True:
+        page = list(itertools.islice(labels, per_page))
+        if not page:
+            return
+        yield page
+
+
+def render_sheets(labels, path, sheet=DEFAULT_SHEET, workers=None, page_count=None):
+    # Renders (sample_id, sample_type, date) labels to path: a PDF, or PNG
+    # pages when path ends in .png. labels may be any iterable (e.g. a
+    # cursor). PNG pages use a pool of `workers` processes unless page_count
+    # shows a short run. Returns the number of pages written.
+    if sheet not in SHEET_FORMATS:
+        raise ValueError(f"Unknown sheet format: {sheet}")
+    raster = path.lower().endswith(".png")
+    if raster and Image is None:
+        raise RuntimeError("PNG label sheets need Pillow (pip install Pillow); save as PDF instead.")
+    fmt = SHEET_FORMATS[sheet]
+    render = render_png_page if raster else render_pdf_page
+    writer = PngWriter(path) if raster else PdfWriter(path, fmt["page"])
+    pages = _pages(labels, fmt["columns"] * fmt["rows"])
+    workers = workers or os.cpu_count() or 1
+    try:
+        if not raster or workers == 1 or (page_count is not None and page_count < MIN_PAGES_FOR_POOL):
+            for page in pages:
+                writer.add_page(render(sheet, page))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                # A bounded window of pages in flight, written in order
+                in_flight = []
+                for page in pages:
+                    in_flight.append(pool.submit(render, sheet, page))
+                    if len(in_flight) >= workers * PAGES_IN_FLIGHT_PER_WORKER:
+                        writer.add_page(in_flight.pop(0).result())
+                for future in in_flight:
+                    writer.add_page(future.result())
+    finally:
+        writer.close()
+    return writer.pages
+
+
+SHEET_LABELS_SQL = """
+SELECT s.animal_id, t.name, s.collection_date
+FROM samples s
+LEFT JOIN sample_types t ON t.id = s.sample_type_id
+"""
+
+
+def cohort_labels(conn, cohort_id):
+    cur = conn.execute(SHEET_LABELS_SQL + " WHERE s.cohort_id = ? ORDER BY s.id", (cohort_id,))
+    return cur
+
+
+def sample_labels(conn, sample_ids):
+    # Labels for the given sample row ids, in the given order
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS sheet_ids (pos INTEGER PRIMARY KEY, id INTEGER)")
+    conn.execute("DELETE FROM sheet_ids")
+    conn.executemany("INSERT INTO sheet_ids (pos, id) VALUES (?, ?)", list(enumerate(sample_ids)))
+    cur = conn.execute(
+        SHEET_LABELS_SQL + " JOIN sheet_ids i ON i.id = s.id ORDER BY i.pos"
+    )
+    rows = cur.fetchall()
+    conn.execute("DELETE FROM sheet_ids")
+    return rows
@@ -0,0 +1,177 @@
+import re
+import lookups
+import print_jobs
+
+# Parent/child (aliquot) relationships between samples. samples.parent_id
+# holds the edge; the schema's triggers keep sample_lineage as its closure,
+# so ancestors are a range scan on (descendant_id, depth) and a whole
+# family is a range scan on ancestor_id from the root.
+
+ALIQUOT_ID_FORMAT = "{parent}-{number}"
+MAX_ALIQUOTS_PER_PARENT = 500
+
+
+def _begin_immediate(conn):
+    # Numbering reads the existing children, so hold the write lock
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+
+
+def _next_number(conn, parent_id, parent_code):
+    # One past the highest "<parent>-N" among the parent's children
+    pattern = re.compile(re.escape(parent_code) + r"-(\d+)$")
+    best = 0
+    for (code,) in conn.execute("SELECT animal_id FROM samples WHERE parent_id = ?", (parent_id,)):
+        match = pattern.match(code)
+        if match:
+            best = max(best, int(match.group(1)))
+    return best + 1
+
+
+def _free_codes(conn, parent_code, start, count):
+    # count unused "<parent>-N" codes from start on, skipping any taken by
+    # hand-entered samples
+    codes = []
+    number = start
+    while len(codes) < count:
+        batch = [ALIQUOT_ID_FORMAT.format(parent=parent_code, number=n) for n in range(number, number + count - len(codes))]
+        placeholders = ", ".join("?" for _ in batch)
+        cur = conn.execute(
+            f"SELECT barcode_value FROM samples WHERE barcode_value IN ({placeholders}) "
+            f"UNION SELECT animal_id FROM samples WHERE animal_id IN ({placeholders})",
+            batch + batch
+        )
+        taken = {row[0] for row in cur.fetchall()}
+        codes.extend(code for code in batch if code not in taken)
+        number += len(batch)
+    return codes
+
+
+def create_aliquots(conn, parent_ids, aliquots, notes=None):
+    # Splits each parent into aliquots: [(sample type, count)] per parent.
+    # Children inherit cohort, experimenter, collection date and time point,
+    # get "<parent>-N" IDs and are queued for labels, all in one transaction.
+    # Returns [(row id, sample ID)] of the new samples in creation order.
+    per_parent = sum(count for _, count in aliquots)
+    if per_parent < 1:
+        raise ValueError("Enter at least one aliquot.")
+    if per_parent > MAX_ALIQUOTS_PER_PARENT:
+        raise ValueError(f"At most {MAX_ALIQUOTS_PER_PARENT} aliquots per sample.")
+    try:
+        _begin_immediate(conn)
+        type_ids = [(lookups.get_or_create_id(conn, 'sample_types', sample_type), count) for sample_type, count in aliquots]
+        conn.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS aliquot_new (pos INTEGER PRIMARY KEY, parent_id INTEGER, code TEXT, sample_type_id INTEGER)"
+        )
+        conn.execute("DELETE FROM aliquot_new")
+        rows = []
+        for parent_id in parent_ids:
+            row = conn.execute("SELECT animal_id FROM samples WHERE id = ?", (parent_id,)).fetchone()
+            if not row:
+                raise ValueError(f"Sample {parent_id} not found.")
+            codes = iter(_free_codes(conn, row[0], _next_number(conn, parent_id, row[0]), per_parent))
+            for type_id, count in type_ids:
+                rows.extend((len(rows), parent_id, next(codes), type_id) for _ in range(count))
+        conn.executemany("INSERT INTO aliquot_new (pos, parent_id, code, sample_type_id) VALUES (?, ?, ?, ?)", rows)
+        conn.execute(
+            """
+            INSERT INTO samples (
+                cohort_id, animal_id, sample_type_id, experimenter_id, notes, barcode_value,
+                collection_date, time_point, parent_id
+            )
+            SELECT p.cohort_id, n.code, n.sample_type_id, p.experimenter_id, ?, n.code,
+                p.collection_date, p.time_point, p.id
+            FROM aliquot_new n JOIN samples p ON p.id = n.parent_id
+            ORDER BY n.pos
+            """,
+            (notes or None,)
+        )
+        cur = conn.execute(
+            "SELECT s.id, s.animal_id FROM aliquot_new n JOIN samples s ON s.barcode_value = n.code ORDER BY n.pos"
+        )
+        created = cur.fetchall()
+        print_jobs.queue_labels(conn, [row_id for row_id, _ in created])
+        conn.execute("DELETE FROM aliquot_new")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return created
+
+
+def root_of(conn, sample_id):
+    cur = conn.execute(
+        "SELECT ancestor_id FROM sample_lineage WHERE descendant_id = ? ORDER BY depth DESC LIMIT 1",
+        (sample_id,)
+    )
+    row = cur.fetchone()
+    return row[0] if row else sample_id
+
+
+def ancestors(conn, sample_id):
+    # [(row id, sample ID, depth)], nearest first
+    cur = conn.execute(
+        """
+        SELECT s.id, s.animal_id, l.depth FROM sample_lineage l JOIN samples s ON s.id = l.ancestor_id
+        WHERE l.descendant_id = ? ORDER BY l.depth
+        """,
+        (sample_id,)
+    )
+    return cur.fetchall()
+
+
+def descendants(conn, sample_id):
+    # [(row id, sample ID, depth)]
+    cur = conn.execute(
+        """
+        SELECT s.id, s.animal_id, l.depth FROM sample_lineage l JOIN samples s ON s.id = l.descendant_id
+        WHERE l.ancestor_id = ? ORDER BY l.depth, s.id
+        """,
+        (sample_id,)
+    )
+    return cur.fetchall()
+
+
+def has_family(conn, sample_id):
+    cur = conn.execute(
+        "SELECT 1 FROM sample_lineage WHERE ancestor_id = ? UNION ALL "
+        "SELECT 1 FROM sample_lineage WHERE descendant_id = ? LIMIT 1",
+        (sample_id, sample_id)
+    )
+    return cur.fetchone() is not None
+
+
+def family(conn, sample_id):
+    # The whole tree the sample belongs to, from its root, in display order
+    # (each sample followed by its aliquots): [(row id, sample ID, sample
+    # type, depth from the root)]
+    root_id = root_of(conn, sample_id)
+    cur = conn.execute(
+        """
+        SELECT s.id, s.parent_id, s.animal_id, t.name, 0 FROM samples s
+        LEFT JOIN sample_types t ON t.id = s.sample_type_id
+        WHERE s.id = ?
+        UNION ALL
+        SELECT s.id, s.parent_id, s.animal_id, t.name, l.depth FROM sample_lineage l
+        JOIN samples s ON s.id = l.descendant_id
+        LEFT JOIN sample_types t ON t.id = s.sample_type_id
+        WHERE l.ancestor_id = ?
+        """,
+        (root_id, root_id)
+    )
+    children = {}
+    root = None
+    for row_id, parent_id, code, sample_type, depth in cur.fetchall():
+        if row_id == root_id:
+            root = (row_id, code, sample_type, depth)
+        else:
+            children.setdefault(parent_id, []).append((row_id, code, sample_type, depth))
+    if root is None:
+        return []
+    ordered = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        ordered.append(node)
+        stack.extend(reversed(sorted(children.get(node[0], []))))
+    return ordered
@@ -0,0 +1,50 @@
+# Dictionary-encoded lookup tables (sample_types, experimenters, subjects).
+# Samples store the integer id; each name is stored once, behind a UNIQUE
+# index.
+
+LOOKUP_TABLES = ('sample_types', 'experimenters', 'subjects')
+
+
+def _check_table(table):
+    if table not in LOOKUP_TABLES:
+        raise ValueError(f"Unknown lookup table: {table}")
+
+
+def get_or_create_id(conn, table, name):
+    _check_table(table)
+    name = (name or "").strip()
+    if not name:
+        return None
+    cur = conn.cursor()
+    cur.execute(f"SELECT id FROM {table} WHERE name = ?", (name,))
+    row = cur.fetchone()
+    if row:
+        return row[0]
+    cur.execute(f"INSERT INTO {table} (name) VALUES (?)", (name,))
+    return cur.lastrowid
+
+
+def find_id(conn, table, name):
+    # Like get_or_create_id but never inserts; None if the name is unknown
+    _check_table(table)
+    cur = conn.cursor()
+    cur.execute(f"SELECT id FROM {table} WHERE name = ?", ((name or "").strip(),))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def name_for(conn, table, lookup_id):
+    _check_table(table)
+    if lookup_id is None:
+        return None
+    cur = conn.cursor()
+    cur.execute(f"SELECT name FROM {table} WHERE id = ?", (lookup_id,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def list_names(conn, table):
+    _check_table(table)
+    cur = conn.cursor()
+    cur.execute(f"SELECT id, name FROM {table} ORDER BY name")
+    return cur.fetchall()
@@ -2,18 +2,44 @@ import sys
 import os
 import sqlite3
 import shutil
+import time
+import getpass
+import html
+import threading
+import multiprocessing
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QListWidget, QStackedWidget,
     QHBoxLayout, QVBoxLayout, QLabel, QStatusBar, QPushButton, QDialog,
     QFormLayout, QLineEdit, QComboBox, QTextEdit, QDateEdit, QMessageBox,
     QRadioButton, QButtonGroup, QSpinBox, QGroupBox, QHBoxLayout,
-    QTableWidget, QTableWidgetItem
+    QTableWidget, QTableWidgetItem, QCheckBox, QFileDialog, QTreeWidget,
+    QTreeWidgetItem, QInputDialog
 )
 from PyQt5.QtCore import QDate
-import win32print
 from PyQt5.QtWidgets import QMessageBox
 from PyQt5.QtGui import QIcon, QFont
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QEvent, QObject, QTimer, pyqtSignal
+import archive
+import scanner
+import reconcile
+import id_allocator
+import stats
+import lookups
+import migrations
+import sync
+import audit
+import printer
+import printer_status
+import printer_pool
+import print_jobs
+import label_sheets
+import bulk_edit
+import maintenance
+import lineage
+import storage
+import fuzzy
+import subjects
+import versioning
 
 # Icon paths must be defined before any class/function uses them
 ICON_SVG_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'assets', 'Logo.svg'))
@@ -25,70 +51,13 @@ def resource_path(relative_path):
         return os.path.join(sys._MEIPASS, relative_path)
     return os.path.join(os.path.abspath("."), relative_path)
 
-ZPL_TEMPLATE = """
-CT~~CD,~CC^~CT~
-^XA
-~TA000
-~JSN
-^LT0
-^MNW
-^MTT
-^PON
-^PMN
-^LH0,0
-^JMA
-^PR4,4
-~SD30
-^JUS
-^LRN
-^CI27
-^PA0,1,1,0
-^XZ
-^XA
-^MMT
-^PW315
-^LL150
-^LS0
-^BY2,3,87^FT{{X_POS}},128^BCN,,Y,N
-^FH\\^FD>:{{SAMPLE_ID}}^FS
-^PQ1,0,1,Y
-^XZ
-"""
-
-def print_barcode(sample_id):
-    # Label and barcode parameters
-    label_width = 315  # dots (from ^PW)
-    module_width = 2   # from ^BY2 (dots per module)
-    quiet_zone = 10    # dots, typical for Code128
-    # Code128 encodes each character in about 11 modules (worst case)
-    barcode_length = len(sample_id)
-    modules_per_char = 11
-    barcode_modules = barcode_length * modules_per_char + 35  # 35 for start/stop chars, etc.
-    barcode_width = barcode_modules * module_width + 2 * quiet_zone
-    x_pos = max(0, int((label_width - barcode_width) / 2))
-    zpl = ZPL_TEMPLATE.replace("{{SAMPLE_ID}}", sample_id).replace("{{X_POS}}", str(x_pos))
-    printer_name = win32print.GetDefaultPrinter()
-    try:
-        hPrinter = win32print.OpenPrinter(printer_name)
-        try:
-            hJob = win32print.StartDocPrinter(hPrinter, 1, ("Sample Label", None, "RAW"))
-            win32print.StartPagePrinter(hPrinter)
-            win32print.WritePrinter(hPrinter, zpl.encode())
-            win32print.EndPagePrinter(hPrinter)
-            win32print.EndDocPrinter(hPrinter)
-        finally:
-            win32print.ClosePrinter(hPrinter)
-        return True
-    except Exception as e:
-        print(f"Failed to print barcode for {sample_id}: {e}")
-        return False
-
 NAV_ITEMS = [
     "Dashboard",
     "Cohorts",
     "Samples",
     "Print Barcodes",
     "Lookup Sample",
+    "Reconcile",
     "Export/Import"
 ]
 
@@ -102,28 +71,46 @@ def get_db_path():
     schema_path = resource_path(os.path.join('db', 'schema.sql'))
     print(f"[DEBUG] Looking for schema at: {schema_path}")
     print(f"[DEBUG] DB will be created at: {db_path}")
-    if not os.path.exists(db_path):
-        if os.path.exists(schema_path):
-            import sqlite3
-            with sqlite3.connect(db_path) as conn:
-                with open(schema_path, 'r') as f:
-                    conn.executescript(f.read())
-        else:
-            raise RuntimeError(f"Schema file not found at {schema_path}")
+    if os.path.exists(schema_path):
+        # Applied on every start: all statements are IF NOT EXISTS, so existing
+        # databases pick up new tables and indexes as well. Column changes to
+        # existing tables are migrated first.
+        with sqlite3.connect(db_path) as conn:
+            # Startup migrations are not attributed to a user
+            audit.open_session(conn, None)
+            migrations.migrate(conn)
+            with open(schema_path, 'r') as f:
+                conn.executescript(f.read())
+    elif not os.path.exists(db_path):
+        raise RuntimeError(f"Schema file not found at {schema_path}")
     return db_path
 
-DB_PATH = get_db_path()
+# Set by init_db() when the app starts. PNG label sheets render in worker
+# processes that re-import this module, so nothing at module level may touch
+# the database.
+DB_PATH = None
+AUDIT_USER_ID = None
+ARCHIVE_PATH = None
+AUDIT_SEGMENT_DIR = None
 
-# Debug: Print DB path and samples table schema at startup
-print(f"[DEBUG] Using database at: {DB_PATH}")
-try:
-    with get_db_connection() as conn:
-        cur = conn.cursor()
-        cur.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='samples'")
-        schema = cur.fetchone()
-        print(f"[DEBUG] samples table schema: {schema[0] if schema else 'NOT FOUND'}")
-except Exception as e:
-    print(f"[DEBUG] Could not read schema: {e}")
+def init_db():
+    global DB_PATH, AUDIT_USER_ID, ARCHIVE_PATH, AUDIT_SEGMENT_DIR
+    DB_PATH = get_db_path()
+    with sqlite3.connect(DB_PATH) as conn:
+        AUDIT_USER_ID = audit.intern_user(conn, getpass.getuser())
+    ARCHIVE_PATH = archive.get_archive_path(DB_PATH)
+    AUDIT_SEGMENT_DIR = os.path.join(os.path.dirname(DB_PATH), 'audit_segments')
+
+    # Debug: Print DB path and samples table schema at startup
+    print(f"[DEBUG] Using database at: {DB_PATH}")
+    try:
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='samples'")
+            schema = cur.fetchone()
+            print(f"[DEBUG] samples table schema: {schema[0] if schema else 'NOT FOUND'}")
+    except Exception as e:
+        print(f"[DEBUG] Could not read schema: {e}")
 
 # Helper function to get a SQLite connection with foreign keys enabled
 def get_db_connection():
@@ -132,8 +119,148 @@ def get_db_connection():
     cur = conn.cursor()
     cur.execute("PRAGMA foreign_keys = ON;")
     cur.close()
+    audit.open_session(conn, AUDIT_USER_ID)
     return conn
 
+SCAN_HISTORY_LIMIT = 200
+RECONCILE_BATCH_SIZE = 500
+RECONCILE_BATCH_DELAY_MS = 150
+PREVIEW_DELAY_MS = 300
+STATS_DAYS = 14
+
+# Sample rows with lookup ids resolved to names: the row id, then the columns
+# of the sample tables: Sample ID, Sample Type, Experimenter, Collection Date,
+# Time Point, Notes
+SAMPLE_ROWS_SQL = """
+    SELECT s.id, s.animal_id, t.name, e.name, s.collection_date, s.time_point, s.notes
+    FROM samples s
+    LEFT JOIN sample_types t ON t.id = s.sample_type_id
+    LEFT JOIN experimenters e ON e.id = s.experimenter_id
+"""
+
+def fill_table(table, rows):
+    # rows start with the record's row id, which is kept as the data of the
+    # first cell rather than shown; edits go by that id, since sample IDs
+    # and cohort names are not unique
+    table.setRowCount(len(rows))
+    for row_idx, row in enumerate(rows):
+        for col_idx, value in enumerate(row[1:]):
+            item = QTableWidgetItem(str(value) if value is not None else "")
+            if col_idx == 0:
+                item.setData(Qt.UserRole, row[0])
+            table.setItem(row_idx, col_idx, item)
+    table.resizeColumnsToContents()
+
+def selected_records(table, all_if_none=False):
+    # [(row id, first column text)] of the selected rows (or of every row)
+    rows = [index.row() for index in table.selectionModel().selectedRows()]
+    if not rows and all_if_none:
+        rows = range(table.rowCount())
+    return [(table.item(row, 0).data(Qt.UserRole), table.item(row, 0).text()) for row in rows]
+
+def format_sample_info(sample, cohort):
+    info = f"<b>Sample ID:</b> {sample['animal_id']}<br>"
+    info += f"<b>Sample Type:</b> {sample['sample_type']}<br>"
+    info += f"<b>Experimenter:</b> {sample['experimenter']}<br>"
+    info += f"<b>Notes:</b> {sample['notes']}<br>"
+    info += f"<b>Barcode Value:</b> {sample['barcode_value']}<br>"
+    info += f"<b>Collection Date:</b> {sample['collection_date']}<br>"
+    info += f"<b>Time Point:</b> {sample['time_point']}<br>"
+    if cohort:
+        info += f"<hr><b>Cohort:</b> {cohort[1]}<br>"
+        info += f"<b>Experimenter:</b> {cohort[2]}<br>"
+        info += f"<b>Date Created:</b> {cohort[3]}<br>"
+    return info
+
+def format_archived_sample_info(conn, cohort, sample):
+    # Archives made before the typed columns existed carry the legacy
+    # species/sex/date_added values instead
+    sample_type = lookups.name_for(conn, 'sample_types', sample.get('sample_type_id')) or sample.get('species')
+    experimenter = lookups.name_for(conn, 'experimenters', sample.get('experimenter_id')) or sample.get('sex')
+    info = f"<b>Sample ID:</b> {sample.get('animal_id')}<br>"
+    info += f"<b>Sample Type:</b> {sample_type}<br>"
+    info += f"<b>Experimenter:</b> {experimenter}<br>"
+    info += f"<b>Notes:</b> {sample.get('notes')}<br>"
+    info += f"<b>Barcode Value:</b> {sample.get('barcode_value')}<br>"
+    info += f"<b>Collection Date:</b> {sample.get('collection_date') or sample.get('date_added')}<br>"
+    info += f"<b>Time Point:</b> {sample.get('time_point')}<br>"
+    info += f"<hr><b>Cohort:</b> {cohort['name']} <i>(archived {cohort['archived_at']})</i><br>"
+    info += f"<b>Experimenter:</b> {cohort['experimenter']}<br>"
+    info += f"<b>Date Created:</b> {cohort['date_created']}<br>"
+    return info
+
+def resolve_lookup(conn, code):
+    # Runs on the scan worker thread; returns the info HTML, or on a miss a
+    # list of near matches [(sample ID, barcode, distance)]
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT s.cohort_id, s.animal_id, t.name, e.name, s.notes, s.barcode_value, s.collection_date, s.time_point, s.id
+        FROM samples s
+        LEFT JOIN sample_types t ON t.id = s.sample_type_id
+        LEFT JOIN experimenters e ON e.id = s.experimenter_id
+        WHERE s.animal_id = ? OR s.barcode_value = ?
+    """, (code, code))
+    row = cur.fetchone()
+    if not row:
+        archived = archive.lookup_archived(ARCHIVE_PATH, code)
+        if archived:
+            return format_archived_sample_info(conn, *archived)
+        return fuzzy.near_matches(conn, code)
+    sample = dict(zip(
+        ["cohort_id", "animal_id", "sample_type", "experimenter", "notes", "barcode_value", "collection_date", "time_point", "id"],
+        row
+    ))
+    cohort = None
+    if sample["cohort_id"]:
+        cur.execute("SELECT * FROM cohorts WHERE id = ?", (sample["cohort_id"],))
+        cohort = cur.fetchone()
+    info = format_sample_info(sample, cohort)
+    subject = subjects.subject_of(conn, sample["id"])
+    if subject:
+        info += f"<b>Subject:</b> {subject[1]} ({subjects.sample_count(conn, subject[0])} sample(s))<br>"
+    location = storage.location(conn, sample["id"])
+    if location:
+        info += f"<b>Location:</b> {storage.describe(location)}<br>"
+    if lineage.has_family(conn, sample["id"]):
+        info += format_family(lineage.family(conn, sample["id"]), sample["id"])
+    return info
+
+def format_suggestions(matches):
+    lines = []
+    for animal_id, barcode_value, distance in matches:
+        line = f'<a href="{html.escape(animal_id)}">{html.escape(animal_id)}</a>'
+        if barcode_value and barcode_value != animal_id:
+            line += f" (barcode {html.escape(barcode_value)})"
+        lines.append(line + f" - {distance} edit(s) away")
+    return "<br>".join(lines)
+
+def format_family(members, current_id):
+    # Indented tree of the sample's whole family, the scanned one in bold
+    info = "<hr><b>Family:</b><br>"
+    for row_id, code, sample_type, depth in members:
+        line = f"{'&nbsp;' * 4 * depth}{code} ({sample_type or '-'})"
+        info += (f"<b>{line}</b>" if row_id == current_id else line) + "<br>"
+    return info
+
+def expand_base_configs(conn, bases, allocate=True, reserved_by=None, seeds=None):
+    # Turns base configs from CreateCohortDialog into sample IDs. "Next free"
+    # bases are allocated from the prefix counter (allocate=True, caller
+    # commits) or only previewed (allocate=False, seeds as for
+    # id_allocator.peek_next).
+    ids = []
+    for cfg in bases:
+        if not cfg["base_name"]:
+            continue
+        if cfg.get("next_free"):
+            if allocate:
+                ids.extend(id_allocator.allocate(conn, cfg["base_name"], cfg["num_samples"], reserved_by))
+            else:
+                ids.extend(id_allocator.peek_next(conn, cfg["base_name"], cfg["num_samples"], seeds))
+        else:
+            for i in range(cfg["num_samples"]):
+                ids.append(f"{cfg['base_name']}{cfg['start_number']+i}")
+    return ids
+
 class AddSampleDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -143,6 +270,8 @@ class AddSampleDialog(QDialog):
 
         self.sample_id = QLineEdit()
         self.experimenter = QLineEdit()
+        self.subject = QLineEdit()
+        self.subject.setPlaceholderText("Optional: animal this was drawn from")
         self.collection_date = QDateEdit()
         self.collection_date.setCalendarPopup(True)
         self.collection_date.setDate(QDate.currentDate())
@@ -154,6 +283,7 @@ class AddSampleDialog(QDialog):
 
         layout.addRow("SampleID", self.sample_id)
         layout.addRow("Experimenter", self.experimenter)
+        layout.addRow("Subject", self.subject)
         layout.addRow("Collection Date", self.collection_date)
         layout.addRow("Sample Type", self.sample_type)
         layout.addRow("Sample Time Point", self.time_point)
@@ -169,6 +299,7 @@ class AddSampleDialog(QDialog):
         data = {
             "SampleID": self.sample_id.text().strip(),
             "Experimenter": self.experimenter.text().strip(),
+            "Subject": self.subject.text().strip(),
             "Collection Date": self.collection_date.date().toString("yyyy-MM-dd"),
             "Sample Type": self.sample_type.currentText(),
             "Sample Time Point": self.time_point.text().strip(),
@@ -184,25 +315,26 @@ class AddSampleDialog(QDialog):
                 cur.execute(
                     """
                     INSERT INTO samples (
-                        cohort_id, animal_id, species, sex, notes, barcode_value, date_added
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                        cohort_id, animal_id, sample_type_id, experimenter_id, notes, barcode_value,
+                        collection_date, time_point, subject_id
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
                     """,
                     (
                         None,  # cohort_id is NULL for manual samples
                         data["SampleID"],
-                        data["Sample Type"],  # store sample type in 'species' for now
-                        data["Experimenter"], # store experimenter in 'sex' for now
+                        lookups.get_or_create_id(conn, 'sample_types', data["Sample Type"]),
+                        lookups.get_or_create_id(conn, 'experimenters', data["Experimenter"]),
                         data["Notes"],
                         data["SampleID"],  # barcode_value = SampleID for now
-                        data["Collection Date"]
+                        data["Collection Date"],
+                        data["Sample Time Point"] or None,
+                        subjects.get_or_create_id(conn, data["Subject"])
                     )
                 )
+                data["row_id"] = cur.lastrowid
+                print_jobs.queue_labels(conn, [data["row_id"]])
                 conn.commit()
-            # Print barcode after saving
-            if print_barcode(data["SampleID"]):
-                QMessageBox.information(self, "Barcode Printed", f"Barcode for {data['SampleID']} sent to printer.")
-            else:
-                QMessageBox.warning(self, "Print Error", f"Failed to print barcode for {data['SampleID']}.")
+            # The main window prints the barcode once the sample is saved
             self.result = data
             self.accept()
         except sqlite3.IntegrityError as e:
@@ -224,19 +356,25 @@ class BaseConfigWidget(QWidget):
         self.start_number.setMinimum(0)
         self.start_number.setMaximum(1000000)
         self.start_number.setValue(0)
+        # Next free: numbers are allocated from the prefix counter on submit
+        self.next_free = QCheckBox("Next free")
+        self.next_free.toggled.connect(lambda checked: self.start_number.setEnabled(not checked))
+        self.next_free.setChecked(True)
         layout.addWidget(QLabel("Base Name:"))
         layout.addWidget(self.base_name)
         layout.addWidget(QLabel("# Samples:"))
         layout.addWidget(self.num_samples)
         layout.addWidget(QLabel("Start #:"))
         layout.addWidget(self.start_number)
+        layout.addWidget(self.next_free)
         self.setLayout(layout)
 
     def get_config(self):
         return {
             "base_name": self.base_name.text().strip(),
             "num_samples": self.num_samples.value(),
-            "start_number": self.start_number.value()
+            "start_number": self.start_number.value(),
+            "next_free": self.next_free.isChecked()
         }
 
 class ManualSampleIDsDialog(QDialog):
@@ -331,9 +469,15 @@ class CreateCohortDialog(QDialog):
         self.manual_layout.addWidget(self.edit_ids_btn)
         self.manual_group.setLayout(self.manual_layout)
         layout.addWidget(self.manual_group)
-        # Preview
+        # Preview, redrawn once typing pauses; seeds caches the counter scan
+        # for prefixes that have no counter yet
         self.preview_label = QLabel()
         layout.addWidget(self.preview_label)
+        self.id_seeds = {}
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(PREVIEW_DELAY_MS)
+        self.preview_timer.timeout.connect(self.update_preview)
         # Buttons
         self.submit_btn = QPushButton("Create Cohort")
         self.submit_btn.clicked.connect(self.submit)
@@ -349,9 +493,10 @@ class CreateCohortDialog(QDialog):
 
     def add_base_config(self):
         base_widget = BaseConfigWidget()
-        base_widget.base_name.textChanged.connect(self.update_preview)
-        base_widget.num_samples.valueChanged.connect(self.update_preview)
-        base_widget.start_number.valueChanged.connect(self.update_preview)
+        base_widget.base_name.textChanged.connect(self.schedule_preview)
+        base_widget.num_samples.valueChanged.connect(self.schedule_preview)
+        base_widget.start_number.valueChanged.connect(self.schedule_preview)
+        base_widget.next_free.toggled.connect(self.schedule_preview)
         self.bases_layout.addWidget(base_widget)
         self.base_widgets.append(base_widget)
         self.update_preview()
@@ -381,15 +526,15 @@ class CreateCohortDialog(QDialog):
         self.manual_group.setVisible(self.manual_radio.isChecked())
         self.update_preview()
 
+    def schedule_preview(self, *_):
+        # Restarts the delay, so a burst of edits redraws the preview once
+        self.preview_timer.start()
+
     def update_preview(self):
         if self.auto_radio.isChecked():
-            ids = []
-            for base in self.base_widgets:
-                cfg = base.get_config()
-                if not cfg["base_name"]:
-                    continue
-                for i in range(cfg["num_samples"]):
-                    ids.append(f"{cfg['base_name']}{cfg['start_number']+i}")
+            bases = [base.get_config() for base in self.base_widgets]
+            with get_db_connection() as conn:
+                ids = expand_base_configs(conn, bases, allocate=False, seeds=self.id_seeds)
             preview = ", ".join(ids[:10])
             if len(ids) > 10:
                 preview += f" ... ({len(ids)} total)"
@@ -415,24 +560,18 @@ class CreateCohortDialog(QDialog):
             QMessageBox.warning(self, "Missing Data", "Cohort Name is required.")
             return
         if self.auto_radio.isChecked():
-            sample_ids = []
-            base_total = 0
-            for base in self.base_widgets:
-                cfg = base.get_config()
-                if not cfg["base_name"]:
-                    continue
-                base_total += cfg["num_samples"]
-                for i in range(cfg["num_samples"]):
-                    sample_ids.append(f"{cfg['base_name']}{cfg['start_number']+i}")
-            if not sample_ids:
+            bases = [cfg for cfg in (base.get_config() for base in self.base_widgets) if cfg["base_name"]]
+            base_total = sum(cfg["num_samples"] for cfg in bases)
+            if not bases:
                 QMessageBox.warning(self, "Missing Data", "At least one base with samples is required.")
                 return
             if base_total != total_samples:
                 QMessageBox.critical(self, "Sample Count Mismatch", f"The sum of samples for all bases ({base_total}) does not match the total Number of Samples ({total_samples}). Please fix this and try again.")
                 return
+            # IDs for "Next free" bases are allocated when the cohort is saved
             self.result = {
                 "name": name,
-                "sample_ids": sample_ids,
+                "bases": bases,
                 "experimenter": experimenter,
                 "collection_date": collection_date,
                 "sample_type": sample_type,
@@ -465,19 +604,20 @@ class CreateCohortDialog(QDialog):
             QMessageBox.information(self, "Assignment Mode", "Please select an assignment mode.")
 
 class CohortSamplesDialog(QDialog):
-    def __init__(self, cohort_name, samples, parent=None, main_window=None):
+    def __init__(self, cohort_name, samples, parent=None, main_window=None, cohort_id=None):
         super().__init__(parent)
         self.setWindowTitle(f"Samples in Cohort: {cohort_name}")
         self.setMinimumWidth(600)
         self.cohort_name = cohort_name
+        self.cohort_id = cohort_id
         self.main_window = main_window  # Reference to MainWindow for refreshing
         self.layout = QVBoxLayout(self)
         label = QLabel(f"<b>Cohort:</b> {cohort_name}")
         self.layout.addWidget(label)
         self.table = QTableWidget()
-        self.table.setColumnCount(5)
+        self.table.setColumnCount(6)
         self.table.setHorizontalHeaderLabels([
-            "Sample ID", "Sample Type", "Experimenter", "Collection Date", "Notes"
+            "Sample ID", "Sample Type", "Experimenter", "Collection Date", "Time Point", "Notes"
         ])
         self.table.setEditTriggers(QTableWidget.NoEditTriggers)
         self.table.setSelectionBehavior(QTableWidget.SelectRows)
@@ -489,6 +629,25 @@ class CohortSamplesDialog(QDialog):
         self.delete_btn = QPushButton("Delete")
         self.delete_btn.clicked.connect(self.delete_selected_samples)
         btn_layout.addWidget(self.delete_btn)
+        self.reprint_btn = QPushButton("Reprint Unprinted")
+        self.reprint_btn.clicked.connect(self.reprint_unprinted)
+        btn_layout.addWidget(self.reprint_btn)
+        self.sheet_btn = QPushButton("Label Sheet...")
+        self.sheet_btn.clicked.connect(self.export_label_sheet)
+        btn_layout.addWidget(self.sheet_btn)
+        self.bulk_edit_btn = QPushButton("Bulk Edit...")
+        self.bulk_edit_btn.clicked.connect(self.bulk_edit_selected)
+        btn_layout.addWidget(self.bulk_edit_btn)
+        self.timeline_btn = QPushButton("Timeline...")
+        self.timeline_btn.clicked.connect(self.open_timeline)
+        btn_layout.addWidget(self.timeline_btn)
+        if main_window:
+            self.aliquot_btn = QPushButton("Create Aliquots...")
+            self.aliquot_btn.clicked.connect(self.create_aliquots_selected)
+            btn_layout.addWidget(self.aliquot_btn)
+            self.store_btn = QPushButton("Store...")
+            self.store_btn.clicked.connect(self.store_samples)
+            btn_layout.addWidget(self.store_btn)
         self.close_btn = QPushButton("Close")
         self.close_btn.clicked.connect(self.accept)
         btn_layout.addWidget(self.close_btn)
@@ -497,79 +656,194 @@ class CohortSamplesDialog(QDialog):
     def refresh_table(self, samples=None):
         if samples is None:
             # Query fresh samples for this cohort
+            cohort_id = self._cohort_id()
+            if cohort_id is None:
+                return
             with get_db_connection() as conn:
                 cur = conn.cursor()
-                cur.execute("SELECT id FROM cohorts WHERE name = ?", (self.cohort_name,))
-                result = cur.fetchone()
-                if not result:
-                    return
-                cohort_id = result[0]
-                cur.execute("""
-                    SELECT animal_id, species, sex, date_added, notes
-                    FROM samples WHERE cohort_id = ? ORDER BY id DESC
-                """, (cohort_id,))
+                cur.execute(SAMPLE_ROWS_SQL + " WHERE s.cohort_id = ? ORDER BY s.id DESC", (cohort_id,))
                 samples = cur.fetchall()
-        self.table.setRowCount(len(samples))
-        for row_idx, row in enumerate(samples):
-            for col_idx, value in enumerate(row):
-                self.table.setItem(row_idx, col_idx, QTableWidgetItem(str(value) if value is not None else ""))
-        self.table.resizeColumnsToContents()
+        fill_table(self.table, samples)
+    def _cohort_id(self):
+        if self.cohort_id is not None:
+            return self.cohort_id
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT id FROM cohorts WHERE name = ?", (self.cohort_name,))
+            result = cur.fetchone()
+        return result[0] if result else None
+    def reprint_unprinted(self):
+        cohort_id = self._cohort_id()
+        if cohort_id is not None and self.main_window:
+            self.main_window.reprint_unprinted(cohort_id)
+    def export_label_sheet(self):
+        cohort_id = self._cohort_id()
+        if cohort_id is None or not self.main_window:
+            return
+        with get_db_connection() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM samples WHERE cohort_id = ?", (cohort_id,)).fetchone()[0]
+        self.main_window.export_label_sheet(
+            lambda conn: label_sheets.cohort_labels(conn, cohort_id), count, self.cohort_name
+        )
+    def open_timeline(self):
+        cohort_id = self._cohort_id()
+        if cohort_id is not None:
+            CohortTimelineDialog(cohort_id, self.cohort_name, self).exec_()
+    def bulk_edit_selected(self):
+        selected = selected_records(self.table)
+        if not selected:
+            QMessageBox.information(self, "Bulk Edit", "No samples selected.")
+            return
+        if BulkEditDialog([row_id for row_id, _ in selected], self).exec_():
+            self.refresh_table()
+            if self.main_window:
+                self.main_window.refresh_samples_table()
+    def create_aliquots_selected(self):
+        selected = selected_records(self.table)
+        if not selected:
+            QMessageBox.information(self, "Create Aliquots", "No samples selected.")
+            return
+        self.main_window.create_aliquots([row_id for row_id, _ in selected])
+        self.refresh_table()
+    def store_samples(self):
+        # The selected samples, or the whole cohort when nothing is selected
+        self.main_window.store_samples([row_id for row_id, _ in selected_records(self.table, all_if_none=True)])
     def edit_sample(self, row, col):
-        sample_id = self.table.item(row, 0).text()
-        dlg = EditSampleDialog(sample_id, self)
+        dlg = EditSampleDialog(self.table.item(row, 0).data(Qt.UserRole), self)
         if dlg.exec_():
             self.refresh_table()
             if self.main_window:
                 self.main_window.refresh_cohorts_table()
     def delete_selected_samples(self):
-        selected = self.table.selectionModel().selectedRows()
+        selected = selected_records(self.table)
         if not selected:
             QMessageBox.information(self, "Delete Samples", "No samples selected.")
             return
-        sample_ids = [self.table.item(row.row(), 0).text() for row in selected]
-        msg = "Are you sure you want to delete the following samples?\n" + ", ".join(sample_ids)
+        msg = "Are you sure you want to delete the following samples?\n" + ", ".join(code for _, code in selected)
         if QMessageBox.question(self, "Confirm Delete", msg, QMessageBox.Yes | QMessageBox.No) == QMessageBox.Yes:
             with get_db_connection() as conn:
-                cur = conn.cursor()
-                for sid in sample_ids:
-                    cur.execute("DELETE FROM samples WHERE animal_id = ?", (sid,))
+                conn.executemany("DELETE FROM samples WHERE id = ?", [(row_id,) for row_id, _ in selected])
                 conn.commit()
             self.refresh_table()
             if self.main_window:
                 self.main_window.refresh_cohorts_table()
                 self.main_window.refresh_samples_table()
 
+class MergeDialog(QDialog):
+    # Shown when a versioned save finds the record changed since it was
+    # loaded. Fields changed on one side only are taken from that side;
+    # for fields both sides changed the user picks. merged holds the result.
+    def __init__(self, base, mine, theirs, labels, describe, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Merge Changes")
+        self.setMinimumWidth(600)
+        self.merged, conflicts = versioning.merge(base, mine, theirs)
+        self.theirs = theirs
+        self.choices = {}
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel(
+            "Someone else saved this record while you were editing it.\n"
+            "Changes to different fields are combined; pick a value where you both changed the same field."
+        ))
+        changed = [column for column in mine if mine[column] != base.get(column) or theirs.get(column) != base.get(column)]
+        self.table = QTableWidget(len(changed), 4)
+        self.table.setHorizontalHeaderLabels(["Field", "Yours", "Theirs", "Result"])
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        for row_idx, column in enumerate(changed):
+            values = [labels[column], describe(column, mine[column]), describe(column, theirs.get(column))]
+            for col_idx, value in enumerate(values):
+                self.table.setItem(row_idx, col_idx, QTableWidgetItem(str(value) if value is not None else ""))
+            if column in conflicts:
+                choice = QComboBox()
+                choice.addItems(["Keep yours", "Take theirs"])
+                self.choices[column] = choice
+                self.table.setCellWidget(row_idx, 3, choice)
+            else:
+                source = "yours" if self.merged[column] == mine[column] and mine[column] != base.get(column) else "theirs"
+                self.table.setItem(row_idx, 3, QTableWidgetItem(source))
+        self.table.resizeColumnsToContents()
+        layout.addWidget(self.table)
+        btn_layout = QHBoxLayout()
+        save_btn = QPushButton("Save Merged")
+        save_btn.clicked.connect(self.accept)
+        btn_layout.addWidget(save_btn)
+        cancel_btn = QPushButton("Cancel")
+        cancel_btn.clicked.connect(self.reject)
+        btn_layout.addWidget(cancel_btn)
+        layout.addLayout(btn_layout)
+
+    def accept(self):
+        for column, choice in self.choices.items():
+            if choice.currentIndex() == 1:
+                self.merged[column] = self.theirs[column]
+        super().accept()
+
+def save_versioned(parent, conn, table, row_id, version, base, mine, labels, describe):
+    # Saves mine over the row loaded at version, prompting to merge for as
+    # long as someone else's save gets in first. Returns the new version, or
+    # None if the row was deleted or the user cancelled the merge.
+    # Untouched fields keep their stored form ('' vs NULL), so they never
+    # count as edits when merging.
+    mine = {column: base.get(column) if (value or None) == (base.get(column) or None) else value
+            for column, value in mine.items()}
+    while True:
+        try:
+            return versioning.save(conn, table, row_id, version, mine)
+        except versioning.ConflictError as e:
+            if e.current is None:
+                QMessageBox.warning(parent, "Record Deleted", str(e))
+                return None
+            theirs, version = e.current
+            dlg = MergeDialog(base, mine, theirs, labels, describe, parent)
+            if not dlg.exec_():
+                return None
+            base, mine = theirs, dlg.merged
+
 class EditSampleDialog(QDialog):
-    def __init__(self, sample_id, parent=None):
+    # Edits one sample, keyed by row id. Saving is conditional on the row
+    # version loaded here (see versioning.py), so a concurrent edit from
+    # another window or bench leads to a merge prompt instead of being lost.
+    COLUMNS = ['animal_id', 'sample_type_id', 'experimenter_id', 'subject_id', 'collection_date', 'time_point', 'notes']
+    LABELS = {
+        'animal_id': "Sample ID", 'sample_type_id': "Sample Type", 'experimenter_id': "Experimenter",
+        'subject_id': "Subject", 'collection_date': "Collection Date", 'time_point': "Time Point", 'notes': "Notes",
+    }
+    LOOKUP_COLUMNS = {'sample_type_id': 'sample_types', 'experimenter_id': 'experimenters', 'subject_id': 'subjects'}
+
+    def __init__(self, row_id, parent=None):
         super().__init__(parent)
-        self.setWindowTitle(f"Edit Sample: {sample_id}")
         self.setMinimumWidth(400)
+        self.row_id = row_id
         layout = QFormLayout(self)
-        # Fetch sample info
         with get_db_connection() as conn:
-            cur = conn.cursor()
-            cur.execute("SELECT animal_id, species, sex, date_added, notes, cohort_id FROM samples WHERE animal_id = ?", (sample_id,))
-            sample = cur.fetchone()
-        if not sample:
+            loaded = versioning.load(conn, 'samples', row_id, self.COLUMNS)
+            if loaded:
+                names = {col: self.describe(col, loaded[0][col], conn) for col in self.LOOKUP_COLUMNS}
+        if not loaded:
             QMessageBox.critical(self, "Error", "Sample not found.")
             self.reject()
             return
-        self.sample_id = QLineEdit(sample[0])
+        self.base, self.version = loaded
+        self.setWindowTitle(f"Edit Sample: {self.base['animal_id']}")
+        self.sample_id = QLineEdit(self.base['animal_id'])
         self.sample_type = QComboBox()
         self.sample_type.addItems(SAMPLE_TYPES)
-        if sample[1] in SAMPLE_TYPES:
-            self.sample_type.setCurrentText(sample[1])
-        self.experimenter = QLineEdit(sample[2])
+        if names['sample_type_id'] in SAMPLE_TYPES:
+            self.sample_type.setCurrentText(names['sample_type_id'])
+        self.experimenter = QLineEdit(names['experimenter_id'] or "")
+        self.subject = QLineEdit(names['subject_id'] or "")
         self.collection_date = QDateEdit()
         self.collection_date.setCalendarPopup(True)
-        self.collection_date.setDate(QDate.fromString(sample[3], "yyyy-MM-dd"))
-        self.notes = QTextEdit(sample[4] if sample[4] else "")
+        self.collection_date.setDate(QDate.fromString(self.base['collection_date'] or "", "yyyy-MM-dd"))
+        self.time_point = QLineEdit(self.base['time_point'] or "")
+        self.notes = QTextEdit(self.base['notes'] or "")
         self.notes.setFixedHeight(60)
-        self.cohort_id = sample[5]
         layout.addRow("Sample ID", self.sample_id)
         layout.addRow("Sample Type", self.sample_type)
         layout.addRow("Experimenter", self.experimenter)
+        layout.addRow("Subject", self.subject)
         layout.addRow("Collection Date", self.collection_date)
+        layout.addRow("Sample Time Point", self.time_point)
         layout.addRow("Notes", self.notes)
         btn_layout = QHBoxLayout()
         save_btn = QPushButton("Save")
@@ -580,169 +854,1638 @@ class EditSampleDialog(QDialog):
         btn_layout.addWidget(cancel_btn)
         layout.addRow(btn_layout)
         self.setLayout(layout)
-        self.original_id = sample[0]
         self.result = None
+
+    def describe(self, column, value, conn=None):
+        # Display form of a column value (lookup ids as names)
+        if column not in self.LOOKUP_COLUMNS:
+            return value
+        if conn is None:
+            with get_db_connection() as conn:
+                return lookups.name_for(conn, self.LOOKUP_COLUMNS[column], value)
+        return lookups.name_for(conn, self.LOOKUP_COLUMNS[column], value)
+
     def save(self):
         new_id = self.sample_id.text().strip()
-        sample_type = self.sample_type.currentText()
         experimenter = self.experimenter.text().strip()
-        collection_date = self.collection_date.date().toString("yyyy-MM-dd")
-        notes = self.notes.toPlainText().strip()
         if not new_id or not experimenter:
             QMessageBox.warning(self, "Missing Data", "Sample ID and Experimenter are required.")
             return
         try:
             with get_db_connection() as conn:
-                cur = conn.cursor()
-                cur.execute(
-                    """
-                    UPDATE samples SET animal_id=?, species=?, sex=?, notes=?, date_added=? WHERE animal_id=?
-                    """,
-                    (new_id, sample_type, experimenter, notes, collection_date, self.original_id)
-                )
+                # New lookup names are kept even if the edit is abandoned
+                mine = {
+                    'animal_id': new_id,
+                    'sample_type_id': lookups.get_or_create_id(conn, 'sample_types', self.sample_type.currentText()),
+                    'experimenter_id': lookups.get_or_create_id(conn, 'experimenters', experimenter),
+                    'subject_id': subjects.get_or_create_id(conn, self.subject.text()),
+                    'collection_date': self.collection_date.date().toString("yyyy-MM-dd"),
+                    'time_point': self.time_point.text().strip() or None,
+                    'notes': self.notes.toPlainText().strip(),
+                }
                 conn.commit()
-            self.result = new_id
-            self.accept()
+                version = save_versioned(self, conn, 'samples', self.row_id, self.version, self.base, mine, self.LABELS, self.describe)
         except sqlite3.IntegrityError as e:
             QMessageBox.critical(self, "Database Error", f"Could not update sample: {e}")
+            return
         except Exception as e:
             QMessageBox.critical(self, "Error", f"An error occurred: {e}")
+            return
+        if version is None:
+            self.reject()
+            return
+        self.result = new_id
+        self.accept()
 
-class MainWindow(QMainWindow):
-    def __init__(self):
-        super().__init__()
-        self.setWindowTitle("SampleLogger")
-        self.setWindowIcon(QIcon(resource_path('assets/Logo.ico')))
-        self.resize(1000, 600)
-        self._init_ui()
+class EditCohortDialog(QDialog):
+    # Same versioned save and merge prompt as EditSampleDialog
+    COLUMNS = ['name', 'experimenter', 'description']
+    LABELS = {'name': "Cohort Name", 'experimenter': "Experimenter", 'description': "Description"}
 
-    def _init_ui(self):
-        self.stack = QStackedWidget()
-        self.pages = {}
-        # Dashboard page
-        dashboard = QWidget()
-        dash_layout = QVBoxLayout()
-        dash_layout.addStretch()
-        btn_font = QFont()
-        btn_font.setPointSize(16)
-        btn_font.setBold(True)
-        btn_size = (300, 80)
-        cohorts_btn = QPushButton("Cohorts")
-        cohorts_btn.setFont(btn_font)
-        cohorts_btn.setFixedSize(*btn_size)
-        cohorts_btn.clicked.connect(lambda: self.stack.setCurrentWidget(self.pages["Cohorts"]))
-        samples_btn = QPushButton("Samples")
-        samples_btn.setFont(btn_font)
-        samples_btn.setFixedSize(*btn_size)
-        samples_btn.clicked.connect(lambda: self.stack.setCurrentWidget(self.pages["Samples"]))
-        lookup_btn = QPushButton("Lookup Sample")
-        lookup_btn.setFont(btn_font)
-        lookup_btn.setFixedSize(*btn_size)
-        lookup_btn.clicked.connect(lambda: self.stack.setCurrentWidget(self.pages["Lookup Sample"]))
-        test_print_btn = QPushButton("Test Print")
-        test_print_btn.setFont(btn_font)
-        test_print_btn.setFixedSize(*btn_size)
-        test_print_btn.clicked.connect(self.test_print_barcode)
-        for btn in [cohorts_btn, samples_btn, lookup_btn, test_print_btn]:
-            dash_layout.addWidget(btn, alignment=Qt.AlignHCenter)
-            dash_layout.addSpacing(30)
-        dash_layout.addStretch()
-        dashboard.setLayout(dash_layout)
-        self.stack.addWidget(dashboard)
-        self.pages["Dashboard"] = dashboard
-        # Other pages
-        for name, create_func in [
-            ("Cohorts", self._create_cohorts_page),
-            ("Samples", self._create_samples_page),
-            ("Lookup Sample", self._create_lookup_sample_page)
-        ]:
-            page = create_func()
-            # Add back button
-            back_btn = QPushButton("Back to Dashboard")
-            back_btn.setFixedWidth(180)
-            back_btn.clicked.connect(lambda _, n="Dashboard": self.stack.setCurrentWidget(self.pages[n]))
-            page.layout().insertWidget(0, back_btn)
-            self.stack.addWidget(page)
-            self.pages[name] = page
-        self.setCentralWidget(self.stack)
-        self.status = QStatusBar()
-        self.setStatusBar(self.status)
-        self.status.showMessage("Ready")
-        self.stack.setCurrentWidget(self.pages["Dashboard"])
-        # Refresh samples table whenever the Samples page is shown
-        self.stack.currentChanged.connect(self._on_page_changed)
+    def __init__(self, cohort_id, parent=None):
+        super().__init__(parent)
+        self.setMinimumWidth(400)
+        self.cohort_id = cohort_id
+        layout = QFormLayout(self)
+        with get_db_connection() as conn:
+            loaded = versioning.load(conn, 'cohorts', cohort_id, self.COLUMNS)
+        if not loaded:
+            QMessageBox.critical(self, "Error", "Cohort not found.")
+            self.reject()
+            return
+        self.base, self.version = loaded
+        self.setWindowTitle(f"Edit Cohort: {self.base['name']}")
+        self.name = QLineEdit(self.base['name'])
+        self.experimenter = QLineEdit(self.base['experimenter'] or "")
+        self.description = QTextEdit(self.base['description'] or "")
+        self.description.setFixedHeight(60)
+        layout.addRow("Cohort Name", self.name)
+        layout.addRow("Experimenter", self.experimenter)
+        layout.addRow("Description", self.description)
+        btn_layout = QHBoxLayout()
+        save_btn = QPushButton("Save")
+        save_btn.clicked.connect(self.save)
+        cancel_btn = QPushButton("Cancel")
+        cancel_btn.clicked.connect(self.reject)
+        btn_layout.addWidget(save_btn)
+        btn_layout.addWidget(cancel_btn)
+        layout.addRow(btn_layout)
 
-    def _on_page_changed(self, index):
-        # Find the name of the current page
-        for name, page in self.pages.items():
-            if self.stack.widget(index) is page:
-                if name == "Samples":
-                    self.refresh_samples_table()
-                break
+    def save(self):
+        mine = {
+            'name': self.name.text().strip(),
+            'experimenter': self.experimenter.text().strip() or None,
+            'description': self.description.toPlainText().strip() or None,
+        }
+        if not mine['name']:
+            QMessageBox.warning(self, "Missing Data", "Cohort Name is required.")
+            return
+        try:
+            with get_db_connection() as conn:
+                version = save_versioned(
+                    self, conn, 'cohorts', self.cohort_id, self.version, self.base, mine, self.LABELS,
+                    lambda column, value: value
+                )
+        except sqlite3.Error as e:
+            QMessageBox.critical(self, "Database Error", f"Could not update cohort: {e}")
+            return
+        if version is None:
+            self.reject()
+            return
+        self.accept()
 
-    def _create_samples_page(self):
-        page = QWidget()
-        layout = QVBoxLayout()
-        label = QLabel("<h2>Samples</h2>")
-        layout.addWidget(label)
-        self.samples_table = QTableWidget()
-        self.samples_table.setColumnCount(5)
-        self.samples_table.setHorizontalHeaderLabels([
-            "Sample ID", "Sample Type", "Experimenter", "Collection Date", "Cohort Name"
+class ArchivedCohortsDialog(QDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Archived Cohorts")
+        self.setMinimumWidth(600)
+        layout = QVBoxLayout(self)
+        self.table = QTableWidget()
+        self.table.setColumnCount(6)
+        self.table.setHorizontalHeaderLabels([
+            "Cohort Name", "Experimenter", "Date Created", "# Samples", "Archived At", "Size (bytes)"
         ])
-        self.samples_table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.samples_table.setSelectionMode(QTableWidget.MultiSelection)
-        self.samples_table.setSortingEnabled(True)
-        self.samples_table.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.samples_table.cellDoubleClicked.connect(self.open_sample_details_dialog)
-        layout.addWidget(self.samples_table)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.table.setSelectionMode(QTableWidget.MultiSelection)
+        layout.addWidget(self.table)
         btn_layout = QHBoxLayout()
-        add_btn = QPushButton("Add Sample")
-        add_btn.clicked.connect(self.open_add_sample_dialog)
-        btn_layout.addWidget(add_btn)
-        print_btn = QPushButton("Print Barcode")
-        print_btn.clicked.connect(self.print_selected_barcodes)
-        btn_layout.addWidget(print_btn)
-        del_btn = QPushButton("Delete")
-        del_btn.clicked.connect(self.delete_selected_samples)
-        btn_layout.addWidget(del_btn)
+        restore_btn = QPushButton("Restore")
+        restore_btn.clicked.connect(self.restore_selected)
+        btn_layout.addWidget(restore_btn)
+        close_btn = QPushButton("Close")
+        close_btn.clicked.connect(self.accept)
+        btn_layout.addWidget(close_btn)
         layout.addLayout(btn_layout)
-        layout.addStretch()
-        page.setLayout(layout)
-        self.refresh_samples_table()
-        return page
+        self.archive_ids = []
+        self.refresh_table()
 
-    def print_selected_barcodes(self):
-        selected = self.samples_table.selectionModel().selectedRows()
+    def refresh_table(self):
+        rows = archive.list_archived_cohorts(ARCHIVE_PATH)
+        self.archive_ids = [row[0] for row in rows]
+        self.table.setRowCount(len(rows))
+        for row_idx, row in enumerate(rows):
+            for col_idx, value in enumerate(row[1:]):
+                self.table.setItem(row_idx, col_idx, QTableWidgetItem(str(value) if value is not None else ""))
+        self.table.resizeColumnsToContents()
+
+    def restore_selected(self):
+        selected = self.table.selectionModel().selectedRows()
         if not selected:
-            QMessageBox.information(self, "Print Barcodes", "No samples selected.")
+            QMessageBox.information(self, "Restore Cohorts", "No cohorts selected.")
             return
-        sample_ids = [self.samples_table.item(row.row(), 0).text() for row in selected]
-        for sid in sample_ids:
-            print_barcode(sid)
-        self.status.showMessage(f"Sent {len(sample_ids)} barcode(s) to printer.")
+        unplaced = []
+        try:
+            with get_db_connection() as conn:
+                for row in selected:
+                    cohort_id, cohort_unplaced = archive.restore_cohort(conn, ARCHIVE_PATH, self.archive_ids[row.row()])
+                    unplaced.extend(cohort_unplaced)
+                    # Cohorts archived before the typed sample columns existed
+                    migrations.normalize_legacy_samples(conn, "cohort_id = ?", (cohort_id,))
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to restore cohort: {e}")
+        if unplaced:
+            shown = ", ".join(unplaced[:20]) + (f" ... ({len(unplaced)} total)" if len(unplaced) > 20 else "")
+            QMessageBox.warning(
+                self, "Restore Cohorts",
+                f"{len(unplaced)} sample(s) could not go back to their freezer position "
+                f"(slot reused or box removed) and are not in storage: {shown}"
+            )
+        self.refresh_table()
 
-    def delete_selected_samples(self):
-        selected = self.samples_table.selectionModel().selectedRows()
-        if not selected:
-            QMessageBox.information(self, "Delete Samples", "No samples selected.")
+class IdPrefixesDialog(QDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Sample ID Prefixes")
+        self.setMinimumWidth(500)
+        layout = QVBoxLayout(self)
+        self.table = QTableWidget()
+        self.table.setColumnCount(5)
+        self.table.setHorizontalHeaderLabels([
+            "Prefix", "Next #", "Zero Padding", "Format", "# Reserved Ranges"
+        ])
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.table.setSelectionMode(QTableWidget.SingleSelection)
+        self.table.cellClicked.connect(self.load_selected)
+        layout.addWidget(self.table)
+        form = QFormLayout()
+        self.prefix = QLineEdit()
+        self.pad_width = QSpinBox()
+        self.pad_width.setMaximum(12)
+        self.id_format = QLineEdit(id_allocator.DEFAULT_ID_FORMAT)
+        form.addRow("Prefix", self.prefix)
+        form.addRow("Zero Padding", self.pad_width)
+        form.addRow("Format", self.id_format)
+        save_btn = QPushButton("Save Format")
+        save_btn.clicked.connect(self.save_format)
+        form.addRow(save_btn)
+        range_layout = QHBoxLayout()
+        self.range_start = QSpinBox()
+        self.range_start.setMaximum(100000000)
+        self.range_end = QSpinBox()
+        self.range_end.setMaximum(100000000)
+        self.reserved_by = QLineEdit()
+        self.reserved_by.setPlaceholderText("Reserved for...")
+        range_layout.addWidget(self.range_start)
+        range_layout.addWidget(QLabel("to"))
+        range_layout.addWidget(self.range_end)
+        range_layout.addWidget(self.reserved_by)
+        reserve_btn = QPushButton("Reserve Range")
+        reserve_btn.clicked.connect(self.reserve)
+        range_layout.addWidget(reserve_btn)
+        form.addRow("Reserve", range_layout)
+        layout.addLayout(form)
+        close_btn = QPushButton("Close")
+        close_btn.clicked.connect(self.accept)
+        layout.addWidget(close_btn)
+        self.refresh_table()
+
+    def refresh_table(self):
+        with get_db_connection() as conn:
+            rows = id_allocator.list_prefixes(conn)
+        self.table.setRowCount(len(rows))
+        for row_idx, row in enumerate(rows):
+            for col_idx, value in enumerate(row):
+                self.table.setItem(row_idx, col_idx, QTableWidgetItem(str(value) if value is not None else ""))
+        self.table.resizeColumnsToContents()
+
+    def load_selected(self, row, col):
+        self.prefix.setText(self.table.item(row, 0).text())
+        self.pad_width.setValue(int(self.table.item(row, 2).text()))
+        self.id_format.setText(self.table.item(row, 3).text())
+        self.range_start.setValue(int(self.table.item(row, 1).text()))
+
+    def save_format(self):
+        prefix = self.prefix.text().strip()
+        if not prefix:
+            QMessageBox.warning(self, "Missing Data", "Prefix is required.")
             return
-        sample_ids = [self.samples_table.item(row.row(), 0).text() for row in selected]
-        msg = "Are you sure you want to delete the following samples?\n" + ", ".join(sample_ids)
-        if QMessageBox.question(self, "Confirm Delete", msg, QMessageBox.Yes | QMessageBox.No) == QMessageBox.Yes:
+        try:
             with get_db_connection() as conn:
-                cur = conn.cursor()
-                for sid in sample_ids:
-                    cur.execute("DELETE FROM samples WHERE animal_id = ?", (sid,))
+                id_allocator.set_prefix_format(conn, prefix, self.pad_width.value(), self.id_format.text().strip())
                 conn.commit()
-            self.refresh_samples_table()
-            self.status.showMessage(f"Deleted {len(sample_ids)} sample(s).")
+        except ValueError as e:
+            QMessageBox.warning(self, "Invalid Format", f"Could not use this format: {e}")
+            return
+        self.refresh_table()
 
-    def _create_cohorts_page(self):
-        page = QWidget()
-        layout = QVBoxLayout()
-        label = QLabel("<h2>Cohorts</h2>")
-        layout.addWidget(label)
+    def reserve(self):
+        prefix = self.prefix.text().strip()
+        if not prefix:
+            QMessageBox.warning(self, "Missing Data", "Prefix is required.")
+            return
+        try:
+            with get_db_connection() as conn:
+                id_allocator.reserve_range(
+                    conn, prefix, self.range_start.value(), self.range_end.value(),
+                    self.reserved_by.text().strip() or None
+                )
+                conn.commit()
+        except id_allocator.AllocationError as e:
+            QMessageBox.warning(self, "Reserve Range", str(e))
+            return
+        self.refresh_table()
+
+class PrinterEditDialog(QDialog):
+    def __init__(self, printer_row=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Edit Printer" if printer_row else "Add Printer")
+        self.setMinimumWidth(450)
+        printer_id, name, address, dpi, template, enabled = printer_row or (None, "", "", printer.DEFAULT_DPI, None, 1)
+        self.printer_id = printer_id
+        layout = QFormLayout(self)
+        self.name_input = QLineEdit(name)
+        layout.addRow("Name:", self.name_input)
+        self.address_input = QLineEdit(address)
+        self.address_input.setPlaceholderText("Windows printer name or tcp://host:port")
+        layout.addRow("Address:", self.address_input)
+        self.dpi_input = QSpinBox()
+        self.dpi_input.setRange(100, 600)
+        self.dpi_input.setValue(dpi)
+        layout.addRow("DPI:", self.dpi_input)
+        self.template_input = QTextEdit(template or "")
+        self.template_input.setPlaceholderText(
+            "Label ZPL; leave empty for the built-in label. Placeholders: "
+            "{{SAMPLE_ID}} {{X_POS}} {{Y_POS}} {{WIDTH}} {{LENGTH}} {{MODULE}} {{HEIGHT}}"
+        )
+        layout.addRow("Template:", self.template_input)
+        self.enabled_input = QCheckBox("Use for printing")
+        self.enabled_input.setChecked(bool(enabled))
+        layout.addRow("", self.enabled_input)
+        self.status_label = QLabel("")
+        layout.addRow("", self.status_label)
+        btn_layout = QHBoxLayout()
+        check_btn = QPushButton("Check Status")
+        check_btn.clicked.connect(self.check_status)
+        btn_layout.addWidget(check_btn)
+        save_btn = QPushButton("Save")
+        save_btn.clicked.connect(self.save)
+        btn_layout.addWidget(save_btn)
+        cancel_btn = QPushButton("Cancel")
+        cancel_btn.clicked.connect(self.reject)
+        btn_layout.addWidget(cancel_btn)
+        layout.addRow(btn_layout)
+
+    def check_status(self):
+        address = self.address_input.text().strip()
+        if not printer_status.is_socket_address(address):
+            self.status_label.setText("Status is only available for tcp:// printers.")
+            return
+        try:
+            status = printer_status.read_status(address)
+            self.status_label.setText(f"Status: {status.describe()}")
+        except (OSError, ValueError) as e:
+            self.status_label.setText(f"Could not reach printer: {e}")
+
+    def save(self):
+        name = self.name_input.text().strip()
+        address = self.address_input.text().strip()
+        if not name or not address:
+            QMessageBox.warning(self, "Missing Data", "Name and address are required.")
+            return
+        try:
+            with get_db_connection() as conn:
+                printer_pool.save_printer(
+                    conn, name, address, self.dpi_input.value(),
+                    self.template_input.toPlainText().strip(), self.enabled_input.isChecked(), self.printer_id
+                )
+        except sqlite3.IntegrityError:
+            QMessageBox.warning(self, "Duplicate Name", f"A printer named '{name}' already exists.")
+            return
+        self.accept()
+
+class PrintersDialog(QDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Printers")
+        self.setMinimumWidth(700)
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel(
+            "Label runs are split across the enabled printers; if one fails, "
+            "its remaining labels go to the others."
+        ))
+        self.table = QTableWidget()
+        self.table.setColumnCount(8)
+        self.table.setHorizontalHeaderLabels([
+            "Name", "Address", "DPI", "Enabled", "Jobs", "Labels", "Failed", "Labels/min"
+        ])
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.table.setSelectionMode(QTableWidget.SingleSelection)
+        self.table.cellDoubleClicked.connect(lambda row, col: self.edit_printer())
+        layout.addWidget(self.table)
+        btn_layout = QHBoxLayout()
+        add_btn = QPushButton("Add...")
+        add_btn.clicked.connect(self.add_printer)
+        btn_layout.addWidget(add_btn)
+        edit_btn = QPushButton("Edit...")
+        edit_btn.clicked.connect(self.edit_printer)
+        btn_layout.addWidget(edit_btn)
+        remove_btn = QPushButton("Remove")
+        remove_btn.clicked.connect(self.remove_printer)
+        btn_layout.addWidget(remove_btn)
+        layout.addLayout(btn_layout)
+        default_layout = QHBoxLayout()
+        default_layout.addWidget(QLabel("Printer when none are enabled:"))
+        self.default_input = QLineEdit()
+        self.default_input.setPlaceholderText("Windows default printer")
+        default_layout.addWidget(self.default_input)
+        layout.addLayout(default_layout)
+        close_btn = QPushButton("Close")
+        close_btn.clicked.connect(self.accept)
+        layout.addWidget(close_btn)
+        self.printers = []
+        with get_db_connection() as conn:
+            cur = conn.execute("SELECT value FROM app_meta WHERE key = ?", (print_jobs.PRINTER_KEY,))
+            row = cur.fetchone()
+        self.default_input.setText(row[0] if row else "")
+        self.refresh()
+
+    def refresh(self):
+        with get_db_connection() as conn:
+            self.printers = printer_pool.list_printers(conn)
+            stats = printer_pool.printer_stats(conn)
+        self.table.setRowCount(len(self.printers))
+        for row_idx, (printer_id, name, address, dpi, template, enabled) in enumerate(self.printers):
+            jobs, labels, failed, rate = stats.get(name, (0, 0, 0, 0.0))
+            values = [name, address, dpi, "Yes" if enabled else "No", jobs, labels, failed, f"{rate:.0f}"]
+            for col_idx, value in enumerate(values):
+                self.table.setItem(row_idx, col_idx, QTableWidgetItem(str(value)))
+        self.table.resizeColumnsToContents()
+
+    def _selected_printer(self):
+        selected = self.table.selectionModel().selectedRows()
+        return self.printers[selected[0].row()] if selected else None
+
+    def add_printer(self):
+        if PrinterEditDialog(parent=self).exec_():
+            self.refresh()
+
+    def edit_printer(self):
+        printer_row = self._selected_printer()
+        if printer_row and PrinterEditDialog(printer_row, self).exec_():
+            self.refresh()
+
+    def remove_printer(self):
+        printer_row = self._selected_printer()
+        if not printer_row:
+            return
+        reply = QMessageBox.question(
+            self, "Remove Printer", f"Remove printer '{printer_row[1]}'?",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+        )
+        if reply == QMessageBox.Yes:
+            with get_db_connection() as conn:
+                printer_pool.remove_printer(conn, printer_row[0])
+            self.refresh()
+
+    def accept(self):
+        with get_db_connection() as conn:
+            print_jobs.set_printer(conn, self.default_input.text().strip() or None)
+        super().accept()
+
+class BulkEditDialog(QDialog):
+    def __init__(self, sample_ids, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(f"Bulk Edit: {len(sample_ids)} sample(s)")
+        self.setMinimumWidth(600)
+        self.sample_ids = sample_ids
+        layout = QVBoxLayout(self)
+        form = QFormLayout()
+        # Each field is only changed when its box is ticked
+        self.fields = {}
+        self.sample_type_input = QComboBox()
+        self.sample_type_input.setEditable(True)
+        self.experimenter_input = QComboBox()
+        self.experimenter_input.setEditable(True)
+        self.subject_input = QComboBox()
+        self.subject_input.setEditable(True)
+        with get_db_connection() as conn:
+            self.sample_type_input.addItems([name for _, name in lookups.list_names(conn, 'sample_types')])
+            self.experimenter_input.addItems([name for _, name in lookups.list_names(conn, 'experimenters')])
+            self.subject_input.addItems([name for _, name in lookups.list_names(conn, 'subjects')])
+        self.date_input = QDateEdit(QDate.currentDate())
+        self.date_input.setCalendarPopup(True)
+        self.shift_input = QSpinBox()
+        self.shift_input.setRange(-365, 365)
+        self.shift_input.setSuffix(" day(s)")
+        self.time_point_input = QLineEdit()
+        self.notes_input = QLineEdit()
+        for key, label, widget in [
+            ('sample_type', "Sample Type", self.sample_type_input),
+            ('experimenter', "Experimenter", self.experimenter_input),
+            ('subject', "Subject", self.subject_input),
+            ('collection_date', "Set Collection Date", self.date_input),
+            ('date_shift', "Shift Collection Date", self.shift_input),
+            ('time_point', "Time Point", self.time_point_input),
+            ('notes', "Notes", self.notes_input),
+        ]:
+            box = QCheckBox(label)
+            widget.setEnabled(False)
+            box.toggled.connect(widget.setEnabled)
+            self.fields[key] = box
+            form.addRow(box, widget)
+        layout.addLayout(form)
+        self.preview_label = QLabel("")
+        layout.addWidget(self.preview_label)
+        self.table = QTableWidget()
+        self.table.setColumnCount(4)
+        self.table.setHorizontalHeaderLabels(["Sample ID", "Field", "Old", "New"])
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        layout.addWidget(self.table)
+        btn_layout = QHBoxLayout()
+        preview_btn = QPushButton("Preview")
+        preview_btn.clicked.connect(self.preview)
+        btn_layout.addWidget(preview_btn)
+        apply_btn = QPushButton("Apply")
+        apply_btn.clicked.connect(self.apply)
+        btn_layout.addWidget(apply_btn)
+        cancel_btn = QPushButton("Cancel")
+        cancel_btn.clicked.connect(self.reject)
+        btn_layout.addWidget(cancel_btn)
+        layout.addLayout(btn_layout)
+
+    def changes(self):
+        values = {
+            'sample_type': self.sample_type_input.currentText().strip(),
+            'experimenter': self.experimenter_input.currentText().strip(),
+            'subject': self.subject_input.currentText().strip(),
+            'collection_date': self.date_input.date().toString("yyyy-MM-dd"),
+            'date_shift': self.shift_input.value(),
+            'time_point': self.time_point_input.text().strip(),
+            'notes': self.notes_input.text().strip(),
+        }
+        return {key: values[key] for key, box in self.fields.items() if box.isChecked()}
+
+    def preview(self):
+        changes = self.changes()
+        if not changes:
+            self.preview_label.setText("Tick at least one field to change.")
+            return None
+        with get_db_connection() as conn:
+            ids = self.sample_ids
+            rows = bulk_edit.preview(conn, ids, changes)
+        self.table.setRowCount(len(rows))
+        for row_idx, row in enumerate(rows):
+            for col_idx, value in enumerate(row):
+                self.table.setItem(row_idx, col_idx, QTableWidgetItem(str(value) if value is not None else ""))
+        self.table.resizeColumnsToContents()
+        limit_note = f" (first {bulk_edit.PREVIEW_LIMIT} shown)" if len(rows) >= bulk_edit.PREVIEW_LIMIT else ""
+        changed = len({row[0] for row in rows})
+        self.preview_label.setText(f"{len(rows)} change(s) in {changed} of {len(ids)} sample(s){limit_note}.")
+        return ids
+
+    def apply(self):
+        changes = self.changes()
+        ids = self.preview()
+        if not ids:
+            return
+        reply = QMessageBox.question(
+            self, "Bulk Edit", f"Apply {bulk_edit.describe(changes)} to {len(ids)} sample(s)?",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+        )
+        if reply != QMessageBox.Yes:
+            return
+        try:
+            with get_db_connection() as conn:
+                bulk_edit.apply(conn, ids, changes)
+        except (ValueError, sqlite3.Error) as e:
+            QMessageBox.critical(self, "Bulk Edit", f"Could not apply changes: {e}")
+            return
+        self.accept()
+
+class AliquotDialog(QDialog):
+    # Splits each selected sample into aliquots and creates them in one go;
+    # created holds [(row id, sample ID)] for printing afterwards
+    def __init__(self, sample_ids, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(f"Create Aliquots: {len(sample_ids)} sample(s)")
+        self.setMinimumWidth(450)
+        self.sample_ids = sample_ids
+        self.created = []
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel(
+            "Aliquots per selected sample. Each gets the ID <parent>-N and the "
+            "parent's cohort, experimenter, collection date and time point."
+        ))
+        with get_db_connection() as conn:
+            types = [name for _, name in lookups.list_names(conn, 'sample_types')]
+        types += [t for t in SAMPLE_TYPES if t not in types]
+        self.table = QTableWidget(len(types), 2)
+        self.table.setHorizontalHeaderLabels(["Sample Type", "Count"])
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.counts = []
+        for row_idx, name in enumerate(types):
+            self.table.setItem(row_idx, 0, QTableWidgetItem(name))
+            spin = QSpinBox()
+            spin.setRange(0, lineage.MAX_ALIQUOTS_PER_PARENT)
+            spin.valueChanged.connect(self._update_total)
+            self.table.setCellWidget(row_idx, 1, spin)
+            self.counts.append((name, spin))
+        self.table.resizeColumnsToContents()
+        layout.addWidget(self.table)
+        form = QFormLayout()
+        self.notes_input = QLineEdit()
+        form.addRow("Notes", self.notes_input)
+        self.print_box = QCheckBox("Print labels")
+        self.print_box.setChecked(True)
+        form.addRow(self.print_box)
+        layout.addLayout(form)
+        self.total_label = QLabel("")
+        layout.addWidget(self.total_label)
+        btn_layout = QHBoxLayout()
+        create_btn = QPushButton("Create")
+        create_btn.clicked.connect(self.create)
+        btn_layout.addWidget(create_btn)
+        cancel_btn = QPushButton("Cancel")
+        cancel_btn.clicked.connect(self.reject)
+        btn_layout.addWidget(cancel_btn)
+        layout.addLayout(btn_layout)
+        self._update_total()
+
+    def _aliquots(self):
+        return [(name, spin.value()) for name, spin in self.counts if spin.value()]
+
+    def _update_total(self):
+        per_parent = sum(count for _, count in self._aliquots())
+        self.total_label.setText(f"{per_parent * len(self.sample_ids)} new sample(s) in total.")
+
+    def create(self):
+        try:
+            with get_db_connection() as conn:
+                parent_ids = self.sample_ids
+                self.created = lineage.create_aliquots(conn, parent_ids, self._aliquots(), self.notes_input.text().strip())
+        except (ValueError, sqlite3.Error) as e:
+            QMessageBox.critical(self, "Create Aliquots", f"Could not create aliquots: {e}")
+            return
+        self.accept()
+
+class StorageDialog(QDialog):
+    # Freezer / rack / box tree with the selected box's layout. Tubes in the
+    # box can be moved to another position or taken out of storage. Opened
+    # with sample IDs it also stores them, starting at the selected box.
+    def __init__(self, sample_ids=None, parent=None):
+        super().__init__(parent)
+        self.sample_ids = sample_ids or []
+        self.setWindowTitle(f"Store {len(self.sample_ids)} sample(s)" if self.sample_ids else "Storage")
+        self.setMinimumSize(900, 500)
+        self.placements = []
+        layout = QVBoxLayout(self)
+        main_layout = QHBoxLayout()
+        self.tree = QTreeWidget()
+        self.tree.setHeaderLabels(["Storage", "Used"])
+        self.tree.currentItemChanged.connect(lambda current, previous: self.show_box())
+        main_layout.addWidget(self.tree, 1)
+        self.grid = QTableWidget()
+        self.grid.setEditTriggers(QTableWidget.NoEditTriggers)
+        main_layout.addWidget(self.grid, 2)
+        layout.addLayout(main_layout)
+        btn_layout = QHBoxLayout()
+        for text, slot in [
+            ("Add Freezer...", self.add_freezer),
+            ("Add Rack...", self.add_rack),
+            ("Add Box...", self.add_box),
+            ("Remove", self.remove_selected),
+            ("Move Tube...", self.move_tube),
+            ("Take Out of Storage", self.unstore_tubes),
+        ]:
+            btn = QPushButton(text)
+            btn.clicked.connect(slot)
+            btn_layout.addWidget(btn)
+        btn_layout.addStretch()
+        if self.sample_ids:
+            self.store_btn = QPushButton(f"Store {len(self.sample_ids)} Sample(s) Here")
+            self.store_btn.clicked.connect(self.store_samples)
+            btn_layout.addWidget(self.store_btn)
+        close_btn = QPushButton("Close")
+        close_btn.clicked.connect(self.reject)
+        btn_layout.addWidget(close_btn)
+        layout.addLayout(btn_layout)
+        self.refresh()
+
+    def refresh(self):
+        # Rebuilds the tree, keeping the current freezer / rack / box selected
+        current = self._selected()
+        self.tree.clear()
+        freezers, racks = {}, {}
+        with get_db_connection() as conn:
+            rows = storage.tree(conn)
+        for freezer_id, freezer, rack_id, rack, box_id, box, box_rows, cols, used, capacity in rows:
+            if freezer_id not in freezers:
+                freezers[freezer_id] = QTreeWidgetItem(self.tree, [freezer, ""])
+                freezers[freezer_id].setData(0, Qt.UserRole, ('freezers', freezer_id))
+            if rack_id is not None and rack_id not in racks:
+                racks[rack_id] = QTreeWidgetItem(freezers[freezer_id], [rack, ""])
+                racks[rack_id].setData(0, Qt.UserRole, ('racks', rack_id))
+            if box_id is not None:
+                item = QTreeWidgetItem(racks[rack_id], [box, f"{used}/{capacity}"])
+                item.setData(0, Qt.UserRole, ('boxes', box_id, box_rows, cols))
+        self.tree.expandAll()
+        self.tree.resizeColumnToContents(0)
+        if current:
+            for item in self.tree.findItems("", Qt.MatchContains | Qt.MatchRecursive):
+                data = item.data(0, Qt.UserRole)
+                if data and tuple(data[:2]) == tuple(current[:2]):
+                    self.tree.setCurrentItem(item)
+                    break
+        self.show_box()
+
+    def _selected(self):
+        item = self.tree.currentItem()
+        return item.data(0, Qt.UserRole) if item else None
+
+    def show_box(self):
+        selected = self._selected()
+        if self.sample_ids:
+            self.store_btn.setEnabled(bool(selected) and selected[0] == 'boxes')
+        if not selected or selected[0] != 'boxes':
+            self.grid.setRowCount(0)
+            self.grid.setColumnCount(0)
+            return
+        _, box_id, box_rows, cols = selected
+        with get_db_connection() as conn:
+            contents = storage.box_contents(conn, box_id)
+        self.grid.setRowCount(box_rows)
+        self.grid.setColumnCount(cols)
+        self.grid.setVerticalHeaderLabels(list(storage.ROW_LETTERS[:box_rows]))
+        self.grid.setHorizontalHeaderLabels([str(c + 1) for c in range(cols)])
+        for position in range(box_rows * cols):
+            sample_id, code = contents.get(position, (None, ""))
+            item = QTableWidgetItem(code)
+            item.setData(Qt.UserRole, sample_id)
+            self.grid.setItem(position // cols, position % cols, item)
+        self.grid.resizeColumnsToContents()
+
+    def _selected_tubes(self):
+        # [(sample row id, sample ID)] of the selected occupied positions
+        return [
+            (item.data(Qt.UserRole), item.text()) for item in self.grid.selectedItems()
+            if item.data(Qt.UserRole) is not None
+        ]
+
+    def move_tube(self):
+        selected = self._selected()
+        tubes = self._selected_tubes()
+        if not selected or selected[0] != 'boxes' or len(tubes) != 1:
+            QMessageBox.information(self, "Move Tube", "Select one tube in the box to move.")
+            return
+        _, box_id, box_rows, cols = selected
+        sample_id, code = tubes[0]
+        label, ok = QInputDialog.getText(self, "Move Tube", f"New position for {code} (e.g. B4):")
+        if not ok or not label.strip():
+            return
+        try:
+            position = storage.parse_position(label, box_rows, cols)
+            with get_db_connection() as conn:
+                storage.store_at(conn, sample_id, box_id, position)
+        except (storage.StorageError, sqlite3.Error) as e:
+            QMessageBox.warning(self, "Move Tube", str(e))
+            return
+        self.show_box()
+
+    def unstore_tubes(self):
+        tubes = self._selected_tubes()
+        if not tubes:
+            QMessageBox.information(self, "Take Out of Storage", "Select the tubes to take out.")
+            return
+        reply = QMessageBox.question(
+            self, "Take Out of Storage", f"Take {len(tubes)} tube(s) out of storage?",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+        )
+        if reply != QMessageBox.Yes:
+            return
+        with get_db_connection() as conn:
+            storage.unstore(conn, [sample_id for sample_id, _ in tubes])
+        self.refresh()
+
+    def _add(self, title, create):
+        name, ok = QInputDialog.getText(self, title, "Name:")
+        if not ok or not name.strip():
+            return
+        try:
+            with get_db_connection() as conn:
+                create(conn, name.strip())
+        except (storage.StorageError, sqlite3.Error) as e:
+            QMessageBox.critical(self, title, str(e))
+            return
+        self.refresh()
+
+    def add_freezer(self):
+        self._add("Add Freezer", storage.add_freezer)
+
+    def add_rack(self):
+        selected = self._selected()
+        if not selected or selected[0] != 'freezers':
+            QMessageBox.information(self, "Add Rack", "Select the freezer to add the rack to.")
+            return
+        self._add("Add Rack", lambda conn, name: storage.add_rack(conn, selected[1], name))
+
+    def add_box(self):
+        selected = self._selected()
+        if not selected or selected[0] != 'racks':
+            QMessageBox.information(self, "Add Box", "Select the rack to add the box to.")
+            return
+        box_rows, ok = QInputDialog.getInt(self, "Add Box", "Rows:", storage.DEFAULT_BOX_ROWS, 1, len(storage.ROW_LETTERS))
+        if not ok:
+            return
+        cols, ok = QInputDialog.getInt(self, "Add Box", "Columns:", storage.DEFAULT_BOX_COLS, 1, 48)
+        if not ok:
+            return
+        self._add("Add Box", lambda conn, name: storage.add_box(conn, selected[1], name, box_rows, cols))
+
+    def remove_selected(self):
+        selected = self._selected()
+        if not selected:
+            return
+        try:
+            with get_db_connection() as conn:
+                storage.remove(conn, selected[0], selected[1])
+        except storage.StorageError as e:
+            QMessageBox.warning(self, "Remove", str(e))
+            return
+        self.refresh()
+
+    def store_samples(self):
+        selected = self._selected()
+        try:
+            with get_db_connection() as conn:
+                ids = self.sample_ids
+                self.placements = storage.store(conn, ids, selected[1])
+        except (storage.StorageError, sqlite3.Error) as e:
+            QMessageBox.critical(self, "Store Samples", f"Could not store samples: {e}")
+            return
+        self.accept()
+
+class SubjectTimelineDialog(QDialog):
+    # Every sample drawn from one subject, oldest first, loaded a page at a
+    # time; the subject's details can be edited here
+    def __init__(self, subject_id, parent=None):
+        super().__init__(parent)
+        self.setMinimumSize(700, 450)
+        self.subject_id = subject_id
+        self.cursor = None
+        layout = QVBoxLayout(self)
+        with get_db_connection() as conn:
+            name, species, sex, notes = subjects.get(conn, subject_id)
+            self.total = subjects.sample_count(conn, subject_id)
+        self.setWindowTitle(f"Timeline: {name}")
+        form = QFormLayout()
+        self.name_input = QLineEdit(name)
+        self.species_input = QLineEdit(species or "")
+        self.sex_input = QLineEdit(sex or "")
+        self.notes_input = QLineEdit(notes or "")
+        form.addRow("Subject", self.name_input)
+        form.addRow("Species", self.species_input)
+        form.addRow("Sex", self.sex_input)
+        form.addRow("Notes", self.notes_input)
+        layout.addLayout(form)
+        self.count_label = QLabel()
+        layout.addWidget(self.count_label)
+        self.table = QTableWidget()
+        self.table.setColumnCount(5)
+        self.table.setHorizontalHeaderLabels(["Collection Date", "Time Point", "Sample ID", "Sample Type", "Cohort"])
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        layout.addWidget(self.table)
+        btn_layout = QHBoxLayout()
+        self.more_btn = QPushButton("Load More")
+        self.more_btn.clicked.connect(self.load_page)
+        btn_layout.addWidget(self.more_btn)
+        btn_layout.addStretch()
+        save_btn = QPushButton("Save Subject")
+        save_btn.clicked.connect(self.save_subject)
+        btn_layout.addWidget(save_btn)
+        close_btn = QPushButton("Close")
+        close_btn.clicked.connect(self.accept)
+        btn_layout.addWidget(close_btn)
+        layout.addLayout(btn_layout)
+        self.load_page()
+
+    def load_page(self):
+        with get_db_connection() as conn:
+            rows, self.cursor = subjects.timeline(conn, self.subject_id, self.cursor)
+        start = self.table.rowCount()
+        self.table.setRowCount(start + len(rows))
+        for row_idx, (_, code, date, time_point, sample_type, cohort) in enumerate(rows, start):
+            for col_idx, value in enumerate([date, time_point, code, sample_type, cohort]):
+                self.table.setItem(row_idx, col_idx, QTableWidgetItem(str(value) if value is not None else ""))
+        self.table.resizeColumnsToContents()
+        self.more_btn.setEnabled(self.cursor is not None)
+        self.count_label.setText(f"Showing {self.table.rowCount()} of {self.total} sample(s).")
+
+    def save_subject(self):
+        try:
+            with get_db_connection() as conn:
+                subjects.update(
+                    conn, self.subject_id, self.name_input.text(), self.species_input.text().strip(),
+                    self.sex_input.text().strip(), self.notes_input.text().strip()
+                )
+        except (ValueError, sqlite3.Error) as e:
+            QMessageBox.critical(self, "Subject", f"Could not save subject: {e}")
+            return
+        self.setWindowTitle(f"Timeline: {self.name_input.text().strip()}")
+
+class CohortTimelineDialog(QDialog):
+    # A cohort's samples as subject x time point, a page of subjects at a time
+    def __init__(self, cohort_id, cohort_name, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(f"Timeline: {cohort_name}")
+        self.setMinimumSize(700, 450)
+        self.cohort_id = cohort_id
+        self.after_name = None
+        self.subject_ids = []
+        self.names = []
+        self.columns = []
+        self.cells = {}
+        layout = QVBoxLayout(self)
+        with get_db_connection() as conn:
+            unlinked = subjects.unlinked_count(conn, cohort_id)
+        if unlinked:
+            layout.addWidget(QLabel(
+                f"{unlinked} sample(s) in this cohort have no subject; set one with Edit or Bulk Edit."
+            ))
+        self.table = QTableWidget()
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.cellDoubleClicked.connect(self.open_subject)
+        layout.addWidget(self.table)
+        btn_layout = QHBoxLayout()
+        self.more_btn = QPushButton("Load More Subjects")
+        self.more_btn.clicked.connect(self.load_page)
+        btn_layout.addWidget(self.more_btn)
+        btn_layout.addStretch()
+        close_btn = QPushButton("Close")
+        close_btn.clicked.connect(self.accept)
+        btn_layout.addWidget(close_btn)
+        layout.addLayout(btn_layout)
+        self.load_page()
+
+    def load_page(self):
+        with get_db_connection() as conn:
+            page, columns, cells, self.after_name = subjects.cohort_timeline(conn, self.cohort_id, self.after_name)
+        for column in columns:
+            if column not in self.columns:
+                self.columns.append(column)
+        self.cells.update(cells)
+        self.subject_ids.extend(subject_id for subject_id, _ in page)
+        self.names.extend(name for _, name in page)
+        self.table.setColumnCount(len(self.columns))
+        self.table.setHorizontalHeaderLabels(self.columns)
+        self.table.setRowCount(len(self.subject_ids))
+        self.table.setVerticalHeaderLabels(self.names)
+        for row_idx, subject_id in enumerate(self.subject_ids):
+            for col_idx, column in enumerate(self.columns):
+                codes = self.cells.get((subject_id, column), [])
+                self.table.setItem(row_idx, col_idx, QTableWidgetItem(", ".join(codes)))
+        self.table.resizeColumnsToContents()
+        self.more_btn.setEnabled(self.after_name is not None)
+
+    def open_subject(self, row, col):
+        SubjectTimelineDialog(self.subject_ids[row], self).exec_()
+
+class LabelSheetDialog(QDialog):
+    def __init__(self, default_name, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Label Sheet")
+        self.setMinimumWidth(450)
+        self.sheet = None
+        self.path = None
+        layout = QFormLayout(self)
+        self.sheet_combo = QComboBox()
+        self.sheet_combo.addItems(list(label_sheets.SHEET_FORMATS))
+        self.sheet_combo.setCurrentText(label_sheets.DEFAULT_SHEET)
+        layout.addRow("Sheet:", self.sheet_combo)
+        path_layout = QHBoxLayout()
+        self.path_input = QLineEdit(os.path.join(os.path.expanduser("~"), f"{default_name}.pdf"))
+        browse_btn = QPushButton("Browse...")
+        browse_btn.clicked.connect(self.browse)
+        path_layout.addWidget(self.path_input)
+        path_layout.addWidget(browse_btn)
+        layout.addRow("Save to:", path_layout)
+        btn_layout = QHBoxLayout()
+        save_btn = QPushButton("Save")
+        save_btn.clicked.connect(self.save)
+        cancel_btn = QPushButton("Cancel")
+        cancel_btn.clicked.connect(self.reject)
+        btn_layout.addWidget(save_btn)
+        btn_layout.addWidget(cancel_btn)
+        layout.addRow(btn_layout)
+
+    def browse(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Label Sheet", self.path_input.text(), "PDF (*.pdf);;PNG pages (*.png)"
+        )
+        if path:
+            self.path_input.setText(path)
+
+    def save(self):
+        path = self.path_input.text().strip()
+        if not path.lower().endswith((".pdf", ".png")):
+            QMessageBox.warning(self, "Label Sheet", "Save as a .pdf file or as .png pages.")
+            return
+        if path.lower().endswith(".png") and label_sheets.Image is None:
+            QMessageBox.warning(self, "Label Sheet", "PNG pages need Pillow (pip install Pillow); save as PDF instead.")
+            return
+        self.sheet = self.sheet_combo.currentText()
+        self.path = path
+        self.accept()
+
+class SyncDialog(QDialog):
+    def __init__(self, engine, parent=None):
+        super().__init__(parent)
+        self.engine = engine
+        self.setWindowTitle("Sync with Central Database")
+        self.setMinimumWidth(550)
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel(
+            "Changes are saved to this computer first and sent to the central database in the background."
+        ))
+        path_layout = QHBoxLayout()
+        self.central_path = QLineEdit()
+        self.central_path.setPlaceholderText("Central database file (e.g. on the network share)")
+        browse_btn = QPushButton("Browse...")
+        browse_btn.clicked.connect(self.browse)
+        path_layout.addWidget(self.central_path)
+        path_layout.addWidget(browse_btn)
+        layout.addLayout(path_layout)
+        btn_layout = QHBoxLayout()
+        self.enable_btn = QPushButton()
+        self.enable_btn.clicked.connect(self.toggle_enabled)
+        btn_layout.addWidget(self.enable_btn)
+        sync_now_btn = QPushButton("Sync Now")
+        sync_now_btn.clicked.connect(self.engine.sync_now)
+        btn_layout.addWidget(sync_now_btn)
+        layout.addLayout(btn_layout)
+        layout.addWidget(QLabel("<b>Conflicts</b> (changed here and on another bench):"))
+        self.table = QTableWidget()
+        self.table.setColumnCount(4)
+        self.table.setHorizontalHeaderLabels(["Type", "Key", "Details", "Since"])
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.table.setSelectionMode(QTableWidget.MultiSelection)
+        layout.addWidget(self.table)
+        resolve_layout = QHBoxLayout()
+        keep_btn = QPushButton("Keep Mine")
+        keep_btn.clicked.connect(lambda: self.resolve_selected(True))
+        take_btn = QPushButton("Take Theirs")
+        take_btn.clicked.connect(lambda: self.resolve_selected(False))
+        close_btn = QPushButton("Close")
+        close_btn.clicked.connect(self.accept)
+        resolve_layout.addWidget(keep_btn)
+        resolve_layout.addWidget(take_btn)
+        resolve_layout.addWidget(close_btn)
+        layout.addLayout(resolve_layout)
+        self.conflicts = []
+        self.refresh()
+
+    def refresh(self):
+        with get_db_connection() as conn:
+            self.central_path.setText(sync.get_setting(conn, 'sync_central_path', ""))
+            enabled = sync.is_enabled(conn)
+            self.conflicts = sync.list_conflicts(conn)
+        self.enable_btn.setText("Disable Sync" if enabled else "Enable Sync")
+        self.central_path.setEnabled(not enabled)
+        self.table.setRowCount(len(self.conflicts))
+        for row_idx, (entity, key, message, count, since) in enumerate(self.conflicts):
+            for col_idx, value in enumerate([entity, key, message, since]):
+                self.table.setItem(row_idx, col_idx, QTableWidgetItem(str(value) if value is not None else ""))
+        self.table.resizeColumnsToContents()
+
+    def browse(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Central Database", self.central_path.text(), "SQLite Database (*.db);;All Files (*)",
+            options=QFileDialog.DontConfirmOverwrite
+        )
+        if path:
+            self.central_path.setText(path)
+
+    def toggle_enabled(self):
+        with get_db_connection() as conn:
+            if sync.is_enabled(conn):
+                sync.disable(conn)
+            else:
+                path = self.central_path.text().strip()
+                if not path:
+                    QMessageBox.warning(self, "Missing Data", "Choose the central database file first.")
+                    return
+                sync.enable(conn, path)
+        self.engine.sync_now()
+        self.refresh()
+
+    def resolve_selected(self, keep_local):
+        selected = self.table.selectionModel().selectedRows()
+        if not selected:
+            QMessageBox.information(self, "Resolve Conflicts", "No conflicts selected.")
+            return
+        try:
+            with get_db_connection() as conn:
+                central_path = sync.get_setting(conn, 'sync_central_path')
+                for row in selected:
+                    entity, key = self.conflicts[row.row()][:2]
+                    sync.resolve_conflict(conn, central_path, entity, key, keep_local)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Could not resolve conflict: {e}")
+        self.engine.sync_now()
+        self.refresh()
+
+class AuditLogDialog(QDialog):
+    # Whole-database log (newest first), or the history of one row
+    def __init__(self, table=None, row_id=None, title="Audit Log", parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(title)
+        self.setMinimumSize(800, 400)
+        self.audit_table = table
+        self.row_id = row_id
+        layout = QVBoxLayout(self)
+        self.table = QTableWidget()
+        self.table.setColumnCount(5)
+        self.table.setHorizontalHeaderLabels(["Time", "User", "Record", "Action", "Changes"])
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        layout.addWidget(self.table)
+        btn_layout = QHBoxLayout()
+        if row_id is not None:
+            self.include_archived = QCheckBox("Include archived segments")
+            self.include_archived.toggled.connect(self.refresh)
+            btn_layout.addWidget(self.include_archived)
+        else:
+            self.include_archived = None
+            btn_layout.addWidget(QLabel("Archive events older than"))
+            self.archive_days = QSpinBox()
+            self.archive_days.setRange(1, 36500)
+            self.archive_days.setValue(365)
+            btn_layout.addWidget(self.archive_days)
+            btn_layout.addWidget(QLabel("days"))
+            archive_btn = QPushButton("Archive")
+            archive_btn.clicked.connect(self.archive_old_events)
+            btn_layout.addWidget(archive_btn)
+        btn_layout.addStretch()
+        close_btn = QPushButton("Close")
+        close_btn.clicked.connect(self.accept)
+        btn_layout.addWidget(close_btn)
+        layout.addLayout(btn_layout)
+        self.refresh()
+
+    def refresh(self):
+        with get_db_connection() as conn:
+            if self.row_id is None:
+                events = audit.recent(conn)
+            else:
+                events = audit.history(conn, self.audit_table, self.row_id)
+                if self.include_archived is not None and self.include_archived.isChecked():
+                    for segment in reversed(audit.list_segments(conn)):
+                        if os.path.exists(segment[0]):
+                            events.extend(audit.segment_history(segment[0], self.audit_table, self.row_id))
+        self.table.setRowCount(len(events))
+        for row_idx, event in enumerate(events):
+            changes = "; ".join(f"{field}: {value}" for field, value in event["changes"].items())
+            values = [event["time"], event["user"], f"{event['table']} #{event['row_id']}", event["op"], changes]
+            for col_idx, value in enumerate(values):
+                self.table.setItem(row_idx, col_idx, QTableWidgetItem(str(value) if value is not None else ""))
+        self.table.resizeColumnsToContents()
+
+    def archive_old_events(self):
+        before_ts = int(time.time()) - self.archive_days.value() * 86400
+        try:
+            with get_db_connection() as conn:
+                moved = audit.roll_segment(conn, AUDIT_SEGMENT_DIR, before_ts)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Could not archive audit events: {e}")
+            return
+        QMessageBox.information(self, "Audit Log", f"Moved {moved} event(s) to {AUDIT_SEGMENT_DIR}.")
+        self.refresh()
+
+class ActivityFilter(QObject):
+    # App-wide event filter: any key or click postpones idle-time
+    # maintenance. It never consumes the event.
+    def __init__(self, maintenance_worker, parent=None):
+        super().__init__(parent)
+        self.maintenance_worker = maintenance_worker
+
+    def eventFilter(self, obj, event):
+        if event.type() in (QEvent.KeyPress, QEvent.MouseButtonPress):
+            self.maintenance_worker.touch()
+        return False
+
+class DiagnosticsDialog(QDialog):
+    # Database file stats and the background maintenance log
+    def __init__(self, maintenance_worker, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Diagnostics")
+        self.setMinimumSize(800, 450)
+        self.maintenance_worker = maintenance_worker
+        layout = QVBoxLayout(self)
+        self.info_label = QLabel()
+        self.info_label.setTextInteractionFlags(Qt.TextSelectableByMouse)
+        layout.addWidget(self.info_label)
+        self.table = QTableWidget()
+        self.table.setColumnCount(5)
+        self.table.setHorizontalHeaderLabels(["Time", "Task", "Status", "Duration (ms)", "Detail"])
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        layout.addWidget(self.table)
+        btn_layout = QHBoxLayout()
+        run_btn = QPushButton("Run Maintenance Now")
+        run_btn.clicked.connect(self.run_now)
+        btn_layout.addWidget(run_btn)
+        refresh_btn = QPushButton("Refresh")
+        refresh_btn.clicked.connect(self.refresh)
+        btn_layout.addWidget(refresh_btn)
+        btn_layout.addStretch()
+        close_btn = QPushButton("Close")
+        close_btn.clicked.connect(self.accept)
+        btn_layout.addWidget(close_btn)
+        layout.addLayout(btn_layout)
+        self.refresh()
+
+    def refresh(self):
+        with get_db_connection() as conn:
+            info = maintenance.diagnostics(conn, DB_PATH)
+            runs = maintenance.recent_runs(conn)
+        text = f"<b>Database:</b> {info['path']}<br>"
+        text += f"<b>Size:</b> {info['file_size'] / 1048576:.1f} MB ({info['page_count']} pages of {info['page_size']} bytes, {info['freelist_count']} free)<br>"
+        text += f"<b>auto_vacuum:</b> {info['auto_vacuum']} &nbsp; <b>journal_mode:</b> {info['journal_mode']} &nbsp; <b>SQLite:</b> {info['sqlite_version']}<br>"
+        if info['pending_reindex']:
+            text += f"<b>Indexes waiting for rebuild:</b> {', '.join(info['pending_reindex'])}<br>"
+        for task, ts, status, duration_ms, detail in info['last_runs']:
+            when = time.strftime('%Y-%m-%d %H:%M', time.localtime(ts))
+            text += f"<b>{task}:</b> {status} at {when} ({detail})<br>"
+        self.info_label.setText(text)
+        self.table.setRowCount(len(runs))
+        for row_idx, (ts, task, status, duration_ms, detail) in enumerate(runs):
+            values = [time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts)), task, status, duration_ms, detail]
+            for col_idx, value in enumerate(values):
+                self.table.setItem(row_idx, col_idx, QTableWidgetItem(str(value) if value is not None else ""))
+        self.table.resizeColumnsToContents()
+
+    def run_now(self):
+        self.maintenance_worker.run_now()
+        QMessageBox.information(self, "Diagnostics", "Maintenance started in the background; press Refresh to see the results.")
+
+class MainWindow(QMainWindow):
+    # (seq, code, source, result) from the scan worker thread
+    scan_resolved = pyqtSignal(int, str, str, object)
+    # status dict from the sync engine thread
+    sync_status = pyqtSignal(object)
+    print_finished = pyqtSignal(int, int, str)
+    printer_status = pyqtSignal(object)
+    sheet_finished = pyqtSignal(str, int, str)
+    # (task, status, detail) from the maintenance worker thread
+    maintenance_run = pyqtSignal(str, str, str)
+
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("SampleLogger")
+        self.setWindowIcon(QIcon(resource_path('assets/Logo.ico')))
+        self.resize(1000, 600)
+        with get_db_connection() as conn:
+            stats.ensure_rollups(conn)
+            fuzzy.ensure_index(conn)
+            audit.ensure_triggers(conn)
+        self._init_ui()
+
+    def _init_ui(self):
+        self.stack = QStackedWidget()
+        self.pages = {}
+        # Dashboard page
+        dashboard = QWidget()
+        dash_layout = QVBoxLayout()
+        dash_layout.addStretch()
+        btn_font = QFont()
+        btn_font.setPointSize(16)
+        btn_font.setBold(True)
+        btn_size = (300, 80)
+        cohorts_btn = QPushButton("Cohorts")
+        cohorts_btn.setFont(btn_font)
+        cohorts_btn.setFixedSize(*btn_size)
+        cohorts_btn.clicked.connect(lambda: self.stack.setCurrentWidget(self.pages["Cohorts"]))
+        samples_btn = QPushButton("Samples")
+        samples_btn.setFont(btn_font)
+        samples_btn.setFixedSize(*btn_size)
+        samples_btn.clicked.connect(lambda: self.stack.setCurrentWidget(self.pages["Samples"]))
+        lookup_btn = QPushButton("Lookup Sample")
+        lookup_btn.setFont(btn_font)
+        lookup_btn.setFixedSize(*btn_size)
+        lookup_btn.clicked.connect(lambda: self.stack.setCurrentWidget(self.pages["Lookup Sample"]))
+        reconcile_btn = QPushButton("Reconcile Box")
+        reconcile_btn.setFont(btn_font)
+        reconcile_btn.setFixedSize(*btn_size)
+        reconcile_btn.clicked.connect(lambda: self.stack.setCurrentWidget(self.pages["Reconcile"]))
+        test_print_btn = QPushButton("Test Print")
+        test_print_btn.setFont(btn_font)
+        test_print_btn.setFixedSize(*btn_size)
+        test_print_btn.clicked.connect(self.test_print_barcode)
+        for btn in [cohorts_btn, samples_btn, lookup_btn, reconcile_btn, test_print_btn]:
+            dash_layout.addWidget(btn, alignment=Qt.AlignHCenter)
+            dash_layout.addSpacing(30)
+        dash_layout.addStretch()
+        dash_outer = QHBoxLayout()
+        dash_outer.addLayout(dash_layout)
+        dash_outer.addWidget(self._create_stats_panel(), 1)
+        dashboard.setLayout(dash_outer)
+        self.stack.addWidget(dashboard)
+        self.pages["Dashboard"] = dashboard
+        # Other pages
+        for name, create_func in [
+            ("Cohorts", self._create_cohorts_page),
+            ("Samples", self._create_samples_page),
+            ("Lookup Sample", self._create_lookup_sample_page),
+            ("Reconcile", self._create_reconcile_page)
+        ]:
+            page = create_func()
+            # Add back button
+            back_btn = QPushButton("Back to Dashboard")
+            back_btn.setFixedWidth(180)
+            back_btn.clicked.connect(lambda _, n="Dashboard": self.stack.setCurrentWidget(self.pages[n]))
+            page.layout().insertWidget(0, back_btn)
+            self.stack.addWidget(page)
+            self.pages[name] = page
+        self.setCentralWidget(self.stack)
+        self.status = QStatusBar()
+        self.setStatusBar(self.status)
+        self.status.showMessage("Ready")
+        self.sync_label = QLabel("Sync: off")
+        self.status.addPermanentWidget(self.sync_label)
+        sync_btn = QPushButton("Sync...")
+        sync_btn.clicked.connect(self.open_sync_dialog)
+        self.status.addPermanentWidget(sync_btn)
+        audit_btn = QPushButton("Audit Log...")
+        audit_btn.clicked.connect(lambda: AuditLogDialog(parent=self).exec_())
+        self.status.addPermanentWidget(audit_btn)
+        self.sync_status.connect(self._on_sync_status)
+        self.sync_engine = sync.SyncEngine(get_db_connection, self.sync_status.emit)
+        self.sync_engine.start()
+        self.printer_label = QLabel("Printer: -")
+        self.status.addPermanentWidget(self.printer_label)
+        printer_btn = QPushButton("Printers...")
+        printer_btn.clicked.connect(self.open_printers_dialog)
+        self.status.addPermanentWidget(printer_btn)
+        self._load_printers()
+        self.print_finished.connect(self._on_print_finished)
+        self.sheet_finished.connect(self._on_sheet_finished)
+        self.printer_status.connect(self._on_printer_status)
+        self.print_worker = print_jobs.PrintWorker(get_db_connection, self.print_finished.emit)
+        self.print_worker.start()
+        self.printer_monitor = printer_status.StatusMonitor(lambda: list(self.printer_names), self.printer_status.emit)
+        self.printer_monitor.start()
+        diagnostics_btn = QPushButton("Diagnostics...")
+        diagnostics_btn.clicked.connect(lambda: DiagnosticsDialog(self.maintenance_worker, self).exec_())
+        self.status.addPermanentWidget(diagnostics_btn)
+        self.maintenance_run.connect(self._on_maintenance_run)
+        self.maintenance_worker = maintenance.MaintenanceWorker(get_db_connection, self.maintenance_run.emit)
+        self.maintenance_worker.start()
+        # Any key or click in the app postpones idle-time maintenance
+        self.activity_filter = ActivityFilter(self.maintenance_worker, self)
+        QApplication.instance().installEventFilter(self.activity_filter)
+        self.stack.setCurrentWidget(self.pages["Dashboard"])
+        # Refresh samples table whenever the Samples page is shown
+        self.stack.currentChanged.connect(self._on_page_changed)
+
+    def _on_page_changed(self, index):
+        # Find the name of the current page
+        for name, page in self.pages.items():
+            if self.stack.widget(index) is page:
+                if name == "Dashboard":
+                    self.refresh_dashboard_stats()
+                elif name == "Samples":
+                    self.refresh_samples_table()
+                elif name == "Reconcile":
+                    self.refresh_reconcile_cohorts()
+                break
+
+    def _create_stats_panel(self):
+        panel = QGroupBox("Statistics")
+        layout = QVBoxLayout()
+        self.stats_summary = QLabel()
+        layout.addWidget(self.stats_summary)
+        layout.addWidget(QLabel("<b>Collected this week</b> (experimenter x sample type):"))
+        self.stats_pivot = QTableWidget()
+        self.stats_pivot.setEditTriggers(QTableWidget.NoEditTriggers)
+        layout.addWidget(self.stats_pivot)
+        layout.addWidget(QLabel(f"<b>Samples per collection day</b> (last {STATS_DAYS} days):"))
+        self.stats_daily = QLabel()
+        self.stats_daily.setFont(QFont("Courier New"))
+        layout.addWidget(self.stats_daily)
+        refresh_btn = QPushButton("Refresh")
+        refresh_btn.clicked.connect(self.refresh_dashboard_stats)
+        layout.addWidget(refresh_btn)
+        panel.setLayout(layout)
+        self.refresh_dashboard_stats()
+        return panel
+
+    def refresh_dashboard_stats(self):
+        # Everything here reads the sample_rollup table
+        with get_db_connection() as conn:
+            total = stats.total_samples(conn)
+            by_type = stats.counts_by(conn, 'sample_type')
+            pivot = stats.pivot(conn, stats.week_start())
+            daily = stats.daily_counts(conn, STATS_DAYS)
+        summary = f"<b>Total samples:</b> {total}<br>"
+        summary += "<b>By sample type:</b> " + ", ".join(f"{t or '(none)'}: {n}" for t, n in by_type)
+        self.stats_summary.setText(summary)
+        sample_types = sorted({t for row in pivot.values() for t in row})
+        self.stats_pivot.setColumnCount(len(sample_types) + 1)
+        self.stats_pivot.setHorizontalHeaderLabels([t or "(none)" for t in sample_types] + ["Total"])
+        experimenters = sorted(pivot)
+        self.stats_pivot.setRowCount(len(experimenters))
+        self.stats_pivot.setVerticalHeaderLabels([e or "(none)" for e in experimenters])
+        for row_idx, experimenter in enumerate(experimenters):
+            counts = pivot[experimenter]
+            for col_idx, sample_type in enumerate(sample_types):
+                self.stats_pivot.setItem(row_idx, col_idx, QTableWidgetItem(str(counts.get(sample_type, 0))))
+            self.stats_pivot.setItem(row_idx, len(sample_types), QTableWidgetItem(str(sum(counts.values()))))
+        self.stats_pivot.resizeColumnsToContents()
+        peak = max([n for _, n in daily] + [1])
+        lines = [f"{day}  {'#' * round(n * 30 / peak):<30} {n}" for day, n in daily]
+        self.stats_daily.setText("\n".join(lines))
+
+    def _create_samples_page(self):
+        page = QWidget()
+        layout = QVBoxLayout()
+        label = QLabel("<h2>Samples</h2>")
+        layout.addWidget(label)
+        filter_layout = QHBoxLayout()
+        self.filter_sample_type = QComboBox()
+        self.filter_experimenter = QComboBox()
+        filter_layout.addWidget(QLabel("Sample Type:"))
+        filter_layout.addWidget(self.filter_sample_type)
+        filter_layout.addWidget(QLabel("Experimenter:"))
+        filter_layout.addWidget(self.filter_experimenter)
+        filter_layout.addStretch()
+        layout.addLayout(filter_layout)
+        self.samples_table = QTableWidget()
+        self.samples_table.setColumnCount(7)
+        self.samples_table.setHorizontalHeaderLabels([
+            "Sample ID", "Sample Type", "Experimenter", "Collection Date", "Time Point", "Cohort Name", "Label"
+        ])
+        self.samples_table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.samples_table.setSelectionMode(QTableWidget.MultiSelection)
+        self.samples_table.setSortingEnabled(True)
+        self.samples_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.samples_table.cellDoubleClicked.connect(self.open_sample_details_dialog)
+        layout.addWidget(self.samples_table)
+        btn_layout = QHBoxLayout()
+        add_btn = QPushButton("Add Sample")
+        add_btn.clicked.connect(self.open_add_sample_dialog)
+        btn_layout.addWidget(add_btn)
+        print_btn = QPushButton("Print Barcode")
+        print_btn.clicked.connect(self.print_selected_barcodes)
+        btn_layout.addWidget(print_btn)
+        reprint_btn = QPushButton("Reprint Unprinted")
+        reprint_btn.clicked.connect(lambda: self.reprint_unprinted())
+        btn_layout.addWidget(reprint_btn)
+        mark_btn = QPushButton("Mark Unprinted")
+        mark_btn.clicked.connect(self.mark_selected_unprinted)
+        btn_layout.addWidget(mark_btn)
+        sheet_btn = QPushButton("Label Sheet...")
+        sheet_btn.clicked.connect(self.export_selected_label_sheet)
+        btn_layout.addWidget(sheet_btn)
+        bulk_btn = QPushButton("Bulk Edit...")
+        bulk_btn.clicked.connect(self.bulk_edit_selected)
+        btn_layout.addWidget(bulk_btn)
+        undo_bulk_btn = QPushButton("Undo Bulk Edit")
+        undo_bulk_btn.clicked.connect(self.undo_bulk_edit)
+        btn_layout.addWidget(undo_bulk_btn)
+        aliquot_btn = QPushButton("Create Aliquots...")
+        aliquot_btn.clicked.connect(self.create_aliquots_selected)
+        btn_layout.addWidget(aliquot_btn)
+        storage_btn = QPushButton("Storage...")
+        storage_btn.clicked.connect(self.store_selected)
+        btn_layout.addWidget(storage_btn)
+        del_btn = QPushButton("Delete")
+        del_btn.clicked.connect(self.delete_selected_samples)
+        btn_layout.addWidget(del_btn)
+        history_btn = QPushButton("History")
+        history_btn.clicked.connect(self.open_sample_history)
+        btn_layout.addWidget(history_btn)
+        timeline_btn = QPushButton("Timeline...")
+        timeline_btn.clicked.connect(self.open_subject_timeline)
+        btn_layout.addWidget(timeline_btn)
+        layout.addLayout(btn_layout)
+        layout.addStretch()
+        page.setLayout(layout)
+        self.refresh_samples_table()
+        self.filter_sample_type.currentIndexChanged.connect(self.refresh_samples_table)
+        self.filter_experimenter.currentIndexChanged.connect(self.refresh_samples_table)
+        return page
+
+    def _refresh_filter_combo(self, combo, table):
+        # Repopulates a lookup filter, keeping the current choice
+        current = combo.currentData()
+        combo.blockSignals(True)
+        combo.clear()
+        combo.addItem("All", None)
+        with get_db_connection() as conn:
+            for lookup_id, name in lookups.list_names(conn, table):
+                combo.addItem(name, lookup_id)
+        index = combo.findData(current)
+        combo.setCurrentIndex(index if index >= 0 else 0)
+        combo.blockSignals(False)
+
+    def print_selected_barcodes(self):
+        selected = selected_records(self.samples_table)
+        if not selected:
+            QMessageBox.information(self, "Print Barcodes", "No samples selected.")
+            return
+        self.queue_print(lambda conn: print_jobs.print_samples(conn, selected, on_status=self.printer_status.emit))
+
+    def reprint_unprinted(self, cohort_id=None):
+        self.queue_print(lambda conn: print_jobs.reprint_unprinted(
+            conn, cohort_id, on_status=self.printer_status.emit
+        ))
+
+    def bulk_edit_selected(self):
+        selected = selected_records(self.samples_table)
+        if not selected:
+            QMessageBox.information(self, "Bulk Edit", "No samples selected.")
+            return
+        if BulkEditDialog([row_id for row_id, _ in selected], self).exec_():
+            self.status.showMessage(f"Updated {len(selected)} sample(s).")
+            self.refresh_samples_table()
+
+    def create_aliquots_selected(self):
+        selected = selected_records(self.samples_table)
+        if not selected:
+            QMessageBox.information(self, "Create Aliquots", "No samples selected.")
+            return
+        self.create_aliquots([row_id for row_id, _ in selected])
+
+    def store_selected(self):
+        # With nothing selected this just manages freezers, racks and boxes
+        self.store_samples([row_id for row_id, _ in selected_records(self.samples_table)])
+
+    def store_samples(self, sample_ids):
+        dlg = StorageDialog(sample_ids, self)
+        if dlg.exec_():
+            boxes = len({box_id for _, box_id, _ in dlg.placements})
+            self.status.showMessage(f"Stored {len(dlg.placements)} sample(s) in {boxes} box(es).")
+
+    def create_aliquots(self, sample_ids):
+        dlg = AliquotDialog(sample_ids, self)
+        if not dlg.exec_():
+            return
+        if dlg.print_box.isChecked():
+            created = dlg.created
+            self.queue_print(lambda conn: print_jobs.print_samples(conn, created, on_status=self.printer_status.emit))
+        self.status.showMessage(f"Created {len(dlg.created)} aliquot(s).")
+        self.refresh_samples_table()
+
+    def undo_bulk_edit(self):
+        with get_db_connection() as conn:
+            last = bulk_edit.last_undoable(conn)
+        if not last:
+            QMessageBox.information(self, "Undo Bulk Edit", "There is no bulk edit to undo.")
+            return
+        edit_id, description, count = last
+        reply = QMessageBox.question(
+            self, "Undo Bulk Edit", f"Undo '{description}' on {count} sample(s)?",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+        )
+        if reply != QMessageBox.Yes:
+            return
+        try:
+            with get_db_connection() as conn:
+                restored, moved = bulk_edit.undo(conn, edit_id)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to undo bulk edit: {e}")
+            return
+        self.status.showMessage(f"Undid bulk edit on {restored} sample(s).")
+        if moved:
+            shown = ", ".join(moved[:20]) + (f" ... ({len(moved)} total)" if len(moved) > 20 else "")
+            QMessageBox.warning(
+                self, "Undo Bulk Edit",
+                f"{len(moved)} sample(s) were changed after the bulk edit and were left as they are: {shown}"
+            )
+        self.refresh_samples_table()
+
+    def export_selected_label_sheet(self):
+        selected = selected_records(self.samples_table)
+        if not selected:
+            QMessageBox.information(self, "Label Sheet", "No samples selected.")
+            return
+        row_ids = [row_id for row_id, _ in selected]
+        self.export_label_sheet(lambda conn: label_sheets.sample_labels(conn, row_ids), len(row_ids), "labels")
+
+    def export_label_sheet(self, load_labels, label_count, default_name):
+        # load_labels(conn) returns the (sample_id, type, date) rows; it runs
+        # on the render thread so a cohort cursor is streamed, not loaded
+        dlg = LabelSheetDialog(default_name, self)
+        if not dlg.exec_():
+            return
+        fmt = label_sheets.SHEET_FORMATS[dlg.sheet]
+        page_count = -(-label_count // (fmt["columns"] * fmt["rows"]))
+        def render():
+            try:
+                with get_db_connection() as conn:
+                    pages = label_sheets.render_sheets(load_labels(conn), dlg.path, dlg.sheet, page_count=page_count)
+                self.sheet_finished.emit(dlg.path, pages, "")
+            except Exception as e:
+                self.sheet_finished.emit(dlg.path, 0, str(e))
+        threading.Thread(target=render, daemon=True).start()
+        self.status.showMessage(f"Rendering {label_count} label(s) to {dlg.path}...")
+
+    def _on_sheet_finished(self, path, pages, error):
+        if error:
+            QMessageBox.warning(self, "Label Sheet", f"Could not write label sheet: {error}")
+            self.status.showMessage("Label sheet failed.")
+        else:
+            self.status.showMessage(f"Wrote {pages} label sheet page(s) to {path}.")
+
+    def queue_print(self, request):
+        # Printing runs on the print worker; results come back via print_finished
+        self.print_worker.submit(request)
+        self.status.showMessage("Printing...")
+
+    def mark_selected_unprinted(self):
+        selected = selected_records(self.samples_table)
+        if not selected:
+            QMessageBox.information(self, "Mark Unprinted", "No samples selected.")
+            return
+        with get_db_connection() as conn:
+            print_jobs.mark_unprinted(conn, [row_id for row_id, _ in selected])
+        self.status.showMessage(f"Marked {len(selected)} label(s) for reprinting.")
+        self.refresh_samples_table()
+
+    def _on_print_finished(self, printed, failed, error):
+        if not printed and not failed:
+            if error:
+                QMessageBox.warning(self, "Print Error", f"Printing failed: {error}")
+                self.status.showMessage("Printing failed.")
+            else:
+                self.status.showMessage("Nothing to print.")
+            return
+        self._report_print(printed, failed, error)
+        self.refresh_samples_table()
+
+    def _report_print(self, printed, failed, detail=""):
+        # detail names the printers that failed, where the request gives it
+        if failed:
+            QMessageBox.warning(
+                self, "Print Error",
+                f"{failed} label(s) failed to print; {printed} sent.\n\n{detail}" if detail else
+                f"{failed} label(s) failed to print; {printed} sent. Use 'Reprint Unprinted' to retry."
+            )
+        self.status.showMessage(f"Sent {printed} barcode(s) to printer, {failed} failed.")
+
+    def open_sample_history(self):
+        selected = selected_records(self.samples_table)
+        if not selected:
+            QMessageBox.information(self, "Sample History", "No sample selected.")
+            return
+        row_id, sample_id = selected[0]
+        AuditLogDialog("samples", row_id, f"History of {sample_id}", self).exec_()
+
+    def open_subject_timeline(self):
+        # The selected sample's subject, or one picked from the list
+        selected = selected_records(self.samples_table)
+        with get_db_connection() as conn:
+            subject = subjects.subject_of(conn, selected[0][0]) if selected else None
+            names = lookups.list_names(conn, 'subjects')
+        if subject is None:
+            if not names:
+                QMessageBox.information(self, "Timeline", "No subjects yet; set a sample's subject with Edit or Bulk Edit.")
+                return
+            name, ok = QInputDialog.getItem(self, "Timeline", "Subject:", [name for _, name in names], 0, False)
+            if not ok:
+                return
+            subject = next(entry for entry in names if entry[1] == name)
+        SubjectTimelineDialog(subject[0], self).exec_()
+
+    def delete_selected_samples(self):
+        selected = selected_records(self.samples_table)
+        if not selected:
+            QMessageBox.information(self, "Delete Samples", "No samples selected.")
+            return
+        msg = "Are you sure you want to delete the following samples?\n" + ", ".join(code for _, code in selected)
+        if QMessageBox.question(self, "Confirm Delete", msg, QMessageBox.Yes | QMessageBox.No) == QMessageBox.Yes:
+            with get_db_connection() as conn:
+                conn.executemany("DELETE FROM samples WHERE id = ?", [(row_id,) for row_id, _ in selected])
+                conn.commit()
+            self.refresh_samples_table()
+            self.status.showMessage(f"Deleted {len(selected)} sample(s).")
+
+    def _create_cohorts_page(self):
+        page = QWidget()
+        layout = QVBoxLayout()
+        label = QLabel("<h2>Cohorts</h2>")
+        layout.addWidget(label)
         self.cohorts_table = QTableWidget()
         self.cohorts_table.setColumnCount(4)
         self.cohorts_table.setHorizontalHeaderLabels([
@@ -758,9 +2501,21 @@ class MainWindow(QMainWindow):
         add_btn = QPushButton("Create Cohort")
         add_btn.clicked.connect(self.open_create_cohort_dialog)
         btn_layout.addWidget(add_btn)
+        edit_btn = QPushButton("Edit...")
+        edit_btn.clicked.connect(self.edit_selected_cohort)
+        btn_layout.addWidget(edit_btn)
         del_btn = QPushButton("Delete")
         del_btn.clicked.connect(self.delete_selected_cohorts)
         btn_layout.addWidget(del_btn)
+        archive_btn = QPushButton("Archive")
+        archive_btn.clicked.connect(self.archive_selected_cohorts)
+        btn_layout.addWidget(archive_btn)
+        archived_btn = QPushButton("Archived Cohorts...")
+        archived_btn.clicked.connect(self.open_archived_cohorts_dialog)
+        btn_layout.addWidget(archived_btn)
+        prefixes_btn = QPushButton("ID Prefixes...")
+        prefixes_btn.clicked.connect(lambda: IdPrefixesDialog(self).exec_())
+        btn_layout.addWidget(prefixes_btn)
         layout.addLayout(btn_layout)
         layout.addStretch()
         page.setLayout(layout)
@@ -768,83 +2523,115 @@ class MainWindow(QMainWindow):
         return page
 
     def view_cohort_samples(self):
-        selected = self.cohorts_table.selectionModel().selectedRows()
+        selected = selected_records(self.cohorts_table)
         if not selected:
             QMessageBox.information(self, "View Samples", "No cohort selected.")
             return
-        row = selected[0].row()
-        cohort_name = self.cohorts_table.item(row, 0).text()
-        # Get cohort id by name
+        self.show_cohort_samples(*selected[0])
+
+    def show_cohort_samples(self, cohort_id, cohort_name):
         with get_db_connection() as conn:
             cur = conn.cursor()
-            cur.execute("SELECT id FROM cohorts WHERE name = ?", (cohort_name,))
-            result = cur.fetchone()
-            if not result:
-                QMessageBox.warning(self, "Error", "Cohort not found in database.")
-                return
-            cohort_id = result[0]
-            cur.execute("""
-                SELECT animal_id, species, sex, date_added, notes
-                FROM samples WHERE cohort_id = ? ORDER BY id DESC
-            """, (cohort_id,))
+            cur.execute(SAMPLE_ROWS_SQL + " WHERE s.cohort_id = ? ORDER BY s.id DESC", (cohort_id,))
             samples = cur.fetchall()
-        dlg = CohortSamplesDialog(cohort_name, samples, self)
+        dlg = CohortSamplesDialog(cohort_name, samples, self, main_window=self, cohort_id=cohort_id)
         dlg.exec_()
 
+    def edit_selected_cohort(self):
+        selected = selected_records(self.cohorts_table)
+        if not selected:
+            QMessageBox.information(self, "Edit Cohort", "No cohort selected.")
+            return
+        if EditCohortDialog(selected[0][0], self).exec_():
+            self.refresh_cohorts_table()
+            self.refresh_samples_table()
+
     def delete_selected_cohorts(self):
-        selected = self.cohorts_table.selectionModel().selectedRows()
+        selected = selected_records(self.cohorts_table)
         if not selected:
             QMessageBox.information(self, "Delete Cohorts", "No cohorts selected.")
             return
-        cohort_names = [self.cohorts_table.item(row.row(), 0).text() for row in selected]
-        msg = "Are you sure you want to delete the following cohorts?\n" + ", ".join(cohort_names) + "\n(All samples in these cohorts will also be deleted.)"
+        msg = "Are you sure you want to delete the following cohorts?\n" + ", ".join(name for _, name in selected) + "\n(All samples in these cohorts will also be deleted.)"
         if QMessageBox.question(self, "Confirm Delete", msg, QMessageBox.Yes | QMessageBox.No) == QMessageBox.Yes:
             with get_db_connection() as conn:
-                cur = conn.cursor()
-                for name in cohort_names:
-                    cur.execute("DELETE FROM cohorts WHERE name = ?", (name,))
+                conn.executemany("DELETE FROM cohorts WHERE id = ?", [(cohort_id,) for cohort_id, _ in selected])
                 conn.commit()
             self.refresh_cohorts_table()
             self.refresh_samples_table()
-            self.status.showMessage(f"Deleted {len(cohort_names)} cohort(s) and their samples.")
+            self.status.showMessage(f"Deleted {len(selected)} cohort(s) and their samples.")
+
+    def archive_selected_cohorts(self):
+        selected = selected_records(self.cohorts_table)
+        if not selected:
+            QMessageBox.information(self, "Archive Cohorts", "No cohorts selected.")
+            return
+        msg = "Move the following cohorts and their samples to the archive?\n" + ", ".join(name for _, name in selected) + "\n(They can be restored later from Archived Cohorts.)"
+        if QMessageBox.question(self, "Confirm Archive", msg, QMessageBox.Yes | QMessageBox.No) != QMessageBox.Yes:
+            return
+        archived = 0
+        total = 0
+        try:
+            with get_db_connection() as conn:
+                for cohort_id, _ in selected:
+                    total += archive.archive_cohort(conn, ARCHIVE_PATH, cohort_id)
+                    archived += 1
+        except Exception as e:
+            # Each cohort is its own transaction; the ones before it stay archived
+            QMessageBox.critical(self, "Error", f"Failed to archive cohort {selected[archived][1]}: {e}")
+        self.refresh_cohorts_table()
+        self.refresh_samples_table()
+        self.status.showMessage(f"Archived {archived} cohort(s) with {total} sample(s).")
+
+    def open_archived_cohorts_dialog(self):
+        dlg = ArchivedCohortsDialog(self)
+        dlg.exec_()
+        self.refresh_cohorts_table()
+        self.refresh_samples_table()
 
     def refresh_samples_table(self):
+        self._refresh_filter_combo(self.filter_sample_type, 'sample_types')
+        self._refresh_filter_combo(self.filter_experimenter, 'experimenters')
+        # Filters compare the indexed integer lookup ids
+        conditions = []
+        params = []
+        if self.filter_sample_type.currentData() is not None:
+            conditions.append("s.sample_type_id = ?")
+            params.append(self.filter_sample_type.currentData())
+        if self.filter_experimenter.currentData() is not None:
+            conditions.append("s.experimenter_id = ?")
+            params.append(self.filter_experimenter.currentData())
+        where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
         with get_db_connection() as conn:
             cur = conn.cursor()
-            cur.execute("""
-                SELECT s.animal_id, s.species, s.sex, s.date_added, c.name
+            cur.execute(f"""
+                SELECT s.id, s.animal_id, t.name, e.name, s.collection_date, s.time_point, c.name, p.status
                 FROM samples s
+                LEFT JOIN sample_types t ON t.id = s.sample_type_id
+                LEFT JOIN experimenters e ON e.id = s.experimenter_id
                 LEFT JOIN cohorts c ON s.cohort_id = c.id
+                LEFT JOIN sample_print_state p ON p.sample_id = s.id
+                {where}
                 ORDER BY s.id DESC
-            """)
+            """, params)
             rows = cur.fetchall()
-        self.samples_table.setRowCount(len(rows))
-        for row_idx, row in enumerate(rows):
-            for col_idx, value in enumerate(row):
-                self.samples_table.setItem(row_idx, col_idx, QTableWidgetItem(str(value) if value is not None else ""))
-        self.samples_table.resizeColumnsToContents()
+        fill_table(self.samples_table, rows)
 
     def refresh_cohorts_table(self):
         with get_db_connection() as conn:
             cur = conn.cursor()
             cur.execute("SELECT id, name, experimenter, date_created FROM cohorts ORDER BY id DESC")
             rows = cur.fetchall()
-            # Get sample counts for each cohort
-            sample_counts = {}
-            for row in rows:
-                cur.execute("SELECT COUNT(*) FROM samples WHERE cohort_id = ?", (row[0],))
-                sample_counts[row[0]] = cur.fetchone()[0]
-        self.cohorts_table.setRowCount(len(rows))
-        for row_idx, row in enumerate(rows):
-            cohort_id, name, experimenter, date_created = row
-            count = sample_counts.get(cohort_id, 0)
-            for col_idx, value in enumerate([name, experimenter, date_created, count]):
-                self.cohorts_table.setItem(row_idx, col_idx, QTableWidgetItem(str(value) if value is not None else ""))
-        self.cohorts_table.resizeColumnsToContents()
+            # Sample counts for every cohort come from the rollup in one query
+            sample_counts = stats.cohort_counts(conn)
+        fill_table(self.cohorts_table, [row + (sample_counts.get(row[0], 0),) for row in rows])
 
     def open_add_sample_dialog(self):
         dialog = AddSampleDialog(self)
         if dialog.exec_():
+            data = dialog.result
+            self.queue_print(lambda conn: print_jobs.print_samples(
+                conn, [(data["row_id"], data["SampleID"])], on_status=self.printer_status.emit
+            ))
             self.status.showMessage("Sample added to database.")
             self.refresh_samples_table()
         else:
@@ -857,33 +2644,45 @@ class MainWindow(QMainWindow):
             data = dialog.result
             try:
                 with get_db_connection() as conn:
+                    if "bases" in data:
+                        # Allocation takes the write lock; IDs and rows commit together
+                        data["sample_ids"] = expand_base_configs(conn, data["bases"], reserved_by=data["name"])
                     cur = conn.cursor()
                     cur.execute(
                         "INSERT INTO cohorts (name, experimenter, date_created) VALUES (?, ?, ?)",
                         (data["name"], data["experimenter"], data["collection_date"])
                     )
                     cohort_id = cur.lastrowid
+                    sample_type_id = lookups.get_or_create_id(conn, 'sample_types', data["sample_type"])
+                    experimenter_id = lookups.get_or_create_id(conn, 'experimenters', data["experimenter"])
+                    sample_rows = []
                     for sid in data["sample_ids"]:
                         cur.execute(
                             """
                             INSERT INTO samples (
-                                cohort_id, animal_id, species, sex, notes, barcode_value, date_added
-                            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                                cohort_id, animal_id, sample_type_id, experimenter_id, notes, barcode_value,
+                                collection_date, time_point
+                            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
                             """,
                             (
                                 cohort_id,
                                 sid,
-                                data["sample_type"],
-                                data["experimenter"],
+                                sample_type_id,
+                                experimenter_id,
                                 data["notes"],
                                 sid,
-                                data["collection_date"]
+                                data["collection_date"],
+                                data["time_point"] or None
                             )
                         )
-                        # Print barcode for each sample
-                        print_barcode(sid)
+                        sample_rows.append((cur.lastrowid, sid))
+                    print_jobs.queue_labels(conn, [row_id for row_id, _ in sample_rows])
                     conn.commit()
-                self.status.showMessage(f"Cohort '{data['name']}' and {len(data['sample_ids'])} samples created and barcodes printed.")
+                # Print only once the IDs are committed
+                self.queue_print(lambda conn: print_jobs.print_samples(
+                    conn, sample_rows, on_status=self.printer_status.emit
+                ))
+                self.status.showMessage(f"Cohort '{data['name']}' and {len(data['sample_ids'])} samples created; printing barcodes.")
                 self.refresh_cohorts_table()
                 self.refresh_samples_table()
             except Exception as e:
@@ -903,10 +2702,27 @@ class MainWindow(QMainWindow):
         layout.addWidget(label)
         self.lookup_input = QLineEdit()
         self.lookup_input.setPlaceholderText("Scan or enter SampleID...")
-        self.lookup_input.returnPressed.connect(self.lookup_sample)
+        # Enter/Tab are handled in eventFilter so scans never wait on the DB
+        self.lookup_input.installEventFilter(self)
         layout.addWidget(self.lookup_input)
         self.lookup_result = QLabel()
+        self.lookup_result.setTextFormat(Qt.RichText)
+        # Near-match suggestions are links that look the code up again
+        self.lookup_result.linkActivated.connect(lambda code: self.submit_scan(code, "suggestion"))
         layout.addWidget(self.lookup_result)
+        layout.addWidget(QLabel("Recent scans:"))
+        self.scan_history = QListWidget()
+        self.scan_history.setMaximumHeight(150)
+        layout.addWidget(self.scan_history)
+        self.pending_scans = {}
+        self.scan_assembler = scanner.ScanAssembler()
+        self.scan_idle_timer = QTimer(self)
+        self.scan_idle_timer.setSingleShot(True)
+        self.scan_idle_timer.setInterval(int(scanner.SCANNER_END_GAP * 1000) + 20)
+        self.scan_idle_timer.timeout.connect(self._flush_idle_scan)
+        self.scan_resolved.connect(self._on_scan_resolved)
+        self.scan_worker = scanner.ScanWorker(get_db_connection, resolve_lookup, self.scan_resolved.emit)
+        self.scan_worker.start()
         layout.addStretch()
         page.setLayout(layout)
         # Autofocus when page is shown
@@ -916,101 +2732,349 @@ class MainWindow(QMainWindow):
         return page
 
     def lookup_sample(self):
+        # Manual entry: whatever is in the field (typed, edited or pasted)
         sample_id = self.lookup_input.text().strip()
+        self.scan_assembler.reset()
+        self.lookup_input.clear()
+        self.lookup_input.setFocus()
         if not sample_id:
             self.lookup_result.setText("")
+            return
+        self.submit_scan(sample_id, "manual")
+
+    def submit_scan(self, code, source):
+        code = code.strip()
+        if not code:
+            return
+        seq = self.scan_worker.submit(code, source)
+        self.scan_history.insertItem(0, f"#{seq}  {code}  ({source}) ...")
+        self.pending_scans[seq] = self.scan_history.item(0)
+        while self.scan_history.count() > SCAN_HISTORY_LIMIT:
+            self.scan_history.takeItem(self.scan_history.count() - 1)
+
+    def _on_scan_resolved(self, seq, code, source, result):
+        # Worker results arrive in submission order
+        item = self.pending_scans.pop(seq, None)
+        if isinstance(result, Exception):
+            text = f"Lookup of '{code}' failed: {result}"
+            status = "error"
+        elif not result:
+            text = f"Sample '{code}' not found."
+            status = "not found"
+        elif isinstance(result, list):
+            text = f"Sample '{code}' not found. Did you mean:<br>" + format_suggestions(result)
+            status = "not found"
+        else:
+            text = result
+            status = "found"
+        if item is not None and self.scan_history.row(item) >= 0:
+            item.setText(f"#{seq}  {code}  ({source}) {status}")
+        self.lookup_result.setText(text)
+
+    def _flush_idle_scan(self):
+        finished = self.scan_assembler.flush_if_idle()
+        if finished:
             self.lookup_input.clear()
-            self.lookup_input.setFocus()
+            self.submit_scan(*finished)
+
+    def _handle_lookup_key(self, event):
+        key = event.key()
+        if key in (Qt.Key_Return, Qt.Key_Enter, Qt.Key_Tab):
+            finished = self.scan_assembler.terminate()
+            if finished and finished[1] == "scanner":
+                self.lookup_input.clear()
+                self.submit_scan(*finished)
+            else:
+                self.lookup_sample()
+            return True
+        text = event.text()
+        if text and text.isprintable():
+            finished = self.scan_assembler.add_char(text)
+            if finished:
+                # A terminator-less scan just ended; drop it from the field
+                # before this key is inserted
+                self.lookup_input.clear()
+                self.submit_scan(*finished)
+            self.scan_idle_timer.start()
+            return False
+        self.scan_assembler.mark_edited()
+        return False
+
+    def _create_reconcile_page(self):
+        page = QWidget()
+        layout = QVBoxLayout()
+        label = QLabel("<h2>Reconcile Box</h2><p>Pick the expected cohort, start a session and scan every tube in the box:</p>")
+        layout.addWidget(label)
+        top_layout = QHBoxLayout()
+        self.reconcile_cohort = QComboBox()
+        top_layout.addWidget(QLabel("Expected Cohort:"))
+        top_layout.addWidget(self.reconcile_cohort, 1)
+        self.reconcile_start_btn = QPushButton("Start Session")
+        self.reconcile_start_btn.clicked.connect(self.start_reconcile_session)
+        top_layout.addWidget(self.reconcile_start_btn)
+        self.reconcile_resume_btn = QPushButton("Resume Session...")
+        self.reconcile_resume_btn.clicked.connect(self.resume_reconcile_session)
+        top_layout.addWidget(self.reconcile_resume_btn)
+        self.reconcile_finish_btn = QPushButton("Finish Session")
+        self.reconcile_finish_btn.clicked.connect(self.finish_reconcile_session)
+        self.reconcile_finish_btn.setEnabled(False)
+        top_layout.addWidget(self.reconcile_finish_btn)
+        layout.addLayout(top_layout)
+        self.reconcile_input = QLineEdit()
+        self.reconcile_input.setPlaceholderText("Scan tubes...")
+        self.reconcile_input.setEnabled(False)
+        self.reconcile_input.returnPressed.connect(self.queue_reconcile_scan)
+        layout.addWidget(self.reconcile_input)
+        self.reconcile_summary = QLabel()
+        layout.addWidget(self.reconcile_summary)
+        lists_layout = QHBoxLayout()
+        self.reconcile_lists = {}
+        for title in ["Missing", "Unexpected", "Duplicates"]:
+            group = QGroupBox(title)
+            group_layout = QVBoxLayout()
+            widget = QListWidget()
+            group_layout.addWidget(widget)
+            group.setLayout(group_layout)
+            lists_layout.addWidget(group)
+            self.reconcile_lists[title] = widget
+        layout.addLayout(lists_layout)
+        page.setLayout(layout)
+        self.reconcile_session = None
+        self.reconcile_pending = []
+        # Scans are only queued on Enter; the timer resolves them in batches
+        self.reconcile_timer = QTimer(self)
+        self.reconcile_timer.setSingleShot(True)
+        self.reconcile_timer.setInterval(RECONCILE_BATCH_DELAY_MS)
+        self.reconcile_timer.timeout.connect(self.flush_reconcile_scans)
+        self.refresh_reconcile_cohorts()
+        return page
+
+    def refresh_reconcile_cohorts(self):
+        if self.reconcile_session is not None:
             return
+        self.reconcile_cohort.clear()
         with get_db_connection() as conn:
             cur = conn.cursor()
-            cur.execute("SELECT * FROM samples WHERE animal_id = ? OR barcode_value = ?", (sample_id, sample_id))
-            sample = cur.fetchone()
-            if not sample:
-                self.lookup_result.setText(f"Sample '{sample_id}' not found.")
-                self.lookup_input.clear()
-                self.lookup_input.setFocus()
-                return
-            # Get cohort info
-            cohort = None
-            if sample[1]:
-                cur.execute("SELECT * FROM cohorts WHERE id = ?", (sample[1],))
-                cohort = cur.fetchone()
-            # Display info
-            info = f"<b>Sample ID:</b> {sample[2]}<br>"
-            info += f"<b>Sample Type:</b> {sample[3]}<br>"
-            info += f"<b>Experimenter:</b> {sample[4]}<br>"
-            info += f"<b>Notes:</b> {sample[5]}<br>"
-            info += f"<b>Barcode Value:</b> {sample[6]}<br>"
-            info += f"<b>Collection Date:</b> {sample[7]}<br>"
-            if cohort:
-                info += f"<hr><b>Cohort:</b> {cohort[1]}<br>"
-                info += f"<b>Experimenter:</b> {cohort[2]}<br>"
-                info += f"<b>Date Created:</b> {cohort[3]}<br>"
-            self.lookup_result.setText(info)
-        self.lookup_input.clear()
-        self.lookup_input.setFocus()
+            cur.execute("SELECT id, name FROM cohorts ORDER BY id DESC")
+            for cohort_id, name in cur.fetchall():
+                self.reconcile_cohort.addItem(name, cohort_id)
+
+    def start_reconcile_session(self):
+        cohort_id = self.reconcile_cohort.currentData()
+        if cohort_id is None:
+            QMessageBox.information(self, "Reconcile", "No cohort selected.")
+            return
+        with get_db_connection() as conn:
+            self._enter_reconcile_session(reconcile.start_session(conn, cohort_id))
+
+    def resume_reconcile_session(self):
+        with get_db_connection() as conn:
+            sessions = reconcile.unfinished_sessions(conn)
+        if not sessions:
+            QMessageBox.information(self, "Reconcile", "There is no unfinished session to resume.")
+            return
+        labels = [f"#{session_id}: {name}, started {started_at} ({scans} scan(s))" for session_id, name, started_at, scans in sessions]
+        label, ok = QInputDialog.getItem(self, "Resume Session", "Unfinished session:", labels, 0, False)
+        if not ok:
+            return
+        session_id = sessions[labels.index(label)][0]
+        try:
+            with get_db_connection() as conn:
+                session = reconcile.resume_session(conn, session_id)
+        except ValueError as e:
+            QMessageBox.warning(self, "Reconcile", str(e))
+            return
+        index = self.reconcile_cohort.findData(session.cohort_id)
+        if index >= 0:
+            self.reconcile_cohort.setCurrentIndex(index)
+        self._enter_reconcile_session(session)
+
+    def _enter_reconcile_session(self, session):
+        self.reconcile_session = session
+        self.reconcile_pending = []
+        self.reconcile_cohort.setEnabled(False)
+        self.reconcile_start_btn.setEnabled(False)
+        self.reconcile_resume_btn.setEnabled(False)
+        self.reconcile_finish_btn.setEnabled(True)
+        self.reconcile_input.setEnabled(True)
+        self.reconcile_input.setFocus()
+        self.update_reconcile_view()
+
+    def queue_reconcile_scan(self):
+        code = self.reconcile_input.text().strip()
+        self.reconcile_input.clear()
+        if code and self.reconcile_session is not None:
+            self.reconcile_pending.append(code)
+            if len(self.reconcile_pending) >= RECONCILE_BATCH_SIZE:
+                self.flush_reconcile_scans()
+            else:
+                self.reconcile_timer.start()
+
+    def flush_reconcile_scans(self):
+        if not self.reconcile_pending or self.reconcile_session is None:
+            return
+        codes, self.reconcile_pending = self.reconcile_pending, []
+        try:
+            with get_db_connection() as conn:
+                reconcile.add_scans(conn, self.reconcile_session, codes)
+        except Exception as e:
+            # Kept for the next batch; the diff does not count them yet
+            self.reconcile_pending = codes + self.reconcile_pending
+            QMessageBox.critical(self, "Error", f"Failed to record scans (they will be retried): {e}")
+        self.update_reconcile_view()
+
+    def update_reconcile_view(self):
+        session = self.reconcile_session
+        if session is None:
+            return
+        missing = session.missing()
+        unexpected = session.unexpected()
+        duplicates = session.duplicates()
+        for title, codes in [("Missing", missing), ("Unexpected", unexpected), ("Duplicates", duplicates)]:
+            widget = self.reconcile_lists[title]
+            widget.clear()
+            widget.addItems(codes)
+        self.reconcile_summary.setText(
+            f"Scanned: {sum(session.scan_counts.values())} | "
+            f"Matched: {session.matched_count()} of {len(session.expected)} | "
+            f"Missing: {len(missing)} | Unexpected: {len(unexpected)} | Duplicates: {len(duplicates)}"
+        )
+
+    def finish_reconcile_session(self):
+        if self.reconcile_session is None:
+            return
+        self.reconcile_timer.stop()
+        self.flush_reconcile_scans()
+        if self.reconcile_pending:
+            # Scans that could not be saved; the session stays open
+            return
+        with get_db_connection() as conn:
+            reconcile.finish_session(conn, self.reconcile_session)
+        self.update_reconcile_view()
+        self.status.showMessage(f"Reconciliation session {self.reconcile_session.session_id} saved.")
+        self.reconcile_session = None
+        self.reconcile_cohort.setEnabled(True)
+        self.reconcile_start_btn.setEnabled(True)
+        self.reconcile_resume_btn.setEnabled(True)
+        self.reconcile_finish_btn.setEnabled(False)
+        self.reconcile_input.setEnabled(False)
 
     def test_print_barcode(self):
-        if print_barcode("Test"):
-            self.status.showMessage("Test barcode sent to printer.")
-        else:
-            self.status.showMessage("Failed to print test barcode.")
+        self.queue_print(lambda conn: print_jobs.print_test_label(conn, self.printer_status.emit))
 
     def open_cohort_samples_dialog(self, row, col):
-        cohort_name = self.cohorts_table.item(row, 0).text()
-        with get_db_connection() as conn:
-            cur = conn.cursor()
-            cur.execute("SELECT id FROM cohorts WHERE name = ?", (cohort_name,))
-            result = cur.fetchone()
-            if not result:
-                QMessageBox.warning(self, "Error", "Cohort not found in database.")
-                return
-            cohort_id = result[0]
-            cur.execute("""
-                SELECT animal_id, species, sex, date_added, notes
-                FROM samples WHERE cohort_id = ? ORDER BY id DESC
-            """, (cohort_id,))
-            samples = cur.fetchall()
-        dlg = CohortSamplesDialog(cohort_name, samples, self)
-        dlg.exec_()
+        item = self.cohorts_table.item(row, 0)
+        self.show_cohort_samples(item.data(Qt.UserRole), item.text())
 
     def open_sample_details_dialog(self, row, col):
-        sample_id = self.samples_table.item(row, 0).text()
-        dlg = EditSampleDialog(sample_id, self)
+        dlg = EditSampleDialog(self.samples_table.item(row, 0).data(Qt.UserRole), self)
         if dlg.exec_():
             self.refresh_samples_table()
 
     def edit_cohort_dialog(self, row, col):
-        cohort_name = self.cohorts_table.item(row, 0).text()
-        dlg = EditPlaceholderDialog(f"Edit Cohort: {cohort_name}", self)
-        dlg.exec_()
+        if EditCohortDialog(self.cohorts_table.item(row, 0).data(Qt.UserRole), self).exec_():
+            self.refresh_cohorts_table()
 
     def edit_sample_dialog(self, row, col):
-        sample_id = self.samples_table.item(row, 0).text()
-        dlg = EditPlaceholderDialog(f"Edit Sample: {sample_id}", self)
-        dlg.exec_()
+        self.open_sample_details_dialog(row, col)
 
     def view_sample_details(self):
-        selected = self.samples_table.selectionModel().selectedRows()
+        selected = selected_records(self.samples_table)
         if not selected:
             QMessageBox.information(self, "View Details", "No sample selected.")
             return
-        row = selected[0].row()
-        sample_id = self.samples_table.item(row, 0).text()
+        row_id, sample_id = selected[0]
         with get_db_connection() as conn:
             cur = conn.cursor()
-            cur.execute("SELECT animal_id, species, sex, date_added, notes FROM samples WHERE animal_id = ?", (sample_id,))
+            cur.execute(SAMPLE_ROWS_SQL + " WHERE s.id = ?", (row_id,))
             sample = cur.fetchone()
         if sample:
             dlg = CohortSamplesDialog(f"Sample: {sample_id}", [sample], self)
             dlg.exec_()
 
     def eventFilter(self, obj, event):
-        # Remove triple-click logic, keep only default event handling
+        if obj is getattr(self, "lookup_input", None) and event.type() == QEvent.KeyPress:
+            return self._handle_lookup_key(event)
         return super().eventFilter(obj, event)
 
+    def open_sync_dialog(self):
+        dlg = SyncDialog(self.sync_engine, self)
+        dlg.exec_()
+
+    def open_printers_dialog(self):
+        PrintersDialog(self).exec_()
+        self._load_printers()
+        self.printer_monitor.poll_now()
+
+    def _load_printers(self):
+        # {address: name} of the printers runs go to
+        with get_db_connection() as conn:
+            try:
+                printers = print_jobs.pool_for(conn)
+            except Exception:
+                printers = []
+        self.printer_names = {p.address: p.name for p in printers}
+        self.printer_states = {}
+        self._show_printer_states()
+
+    def _show_printer_states(self):
+        if len(self.printer_names) > 1:
+            states = [self.printer_states.get(address) for address in self.printer_names]
+            text = f"Printers: {states.count('ready')}/{len(states)} ready"
+        elif self.printer_names:
+            address, name = next(iter(self.printer_names.items()))
+            state = self.printer_states.get(address)
+            text = f"Printer: {name} ({state})" if state else f"Printer: {name}"
+        else:
+            text = "Printer: none"
+        self.printer_label.setText(text)
+        self.printer_label.setToolTip("\n".join(
+            f"{name}: {self.printer_states.get(address, address)}" for address, name in self.printer_names.items()
+        ))
+
+    def _on_printer_status(self, result):
+        if result["printer"] not in self.printer_names:
+            return
+        if "error" in result:
+            self.printer_states[result["printer"]] = f"offline at {result['time']}"
+        else:
+            self.printer_states[result["printer"]] = result["status"].describe()
+        self._show_printer_states()
+
+    def _on_maintenance_run(self, task, status, detail):
+        if status == "error":
+            self.status.showMessage(f"Database maintenance ({task}) failed: {detail}", 10000)
+
+    def _on_sync_status(self, status):
+        if not status.get("enabled"):
+            self.sync_label.setText("Sync: off")
+            return
+        if "error" in status:
+            text = f"Sync: offline, {status['pending']} change(s) queued ({status['time']})"
+        else:
+            text = f"Sync: {status['pending']} pending ({status['time']})"
+        if status.get("conflicted"):
+            text += f", {status['conflicted']} conflict(s)"
+        self.sync_label.setText(text)
+        self.sync_label.setToolTip(status.get("error", ""))
+        if status.get("pulled"):
+            # Changes from other benches landed in the local replica
+            self.refresh_cohorts_table()
+            self.refresh_samples_table()
+
+    def closeEvent(self, event):
+        self.scan_worker.stop()
+        self.sync_engine.stop()
+        self.print_worker.stop()
+        self.printer_monitor.stop()
+        self.maintenance_worker.stop()
+        super().closeEvent(event)
+
 if __name__ == "__main__":
+    # PNG label sheet pages render in worker processes; in the frozen build
+    # a worker must stop here, before the database is opened
+    multiprocessing.freeze_support()
+    init_db()
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
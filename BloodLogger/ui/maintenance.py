@@ -0,0 +1,335 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+import fuzzy
+
+# Database upkeep that runs on a worker thread while the app is idle:
+# statistics for the query planner, returning free pages to the file system
+# (auto_vacuum=INCREMENTAL; older files are switched over by a one-off full
+# VACUUM, see migrations), a rolling per-table quick_check
+# and rebuilding any index the check flags. code_grams is an index kept as a
+# WITHOUT ROWID table, so it is flagged by name and rebuilt from samples.
+# Every task runs under a time budget enforced by a progress handler and
+# records its outcome in maintenance_runs for the diagnostics dialog.
+
+IDLE_SECONDS = 300            # no user input for this long counts as idle
+CHECK_INTERVAL = 30           # how often the worker looks for due tasks
+VACUUM_MIN_FREE_PAGES = 64
+VACUUM_STEP_PAGES = 256
+ANALYSIS_LIMIT = 1000         # rows sampled per index by ANALYZE / optimize
+RUN_HISTORY_DAYS = 180
+BUSY_TIMEOUT_MS = 2000
+
+CHECK_NEXT_KEY = 'maintenance_check_next'
+REINDEX_KEY = 'maintenance_reindex'
+
+DAY = 24 * 3600
+
+# Tables that only index other tables: name -> rebuild(conn), which commits
+DERIVED_TABLES = {
+    'code_grams': fuzzy.rebuild_index,
+}
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+def _meta(conn, key, default=None):
+    row = conn.execute("SELECT value FROM app_meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+
+def _set_meta(conn, key, value):
+    conn.execute("INSERT OR REPLACE INTO app_meta (key, value) VALUES (?, ?)", (key, value))
+
+
+def _pragma(conn, name):
+    return conn.execute(f"PRAGMA {name}").fetchone()[0]
+
+
+def _deadline_handler(deadline):
+    # Non-zero aborts the running statement with "interrupted"
+    return lambda: 1 if time.monotonic() > deadline else 0
+
+
+def _check_deadline(deadline):
+    if time.monotonic() > deadline:
+        raise BudgetExceeded()
+
+
+# --- tasks: each returns (status, detail) ---
+
+def optimize(conn, deadline):
+    conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+    cur = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+    if cur.fetchone() is None:
+        # First run: gather statistics for every index
+        conn.execute("ANALYZE")
+        conn.commit()
+        return "ok", "analyzed all tables"
+    conn.execute("PRAGMA optimize")
+    conn.commit()
+    return "ok", "optimized"
+
+
+def convert_auto_vacuum(conn, deadline):
+    # Files created before auto_vacuum was set only switch mode through a
+    # full VACUUM, which needs no other connection to be writing
+    if _pragma(conn, "auto_vacuum") == 2:
+        return "skipped", "auto_vacuum is already INCREMENTAL"
+    conn.commit()
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    return "ok", f"switched auto_vacuum to INCREMENTAL ({_pragma(conn, 'page_count')} page(s))"
+
+
+def incremental_vacuum(conn, deadline):
+    if _pragma(conn, "auto_vacuum") != 2:
+        return "skipped", "auto_vacuum is not INCREMENTAL"
+    page_size = _pragma(conn, "page_size")
+    start = _pragma(conn, "freelist_count")
+    remaining = start
+    while remaining:
+        _check_deadline(deadline)
+        # Each step is its own short write transaction
+        conn.execute(f"PRAGMA incremental_vacuum({VACUUM_STEP_PAGES})").fetchall()
+        conn.commit()
+        remaining = _pragma(conn, "freelist_count")
+    freed = start - remaining
+    return "ok", f"released {freed} page(s) ({freed * page_size // 1024} KB)"
+
+
+def _tables(conn):
+    cur = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    )
+    return [row[0] for row in cur.fetchall()]
+
+
+def quick_check(conn, deadline):
+    # Checks one table at a time, resuming after the last table checked, so
+    # a large database is covered over several idle periods
+    tables = _tables(conn)
+    position = _meta(conn, CHECK_NEXT_KEY)
+    start = tables.index(position) if position in tables else 0
+    problems = []
+    flagged = set(json.loads(_meta(conn, REINDEX_KEY, "[]")))
+    checked = 0
+    try:
+        for table in tables[start:]:
+            _check_deadline(deadline)
+            result = [row[0] for row in conn.execute(f'PRAGMA quick_check("{table}")').fetchall()]
+            checked += 1
+            if result != ["ok"]:
+                problems.extend(result)
+                flagged.update(re.findall(r"index (\w+)", " ".join(result)))
+                if table in DERIVED_TABLES:
+                    flagged.add(table)
+    except sqlite3.OperationalError as e:
+        if "interrupt" not in str(e):
+            raise
+        if not checked:
+            # One table larger than the whole budget; move past it rather
+            # than retrying it forever
+            problems.append(f"{tables[start]} not checked within the time budget")
+            checked = 1
+    except BudgetExceeded:
+        pass
+    # The deadline may have passed; the bookkeeping below must still run
+    conn.set_progress_handler(None, 0)
+    finished = start + checked >= len(tables)
+    _set_meta(conn, CHECK_NEXT_KEY, "" if finished else tables[start + checked])
+    _set_meta(conn, REINDEX_KEY, json.dumps(sorted(flagged)))
+    conn.commit()
+    if problems:
+        return ("error" if flagged else "partial"), "; ".join(problems[:20])
+    if not finished:
+        return "partial", f"checked {start + checked} of {len(tables)} table(s)"
+    return "ok", f"checked {len(tables)} table(s)"
+
+
+def rebuild_indexes(conn, deadline):
+    # Indexes dropped since they were flagged are simply forgotten
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    existing.update(DERIVED_TABLES)
+    pending = [i for i in json.loads(_meta(conn, REINDEX_KEY, "[]")) if i in existing]
+    rebuilt = []
+    while pending:
+        _check_deadline(deadline)
+        index = pending.pop(0)
+        if index in DERIVED_TABLES:
+            DERIVED_TABLES[index](conn)
+        else:
+            conn.execute(f'REINDEX "{index}"')
+        rebuilt.append(index)
+        _set_meta(conn, REINDEX_KEY, json.dumps(pending))
+        conn.commit()
+    _set_meta(conn, REINDEX_KEY, "[]")
+    conn.commit()
+    return "ok", "rebuilt " + (", ".join(rebuilt) or "nothing")
+
+
+# --- scheduling ---
+
+def _last_success(conn, task):
+    cur = conn.execute(
+        "SELECT MAX(ts) FROM maintenance_runs WHERE task = ? AND status IN ('ok', 'skipped')",
+        (task,)
+    )
+    return cur.fetchone()[0] or 0
+
+
+def _due_by_interval(interval):
+    return lambda conn, task: time.time() - _last_success(conn, task) >= interval
+
+
+def _conversion_due(conn, task):
+    return _pragma(conn, "auto_vacuum") != 2
+
+
+def _vacuum_due(conn, task):
+    return _pragma(conn, "auto_vacuum") == 2 and _pragma(conn, "freelist_count") >= VACUUM_MIN_FREE_PAGES
+
+
+def _reindex_due(conn, task):
+    return bool(json.loads(_meta(conn, REINDEX_KEY, "[]")))
+
+
+def _check_due(conn, task):
+    # A check cycle in progress continues at the next idle period
+    return bool(_meta(conn, CHECK_NEXT_KEY)) or _due_by_interval(DAY)(conn, task)
+
+
+# name -> (function, is due(conn, name), time budget in seconds)
+TASKS = {
+    'optimize': (optimize, _due_by_interval(DAY), 10.0),
+    'convert_auto_vacuum': (convert_auto_vacuum, _conversion_due, 120.0),
+    'incremental_vacuum': (incremental_vacuum, _vacuum_due, 2.0),
+    'quick_check': (quick_check, _check_due, 5.0),
+    'rebuild_indexes': (rebuild_indexes, _reindex_due, 10.0),
+}
+
+
+def record_run(conn, task, status, duration_ms, detail):
+    conn.execute(
+        "INSERT INTO maintenance_runs (ts, task, status, duration_ms, detail) VALUES (?, ?, ?, ?, ?)",
+        (int(time.time()), task, status, duration_ms, detail)
+    )
+    conn.execute("DELETE FROM maintenance_runs WHERE ts < ?", (int(time.time()) - RUN_HISTORY_DAYS * DAY,))
+    conn.commit()
+
+
+def run_task(conn, task):
+    # Runs one task under its time budget and records the outcome
+    func, _, budget = TASKS[task]
+    started = time.monotonic()
+    deadline = started + budget
+    conn.set_progress_handler(_deadline_handler(deadline), 1000)
+    try:
+        status, detail = func(conn, deadline)
+    except BudgetExceeded:
+        conn.rollback()
+        status, detail = "partial", f"stopped after the {budget:g}s budget"
+    except sqlite3.Error as e:
+        conn.rollback()
+        if "interrupt" in str(e):
+            status, detail = "partial", f"stopped after the {budget:g}s budget"
+        else:
+            status, detail = "error", str(e)
+    finally:
+        conn.set_progress_handler(None, 0)
+    duration_ms = int((time.monotonic() - started) * 1000)
+    record_run(conn, task, status, duration_ms, detail)
+    return status, detail
+
+
+def due_tasks(conn):
+    return [task for task, (_, is_due, _) in TASKS.items() if is_due(conn, task)]
+
+
+def diagnostics(conn, db_path):
+    info = {
+        "path": db_path,
+        "file_size": os.path.getsize(db_path) if os.path.exists(db_path) else 0,
+        "page_size": _pragma(conn, "page_size"),
+        "page_count": _pragma(conn, "page_count"),
+        "freelist_count": _pragma(conn, "freelist_count"),
+        "auto_vacuum": {0: "NONE", 1: "FULL", 2: "INCREMENTAL"}.get(_pragma(conn, "auto_vacuum")),
+        "journal_mode": _pragma(conn, "journal_mode"),
+        "sqlite_version": sqlite3.sqlite_version,
+        "pending_reindex": json.loads(_meta(conn, REINDEX_KEY, "[]")),
+    }
+    cur = conn.execute(
+        """
+        SELECT r.task, r.ts, r.status, r.duration_ms, r.detail FROM maintenance_runs r
+        WHERE r.id = (SELECT MAX(id) FROM maintenance_runs WHERE task = r.task)
+        ORDER BY r.task
+        """
+    )
+    info["last_runs"] = cur.fetchall()
+    return info
+
+
+def recent_runs(conn, limit=200):
+    return conn.execute(
+        "SELECT ts, task, status, duration_ms, detail FROM maintenance_runs ORDER BY id DESC LIMIT ?",
+        (limit,)
+    ).fetchall()
+
+
+class MaintenanceWorker(threading.Thread):
+    # Runs due tasks, one at a time, once the UI has been idle for
+    # IDLE_SECONDS; touch() on user input postpones it. on_run is called from
+    # this thread with (task, status, detail) after each task.
+    def __init__(self, connect, on_run, idle_seconds=IDLE_SECONDS, interval=CHECK_INTERVAL):
+        super().__init__(daemon=True)
+        self.connect = connect
+        self.on_run = on_run
+        self.idle_seconds = idle_seconds
+        self.interval = interval
+        self.last_activity = time.monotonic()
+        self.wake = threading.Event()
+        self.forced = False
+        self.stopped = False
+
+    def touch(self):
+        self.last_activity = time.monotonic()
+
+    def run_now(self):
+        # Runs every task once, idle or not
+        self.forced = True
+        self.wake.set()
+
+    def stop(self):
+        self.stopped = True
+        self.wake.set()
+
+    def _idle(self):
+        return time.monotonic() - self.last_activity >= self.idle_seconds
+
+    def run(self):
+        conn = self.connect()
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        try:
+            while not self.stopped:
+                forced, self.forced = self.forced, False
+                if forced or self._idle():
+                    tasks = list(TASKS) if forced else due_tasks(conn)
+                    for task in tasks:
+                        if self.stopped or not (forced or self._idle()):
+                            break
+                        try:
+                            status, detail = run_task(conn, task)
+                        except sqlite3.Error as e:
+                            # Locked by the UI; try again next time round
+                            conn.rollback()
+                            status, detail = "error", str(e)
+                        self.on_run(task, status, detail)
+                self.wake.wait(self.interval)
+                self.wake.clear()
+        finally:
+            conn.close()
@@ -0,0 +1,158 @@
+# Schema migrations for existing databases, tracked with PRAGMA user_version.
+# They run before schema.sql is applied, so by the time its IF NOT EXISTS
+# statements run every table already has the columns they refer to. A brand
+# new database has no samples table yet; it gets the current schema straight
+# from schema.sql and is stamped with the latest version.
+
+MIGRATION_CHUNK_SIZE = 5000
+
+
+def table_exists(conn, table):
+    cur = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    return cur.fetchone() is not None
+
+
+def column_names(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def add_column(conn, table, column, decl):
+    if column not in column_names(conn, table):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+def normalize_legacy_samples(conn, where_sql="1", params=(), chunk_size=MIGRATION_CHUNK_SIZE):
+    # Moves sample type / experimenter / collection date out of the legacy
+    # species / sex / date_added text columns into the typed columns, one id
+    # range at a time so a large table never sits in one huge transaction.
+    # Also used for cohorts restored from archives made before the migration.
+    cur = conn.cursor()
+    cur.execute(
+        f"""
+        INSERT OR IGNORE INTO sample_types (name)
+        SELECT DISTINCT trim(species) FROM samples
+        WHERE ({where_sql}) AND sample_type_id IS NULL AND trim(COALESCE(species, '')) != ''
+        """,
+        params
+    )
+    cur.execute(
+        f"""
+        INSERT OR IGNORE INTO experimenters (name)
+        SELECT DISTINCT trim(sex) FROM samples
+        WHERE ({where_sql}) AND experimenter_id IS NULL AND trim(COALESCE(sex, '')) != ''
+        """,
+        params
+    )
+    conn.commit()
+    cur.execute(f"SELECT MIN(id), MAX(id) FROM samples WHERE {where_sql}", params)
+    low, high = cur.fetchone()
+    if low is None:
+        return
+    for start in range(low, high + 1, chunk_size):
+        cur.execute(
+            f"""
+            UPDATE samples SET
+                sample_type_id = COALESCE(sample_type_id, (SELECT id FROM sample_types WHERE name = trim(samples.species))),
+                experimenter_id = COALESCE(experimenter_id, (SELECT id FROM experimenters WHERE name = trim(samples.sex))),
+                collection_date = COALESCE(collection_date, date(date_added)),
+                species = NULL,
+                sex = NULL
+            WHERE id BETWEEN ? AND ? AND ({where_sql})
+                AND (species IS NOT NULL OR sex IS NOT NULL OR (collection_date IS NULL AND date_added IS NOT NULL))
+            """,
+            (start, start + chunk_size - 1) + tuple(params)
+        )
+        conn.commit()
+
+
+def _migrate_typed_sample_columns(conn):
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS sample_types (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS experimenters (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL
+        );
+    """)
+    add_column(conn, "samples", "sample_type_id", "INTEGER REFERENCES sample_types(id)")
+    add_column(conn, "samples", "experimenter_id", "INTEGER REFERENCES experimenters(id)")
+    add_column(conn, "samples", "collection_date", "TEXT")
+    add_column(conn, "samples", "time_point", "TEXT")
+    # The text-keyed rollup is rebuilt on the new columns by stats.ensure_rollups
+    conn.executescript("""
+        DROP TRIGGER IF EXISTS trg_sample_rollup_insert;
+        DROP TRIGGER IF EXISTS trg_sample_rollup_delete;
+        DROP TRIGGER IF EXISTS trg_sample_rollup_update;
+        DROP TABLE IF EXISTS sample_rollup;
+    """)
+    if table_exists(conn, "app_meta"):
+        conn.execute("DELETE FROM app_meta WHERE key = 'sample_rollup_built'")
+        conn.commit()
+    normalize_legacy_samples(conn)
+
+
+def _migrate_cohort_uids(conn):
+    add_column(conn, "cohorts", "uid", "TEXT")
+    conn.execute("UPDATE cohorts SET uid = lower(hex(randomblob(16))) WHERE uid IS NULL")
+    conn.commit()
+
+
+def _migrate_incremental_vacuum(conn):
+    # auto_vacuum can only be switched on an existing file by a full VACUUM,
+    # which would hold up startup on a large file. maintenance.py runs it
+    # (convert_auto_vacuum) the first time the app is idle, and returns free
+    # pages with incremental_vacuum from then on.
+    pass
+
+
+def _migrate_sample_parent(conn):
+    # sample_lineage itself comes from schema.sql; it starts empty, matching
+    # the (all NULL) parents
+    add_column(conn, "samples", "parent_id", "INTEGER REFERENCES samples(id) ON DELETE SET NULL")
+    conn.commit()
+
+
+def _migrate_sample_subject(conn):
+    add_column(conn, "samples", "subject_id", "INTEGER REFERENCES subjects(id) ON DELETE SET NULL")
+    conn.commit()
+
+
+def _migrate_row_versions(conn):
+    add_column(conn, "samples", "row_version", "INTEGER NOT NULL DEFAULT 1")
+    add_column(conn, "cohorts", "row_version", "INTEGER NOT NULL DEFAULT 1")
+    conn.commit()
+
+
+def _migrate_bulk_edit_row_versions(conn):
+    # Rows of older edits stay NULL, so undo treats them as changed since
+    if table_exists(conn, "bulk_edit_rows"):
+        add_column(conn, "bulk_edit_rows", "row_version", "INTEGER")
+    conn.commit()
+
+
+# Index i holds the migration that takes user_version from i to i + 1
+MIGRATIONS = [
+    _migrate_typed_sample_columns,
+    _migrate_cohort_uids,
+    _migrate_incremental_vacuum,
+    _migrate_sample_parent,
+    _migrate_sample_subject,
+    _migrate_row_versions,
+    _migrate_bulk_edit_row_versions,
+]
+
+
+def migrate(conn):
+    if not table_exists(conn, "samples"):
+        # New database: schema.sql creates the current schema. auto_vacuum
+        # takes effect without a VACUUM only before the first table exists.
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute(f"PRAGMA user_version = {len(MIGRATIONS)}")
+        return
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for index in range(version, len(MIGRATIONS)):
+        MIGRATIONS[index](conn)
+        conn.execute(f"PRAGMA user_version = {index + 1}")
+        conn.commit()
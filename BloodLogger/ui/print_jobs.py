@@ -0,0 +1,242 @@
+import queue
+import threading
+import time
+import printer
+import printer_pool
+
+# Label print tracking. Samples created in this app get a sample_print_state
+# row in the same transaction as the sample; every job sent to a printer is
+# logged in print_jobs with one print_history row per label, and the outcome
+# is committed batch by batch so a failure part-way through a cohort leaves
+# exactly the unprinted remainder in the unprinted_samples view. Runs are
+# split across the printer pool (printer_pool.py) when one is set up.
+
+PRINT_BATCH_SIZE = 50
+PRINTER_KEY = 'printer_name'
+PENDING = 'pending'
+PRINTED = 'printed'
+FAILED = 'failed'
+PARTIAL = 'partial'
+
+
+def get_printer(conn):
+    # The configured printer (a Windows printer name or tcp://host:port),
+    # falling back to the Windows default printer
+    cur = conn.execute("SELECT value FROM app_meta WHERE key = ?", (PRINTER_KEY,))
+    row = cur.fetchone()
+    return row[0] if row and row[0] else printer.default_printer()
+
+
+def set_printer(conn, printer_name):
+    if printer_name:
+        conn.execute("INSERT OR REPLACE INTO app_meta (key, value) VALUES (?, ?)", (PRINTER_KEY, printer_name))
+    else:
+        conn.execute("DELETE FROM app_meta WHERE key = ?", (PRINTER_KEY,))
+    conn.commit()
+
+
+def queue_labels(conn, sample_ids):
+    # Marks samples as still needing a label; the caller commits
+    conn.executemany(
+        """
+        INSERT INTO sample_print_state (sample_id, status) VALUES (?, 'pending')
+        ON CONFLICT(sample_id) DO UPDATE SET status = 'pending'
+        """,
+        [(sid,) for sid in sample_ids]
+    )
+
+
+def record_job(conn, printer_name, sample_ids, outcome, error=None, printed=None):
+    # printed, when given, is how many leading labels printed before the
+    # job failed; the job is then recorded as partial
+    outcomes = [outcome] * len(sample_ids)
+    if outcome == FAILED and printed:
+        outcomes[:printed] = [PRINTED] * printed
+        outcome = PARTIAL
+    cur = conn.execute(
+        """
+        INSERT INTO print_jobs (ts, printer, label_count, outcome, error)
+        VALUES (CAST(strftime('%s', 'now') AS INTEGER), ?, ?, ?, ?)
+        """,
+        (printer_name, len(sample_ids), outcome, error)
+    )
+    job_id = cur.lastrowid
+    conn.executemany(
+        "INSERT INTO print_history (job_id, sample_id, outcome) VALUES (?, ?, ?)",
+        [(job_id, sid, label_outcome) for sid, label_outcome in zip(sample_ids, outcomes)]
+    )
+    conn.executemany(
+        """
+        INSERT INTO sample_print_state (sample_id, status, attempts, last_job_id) VALUES (?, ?, 1, ?)
+        ON CONFLICT(sample_id) DO UPDATE SET
+            status = excluded.status, attempts = attempts + 1, last_job_id = excluded.last_job_id
+        """,
+        [(sid, label_outcome, job_id) for sid, label_outcome in zip(sample_ids, outcomes)]
+    )
+    return job_id
+
+
+def pool_for(conn, printer_name=None):
+    # The printers a run is split across: the given one, the enabled pool
+    # printers, or the single configured printer
+    if printer_name:
+        return [printer_pool.PoolPrinter(printer_name, printer_name)]
+    printers = printer_pool.active_printers(conn)
+    if printers:
+        return printers
+    printer_name = get_printer(conn)
+    return [printer_pool.PoolPrinter(printer_name, printer_name)]
+
+
+def _sender(pool_printer, work, results, on_status):
+    # Takes batches off the shared queue until it is empty, so an idle or
+    # faster printer takes more of the run. On an error the labels it did not
+    # print go back on the queue for the other printers and it drops out.
+    while True:
+        try:
+            batch = work.get_nowait()
+        except queue.Empty:
+            return
+        started = time.monotonic()
+        try:
+            printer.send_labels(
+                [label for _, label in batch], pool_printer.address, on_status,
+                pool_printer.template, pool_printer.dpi
+            )
+            done, error = len(batch), None
+        except Exception as e:
+            done, error = getattr(e, "printed", 0), str(e) or type(e).__name__
+        results.put((pool_printer, batch, done, error, int((time.monotonic() - started) * 1000)))
+        if error:
+            if batch[done:]:
+                work.put(batch[done:])
+            return
+
+
+def print_samples(conn, samples, printer_name=None, batch_size=PRINT_BATCH_SIZE, on_status=None):
+    # samples is [(sample row id, label text)]. Splits the run into batches
+    # across the printer pool, one sender thread per printer, and records
+    # each job here as it finishes. batch_size None sends one job per
+    # printer. Returns (printed, failed) label counts. on_status receives
+    # printer status updates while network printers are being paced.
+    if not samples:
+        return 0, 0
+    try:
+        printers = pool_for(conn, printer_name)
+    except Exception as e:
+        record_job(conn, printer_name, [sid for sid, _ in samples], FAILED, str(e))
+        conn.commit()
+        return 0, len(samples)
+    if batch_size is None:
+        batch_size = -(-len(samples) // len(printers))
+    work = queue.Queue()
+    for start in range(0, len(samples), batch_size):
+        work.put(samples[start:start + batch_size])
+    results = queue.Queue()
+    healthy = list(printers)
+    printed = 0
+    # A remainder put back after the other senders finished gets another round
+    while healthy and not work.empty():
+        senders = [
+            threading.Thread(target=_sender, args=(p, work, results, on_status), daemon=True)
+            for p in healthy
+        ]
+        for sender in senders:
+            sender.start()
+        while any(sender.is_alive() for sender in senders) or not results.empty():
+            try:
+                pool_printer, batch, done, error, busy_ms = results.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            record_job(
+                conn, pool_printer.name, [sid for sid, _ in batch],
+                FAILED if error else PRINTED, error, done
+            )
+            printer_pool.record_stats(conn, pool_printer.name, done, len(batch) - done, busy_ms)
+            conn.commit()
+            printed += done
+            if error and pool_printer in healthy:
+                healthy.remove(pool_printer)
+    # Batches no printer could take were never sent; they stay (or start)
+    # pending in sample_print_state so the unprinted view lists them
+    leftover = []
+    while not work.empty():
+        leftover.extend(sid for sid, _ in work.get_nowait())
+    if leftover:
+        conn.executemany(
+            "INSERT INTO sample_print_state (sample_id, status) VALUES (?, 'pending') ON CONFLICT(sample_id) DO NOTHING",
+            [(sid,) for sid in leftover]
+        )
+        conn.commit()
+    return printed, len(samples) - printed
+
+
+def unprinted(conn, cohort_id=None):
+    # [(sample row id, animal_id)] still waiting for a label, oldest first
+    sql = "SELECT id, animal_id FROM unprinted_samples"
+    params = ()
+    if cohort_id is not None:
+        sql += " WHERE cohort_id = ?"
+        params = (cohort_id,)
+    return conn.execute(sql + " ORDER BY id", params).fetchall()
+
+
+def reprint_unprinted(conn, cohort_id=None, printer_name=None, on_status=None):
+    # Sends everything that did not print as a single batched job (one per
+    # printer when there is a pool)
+    return print_samples(conn, unprinted(conn, cohort_id), printer_name, None, on_status)
+
+
+def print_test_label(conn, on_status=None):
+    # One untracked label on every printer; returns counts like print_samples
+    # plus one line per printer that failed
+    printed = 0
+    errors = []
+    for pool_printer in pool_for(conn):
+        try:
+            printer.send_labels(["Test"], pool_printer.address, on_status, pool_printer.template, pool_printer.dpi)
+            printed += 1
+        except Exception as e:
+            errors.append(f"{pool_printer.name}: {e}")
+    return printed, len(errors), "\n".join(errors)
+
+
+def mark_unprinted(conn, sample_ids):
+    # For labels that came out damaged or jammed after the job was accepted
+    queue_labels(conn, sample_ids)
+    conn.commit()
+
+
+class PrintWorker(threading.Thread):
+    # Runs print requests in FIFO order on its own connection so a paced run
+    # never blocks the UI. A request is a function of the connection that
+    # returns (printed, failed), optionally followed by a detail message;
+    # on_done is called from this thread with (printed, failed, detail or
+    # error message or ""). A request that raised reports (0, 0, error).
+    def __init__(self, connect, on_done):
+        super().__init__(daemon=True)
+        self.connect = connect
+        self.on_done = on_done
+        self.requests = queue.Queue()
+
+    def submit(self, request):
+        self.requests.put(request)
+
+    def stop(self):
+        self.requests.put(None)
+
+    def run(self):
+        conn = self.connect()
+        try:
+            while True:
+                request = self.requests.get()
+                if request is None:
+                    break
+                try:
+                    printed, failed, *detail = request(conn)
+                    self.on_done(printed, failed, detail[0] if detail else "")
+                except Exception as e:
+                    conn.rollback()
+                    self.on_done(0, 0, str(e))
+        finally:
+            conn.close()
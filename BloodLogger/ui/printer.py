@@ -0,0 +1,108 @@
+import win32print
+import printer_status
+
+# ZPL for the Zebra label printer. ZPL_SETUP configures the printer once per
+# job; ZPL_LABEL is repeated for every label, so a batch is one raw job.
+
+ZPL_SETUP = """
+CT~~CD,~CC^~CT~
+^XA
+~TA000
+~JSN
+^LT0
+^MNW
+^MTT
+^PON
+^PMN
+^LH0,0
+^JMA
+^PR4,4
+~SD30
+^JUS
+^LRN
+^CI27
+^PA0,1,1,0
+^XZ
+"""
+
+# Placeholders are filled in by label_zpl for the printer's resolution; a
+# printer in the pool may use its own template with the same placeholders.
+ZPL_LABEL = """
+^XA
+^MMT
+^PW{{WIDTH}}
+^LL{{LENGTH}}
+^LS0
+^BY{{MODULE}},3,{{HEIGHT}}^FT{{X_POS}},{{Y_POS}}^BCN,,Y,N
+^FH\\^FD>:{{SAMPLE_ID}}^FS
+^PQ1,0,1,Y
+^XZ
+"""
+
+DEFAULT_DPI = 300
+# 1.05 x 0.50 inch label; dot values below are at DEFAULT_DPI
+LABEL_WIDTH_IN = 1.05
+LABEL_LENGTH_IN = 0.50
+
+
+def label_zpl(sample_id, template=None, dpi=DEFAULT_DPI):
+    scale = dpi / DEFAULT_DPI
+    # Label and barcode parameters
+    label_width = round(LABEL_WIDTH_IN * dpi)  # dots (from ^PW)
+    module_width = max(1, round(2 * scale))    # from ^BY (dots per module)
+    quiet_zone = round(10 * scale)             # dots, typical for Code128
+    # Code128 encodes each character in about 11 modules (worst case)
+    barcode_length = len(sample_id)
+    modules_per_char = 11
+    barcode_modules = barcode_length * modules_per_char + 35  # 35 for start/stop chars, etc.
+    barcode_width = barcode_modules * module_width + 2 * quiet_zone
+    x_pos = max(0, int((label_width - barcode_width) / 2))
+    values = {
+        "SAMPLE_ID": sample_id,
+        "X_POS": x_pos,
+        "Y_POS": round(128 * scale),
+        "WIDTH": label_width,
+        "LENGTH": round(LABEL_LENGTH_IN * dpi),
+        "MODULE": module_width,
+        "HEIGHT": round(87 * scale),
+    }
+    zpl = template or ZPL_LABEL
+    for key, value in values.items():
+        zpl = zpl.replace("{{" + key + "}}", str(value))
+    return zpl
+
+
+def default_printer():
+    return win32print.GetDefaultPrinter()
+
+
+def send_raw(data, printer_name=None, job_name="Sample Label"):
+    # Spools one RAW job; raises if the printer cannot take it
+    printer_name = printer_name or default_printer()
+    hPrinter = win32print.OpenPrinter(printer_name)
+    try:
+        win32print.StartDocPrinter(hPrinter, 1, (job_name, None, "RAW"))
+        win32print.StartPagePrinter(hPrinter)
+        win32print.WritePrinter(hPrinter, data.encode())
+        win32print.EndPagePrinter(hPrinter)
+        win32print.EndDocPrinter(hPrinter)
+    finally:
+        win32print.ClosePrinter(hPrinter)
+
+
+def send_labels(sample_ids, printer_name=None, on_status=None, template=None, dpi=DEFAULT_DPI):
+    # Network printers are paced on ~HS status; spooled ones get one RAW job
+    labels = [label_zpl(sid, template, dpi) for sid in sample_ids]
+    if printer_status.is_socket_address(printer_name):
+        printer_status.send_paced(printer_name, ZPL_SETUP, labels, on_status)
+    else:
+        send_raw(ZPL_SETUP + "".join(labels), printer_name, f"Sample Labels ({len(sample_ids)})")
+
+
+def print_barcode(sample_id, printer_name=None):
+    try:
+        send_labels([sample_id], printer_name)
+        return True
+    except Exception as e:
+        print(f"Failed to print barcode for {sample_id}: {e}")
+        return False
@@ -0,0 +1,80 @@
+import printer
+
+# Named printers for splitting label runs (see print_jobs.print_samples).
+# Each printer has its own address, resolution and optionally its own label
+# template. With no printers configured, runs go to the single printer from
+# print_jobs.get_printer. printer_stats accumulates per-printer throughput.
+
+
+class PoolPrinter:
+    def __init__(self, name, address, dpi=printer.DEFAULT_DPI, template=None, printer_id=None):
+        self.id = printer_id
+        self.name = name
+        self.address = address
+        self.dpi = dpi
+        self.template = template or None
+
+
+def list_printers(conn, enabled_only=False):
+    sql = "SELECT id, name, address, dpi, template, enabled FROM printers"
+    if enabled_only:
+        sql += " WHERE enabled = 1"
+    return conn.execute(sql + " ORDER BY name").fetchall()
+
+
+def active_printers(conn):
+    return [
+        PoolPrinter(name, address, dpi, template, printer_id)
+        for printer_id, name, address, dpi, template, _ in list_printers(conn, enabled_only=True)
+    ]
+
+
+def save_printer(conn, name, address, dpi, template=None, enabled=True, printer_id=None):
+    if printer_id is None:
+        cur = conn.execute(
+            "INSERT INTO printers (name, address, dpi, template, enabled) VALUES (?, ?, ?, ?, ?)",
+            (name, address, dpi, template or None, int(enabled))
+        )
+        printer_id = cur.lastrowid
+    else:
+        old_name = conn.execute("SELECT name FROM printers WHERE id = ?", (printer_id,)).fetchone()[0]
+        conn.execute(
+            "UPDATE printers SET name = ?, address = ?, dpi = ?, template = ?, enabled = ? WHERE id = ?",
+            (name, address, dpi, template or None, int(enabled), printer_id)
+        )
+        conn.execute("UPDATE printer_stats SET printer = ? WHERE printer = ?", (name, old_name))
+    conn.commit()
+    return printer_id
+
+
+def remove_printer(conn, printer_id):
+    conn.execute("DELETE FROM printers WHERE id = ?", (printer_id,))
+    conn.commit()
+
+
+def record_stats(conn, name, labels, failed, busy_ms):
+    # Called once per job; the caller commits
+    conn.execute(
+        """
+        INSERT INTO printer_stats (printer, jobs, labels, failed_labels, busy_ms, last_used)
+        VALUES (?, 1, ?, ?, ?, CAST(strftime('%s', 'now') AS INTEGER))
+        ON CONFLICT(printer) DO UPDATE SET
+            jobs = jobs + 1,
+            labels = labels + excluded.labels,
+            failed_labels = failed_labels + excluded.failed_labels,
+            busy_ms = busy_ms + excluded.busy_ms,
+            last_used = excluded.last_used
+        """,
+        (name, labels, failed, busy_ms)
+    )
+
+
+def printer_stats(conn):
+    # {name: (jobs, labels, failed labels, labels per minute while busy)}
+    stats = {}
+    for name, jobs, labels, failed, busy_ms in conn.execute(
+        "SELECT printer, jobs, labels, failed_labels, busy_ms FROM printer_stats"
+    ):
+        rate = labels * 60000.0 / busy_ms if busy_ms else 0.0
+        stats[name] = (jobs, labels, failed, rate)
+    return stats
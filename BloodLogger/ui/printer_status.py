@@ -0,0 +1,206 @@
+import socket
+import threading
+import time
+
+# Zebra host status (~HS) over the raw TCP port, used to pace label runs.
+# The printer answers ~HS with three STX...ETX framed, comma-separated
+# strings; the fields used here are:
+#   1: comms, paper out, pause, label length, formats in receive buffer,
+#      buffer full, diagnostic mode, partial format, ...
+#   2: function settings, unused, head up, ribbon out, thermal transfer,
+#      print mode, print width mode, label waiting, labels remaining, ...
+# A run that gives up on a stopped printer cancels the formats still in its
+# buffer (~JA) before failing over, so they do not print as well once the
+# fault is cleared and the tubes do not get two labels.
+# Printer names with the tcp:// prefix ("tcp://host:port") take this path;
+# anything else is a Windows printer and goes through the spooler.
+
+SOCKET_PREFIX = "tcp://"
+DEFAULT_PORT = 9100
+SOCKET_TIMEOUT = 5.0
+POLL_INTERVAL = 0.25         # seconds between ~HS polls while a run is waiting
+MONITOR_INTERVAL = 2.0       # seconds between ~HS polls while idle
+MAX_BUFFERED_FORMATS = 8     # labels kept queued in the printer ahead of the head
+STATUS_WAIT_TIMEOUT = 120.0  # how long a run waits for paper/pause/head to clear
+
+STX = b"\x02"
+ETX = b"\x03"
+CANCEL_ALL = b"~JA"
+
+# One connection per printer at a time; runs and the monitor share the port
+_printer_locks = {}
+_printer_locks_guard = threading.Lock()
+
+
+class PrinterStatusError(Exception):
+    # Raised when a paced run gives up; printed is the number of leading
+    # labels that printed or will still print (anything ~JA did not cancel).
+    def __init__(self, message, printed=0):
+        super().__init__(message)
+        self.printed = printed
+
+
+class HostStatus:
+    def __init__(self, fields1, fields2):
+        self.paper_out = fields1[1] == "1"
+        self.paused = fields1[2] == "1"
+        self.formats_in_buffer = int(fields1[4])
+        self.buffer_full = fields1[5] == "1"
+        self.head_open = fields2[2] == "1"
+        self.ribbon_out = fields2[3] == "1"
+        self.labels_remaining = int(fields2[8])
+
+    def problems(self):
+        # Conditions that stop the printer until someone attends to it
+        problems = []
+        if self.paper_out:
+            problems.append("paper out")
+        if self.head_open:
+            problems.append("head open")
+        if self.ribbon_out:
+            problems.append("ribbon out")
+        if self.paused:
+            problems.append("paused")
+        return problems
+
+    def describe(self):
+        problems = self.problems()
+        if problems:
+            return ", ".join(problems)
+        if self.buffer_full:
+            return "buffer full"
+        if self.formats_in_buffer:
+            return f"printing ({self.formats_in_buffer} queued)"
+        return "ready"
+
+
+def printer_lock(printer_name):
+    with _printer_locks_guard:
+        return _printer_locks.setdefault(printer_name, threading.Lock())
+
+
+def is_socket_address(printer_name):
+    return bool(printer_name) and printer_name.startswith(SOCKET_PREFIX)
+
+
+def parse_address(printer_name):
+    host, _, port = printer_name[len(SOCKET_PREFIX):].partition(":")
+    return host, int(port or DEFAULT_PORT)
+
+
+def parse_host_status(response):
+    # response is the raw bytes of the three framed strings
+    frames = []
+    for chunk in response.split(ETX):
+        if STX in chunk:
+            frames.append(chunk.split(STX, 1)[1].decode("ascii").split(","))
+    if len(frames) < 2 or len(frames[0]) < 6 or len(frames[1]) < 9:
+        raise ValueError(f"Unexpected ~HS response: {response!r}")
+    return HostStatus(frames[0], frames[1])
+
+
+def query_host_status(sock):
+    sock.sendall(b"~HS")
+    response = b""
+    while response.count(ETX) < 3:
+        data = sock.recv(1024)
+        if not data:
+            raise ConnectionError("Printer closed the connection")
+        response += data
+    return parse_host_status(response)
+
+
+def read_status(printer_name, timeout=SOCKET_TIMEOUT):
+    with socket.create_connection(parse_address(printer_name), timeout=timeout) as sock:
+        return query_host_status(sock)
+
+
+def send_paced(printer_name, setup, labels, on_status=None,
+               max_buffered=MAX_BUFFERED_FORMATS, wait_timeout=None):
+    # Sends labels (one ZPL format each) over the raw port, topping the
+    # printer's receive buffer up to max_buffered formats between ~HS polls
+    # and holding off while it is paused, open or out of media. Returns once
+    # the buffer has drained; raises PrinterStatusError if a stop condition
+    # does not clear within wait_timeout seconds, or if the connection drops
+    # part-way. on_status gets the same dicts as StatusMonitor's.
+    if wait_timeout is None:
+        wait_timeout = STATUS_WAIT_TIMEOUT
+    sent = 0
+    with printer_lock(printer_name), socket.create_connection(parse_address(printer_name), timeout=SOCKET_TIMEOUT) as sock:
+        sock.sendall(setup.encode())
+        try:
+            blocked_since = None
+            while True:
+                status = query_host_status(sock)
+                if on_status:
+                    on_status({"printer": printer_name, "time": time.strftime("%H:%M:%S"), "status": status})
+                problems = status.problems()
+                if problems:
+                    blocked_since = blocked_since or time.monotonic()
+                    if time.monotonic() - blocked_since > wait_timeout:
+                        sock.sendall(CANCEL_ALL)
+                        cancelled = status.formats_in_buffer - query_host_status(sock).formats_in_buffer
+                        raise PrinterStatusError(
+                            f"Printer stopped: {', '.join(problems)}; {cancelled} queued label(s) cancelled",
+                            printed=max(0, sent - cancelled)
+                        )
+                    time.sleep(POLL_INTERVAL)
+                    continue
+                blocked_since = None
+                if sent >= len(labels):
+                    if not status.formats_in_buffer:
+                        return sent
+                    time.sleep(POLL_INTERVAL)
+                    continue
+                room = max_buffered - status.formats_in_buffer
+                if status.buffer_full or room <= 0:
+                    time.sleep(POLL_INTERVAL)
+                    continue
+                chunk = labels[sent:sent + room]
+                sock.sendall("".join(chunk).encode())
+                sent += len(chunk)
+        except (OSError, ValueError) as e:
+            # The labels already sent are in the printer and will still print
+            if not sent:
+                raise
+            raise PrinterStatusError(f"Connection lost after {sent} label(s) sent: {e}", printed=sent) from e
+
+
+class StatusMonitor(threading.Thread):
+    # Polls ~HS on each network printer every MONITOR_INTERVAL seconds,
+    # skipping any printer a run currently holds. get_printers returns the
+    # printer names to watch; on_status is called from this thread with a
+    # dict (printer, time, and status or error) per printer.
+    def __init__(self, get_printers, on_status, interval=MONITOR_INTERVAL):
+        super().__init__(daemon=True)
+        self.get_printers = get_printers
+        self.on_status = on_status
+        self.interval = interval
+        self.wake = threading.Event()
+        self.stopped = False
+
+    def poll_now(self):
+        self.wake.set()
+
+    def stop(self):
+        self.stopped = True
+        self.wake.set()
+
+    def run(self):
+        while not self.stopped:
+            for printer_name in self.get_printers():
+                if not is_socket_address(printer_name):
+                    continue
+                lock = printer_lock(printer_name)
+                if not lock.acquire(blocking=False):
+                    continue
+                result = {"printer": printer_name, "time": time.strftime("%H:%M:%S")}
+                try:
+                    result["status"] = read_status(printer_name)
+                except (OSError, ValueError) as e:
+                    result["error"] = str(e)
+                finally:
+                    lock.release()
+                self.on_status(result)
+            self.wake.wait(self.interval)
+            self.wake.clear()
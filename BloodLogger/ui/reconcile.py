@@ -0,0 +1,144 @@
+from collections import Counter
+
+# Rack/box reconciliation. A session holds the expected set (a cohort's
+# samples) in memory; scans are resolved in batches with one temp-table join
+# per batch, persisted to reconcile_scans, and diffed against the expected set.
+# The in-memory diff only changes once a batch is committed, so it never
+# counts scans that were not saved, and an unfinished session can be resumed
+# from its saved scans.
+
+
+class ReconcileSession:
+    def __init__(self, session_id, cohort_id, expected):
+        self.session_id = session_id
+        self.cohort_id = cohort_id
+        # sample id -> SampleID for everything that should be in the box
+        self.expected = expected
+        self.scan_counts = Counter()  # code -> times scanned
+        self.code_to_sample = {}      # code -> sample id (None if unknown)
+        self.sample_counts = Counter()  # sample id -> times scanned
+
+    def missing(self):
+        return sorted(self.expected[sid] for sid in self.expected if sid not in self.sample_counts)
+
+    def unexpected(self):
+        return sorted(code for code, sid in self.code_to_sample.items() if sid not in self.expected)
+
+    def duplicates(self):
+        dupes = set()
+        for code, count in self.scan_counts.items():
+            sid = self.code_to_sample.get(code)
+            if count > 1 or (sid is not None and self.sample_counts[sid] > 1):
+                dupes.add(code)
+        return sorted(dupes)
+
+    def matched_count(self):
+        return sum(1 for sid in self.sample_counts if sid in self.expected)
+
+    def _count(self, scans):
+        # scans is [(code, sample id or None)]
+        for code, sid in scans:
+            self.code_to_sample.setdefault(code, sid)
+            self.scan_counts[code] += 1
+            if sid is not None:
+                self.sample_counts[sid] += 1
+
+
+def _expected(cur, cohort_id):
+    cur.execute("SELECT id, animal_id FROM samples WHERE cohort_id = ?", (cohort_id,))
+    return dict(cur.fetchall())
+
+
+def start_session(conn, cohort_id):
+    cur = conn.cursor()
+    expected = _expected(cur, cohort_id)
+    cur.execute(
+        "INSERT INTO reconcile_sessions (cohort_id, expected_count) VALUES (?, ?)",
+        (cohort_id, len(expected))
+    )
+    session_id = cur.lastrowid
+    conn.commit()
+    return ReconcileSession(session_id, cohort_id, expected)
+
+
+def resolve_codes(conn, codes):
+    # One round-trip for the whole batch: load the codes into a temp table and
+    # join on both indexed ID columns. Returns {code: sample id}.
+    cur = conn.cursor()
+    cur.execute("CREATE TEMP TABLE IF NOT EXISTS reconcile_batch (code TEXT PRIMARY KEY)")
+    cur.execute("DELETE FROM temp.reconcile_batch")
+    cur.executemany("INSERT OR IGNORE INTO temp.reconcile_batch (code) VALUES (?)", [(c,) for c in codes])
+    cur.execute("""
+        SELECT b.code, s.id FROM temp.reconcile_batch b JOIN samples s ON s.barcode_value = b.code
+        UNION
+        SELECT b.code, s.id FROM temp.reconcile_batch b JOIN samples s ON s.animal_id = b.code
+    """)
+    resolved = {}
+    for code, sample_id in cur.fetchall():
+        resolved.setdefault(code, sample_id)
+    cur.execute("DELETE FROM temp.reconcile_batch")
+    return resolved
+
+
+def unfinished_sessions(conn):
+    # [(session id, cohort name, started at, scans so far)], newest first
+    cur = conn.execute(
+        """
+        SELECT r.id, c.name, r.started_at, (SELECT COUNT(*) FROM reconcile_scans s WHERE s.session_id = r.id)
+        FROM reconcile_sessions r JOIN cohorts c ON c.id = r.cohort_id
+        WHERE r.finished_at IS NULL ORDER BY r.id DESC
+        """
+    )
+    return cur.fetchall()
+
+
+def resume_session(conn, session_id):
+    # Rebuilds an unfinished session from its saved scans. The expected set
+    # is the cohort as it is now.
+    cur = conn.cursor()
+    cur.execute("SELECT cohort_id, finished_at FROM reconcile_sessions WHERE id = ?", (session_id,))
+    row = cur.fetchone()
+    if not row:
+        raise ValueError(f"Reconciliation session {session_id} not found.")
+    cohort_id, finished_at = row
+    if finished_at is not None:
+        raise ValueError(f"Reconciliation session {session_id} is already finished.")
+    if cohort_id is None:
+        raise ValueError(f"The cohort of reconciliation session {session_id} has been deleted.")
+    session = ReconcileSession(session_id, cohort_id, _expected(cur, cohort_id))
+    cur.execute("SELECT code, sample_id FROM reconcile_scans WHERE session_id = ? ORDER BY id", (session_id,))
+    session._count(cur.fetchall())
+    return session
+
+
+def add_scans(conn, session, codes):
+    # Resolves and records a batch of scanned codes in one transaction; the
+    # session is only updated once the batch is committed
+    codes = [c for c in (code.strip() for code in codes) if c]
+    if not codes:
+        return
+    new_codes = [c for c in set(codes) if c not in session.code_to_sample]
+    try:
+        resolved = resolve_codes(conn, new_codes) if new_codes else {}
+        scans = [(code, session.code_to_sample.get(code, resolved.get(code))) for code in codes]
+        conn.executemany(
+            "INSERT INTO reconcile_scans (session_id, code, sample_id) VALUES (?, ?, ?)",
+            [(session.session_id, code, sid) for code, sid in scans]
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    session._count(scans)
+
+
+def finish_session(conn, session):
+    conn.execute(
+        """
+        UPDATE reconcile_sessions SET finished_at = CURRENT_TIMESTAMP,
+            missing_count = ?, unexpected_count = ?, duplicate_count = ?
+        WHERE id = ?
+        """,
+        (len(session.missing()), len(session.unexpected()), len(session.duplicates()), session.session_id)
+    )
+    conn.commit()
@@ -0,0 +1,114 @@
+import time
+import queue
+import threading
+
+# Keyboard-wedge scanner input. ScanAssembler sees every key press on the
+# lookup field (via MainWindow.eventFilter) and cuts the stream into codes,
+# either on a terminator key or on a pause after a fast burst. Codes go to
+# ScanWorker, which resolves them on its own thread and connection so the
+# UI never waits on the database between scans.
+
+# A scanner types a whole code in a few ms per key; people rarely go below
+# ~80 ms between keys
+SCANNER_MAX_KEY_INTERVAL = 0.035
+# Pause after a scanner burst that ends a code when no terminator is sent
+SCANNER_END_GAP = 0.08
+SCANNER_MIN_LENGTH = 3
+
+
+class ScanAssembler:
+    def __init__(self, max_key_interval=SCANNER_MAX_KEY_INTERVAL, end_gap=SCANNER_END_GAP, min_length=SCANNER_MIN_LENGTH):
+        self.max_key_interval = max_key_interval
+        self.end_gap = end_gap
+        self.min_length = min_length
+        self.reset()
+
+    def reset(self):
+        self.chars = []
+        self.first_time = None
+        self.last_time = None
+        self.edited = False
+
+    def is_burst(self):
+        # True when the buffered characters arrived at scanner speed
+        if self.edited or len(self.chars) < self.min_length:
+            return False
+        mean_interval = (self.last_time - self.first_time) / (len(self.chars) - 1)
+        return mean_interval <= self.max_key_interval
+
+    def _take(self):
+        code = "".join(self.chars)
+        source = "scanner" if self.is_burst() else "manual"
+        self.reset()
+        return code, source
+
+    def add_char(self, char, now=None):
+        # Returns a finished (code, source) when this key starts a new burst
+        # after a terminator-less scan, otherwise None
+        now = time.monotonic() if now is None else now
+        finished = None
+        if self.chars and now - self.last_time > self.end_gap and self.is_burst():
+            finished = self._take()
+        if not self.chars:
+            self.first_time = now
+        self.chars.append(char)
+        self.last_time = now
+        return finished
+
+    def mark_edited(self):
+        # Cursor keys, backspace, paste etc. mean a person is editing the text
+        self.edited = True
+
+    def terminate(self):
+        # Terminator key (Enter/Tab). Returns (code, source) or None if empty
+        if not self.chars:
+            self.reset()
+            return None
+        return self._take()
+
+    def flush_if_idle(self, now=None):
+        # Called from a timer so the last terminator-less scan is not held back
+        now = time.monotonic() if now is None else now
+        if self.chars and now - self.last_time > self.end_gap and self.is_burst():
+            return self._take()
+        return None
+
+
+class ScanWorker(threading.Thread):
+    # Resolves codes in FIFO order with a single connection. on_result is
+    # called from the worker thread with (seq, code, source, result); the UI
+    # side must hand it over to the GUI thread (e.g. through a Qt signal).
+    def __init__(self, connect, resolve, on_result):
+        super().__init__(daemon=True)
+        self.connect = connect
+        self.resolve = resolve
+        self.on_result = on_result
+        self.codes = queue.Queue()
+        self.seq = 0
+        self.lock = threading.Lock()
+
+    def submit(self, code, source="manual"):
+        with self.lock:
+            self.seq += 1
+            seq = self.seq
+        self.codes.put((seq, code, source))
+        return seq
+
+    def stop(self):
+        self.codes.put(None)
+
+    def run(self):
+        conn = self.connect()
+        try:
+            while True:
+                item = self.codes.get()
+                if item is None:
+                    break
+                seq, code, source = item
+                try:
+                    result = self.resolve(conn, code)
+                except Exception as e:
+                    result = e
+                self.on_result(seq, code, source, result)
+        finally:
+            conn.close()
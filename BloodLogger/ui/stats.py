@@ -0,0 +1,107 @@
+import datetime
+
+# Dashboard statistics. All queries read sample_rollup, which the triggers in
+# schema.sql keep in step with samples, so their cost depends on the number of
+# distinct type/experimenter/cohort/day combinations, not on the sample count.
+
+ROLLUP_BUILT_KEY = 'sample_rollup_built'
+
+REBUILD_SQL = """
+DELETE FROM sample_rollup;
+INSERT INTO sample_rollup (sample_type_id, experimenter_id, cohort_id, collection_date, sample_count)
+SELECT COALESCE(sample_type_id, 0), COALESCE(experimenter_id, 0), COALESCE(cohort_id, 0), COALESCE(collection_date, ''), COUNT(*)
+FROM samples
+GROUP BY 1, 2, 3, 4;
+"""
+
+
+def rebuild_rollups(conn):
+    cur = conn.cursor()
+    for statement in REBUILD_SQL.strip().split(";"):
+        if statement.strip():
+            cur.execute(statement)
+    cur.execute("INSERT OR REPLACE INTO app_meta (key, value) VALUES (?, '1')", (ROLLUP_BUILT_KEY,))
+    conn.commit()
+
+
+def ensure_rollups(conn):
+    # Backfill once for databases that had samples before the triggers existed
+    cur = conn.cursor()
+    cur.execute("SELECT value FROM app_meta WHERE key = ?", (ROLLUP_BUILT_KEY,))
+    if not cur.fetchone():
+        rebuild_rollups(conn)
+
+
+def week_start(today=None):
+    today = today or datetime.date.today()
+    return (today - datetime.timedelta(days=today.weekday())).isoformat()
+
+
+def total_samples(conn):
+    cur = conn.cursor()
+    cur.execute("SELECT COALESCE(SUM(sample_count), 0) FROM sample_rollup")
+    return cur.fetchone()[0]
+
+
+# Rollup dimension -> (rollup column, lookup table holding its names)
+DIMENSIONS = {
+    'sample_type': ('sample_type_id', 'sample_types'),
+    'experimenter': ('experimenter_id', 'experimenters'),
+    'cohort_id': ('cohort_id', None),
+    'collection_date': ('collection_date', None),
+}
+
+
+def counts_by(conn, dimension, since=None):
+    # Returns [(value, count)]; lookup ids are returned as their names
+    if dimension not in DIMENSIONS:
+        raise ValueError(f"Unknown rollup dimension: {dimension}")
+    column, table = DIMENSIONS[dimension]
+    if table:
+        sql = f"SELECT COALESCE(l.name, ''), SUM(r.sample_count) FROM sample_rollup r LEFT JOIN {table} l ON l.id = r.{column}"
+    else:
+        sql = f"SELECT r.{column}, SUM(r.sample_count) FROM sample_rollup r"
+    params = ()
+    if since:
+        sql += " WHERE r.collection_date >= ?"
+        params = (since,)
+    sql += f" GROUP BY r.{column} ORDER BY 1"
+    cur = conn.cursor()
+    cur.execute(sql, params)
+    return cur.fetchall()
+
+
+def cohort_counts(conn):
+    return dict(counts_by(conn, 'cohort_id'))
+
+
+def pivot(conn, since):
+    # {experimenter: {sample_type: count}} for samples collected on/after since
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT COALESCE(e.name, ''), COALESCE(t.name, ''), SUM(r.sample_count)
+        FROM sample_rollup r
+        LEFT JOIN experimenters e ON e.id = r.experimenter_id
+        LEFT JOIN sample_types t ON t.id = r.sample_type_id
+        WHERE r.collection_date >= ?
+        GROUP BY r.experimenter_id, r.sample_type_id
+        """,
+        (since,)
+    )
+    table = {}
+    for experimenter, sample_type, count in cur.fetchall():
+        table.setdefault(experimenter, {})[sample_type] = count
+    return table
+
+
+def daily_counts(conn, days=14, today=None):
+    # [(date, count)] for the last `days` days, including days with no samples
+    today = today or datetime.date.today()
+    first = today - datetime.timedelta(days=days - 1)
+    counts = dict(counts_by(conn, 'collection_date', first.isoformat()))
+    result = []
+    for i in range(days):
+        day = (first + datetime.timedelta(days=i)).isoformat()
+        result.append((day, counts.get(day, 0)))
+    return result
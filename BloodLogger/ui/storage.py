@@ -0,0 +1,243 @@
+import time
+
+# Freezer storage: freezer -> rack -> box -> position. A sample has at most
+# one location (sample_locations, keyed by sample). Each box keeps a bitmap
+# of taken positions, so finding free slots in a box is a few integer
+# operations instead of a scan of its contents. The schema's triggers clear
+# the bitmap whenever locations change outside this module; it is rebuilt
+# from the (box_id, position) index the next time the box is filled.
+
+DEFAULT_BOX_ROWS = 9
+DEFAULT_BOX_COLS = 9
+ROW_LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+class StorageError(Exception):
+    pass
+
+
+def _begin_immediate(conn):
+    # Read the bitmaps under the write lock so two benches never pick the
+    # same slot; the function commits
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+
+
+def position_label(position, cols):
+    return f"{ROW_LETTERS[position // cols]}{position % cols + 1}"
+
+
+def parse_position(label, rows, cols):
+    label = label.strip().upper()
+    if len(label) < 2 or label[0] not in ROW_LETTERS[:rows] or not label[1:].isdigit():
+        raise StorageError(f"Invalid position: {label}")
+    col = int(label[1:])
+    if not 1 <= col <= cols:
+        raise StorageError(f"Invalid position: {label}")
+    return ROW_LETTERS.index(label[0]) * cols + col - 1
+
+
+# --- hierarchy ---
+
+def add_freezer(conn, name, description=None):
+    cur = conn.execute("INSERT INTO freezers (name, description) VALUES (?, ?)", (name, description or None))
+    conn.commit()
+    return cur.lastrowid
+
+
+def add_rack(conn, freezer_id, name):
+    cur = conn.execute("INSERT INTO racks (freezer_id, name) VALUES (?, ?)", (freezer_id, name))
+    conn.commit()
+    return cur.lastrowid
+
+
+def add_box(conn, rack_id, name, rows=DEFAULT_BOX_ROWS, cols=DEFAULT_BOX_COLS):
+    if not 1 <= rows <= len(ROW_LETTERS) or cols < 1:
+        raise StorageError(f"A box has 1-{len(ROW_LETTERS)} rows and at least one column.")
+    cur = conn.execute(
+        "INSERT INTO boxes (rack_id, name, rows, cols, capacity, occupancy) VALUES (?, ?, ?, ?, ?, ?)",
+        (rack_id, name, rows, cols, rows * cols, bytes((rows * cols + 7) // 8))
+    )
+    conn.commit()
+    return cur.lastrowid
+
+
+def remove(conn, level, item_id):
+    # level is 'freezers', 'racks' or 'boxes'; only empty ones can go
+    scope = {'freezers': "r.freezer_id = ?", 'racks': "b.rack_id = ?", 'boxes': "b.id = ?"}[level]
+    cur = conn.execute(
+        f"SELECT SUM(b.used) FROM boxes b JOIN racks r ON r.id = b.rack_id WHERE {scope}",
+        (item_id,)
+    )
+    if cur.fetchone()[0]:
+        raise StorageError("Only empty storage can be removed; move its samples first.")
+    conn.execute(f"DELETE FROM {level} WHERE id = ?", (item_id,))
+    conn.commit()
+
+
+def tree(conn):
+    # [(freezer id, freezer, rack id, rack, box id, box, rows, cols, used,
+    # capacity)], racks and boxes NULL for empty levels
+    cur = conn.execute(
+        """
+        SELECT f.id, f.name, r.id, r.name, b.id, b.name, b.rows, b.cols, b.used, b.capacity
+        FROM freezers f
+        LEFT JOIN racks r ON r.freezer_id = f.id
+        LEFT JOIN boxes b ON b.rack_id = r.id
+        ORDER BY f.name, r.id, b.id
+        """
+    )
+    return cur.fetchall()
+
+
+# --- occupancy ---
+
+def _bitmap(conn, box_id):
+    # Taken positions of a box as an int (bit i = position i)
+    occupancy, capacity = conn.execute("SELECT occupancy, capacity FROM boxes WHERE id = ?", (box_id,)).fetchone()
+    if occupancy is not None:
+        return int.from_bytes(occupancy, "little")
+    bits = 0
+    for (position,) in conn.execute("SELECT position FROM sample_locations WHERE box_id = ?", (box_id,)):
+        bits |= 1 << position
+    return bits
+
+
+def _store_bitmap(conn, box_id, bits, capacity):
+    conn.execute(
+        "UPDATE boxes SET occupancy = ? WHERE id = ?",
+        (bits.to_bytes((capacity + 7) // 8, "little"), box_id)
+    )
+
+
+def _free_positions(bits, capacity, count):
+    # Lowest count free positions, lowest first
+    free = ~bits & ((1 << capacity) - 1)
+    positions = []
+    while free and len(positions) < count:
+        lowest = free & -free
+        positions.append(lowest.bit_length() - 1)
+        free ^= lowest
+    return positions
+
+
+def _candidate_boxes(conn, box_id):
+    # The box and every box with room after it in the same freezer, in the
+    # order they were added
+    cur = conn.execute(
+        """
+        SELECT b.id, b.capacity, b.used FROM boxes b
+        JOIN racks r ON r.id = b.rack_id
+        WHERE r.freezer_id = (SELECT r2.freezer_id FROM boxes b2 JOIN racks r2 ON r2.id = b2.rack_id WHERE b2.id = ?)
+        ORDER BY r.id, b.id
+        """,
+        (box_id,)
+    )
+    boxes = cur.fetchall()
+    ids = [b[0] for b in boxes]
+    start = ids.index(box_id) if box_id in ids else len(ids)
+    return [(b[0], b[1]) for b in boxes[start:] if b[2] < b[1]]
+
+
+def store(conn, sample_ids, box_id):
+    # Puts the samples, in order, into the first free positions of box_id,
+    # continuing into the following boxes of the same freezer when it fills
+    # up. Samples that already have a location are moved. One transaction.
+    # Returns [(sample id, box id, position)].
+    try:
+        _begin_immediate(conn)
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS store_ids (pos INTEGER PRIMARY KEY, id INTEGER)")
+        conn.execute("DELETE FROM store_ids")
+        conn.executemany("INSERT INTO store_ids (pos, id) VALUES (?, ?)", list(enumerate(sample_ids)))
+        conn.execute("DELETE FROM sample_locations WHERE sample_id IN (SELECT id FROM store_ids)")
+        placements = []
+        bitmaps = {}
+        remaining = list(sample_ids)
+        for candidate_id, capacity in _candidate_boxes(conn, box_id):
+            bits = _bitmap(conn, candidate_id)
+            positions = _free_positions(bits, capacity, len(remaining))
+            for sample_id, position in zip(remaining, positions):
+                placements.append((sample_id, candidate_id, position))
+                bits |= 1 << position
+            bitmaps[candidate_id] = (bits, capacity)
+            remaining = remaining[len(positions):]
+            if not remaining:
+                break
+        if remaining:
+            raise StorageError(f"Not enough free positions: {len(remaining)} sample(s) left over.")
+        now = int(time.time())
+        conn.executemany(
+            "INSERT INTO sample_locations (sample_id, box_id, position, placed_at) VALUES (?, ?, ?, ?)",
+            [placement + (now,) for placement in placements]
+        )
+        # The insert trigger cleared the bitmaps; write the updated ones
+        for candidate_id, (bits, capacity) in bitmaps.items():
+            _store_bitmap(conn, candidate_id, bits, capacity)
+        conn.execute("DELETE FROM store_ids")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return placements
+
+
+def store_at(conn, sample_id, box_id, position):
+    # Puts one sample into a given position, moving it if already stored
+    try:
+        _begin_immediate(conn)
+        row = conn.execute("SELECT capacity FROM boxes WHERE id = ?", (box_id,)).fetchone()
+        if not row:
+            raise StorageError(f"Box {box_id} not found.")
+        capacity = row[0]
+        if not 0 <= position < capacity:
+            raise StorageError(f"Position {position} is outside the box.")
+        conn.execute("DELETE FROM sample_locations WHERE sample_id = ?", (sample_id,))
+        cur = conn.execute("SELECT sample_id FROM sample_locations WHERE box_id = ? AND position = ?", (box_id, position))
+        if cur.fetchone():
+            raise StorageError("That position is already taken.")
+        conn.execute(
+            "INSERT INTO sample_locations (sample_id, box_id, position, placed_at) VALUES (?, ?, ?, ?)",
+            (sample_id, box_id, position, int(time.time()))
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def unstore(conn, sample_ids):
+    conn.executemany("DELETE FROM sample_locations WHERE sample_id = ?", [(sid,) for sid in sample_ids])
+    conn.commit()
+
+
+# --- lookups ---
+
+LOCATION_SQL = """
+    SELECT f.name, r.name, b.name, l.position, b.cols, b.id
+    FROM sample_locations l
+    JOIN boxes b ON b.id = l.box_id
+    JOIN racks r ON r.id = b.rack_id
+    JOIN freezers f ON f.id = r.freezer_id
+"""
+
+
+def location(conn, sample_id):
+    # (freezer, rack, box, position label) or None
+    row = conn.execute(LOCATION_SQL + " WHERE l.sample_id = ?", (sample_id,)).fetchone()
+    if not row:
+        return None
+    freezer, rack, box, position, cols, _ = row
+    return freezer, rack, box, position_label(position, cols)
+
+
+def describe(loc):
+    return " / ".join(loc) if loc else ""
+
+
+def box_contents(conn, box_id):
+    # {position: (sample row id, sample ID)}
+    cur = conn.execute(
+        "SELECT l.position, s.id, s.animal_id FROM sample_locations l JOIN samples s ON s.id = l.sample_id WHERE l.box_id = ?",
+        (box_id,)
+    )
+    return {position: (sample_id, code) for position, sample_id, code in cur.fetchall()}
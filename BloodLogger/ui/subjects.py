@@ -0,0 +1,148 @@
+import lookups
+
+# Subjects (animals) that samples are drawn from. A study collects the same
+# animal at many time points, often across cohorts; samples.subject_id links
+# each draw to its subject, and the subject table is a lookup table like
+# sample_types (see lookups.py). Timelines read the covering index
+# idx_samples_subject_timeline (subject, collection date, time point, id)
+# and page with a keyset cursor, so every page is one index range scan no
+# matter how deep into the history it starts.
+
+TIMELINE_PAGE_SIZE = 100
+COHORT_PAGE_SUBJECTS = 50
+
+# Columns of the covering index; the row order of a timeline
+TIMELINE_SQL = """
+    SELECT s.id, s.animal_id, s.collection_date, s.time_point, s.sample_type_id, s.cohort_id
+    FROM samples s WHERE s.subject_id = ?{after}
+    ORDER BY s.collection_date, s.time_point, s.id LIMIT ?
+"""
+
+
+def get_or_create_id(conn, name):
+    return lookups.get_or_create_id(conn, 'subjects', name)
+
+
+def subject_of(conn, sample_id):
+    # (subject id, name) of a sample, or None
+    cur = conn.execute(
+        "SELECT j.id, j.name FROM samples s JOIN subjects j ON j.id = s.subject_id WHERE s.id = ?",
+        (sample_id,)
+    )
+    return cur.fetchone()
+
+
+def get(conn, subject_id):
+    # (name, species, sex, notes) or None
+    cur = conn.execute("SELECT name, species, sex, notes FROM subjects WHERE id = ?", (subject_id,))
+    return cur.fetchone()
+
+
+def update(conn, subject_id, name, species=None, sex=None, notes=None):
+    name = (name or "").strip()
+    if not name:
+        raise ValueError("A subject needs a name.")
+    conn.execute(
+        "UPDATE subjects SET name = ?, species = ?, sex = ?, notes = ? WHERE id = ?",
+        (name, species or None, sex or None, notes or None, subject_id)
+    )
+    conn.commit()
+
+
+def sample_count(conn, subject_id):
+    cur = conn.execute("SELECT COUNT(*) FROM samples WHERE subject_id = ?", (subject_id,))
+    return cur.fetchone()[0]
+
+
+def _ranges_after(cursor):
+    # The index entries after cursor = (collection date, time point, row id)
+    # as consecutive ranges: the rest of the cursor's date and time point,
+    # the rest of its date, then later dates. NULL sorts first, so the rows
+    # after a NULL are the non-NULL ones.
+    if cursor is None:
+        return [("", ())]
+    date, time_point, row_id = cursor
+    same_date = " AND s.collection_date IS ?"
+    return [
+        (same_date + " AND s.time_point IS ? AND s.id > ?", (date, time_point, row_id)),
+        (same_date + (" AND s.time_point IS NOT NULL" if time_point is None else " AND s.time_point > ?"),
+         (date,) if time_point is None else (date, time_point)),
+        (" AND s.collection_date IS NOT NULL" if date is None else " AND s.collection_date > ?",
+         () if date is None else (date,)),
+    ]
+
+
+def timeline(conn, subject_id, after=None, limit=TIMELINE_PAGE_SIZE):
+    # One page of a subject's samples in collection order: ([(row id, sample
+    # ID, collection date, time point, sample type, cohort)], cursor for the
+    # next page or None at the end)
+    rows = []
+    for after_sql, params in _ranges_after(after):
+        cur = conn.execute(TIMELINE_SQL.format(after=after_sql), (subject_id,) + params + (limit + 1 - len(rows),))
+        rows.extend(cur.fetchall())
+        if len(rows) > limit:
+            break
+    more = len(rows) > limit
+    rows = rows[:limit]
+    type_ids = {row[4] for row in rows if row[4] is not None}
+    cohort_ids = {row[5] for row in rows if row[5] is not None}
+    types = _names(conn, "sample_types", type_ids)
+    cohorts = _names(conn, "cohorts", cohort_ids)
+    page = [
+        (row_id, code, date, time_point, types.get(type_id), cohorts.get(cohort_id))
+        for row_id, code, date, time_point, type_id, cohort_id in rows
+    ]
+    cursor = (rows[-1][2], rows[-1][3], rows[-1][0]) if more else None
+    return page, cursor
+
+
+def _names(conn, table, ids):
+    if not ids:
+        return {}
+    placeholders = ", ".join("?" for _ in ids)
+    cur = conn.execute(f"SELECT id, name FROM {table} WHERE id IN ({placeholders})", tuple(ids))
+    return dict(cur.fetchall())
+
+
+def cohort_timeline(conn, cohort_id, after_name=None, limit=COHORT_PAGE_SUBJECTS):
+    # A cohort's draws as subject x time point, one page of subjects (by
+    # name) at a time. Draws without a time point are keyed by their
+    # collection date. Returns (subjects [(id, name)], columns in collection
+    # order, {(subject id, column): [sample IDs]}, next after_name or None).
+    cur = conn.execute(
+        """
+        SELECT DISTINCT j.id, j.name FROM samples s JOIN subjects j ON j.id = s.subject_id
+        WHERE s.cohort_id = ? AND j.name > ? ORDER BY j.name LIMIT ?
+        """,
+        (cohort_id, after_name or "", limit + 1)
+    )
+    page = cur.fetchall()
+    more = len(page) > limit
+    page = page[:limit]
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS timeline_subjects (id INTEGER PRIMARY KEY)")
+    conn.execute("DELETE FROM timeline_subjects")
+    conn.executemany("INSERT INTO timeline_subjects (id) VALUES (?)", [(subject_id,) for subject_id, _ in page])
+    cur = conn.execute(
+        """
+        SELECT s.subject_id, s.animal_id, s.collection_date, s.time_point FROM timeline_subjects t
+        CROSS JOIN samples s ON s.subject_id = t.id
+        WHERE s.cohort_id = ?
+        ORDER BY s.collection_date, s.time_point, s.id
+        """,
+        (cohort_id,)
+    )
+    columns = []
+    cells = {}
+    for subject_id, code, date, time_point in cur.fetchall():
+        column = time_point or date or "(none)"
+        if column not in columns:
+            columns.append(column)
+        cells.setdefault((subject_id, column), []).append(code)
+    conn.execute("DELETE FROM timeline_subjects")
+    return page, columns, cells, (page[-1][1] if more else None)
+
+
+def unlinked_count(conn, cohort_id):
+    # Samples of the cohort with no subject yet
+    cur = conn.execute("SELECT COUNT(*) FROM samples WHERE cohort_id = ? AND subject_id IS NULL", (cohort_id,))
+    return cur.fetchone()[0]
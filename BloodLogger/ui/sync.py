@@ -0,0 +1,447 @@
+import json
+import time
+import uuid
+import sqlite3
+import threading
+
+import lookups
+
+# Offline-tolerant sync between this bench's local database and a central
+# database file (typically on a network share).
+#
+# Local writes never touch the share: triggers queue the changed keys in
+# sync_outbox and SyncEngine pushes them in batches on a worker thread. The
+# central file is a change log (sync_log) plus the current version of every
+# key (sync_rows). A push whose base version (sync_versions) no longer matches
+# the central one is a conflict and is left for the user to resolve. Pulls
+# apply sync_log entries after the last seen sequence number, so the local
+# replica is refreshed incrementally and all reads stay local.
+
+CENTRAL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sync_log (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    entity TEXT NOT NULL,
+    entity_key TEXT NOT NULL,
+    op TEXT NOT NULL,
+    payload TEXT,
+    origin TEXT NOT NULL,
+    changed_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS sync_rows (
+    entity TEXT NOT NULL,
+    entity_key TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    origin TEXT NOT NULL,
+    deleted INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (entity, entity_key)
+) WITHOUT ROWID;
+"""
+
+PUSH_BATCH_SIZE = 500
+PULL_BATCH_SIZE = 2000
+SYNC_INTERVAL = 10  # seconds between background sync rounds
+CENTRAL_TIMEOUT = 30  # seconds to wait for the central file lock
+
+
+# --- settings (stored in the local app_meta table) ---
+
+def get_setting(conn, key, default=None):
+    cur = conn.execute("SELECT value FROM app_meta WHERE key = ?", (key,))
+    row = cur.fetchone()
+    return row[0] if row else default
+
+
+def set_setting(conn, key, value):
+    if value is None:
+        conn.execute("DELETE FROM app_meta WHERE key = ?", (key,))
+    else:
+        conn.execute("INSERT OR REPLACE INTO app_meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+
+def bench_id(conn):
+    value = get_setting(conn, 'sync_bench_id')
+    if not value:
+        value = uuid.uuid4().hex
+        set_setting(conn, 'sync_bench_id', value)
+        conn.commit()
+    return value
+
+
+def is_enabled(conn):
+    return get_setting(conn, 'sync_capture') == '1' and bool(get_setting(conn, 'sync_central_path'))
+
+
+def enable(conn, central_path):
+    # Starts capturing changes and queues every existing row for the first push
+    bench_id(conn)
+    set_setting(conn, 'sync_central_path', central_path)
+    if get_setting(conn, 'sync_capture') != '1':
+        conn.execute("""
+            INSERT INTO sync_outbox (entity, entity_key, op)
+            SELECT 'cohort', uid, 'upsert' FROM cohorts WHERE uid IS NOT NULL
+        """)
+        conn.execute("""
+            INSERT INTO sync_outbox (entity, entity_key, op)
+            SELECT 'sample', barcode_value, 'upsert' FROM samples
+        """)
+        set_setting(conn, 'sync_capture', '1')
+    conn.commit()
+
+
+def disable(conn):
+    set_setting(conn, 'sync_capture', '0')
+    conn.commit()
+
+
+def connect_central(central_path):
+    conn = sqlite3.connect(central_path, timeout=CENTRAL_TIMEOUT)
+    conn.executescript(CENTRAL_SCHEMA)
+    return conn
+
+
+# --- row <-> payload ---
+
+def _sample_payload(conn, barcode_value):
+    cur = conn.execute(
+        """
+        SELECT s.animal_id, s.barcode_value, c.uid, t.name, e.name, s.collection_date,
+            s.time_point, s.notes, s.date_added, p.barcode_value, j.name
+        FROM samples s
+        LEFT JOIN samples p ON p.id = s.parent_id
+        LEFT JOIN subjects j ON j.id = s.subject_id
+        LEFT JOIN cohorts c ON c.id = s.cohort_id
+        LEFT JOIN sample_types t ON t.id = s.sample_type_id
+        LEFT JOIN experimenters e ON e.id = s.experimenter_id
+        WHERE s.barcode_value = ?
+        """,
+        (barcode_value,)
+    )
+    row = cur.fetchone()
+    if not row:
+        return None
+    keys = ["animal_id", "barcode_value", "cohort_uid", "sample_type", "experimenter",
+            "collection_date", "time_point", "notes", "date_added", "parent_barcode", "subject"]
+    return dict(zip(keys, row))
+
+
+def _cohort_payload(conn, uid):
+    cur = conn.execute("SELECT uid, name, experimenter, description, date_created FROM cohorts WHERE uid = ?", (uid,))
+    row = cur.fetchone()
+    if not row:
+        return None
+    return dict(zip(["uid", "name", "experimenter", "description", "date_created"], row))
+
+
+def _build_payload(conn, entity, key):
+    if entity == 'sample':
+        return _sample_payload(conn, key)
+    return _cohort_payload(conn, key)
+
+
+def _apply_change(conn, entity, key, op, payload):
+    # Writes a central change into the local replica. The caller has turned
+    # capture off so this does not echo back into the outbox.
+    if entity == 'cohort':
+        if op == 'delete':
+            conn.execute("DELETE FROM cohorts WHERE uid = ?", (key,))
+            return
+        cur = conn.execute("SELECT id FROM cohorts WHERE uid = ?", (key,))
+        row = cur.fetchone()
+        values = (payload["name"], payload["experimenter"], payload["description"], payload["date_created"])
+        if row:
+            conn.execute(
+                "UPDATE cohorts SET name = ?, experimenter = ?, description = ?, date_created = ?, "
+                "row_version = row_version + 1 WHERE id = ?",
+                values + (row[0],)
+            )
+        else:
+            conn.execute(
+                "INSERT INTO cohorts (name, experimenter, description, date_created, uid) VALUES (?, ?, ?, ?, ?)",
+                values + (key,)
+            )
+        return
+    if op == 'delete':
+        conn.execute("DELETE FROM samples WHERE barcode_value = ?", (key,))
+        return
+    cohort_id = None
+    if payload.get("cohort_uid"):
+        cur = conn.execute("SELECT id FROM cohorts WHERE uid = ?", (payload["cohort_uid"],))
+        row = cur.fetchone()
+        cohort_id = row[0] if row else None
+    # A parent not pulled yet leaves the link empty until the child changes again
+    parent_id = None
+    if payload.get("parent_barcode"):
+        cur = conn.execute("SELECT id FROM samples WHERE barcode_value = ?", (payload["parent_barcode"],))
+        row = cur.fetchone()
+        parent_id = row[0] if row else None
+    values = (
+        cohort_id,
+        payload["animal_id"],
+        lookups.get_or_create_id(conn, 'sample_types', payload.get("sample_type")),
+        lookups.get_or_create_id(conn, 'experimenters', payload.get("experimenter")),
+        payload.get("notes"),
+        payload.get("collection_date"),
+        payload.get("time_point"),
+        parent_id,
+        lookups.get_or_create_id(conn, 'subjects', payload.get("subject")),
+    )
+    cur = conn.execute("SELECT id FROM samples WHERE barcode_value = ?", (key,))
+    row = cur.fetchone()
+    if row:
+        conn.execute(
+            """
+            UPDATE samples SET cohort_id = ?, animal_id = ?, sample_type_id = ?, experimenter_id = ?,
+                notes = ?, collection_date = ?, time_point = ?, parent_id = ?, subject_id = ?,
+                row_version = row_version + 1
+            WHERE id = ?
+            """,
+            values + (row[0],)
+        )
+    else:
+        conn.execute(
+            """
+            INSERT INTO samples (cohort_id, animal_id, sample_type_id, experimenter_id, notes,
+                collection_date, time_point, parent_id, subject_id, barcode_value, date_added)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            values + (key, payload.get("date_added"))
+        )
+
+
+def _local_version(conn, entity, key):
+    cur = conn.execute("SELECT seq FROM sync_versions WHERE entity = ? AND entity_key = ?", (entity, key))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def _set_local_version(conn, entity, key, seq):
+    conn.execute(
+        "INSERT OR REPLACE INTO sync_versions (entity, entity_key, seq) VALUES (?, ?, ?)",
+        (entity, key, seq)
+    )
+
+
+# --- push / pull ---
+
+def push(local, central, origin, batch_size=PUSH_BATCH_SIZE):
+    # Sends one batch of pending outbox entries. Returns (pushed, conflicts).
+    cur = local.execute(
+        "SELECT id, entity, entity_key, op FROM sync_outbox WHERE status = 'pending' ORDER BY id LIMIT ?",
+        (batch_size,)
+    )
+    entries = cur.fetchall()
+    if not entries:
+        return 0, 0
+    # Several edits of one row collapse into one change carrying its latest state
+    latest = {}
+    for entry_id, entity, key, op in entries:
+        latest.setdefault((entity, key), []).append(entry_id)
+    done_ids = []
+    conflicts = {}
+    new_versions = {}
+    central.execute("BEGIN IMMEDIATE")
+    try:
+        for (entity, key), entry_ids in latest.items():
+            base = _local_version(local, entity, key)
+            row = central.execute(
+                "SELECT seq, origin, deleted FROM sync_rows WHERE entity = ? AND entity_key = ?",
+                (entity, key)
+            ).fetchone()
+            payload = _build_payload(local, entity, key)
+            op = 'upsert' if payload is not None else 'delete'
+            if row is not None and row[0] != base:
+                if row[1] == origin and (base is None or row[0] > base):
+                    # Our own earlier push whose local bookkeeping was lost
+                    pass
+                elif op == 'delete' and row[2]:
+                    pass
+                else:
+                    conflicts[(entity, key)] = (entry_ids, f"Changed on another bench (central version {row[0]}).")
+                    continue
+            if op == 'delete' and row is None:
+                done_ids.extend(entry_ids)
+                continue
+            cur = central.execute(
+                "INSERT INTO sync_log (entity, entity_key, op, payload, origin) VALUES (?, ?, ?, ?, ?)",
+                (entity, key, op, json.dumps(payload) if payload is not None else None, origin)
+            )
+            seq = cur.lastrowid
+            central.execute(
+                "INSERT OR REPLACE INTO sync_rows (entity, entity_key, seq, origin, deleted) VALUES (?, ?, ?, ?, ?)",
+                (entity, key, seq, origin, 1 if op == 'delete' else 0)
+            )
+            new_versions[(entity, key)] = seq
+            done_ids.extend(entry_ids)
+        central.commit()
+    except Exception:
+        central.rollback()
+        raise
+    for (entity, key), seq in new_versions.items():
+        _set_local_version(local, entity, key, seq)
+    local.executemany("DELETE FROM sync_outbox WHERE id = ?", [(i,) for i in done_ids])
+    for entry_ids, message in conflicts.values():
+        local.executemany(
+            "UPDATE sync_outbox SET status = 'conflict', message = ? WHERE id = ?",
+            [(message, i) for i in entry_ids]
+        )
+    local.commit()
+    return len(new_versions), len(conflicts)
+
+
+def pull(local, central, origin, batch_size=PULL_BATCH_SIZE):
+    # Applies central changes newer than the last pulled sequence. Keys with
+    # unpushed local changes are skipped; their push will report the conflict.
+    last_seq = int(get_setting(local, 'sync_last_seq', 0))
+    cur = central.execute(
+        "SELECT seq, entity, entity_key, op, payload, origin FROM sync_log WHERE seq > ? ORDER BY seq LIMIT ?",
+        (last_seq, batch_size)
+    )
+    changes = cur.fetchall()
+    if not changes:
+        return 0
+    applied = 0
+    # Off while applying so nothing echoes into the outbox; put back as it
+    # was, so a bench with capture switched off keeps it off
+    capture = get_setting(local, 'sync_capture')
+    set_setting(local, 'sync_capture', '0')
+    try:
+        for seq, entity, key, op, payload, change_origin in changes:
+            last_seq = seq
+            if change_origin == origin:
+                continue
+            pending = local.execute(
+                "SELECT 1 FROM sync_outbox WHERE entity = ? AND entity_key = ? LIMIT 1", (entity, key)
+            ).fetchone()
+            if pending:
+                continue
+            _apply_change(local, entity, key, op, json.loads(payload) if payload else None)
+            _set_local_version(local, entity, key, seq)
+            applied += 1
+        set_setting(local, 'sync_last_seq', last_seq)
+        set_setting(local, 'sync_capture', capture)
+        local.commit()
+    except Exception:
+        local.rollback()
+        raise
+    return applied
+
+
+def sync_once(local, central_path):
+    # One full round: push everything pending, then pull everything new
+    origin = bench_id(local)
+    central = connect_central(central_path)
+    try:
+        pushed = conflicts = pulled = 0
+        while True:
+            n, c = push(local, central, origin)
+            pushed += n
+            conflicts += c
+            if n + c == 0:
+                break
+        while True:
+            n = pull(local, central, origin)
+            pulled += n
+            if n == 0 and not _has_more(local, central):
+                break
+        return pushed, conflicts, pulled
+    finally:
+        central.close()
+
+
+def _has_more(local, central):
+    last_seq = int(get_setting(local, 'sync_last_seq', 0))
+    return central.execute("SELECT 1 FROM sync_log WHERE seq > ? LIMIT 1", (last_seq,)).fetchone() is not None
+
+
+# --- conflicts ---
+
+def list_conflicts(conn):
+    cur = conn.execute("""
+        SELECT entity, entity_key, MAX(message), COUNT(*), MIN(created_at)
+        FROM sync_outbox WHERE status = 'conflict'
+        GROUP BY entity, entity_key ORDER BY MIN(id)
+    """)
+    return cur.fetchall()
+
+
+def pending_count(conn):
+    return conn.execute("SELECT COUNT(*) FROM sync_outbox WHERE status = 'pending'").fetchone()[0]
+
+
+def resolve_conflict(local, central_path, entity, key, keep_local):
+    # keep_local: push this bench's version over the central one.
+    # Otherwise: drop the local change and take the central version.
+    central = connect_central(central_path)
+    try:
+        row = central.execute(
+            "SELECT seq FROM sync_rows WHERE entity = ? AND entity_key = ?", (entity, key)
+        ).fetchone()
+        central_seq = row[0] if row else None
+        if keep_local:
+            if central_seq is not None:
+                _set_local_version(local, entity, key, central_seq)
+            local.execute(
+                "UPDATE sync_outbox SET status = 'pending', message = NULL WHERE entity = ? AND entity_key = ?",
+                (entity, key)
+            )
+            local.commit()
+            return
+        change = central.execute(
+            "SELECT seq, op, payload FROM sync_log WHERE entity = ? AND entity_key = ? ORDER BY seq DESC LIMIT 1",
+            (entity, key)
+        ).fetchone()
+    finally:
+        central.close()
+    capture = get_setting(local, 'sync_capture')
+    set_setting(local, 'sync_capture', '0')
+    try:
+        local.execute("DELETE FROM sync_outbox WHERE entity = ? AND entity_key = ?", (entity, key))
+        if change:
+            _apply_change(local, entity, key, change[1], json.loads(change[2]) if change[2] else None)
+            _set_local_version(local, entity, key, change[0])
+        set_setting(local, 'sync_capture', capture)
+        local.commit()
+    except Exception:
+        local.rollback()
+        raise
+
+
+class SyncEngine(threading.Thread):
+    # Runs sync_once every SYNC_INTERVAL seconds (or when woken) with its own
+    # local connection. on_status is called from this thread with a dict.
+    def __init__(self, connect, on_status, interval=SYNC_INTERVAL):
+        super().__init__(daemon=True)
+        self.connect = connect
+        self.on_status = on_status
+        self.interval = interval
+        self.wake = threading.Event()
+        self.stopped = False
+
+    def sync_now(self):
+        self.wake.set()
+
+    def stop(self):
+        self.stopped = True
+        self.wake.set()
+
+    def run(self):
+        local = self.connect()
+        try:
+            while not self.stopped:
+                status = {"enabled": is_enabled(local), "time": time.strftime("%H:%M:%S")}
+                if status["enabled"]:
+                    try:
+                        status["pushed"], status["conflicts"], status["pulled"] = sync_once(
+                            local, get_setting(local, 'sync_central_path')
+                        )
+                    except (sqlite3.Error, OSError) as e:
+                        # Share offline or locked: changes stay queued locally
+                        local.rollback()
+                        status["error"] = str(e)
+                    status["pending"] = pending_count(local)
+                    status["conflicted"] = len(list_conflicts(local))
+                self.on_status(status)
+                self.wake.wait(self.interval)
+                self.wake.clear()
+        finally:
+            local.close()
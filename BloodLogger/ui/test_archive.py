@@ -0,0 +1,99 @@
+import sqlite3
+
+import pytest
+
+import archive
+import storage
+from conftest import add_sample, open_db
+
+
+def setup_cohort(conn):
+    conn.execute("INSERT INTO app_meta (key, value) VALUES ('sync_capture', '1')")
+    conn.execute("INSERT INTO cohorts (name, uid) VALUES ('Old study', 'uid-1')")
+    conn.commit()
+    ids = [add_sample(conn, f"S{n}", cohort_id=1, notes=f"n{n}") for n in range(3)]
+    aliquot = add_sample(conn, "S0-1", cohort_id=1, parent_id=ids[0])
+    rack = storage.add_rack(conn, storage.add_freezer(conn, "F"), "R")
+    box = storage.add_box(conn, rack, "B", rows=1, cols=4)
+    storage.store(conn, ids, box)
+    conn.execute("DELETE FROM sync_outbox")
+    conn.commit()
+    return ids + [aliquot], box
+
+
+def test_archive_and_restore_round_trip(conn, tmp_path):
+    path = str(tmp_path / "archive.db")
+    ids, box = setup_cohort(conn)
+    before = conn.execute("SELECT * FROM samples ORDER BY id").fetchall()
+    assert archive.archive_cohort(conn, path, 1) == 4
+    assert conn.execute("SELECT COUNT(*) FROM samples").fetchone()[0] == 0
+    assert storage.box_contents(conn, box) == {}
+    (archive_id, name, *_), = archive.list_archived_cohorts(path)
+    assert name == "Old study"
+    assert archive.lookup_archived(path, "S1") is not None
+    assert archive.restore_cohort(conn, path, archive_id) == (1, [])
+    assert conn.execute("SELECT * FROM samples ORDER BY id").fetchall() == before
+    assert sorted(storage.box_contents(conn, box)) == [0, 1, 2]
+    assert conn.execute("SELECT parent_id FROM samples WHERE id = ?", (ids[3],)).fetchone()[0] == ids[0]
+    assert archive.list_archived_cohorts(path) == []
+    # Housekeeping is not synced, and capture is back on afterwards
+    assert conn.execute("SELECT COUNT(*) FROM sync_outbox").fetchone()[0] == 0
+    assert conn.execute("SELECT value FROM app_meta WHERE key = 'sync_capture'").fetchone()[0] == '1'
+
+
+def test_restore_reports_slots_taken_since(conn, tmp_path):
+    path = str(tmp_path / "archive.db")
+    ids, box = setup_cohort(conn)
+    archive.archive_cohort(conn, path, 1)
+    storage.store_at(conn, add_sample(conn, "NEWCOMER"), box, 1)
+    archive_id = archive.list_archived_cohorts(path)[0][0]
+    assert archive.restore_cohort(conn, path, archive_id) == (1, ["S1"])
+    assert storage.box_contents(conn, box)[1][1] == "NEWCOMER"
+    assert storage.location(conn, ids[1]) is None
+
+
+def test_archive_holds_the_write_lock_from_the_read_on(tmp_path, monkeypatch):
+    conn = open_db(str(tmp_path / "live.db"))
+    other = open_db(str(tmp_path / "live.db"))
+    other.execute("PRAGMA busy_timeout = 0")
+    setup_cohort(conn)
+    pause = archive._pause_sync_capture
+    blocked = []
+
+    def pause_while_another_bench_adds(conn):
+        # Runs after the samples are read and before the first write
+        try:
+            add_sample(other, "LATE", cohort_id=1)
+        except sqlite3.OperationalError as e:
+            other.rollback()
+            blocked.append(str(e))
+        return pause(conn)
+
+    monkeypatch.setattr(archive, "_pause_sync_capture", pause_while_another_bench_adds)
+    path = str(tmp_path / "archive.db")
+    assert archive.archive_cohort(conn, path, 1) == 4
+    assert blocked and "locked" in blocked[0]
+    assert archive.list_archived_cohorts(path)[0][4] == 4
+    # Once the cohort is gone the late sample cannot silently join it
+    with pytest.raises(sqlite3.IntegrityError):
+        add_sample(other, "LATE", cohort_id=1)
+
+
+def test_aliquots_in_other_cohorts_are_relinked(conn, tmp_path):
+    path = str(tmp_path / "archive.db")
+    ids, _ = setup_cohort(conn)
+    conn.execute("INSERT INTO cohorts (name) VALUES ('Follow-up')")
+    conn.commit()
+    outside = add_sample(conn, "S1-1", cohort_id=2, parent_id=ids[1])
+    moved = add_sample(conn, "S2-1", cohort_id=2, parent_id=ids[2])
+    archive.archive_cohort(conn, path, 1)
+    assert conn.execute("SELECT parent_id FROM samples WHERE id IN (?, ?)", (outside, moved)).fetchall() == [(None,), (None,)]
+    # One of them gets a new parent while its old one is archived
+    conn.execute("UPDATE samples SET parent_id = ? WHERE id = ?", (outside, moved))
+    conn.commit()
+    archive.restore_cohort(conn, path, archive.list_archived_cohorts(path)[0][0])
+    parents = dict(conn.execute("SELECT id, parent_id FROM samples WHERE cohort_id = 2").fetchall())
+    assert parents == {outside: ids[1], moved: outside}
+    assert conn.execute(
+        "SELECT depth FROM sample_lineage WHERE ancestor_id = ? AND descendant_id = ?", (ids[1], moved)
+    ).fetchone() == (2,)
@@ -0,0 +1,62 @@
+import sqlite3
+import time
+
+import pytest
+
+import audit
+from conftest import add_sample, open_db
+
+
+def test_each_connection_records_its_own_user(tmp_path):
+    path = str(tmp_path / "shared.db")
+    first = open_db(path)
+    second = open_db(path)
+    audit.open_session(first, audit.intern_user(first, "alice"))
+    audit.open_session(second, audit.intern_user(second, "bob"))
+    sample_id = add_sample(first, "S1", notes="a")
+    second.execute("UPDATE samples SET notes = 'b' WHERE id = ?", (sample_id,))
+    second.commit()
+    first.execute("UPDATE samples SET time_point = 'T1' WHERE id = ?", (sample_id,))
+    first.commit()
+    events = audit.history(first, 'samples', sample_id)
+    assert [(e["op"], e["user"]) for e in events] == [("update", "alice"), ("update", "bob"), ("insert", "alice")]
+    assert events[0]["changes"] == {"time_point": [None, "T1"]}
+    assert events[1]["changes"] == {"notes": ["a", "b"]}
+
+
+def test_plain_clients_write_unattributed(tmp_path):
+    path = str(tmp_path / "shared.db")
+    app = open_db(path)
+    audit.open_session(app, audit.intern_user(app, "alice"))
+    # The sqlite3 shell, a DB browser or a script: no session at all
+    plain = sqlite3.connect(path)
+    plain.execute("INSERT INTO samples (animal_id, barcode_value) VALUES ('X', 'X')")
+    plain.execute("UPDATE samples SET notes = 'by hand' WHERE animal_id = 'X'")
+    plain.commit()
+    sample_id = plain.execute("SELECT id FROM samples WHERE animal_id = 'X'").fetchone()[0]
+    app.execute("UPDATE samples SET notes = 'in the app' WHERE id = ?", (sample_id,))
+    app.commit()
+    events = audit.history(app, 'samples', sample_id)
+    assert [(e["op"], e["user"]) for e in events] == [("update", "alice"), ("update", None), ("insert", None)]
+    with pytest.raises(sqlite3.IntegrityError, match="append-only"):
+        plain.execute("DELETE FROM audit_events")
+    plain.rollback()
+    assert app.execute("SELECT COUNT(*) FROM audit_events").fetchone()[0] == 3
+
+
+def test_events_are_append_only_outside_rollover(conn, tmp_path):
+    audit.open_session(conn, audit.intern_user(conn, "alice"))
+    add_sample(conn, "S1")
+    add_sample(conn, "S2")
+    with pytest.raises(sqlite3.IntegrityError, match="append-only"):
+        conn.execute("DELETE FROM audit_events")
+    conn.rollback()
+    assert audit.roll_segment(conn, str(tmp_path / "segments"), time.time() + 1) == 2
+    assert conn.execute("SELECT COUNT(*) FROM audit_events").fetchone()[0] == 0
+    # The guard is back once the segment is written
+    add_sample(conn, "S3")
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("DELETE FROM audit_events")
+    conn.rollback()
+    path = audit.list_segments(conn)[0][0]
+    assert [(e["op"], e["user"]) for e in audit.segment_history(path, 'samples', 1)] == [("insert", "alice")]
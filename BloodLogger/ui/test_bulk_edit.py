@@ -0,0 +1,86 @@
+import pytest
+
+import bulk_edit
+import lookups
+import versioning
+from conftest import add_sample
+
+
+@pytest.fixture
+def ids(conn):
+    conn.execute("INSERT INTO sample_types (name) VALUES ('serum')")
+    return [
+        add_sample(conn, f"S{n}", sample_type_id=1, collection_date="2024-03-01", notes=f"note {n}")
+        for n in range(5)
+    ]
+
+
+def values(conn, sample_ids):
+    placeholders = ", ".join("?" for _ in sample_ids)
+    cur = conn.execute(
+        f"SELECT sample_type_id, collection_date, time_point, notes FROM samples WHERE id IN ({placeholders}) ORDER BY id",
+        sample_ids
+    )
+    return cur.fetchall()
+
+
+def test_preview_lists_only_real_changes(conn, ids):
+    rows = bulk_edit.preview(conn, ids[:2], {'sample_type': 'serum', 'time_point': 'T1', 'date_shift': -1})
+    assert rows == [
+        ("S0", "time_point", None, "T1"), ("S0", "collection_date", "2024-03-01", "2024-02-29"),
+        ("S1", "time_point", None, "T1"), ("S1", "collection_date", "2024-03-01", "2024-02-29"),
+    ]
+    assert len(bulk_edit.preview(conn, ids, {'notes': ''}, limit=3)) == 3
+
+
+def test_apply_in_batches_and_undo(conn, ids):
+    before = values(conn, ids)
+    edit_id = bulk_edit.apply(conn, ids[:4], {'sample_type': 'plasma', 'time_point': 'T1', 'notes': ''}, batch_size=3)
+    plasma = lookups.find_id(conn, 'sample_types', 'plasma')
+    assert values(conn, ids[:4]) == [(plasma, "2024-03-01", "T1", None)] * 4
+    assert values(conn, ids[4:]) == before[4:]
+    assert bulk_edit.last_undoable(conn) == (edit_id, "sample_type = plasma, time_point = T1, notes = (empty)", 4)
+    assert bulk_edit.undo(conn, edit_id) == (4, [])
+    assert values(conn, ids) == before
+    assert bulk_edit.last_undoable(conn) is None
+    with pytest.raises(ValueError, match="already undone"):
+        bulk_edit.undo(conn, edit_id)
+    with pytest.raises(ValueError, match="not found"):
+        bulk_edit.undo(conn, edit_id + 1)
+
+
+def test_date_shift(conn, ids):
+    edit_id = bulk_edit.apply(conn, ids, {'date_shift': 30})
+    assert {row[1] for row in values(conn, ids)} == {"2024-03-31"}
+    bulk_edit.undo(conn, edit_id)
+    assert {row[1] for row in values(conn, ids)} == {"2024-03-01"}
+    with pytest.raises(ValueError):
+        bulk_edit.apply(conn, ids, {'date_shift': 1, 'collection_date': "2024-01-01"})
+    with pytest.raises(ValueError):
+        bulk_edit.apply(conn, ids, {'colour': 'red'})
+    with pytest.raises(ValueError):
+        bulk_edit.apply(conn, ids, {})
+    assert conn.execute("SELECT COUNT(*) FROM bulk_edits").fetchone()[0] == 1
+
+
+def test_undo_skips_samples_changed_since(conn, ids):
+    edit_id = bulk_edit.apply(conn, ids[:3], {'notes': 'bulk'})
+    # A later save of one sample and a later bulk edit of another
+    version = versioning.load(conn, 'samples', ids[0], ['notes'])[1]
+    versioning.save(conn, 'samples', ids[0], version, {'notes': 'hand edit'})
+    bulk_edit.apply(conn, [ids[1]], {'time_point': 'T9'})
+    conn.execute("DELETE FROM samples WHERE id = ?", (ids[2],))
+    conn.commit()
+    assert bulk_edit.undo(conn, edit_id) == (0, ["S0", "S1"])
+    assert values(conn, ids[:2]) == [(1, "2024-03-01", None, "hand edit"), (1, "2024-03-01", "T9", "bulk")]
+
+
+def test_undo_restores_the_untouched_rows(conn, ids):
+    edit_id = bulk_edit.apply(conn, ids, {'notes': 'bulk'})
+    version = versioning.load(conn, 'samples', ids[2], ['notes'])[1]
+    versioning.save(conn, 'samples', ids[2], version, {'notes': 'kept'})
+    assert bulk_edit.undo(conn, edit_id) == (4, ["S2"])
+    assert [row[3] for row in values(conn, ids)] == ["note 0", "note 1", "kept", "note 3", "note 4"]
+    # Undo bumped the versions too, so editors holding the bulk version conflict
+    with pytest.raises(versioning.ConflictError):
+        versioning.save(conn, 'samples', ids[0], version, {'notes': 'stale'})
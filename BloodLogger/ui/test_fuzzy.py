@@ -0,0 +1,75 @@
+import fuzzy
+from conftest import add_sample
+
+
+def stored_grams(conn, sample_id):
+    cur = conn.execute("SELECT gram, pos FROM code_grams WHERE sample_id = ?", (sample_id,))
+    return set(cur.fetchall())
+
+
+def test_grams_are_anchored_from_the_nearer_end():
+    assert fuzzy.grams("ab12") == [("^AB", 0), ("AB1", 1), ("B12", -2), ("12$", -1)]
+    assert fuzzy.grams("abc") == [("^AB", 0), ("ABC", 1), ("BC$", -1)]
+    assert fuzzy.grams("") == []
+
+
+def test_grams_near_the_middle_are_tried_from_both_ends():
+    both = fuzzy.grams("ab12", both_anchors_near_middle=True)
+    assert set(both) - set(fuzzy.grams("ab12")) == {("AB1", -3), ("B12", 2), ("12$", 3)}
+    # A deletion shifts the back half of the code; the middle trigram of the
+    # longer code is still found at the position the shorter one stores
+    long_code, short_code = "XY123456", "XY12456"
+    assert set(fuzzy.grams(long_code, True)) & set(fuzzy.grams(short_code))
+
+
+def test_triggers_store_the_same_grams(conn):
+    sample_id = add_sample(conn, "ab-0042")
+    assert stored_grams(conn, sample_id) == set(fuzzy.grams("ab-0042"))
+    conn.execute("UPDATE samples SET animal_id = 'AB-0043', barcode_value = 'AB-0043' WHERE id = ?", (sample_id,))
+    conn.commit()
+    assert stored_grams(conn, sample_id) == set(fuzzy.grams("AB-0043"))
+    fuzzy.rebuild_index(conn)
+    assert stored_grams(conn, sample_id) == set(fuzzy.grams("AB-0043"))
+    conn.execute("DELETE FROM samples WHERE id = ?", (sample_id,))
+    conn.commit()
+    assert stored_grams(conn, sample_id) == set()
+
+
+def test_one_edit_variants():
+    variants = fuzzy.one_edit_variants("A12")
+    assert {"A13", "A2", "1A2", "A21", "A123", "XA12", "A1-2"} <= variants
+    assert "A12" not in variants
+    assert "21A" not in variants
+    assert all(fuzzy.edit_distance("A12", v) == 1 for v in variants)
+
+
+def test_edit_distance():
+    assert fuzzy.edit_distance("ABC", "ABC") == 0
+    assert fuzzy.edit_distance("ABC", "ACB") == 1
+    assert fuzzy.edit_distance("ABC", "AXC") == 1
+    assert fuzzy.edit_distance("ABCD", "ABD") == 1
+    assert fuzzy.edit_distance("ABCD", "BADC") == 2
+    assert fuzzy.edit_distance("ABCD", "WXYZ") == 3
+    assert fuzzy.edit_distance("A", "ABCDEF") == 3
+    assert fuzzy.edit_distance("ABCD", "WXYZ", limit=5) == 4
+
+
+def test_near_matches_among_dense_sequential_ids(conn):
+    for n in range(1, 300):
+        add_sample(conn, f"M{n:05d}")
+    matches = fuzzy.near_matches(conn, "M00124", limit=100, max_distance=1)
+    assert ("M00124", "M00124", 0) in matches
+    assert {code for code, _, distance in matches if distance == 1} >= {"M00123", "M00125", "M00104", "M00142"}
+    # Transposition, deletion and insertion each count as one edit
+    assert ("M00241", "M00241", 1) in fuzzy.near_matches(conn, "M00421", limit=100, max_distance=1)
+    assert ("M00241", "M00241", 1) in fuzzy.near_matches(conn, "M0241", max_distance=1)
+    assert ("M00241", "M00241", 1) in fuzzy.near_matches(conn, "M000241", max_distance=1)
+    assert fuzzy.near_matches(conn, "  ") == []
+    assert fuzzy.near_matches(conn, "ZZZZZZZZ") == []
+
+
+def test_near_matches_uses_the_barcode_too(conn):
+    sample_id = add_sample(conn, "RAT-7")
+    conn.execute("UPDATE samples SET barcode_value = 'BC998877' WHERE id = ?", (sample_id,))
+    conn.commit()
+    assert fuzzy.near_matches(conn, "BC998787") == [("RAT-7", "BC998877", 1)]
@@ -0,0 +1,100 @@
+import pytest
+
+import id_allocator
+from conftest import add_sample
+
+
+def allocate(conn, prefix, count, **kwargs):
+    ids = id_allocator.allocate(conn, prefix, count, **kwargs)
+    conn.commit()
+    return ids
+
+
+def test_counter_seeds_from_existing_ids(conn):
+    for code in ("M7", "M12", "MX99", "M3a"):
+        add_sample(conn, code)
+    assert id_allocator.peek_next(conn, "M", 2) == ["M13", "M14"]
+    assert allocate(conn, "M", 2) == ["M13", "M14"]
+    assert allocate(conn, "M", 1) == ["M15"]
+    assert allocate(conn, "NEW", 1) == ["NEW0"]
+
+
+def test_allocation_skips_reserved_ranges(conn):
+    id_allocator.reserve_range(conn, "R", 3, 5, reserved_by="Study A")
+    id_allocator.reserve_range(conn, "R", 6, 6)
+    id_allocator.reserve_range(conn, "R", 9, 20)
+    conn.commit()
+    # A block that does not fit before a reservation starts after it
+    assert allocate(conn, "R", 3) == ["R0", "R1", "R2"]
+    assert id_allocator.peek_next(conn, "R", 3) == ["R21", "R22", "R23"]
+    assert id_allocator.peek_next(conn, "R", 2) == ["R7", "R8"]
+    assert allocate(conn, "R", 2) == ["R7", "R8"]
+    assert allocate(conn, "R", 1) == ["R21"]
+    kinds = conn.execute(
+        "SELECT start_number, end_number, kind, reserved_by FROM id_reservations WHERE prefix = 'R' ORDER BY start_number"
+    ).fetchall()
+    assert kinds[0] == (0, 2, 'allocated', None)
+    assert kinds[1] == (3, 5, 'reserved', "Study A")
+
+
+def test_allocation_skips_hand_entered_ids(conn):
+    allocate(conn, "H", 1, reserved_by="Cohort 1")
+    add_sample(conn, "H2")
+    add_sample(conn, "H4")
+    # The preview runs the same check, so it shows what allocate hands out
+    assert id_allocator.peek_next(conn, "H", 2) == ["H5", "H6"]
+    assert allocate(conn, "H", 2) == ["H5", "H6"]
+    assert conn.execute("SELECT reserved_by FROM id_reservations WHERE start_number = 0").fetchone()[0] == "Cohort 1"
+
+
+def test_reservation_errors(conn):
+    allocate(conn, "E", 5)
+    # E5 was entered by hand, so the next block starts at E6 and the counter
+    # moves past a number no reservation covers
+    add_sample(conn, "E5")
+    assert allocate(conn, "E", 1) == ["E6"]
+    id_allocator.reserve_range(conn, "E", 10, 19)
+    conn.commit()
+    for start, end, message in ((15, 25, "overlaps E 10-19"), (3, 4, "overlaps E 0-4"), (5, 5, "below 7"), (30, 29, "before")):
+        with pytest.raises(id_allocator.AllocationError, match=message):
+            id_allocator.reserve_range(conn, "E", start, end)
+        conn.rollback()
+    with pytest.raises(id_allocator.AllocationError):
+        id_allocator.allocate(conn, "", 1)
+    with pytest.raises(id_allocator.AllocationError):
+        id_allocator.allocate(conn, "E", 0)
+
+
+def test_peek_next_caches_seeds(conn):
+    add_sample(conn, "P41")
+    seeds = {}
+    assert id_allocator.peek_next(conn, "P", seeds=seeds) == ["P42"]
+    assert seeds == {"P": 42}
+    add_sample(conn, "P50")
+    assert id_allocator.peek_next(conn, "P", seeds=seeds) == ["P42"]
+    assert id_allocator.peek_next(conn, "P") == ["P51"]
+    # Peeking never creates the counter
+    assert id_allocator.list_prefixes(conn) == []
+
+
+def test_prefix_format(conn):
+    id_allocator.set_prefix_format(conn, "F", 4, "{prefix}-{number:0{width}d}")
+    conn.commit()
+    assert allocate(conn, "F", 2) == ["F-0000", "F-0001"]
+    assert id_allocator.list_prefixes(conn) == [("F", 2, 4, "{prefix}-{number:0{width}d}", 0)]
+    for bad in ("{prefix}{nmber}", "{prefix}{number", "{prefix}", "{0}{number}", "{number:q}", "{prefix.x}{number}"):
+        with pytest.raises(ValueError):
+            id_allocator.set_prefix_format(conn, "F", 4, bad)
+
+
+def test_allocation_only_consults_reservations(conn):
+    for _ in range(50):
+        allocate(conn, "K", 1)
+    id_allocator.reserve_range(conn, "K", 50, 52)
+    conn.commit()
+    assert allocate(conn, "K", 1) == ["K53"]
+    plan = " ".join(row[3] for row in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT MAX(end_number) FROM id_reservations "
+        "WHERE prefix = 'K' AND kind = 'reserved' AND start_number <= 60 AND end_number >= 60"
+    ))
+    assert "idx_id_reservations_kind" in plan
@@ -0,0 +1,61 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import label_sheets
+from conftest import add_sample
+
+SHEET = "Avery 5160 (Letter, 30 per sheet)"
+
+
+def labels(count):
+    return [(f"M{n:05d}", "serum", "2024-03-01") for n in range(count)]
+
+
+def test_pdf_sheets_render_in_process(tmp_path):
+    path = str(tmp_path / "labels.pdf")
+    assert label_sheets.render_sheets(labels(61), path, SHEET) == 3
+    with open(path, "rb") as f:
+        data = f.read()
+    assert data.startswith(b"%PDF") and b"/Count 3 " in data
+    with pytest.raises(ValueError):
+        label_sheets.render_sheets(labels(1), path, "Letter, 7 per sheet")
+
+
+def test_png_pages_through_the_pool_match_in_process(tmp_path):
+    pytest.importorskip("PIL")
+    pooled = str(tmp_path / "pool" / "labels.png")
+    single = str(tmp_path / "single" / "labels.png")
+    os.makedirs(os.path.dirname(pooled))
+    os.makedirs(os.path.dirname(single))
+    count = 30 * (label_sheets.MIN_PAGES_FOR_POOL + 1) - 7
+    assert label_sheets.render_sheets(labels(count), pooled, SHEET, workers=2) == 5
+    assert label_sheets.render_sheets(labels(count), single, SHEET, workers=1) == 5
+    for page in range(1, 6):
+        with open(f"{pooled[:-4]}_{page:04d}.png", "rb") as a, open(f"{single[:-4]}_{page:04d}.png", "rb") as b:
+            content = a.read()
+            assert content.startswith(b"\x89PNG") and content == b.read()
+
+
+def test_importing_main_window_does_not_open_the_database(tmp_path):
+    # What a spawned PNG worker does: import the main module without running it
+    pytest.importorskip("PyQt5")
+    pytest.importorskip("win32print")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([os.path.dirname(__file__)] + sys.path))
+    result = subprocess.run(
+        [sys.executable, "-c", "import main_window"], cwd=str(tmp_path), env=env,
+        capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    assert "[DEBUG]" not in result.stdout
+    assert not os.path.exists(tmp_path / "db")
+
+
+def test_sample_labels_follow_the_selection(conn):
+    conn.execute("INSERT INTO sample_types (name) VALUES ('plasma')")
+    ids = [add_sample(conn, code, sample_type_id=1, collection_date="2024-01-02") for code in ("A", "B", "C")]
+    assert list(label_sheets.sample_labels(conn, [ids[2], ids[0]])) == [
+        ("C", "plasma", "2024-01-02"), ("A", "plasma", "2024-01-02")
+    ]
@@ -0,0 +1,105 @@
+import sqlite3
+
+import pytest
+
+from conftest import add_sample
+
+# The closure triggers in schema.sql are checked against the closure
+# recomputed from samples.parent_id after every kind of edit.
+
+
+def closure(conn):
+    return set(conn.execute("SELECT ancestor_id, descendant_id, depth FROM sample_lineage").fetchall())
+
+
+def expected_closure(conn):
+    parents = dict(conn.execute("SELECT id, parent_id FROM samples").fetchall())
+    pairs = set()
+    for sample_id in parents:
+        depth, parent_id = 1, parents[sample_id]
+        while parent_id is not None:
+            pairs.add((parent_id, sample_id, depth))
+            depth, parent_id = depth + 1, parents[parent_id]
+    return pairs
+
+
+def tree(conn):
+    # root
+    # ├── a ── a1 ── a1x
+    # └── b ── b1
+    ids = {"root": add_sample(conn, "R")}
+    for name, parent in (("a", "root"), ("a1", "a"), ("a1x", "a1"), ("b", "root"), ("b1", "b")):
+        ids[name] = add_sample(conn, name.upper(), parent_id=ids[parent])
+    return ids
+
+
+def test_insert_adds_every_ancestor(conn):
+    ids = tree(conn)
+    assert closure(conn) == expected_closure(conn)
+    assert (ids["root"], ids["a1x"], 3) in closure(conn)
+
+
+def test_reparent_moves_the_whole_subtree(conn):
+    ids = tree(conn)
+    conn.execute("UPDATE samples SET parent_id = ? WHERE id = ?", (ids["b1"], ids["a"]))
+    conn.commit()
+    assert closure(conn) == expected_closure(conn)
+    assert (ids["root"], ids["a1x"], 5) in closure(conn)
+
+
+def test_detach_and_reattach(conn):
+    ids = tree(conn)
+    conn.execute("UPDATE samples SET parent_id = NULL WHERE id = ?", (ids["a1"],))
+    conn.commit()
+    assert closure(conn) == expected_closure(conn)
+    assert not conn.execute("SELECT 1 FROM sample_lineage WHERE descendant_id = ? AND ancestor_id = ?",
+                            (ids["a1x"], ids["root"])).fetchone()
+    conn.execute("UPDATE samples SET parent_id = ? WHERE id = ?", (ids["b"], ids["a1"]))
+    conn.commit()
+    assert closure(conn) == expected_closure(conn)
+
+
+def test_cycles_are_rejected(conn):
+    ids = tree(conn)
+    before = closure(conn)
+    for child in ("root", "a"):
+        with pytest.raises(sqlite3.IntegrityError, match="derived from itself"):
+            conn.execute("UPDATE samples SET parent_id = ? WHERE id = ?", (ids["a1x"], ids[child]))
+        conn.rollback()
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("UPDATE samples SET parent_id = id WHERE id = ?", (ids["b"],))
+    conn.rollback()
+    assert closure(conn) == before
+
+
+def test_delete_drops_pairs_of_the_deleted_sample(conn):
+    ids = tree(conn)
+    conn.execute("UPDATE samples SET parent_id = NULL WHERE parent_id = ?", (ids["b"],))
+    conn.execute("DELETE FROM samples WHERE id = ?", (ids["b"],))
+    conn.commit()
+    assert closure(conn) == expected_closure(conn)
+
+
+def test_lineage_queries(conn):
+    lineage = pytest.importorskip("lineage")
+    ids = tree(conn)
+    assert lineage.root_of(conn, ids["a1x"]) == ids["root"]
+    assert lineage.root_of(conn, ids["root"]) == ids["root"]
+    assert [depth for _, _, depth in lineage.ancestors(conn, ids["a1x"])] == [1, 2, 3]
+    assert [code for _, code, _ in lineage.descendants(conn, ids["a"])] == ["A1", "A1X"]
+    assert [code for _, code, _, _ in lineage.family(conn, ids["b1"])] == ["R", "A", "A1", "A1X", "B", "B1"]
+    assert lineage.has_family(conn, ids["b1"])
+    assert not lineage.has_family(conn, add_sample(conn, "LONE"))
+
+
+def test_create_aliquots_numbers_around_taken_codes(conn):
+    lineage = pytest.importorskip("lineage")
+    parent = add_sample(conn, "P")
+    add_sample(conn, "P-2")
+    created = lineage.create_aliquots(conn, [parent], [("serum", 2), ("plasma", 1)])
+    assert [code for _, code in created] == ["P-1", "P-3", "P-4"]
+    more = lineage.create_aliquots(conn, [parent], [("serum", 1)])
+    assert [code for _, code in more] == ["P-5"]
+    assert closure(conn) == expected_closure(conn)
+    with pytest.raises(ValueError):
+        lineage.create_aliquots(conn, [parent], [("serum", 0)])
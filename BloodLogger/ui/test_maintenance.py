@@ -0,0 +1,119 @@
+import json
+import os
+import sqlite3
+import time
+
+import maintenance
+from conftest import add_sample, open_db
+
+LATER = float("inf")
+
+
+def meta(conn, key):
+    return maintenance._meta(conn, key)
+
+
+class CheckConn:
+    # A connection whose quick_check of one table reports result, or runs
+    # past its budget when result is None
+    def __init__(self, conn, table, result=None):
+        self.conn = conn
+        self.table = table
+        self.result = result
+
+    def execute(self, sql, *args):
+        if sql == f'PRAGMA quick_check("{self.table}")':
+            if self.result is None:
+                self.conn.set_progress_handler(lambda: 1, 1)
+            else:
+                return self.conn.execute("SELECT ?", (self.result,))
+        return self.conn.execute(sql, *args)
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+
+def test_budget_aborts_a_running_statement(conn, monkeypatch):
+    conn.executemany(
+        "INSERT INTO samples (animal_id, barcode_value) VALUES (?, ?)",
+        [(f"S{n}", f"S{n}") for n in range(2000)]
+    )
+    conn.commit()
+    # The deadline has passed before ANALYZE starts, so the progress handler
+    # stops it at its first callback
+    monkeypatch.setitem(maintenance.TASKS, 'optimize', (maintenance.optimize, None, -1.0))
+    assert maintenance.run_task(conn, 'optimize') == ("partial", "stopped after the -1s budget")
+    assert conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone() is None
+    assert maintenance.recent_runs(conn)[0][1:3] == ('optimize', 'partial')
+    # The handler was removed afterwards
+    assert conn.execute("SELECT COUNT(*) FROM samples").fetchone()[0] == 2000
+
+
+def test_table_larger_than_the_budget_is_passed_over(conn):
+    tables = maintenance._tables(conn)
+    status, detail = maintenance.quick_check(CheckConn(conn, tables[0]), LATER)
+    assert status == "partial" and detail == f"{tables[0]} not checked within the time budget"
+    assert meta(conn, maintenance.CHECK_NEXT_KEY) == tables[1]
+    # The handler is off again for the bookkeeping and whatever runs next
+    assert conn.execute("SELECT COUNT(*) FROM samples").fetchone()[0] == 0
+
+
+def test_quick_check_resumes_where_it_stopped(conn, monkeypatch):
+    tables = maintenance._tables(conn)
+    budget = [3]
+
+    def tables_left_in_budget(deadline):
+        if not budget[0]:
+            raise maintenance.BudgetExceeded()
+        budget[0] -= 1
+
+    monkeypatch.setattr(maintenance, "_check_deadline", tables_left_in_budget)
+    assert maintenance.quick_check(conn, LATER) == ("partial", f"checked 3 of {len(tables)} table(s)")
+    assert meta(conn, maintenance.CHECK_NEXT_KEY) == tables[3]
+    assert maintenance._check_due(conn, 'quick_check')
+    budget[0] = len(tables) - 3
+    assert maintenance.quick_check(conn, LATER) == ("ok", f"checked {len(tables)} table(s)")
+    assert meta(conn, maintenance.CHECK_NEXT_KEY) == ""
+
+
+def test_damaged_code_grams_are_rebuilt_from_samples(conn):
+    for code in ("M100", "M101"):
+        add_sample(conn, code)
+    expected = conn.execute("SELECT * FROM code_grams ORDER BY 1, 2, 3").fetchall()
+    status, detail = maintenance.quick_check(
+        CheckConn(conn, "code_grams", "Tree 12 page 34: btreeInitPage() returns error code 11"), LATER
+    )
+    assert status == "error" and "page 34" in detail
+    assert json.loads(meta(conn, maintenance.REINDEX_KEY)) == ["code_grams"]
+    assert maintenance._reindex_due(conn, 'rebuild_indexes')
+    conn.execute("DELETE FROM code_grams WHERE pos > 0")
+    conn.commit()
+    assert maintenance.rebuild_indexes(conn, LATER) == ("ok", "rebuilt code_grams")
+    assert conn.execute("SELECT * FROM code_grams ORDER BY 1, 2, 3").fetchall() == expected
+    assert json.loads(meta(conn, maintenance.REINDEX_KEY)) == []
+
+
+def test_incremental_vacuum_returns_free_pages(tmp_path):
+    path = str(tmp_path / "vacuum.db")
+    conn = open_db(path)
+    conn.execute("CREATE TABLE scratch (data BLOB)")
+    conn.executemany("INSERT INTO scratch (data) VALUES (zeroblob(?))", [(4000,)] * 500)
+    conn.commit()
+    conn.execute("DELETE FROM scratch")
+    conn.commit()
+    size = os.path.getsize(path)
+    assert maintenance._vacuum_due(conn, 'incremental_vacuum')
+    status, detail = maintenance.incremental_vacuum(conn, time.monotonic() + 60)
+    assert status == "ok" and detail.startswith("released ")
+    assert conn.execute("PRAGMA freelist_count").fetchone()[0] == 0
+    assert os.path.getsize(path) < size / 2
+    assert not maintenance._vacuum_due(conn, 'incremental_vacuum')
+    conn.close()
+
+
+def test_incremental_vacuum_needs_the_incremental_mode(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "plain.db"))
+    conn.execute("CREATE TABLE t (x)")
+    assert maintenance.incremental_vacuum(conn, LATER) == ("skipped", "auto_vacuum is not INCREMENTAL")
+    assert not maintenance._vacuum_due(conn, 'incremental_vacuum')
+    conn.close()
@@ -0,0 +1,113 @@
+import sqlite3
+
+import audit
+import maintenance
+import migrations
+from conftest import SCHEMA_PATH, open_db
+
+# The schema before any migration existed (user_version 0)
+LEGACY_SCHEMA = """
+CREATE TABLE cohorts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    experimenter TEXT,
+    description TEXT,
+    date_created TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE samples (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    cohort_id INTEGER,
+    animal_id TEXT NOT NULL,
+    species TEXT,
+    sex TEXT,
+    notes TEXT,
+    barcode_value TEXT UNIQUE NOT NULL,
+    date_added TEXT DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (cohort_id) REFERENCES cohorts(id) ON DELETE CASCADE
+);
+"""
+
+
+def legacy_db(path):
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.execute("INSERT INTO cohorts (name) VALUES ('Old cohort')")
+    conn.executemany(
+        "INSERT INTO samples (cohort_id, animal_id, species, sex, barcode_value, date_added) VALUES (1, ?, ?, ?, ?, ?)",
+        [
+            ("A1", " serum ", "alice", "A1", "2023-05-01 10:00:00"),
+            ("A2", "plasma", "", "A2", "2023-05-02 11:00:00"),
+            ("A3", None, "bob", "A3", None),
+        ]
+    )
+    conn.commit()
+    return conn
+
+
+def upgrade(conn):
+    # What the app does at startup
+    audit.open_session(conn, None)
+    migrations.migrate(conn)
+    with open(SCHEMA_PATH) as f:
+        conn.executescript(f.read())
+
+
+def test_new_database_starts_at_latest_version(tmp_path):
+    conn = open_db(str(tmp_path / "new.db"))
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(migrations.MIGRATIONS)
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+
+def test_legacy_database_runs_the_whole_chain(tmp_path):
+    conn = legacy_db(str(tmp_path / "legacy.db"))
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 0
+    upgrade(conn)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(migrations.MIGRATIONS)
+    # Startup leaves the full VACUUM to the idle maintenance worker
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 0
+    assert maintenance.due_tasks(conn)[:2] == ['optimize', 'convert_auto_vacuum']
+    assert maintenance.run_task(conn, 'convert_auto_vacuum')[0] == "ok"
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    assert 'convert_auto_vacuum' not in maintenance.due_tasks(conn)
+    samples = migrations.column_names(conn, "samples")
+    assert {"sample_type_id", "experimenter_id", "collection_date", "time_point",
+            "parent_id", "subject_id", "row_version"} <= samples
+    assert {"uid", "row_version"} <= migrations.column_names(conn, "cohorts")
+    assert "row_version" in migrations.column_names(conn, "bulk_edit_rows")
+    rows = conn.execute(
+        """
+        SELECT s.animal_id, t.name, e.name, s.collection_date, s.species, s.sex, s.row_version
+        FROM samples s
+        LEFT JOIN sample_types t ON t.id = s.sample_type_id
+        LEFT JOIN experimenters e ON e.id = s.experimenter_id
+        ORDER BY s.id
+        """
+    ).fetchall()
+    assert rows == [
+        ("A1", "serum", "alice", "2023-05-01", None, None, 1),
+        ("A2", "plasma", None, "2023-05-02", None, None, 1),
+        ("A3", None, "bob", None, None, None, 1),
+    ]
+    assert conn.execute("SELECT uid FROM cohorts").fetchone()[0]
+
+
+def test_migrations_resume_from_any_version(tmp_path):
+    conn = legacy_db(str(tmp_path / "partial.db"))
+    audit.open_session(conn, None)
+    for index in range(3):
+        migrations.MIGRATIONS[index](conn)
+        conn.execute(f"PRAGMA user_version = {index + 1}")
+    conn.commit()
+    upgrade(conn)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(migrations.MIGRATIONS)
+    assert "row_version" in migrations.column_names(conn, "samples")
+
+
+def test_restart_is_a_no_op(tmp_path):
+    path = str(tmp_path / "twice.db")
+    conn = legacy_db(path)
+    upgrade(conn)
+    before = conn.execute("SELECT * FROM samples ORDER BY id").fetchall()
+    upgrade(conn)
+    assert conn.execute("SELECT * FROM samples ORDER BY id").fetchall() == before
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(migrations.MIGRATIONS)
@@ -0,0 +1,108 @@
+import re
+import socket
+import time
+
+import pytest
+
+from conftest import add_sample, zebra_standin
+
+pytest.importorskip("win32print")
+import print_jobs  # noqa: E402
+
+
+def printed_codes(state):
+    # Sample IDs in the order the stand-in printed them, once its buffer is empty
+    deadline = time.monotonic() + 10
+    while state.formats and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return [re.search(r"\^FD>:(.*?)\^FS", label).group(1) for label in state.labels]
+
+
+def dead_address():
+    # A port nothing listens on
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return f"tcp://127.0.0.1:{sock.getsockname()[1]}"
+
+
+def new_samples(conn, codes, queued=True):
+    samples = [(add_sample(conn, code), code) for code in codes]
+    if queued:
+        # As the app does when it creates them
+        print_jobs.queue_labels(conn, [sid for sid, _ in samples])
+        conn.commit()
+    return samples
+
+
+def jobs(conn):
+    return conn.execute("SELECT printer, label_count, outcome FROM print_jobs ORDER BY id").fetchall()
+
+
+def test_print_state_and_job_history(conn, standins):
+    state = zebra_standin.PrinterState(capacity=20, label_seconds=0.002)
+    address = standins(state)
+    samples = new_samples(conn, ["A", "B", "C", "D", "E"])
+    assert [code for _, code in print_jobs.unprinted(conn)] == ["A", "B", "C", "D", "E"]
+    assert print_jobs.print_samples(conn, samples[:3], address, batch_size=2) == (3, 0)
+    assert printed_codes(state) == ["A", "B", "C"]
+    assert jobs(conn) == [(address, 2, "printed"), (address, 1, "printed")]
+    assert [code for _, code in print_jobs.unprinted(conn)] == ["D", "E"]
+    # A reprint goes out as one job and counts as a second attempt
+    print_jobs.mark_unprinted(conn, [samples[0][0]])
+    assert print_jobs.reprint_unprinted(conn, printer_name=address) == (3, 0)
+    assert printed_codes(state) == ["A", "B", "C", "A", "D", "E"]
+    assert jobs(conn)[-1] == (address, 3, "printed")
+    assert print_jobs.unprinted(conn) == []
+    history = conn.execute(
+        "SELECT job_id, outcome FROM print_history WHERE sample_id = ? ORDER BY job_id", (samples[0][0],)
+    ).fetchall()
+    assert history == [(1, "printed"), (3, "printed")]
+    assert conn.execute(
+        "SELECT status, attempts, last_job_id FROM sample_print_state WHERE sample_id = ?", (samples[0][0],)
+    ).fetchone() == ("printed", 2, 3)
+
+
+def test_connection_lost_mid_run_counts_what_was_sent(conn, standins):
+    state = zebra_standin.PrinterState(capacity=20, label_seconds=0.02)
+    address = standins(state)
+    samples = new_samples(conn, [f"S{n:02d}" for n in range(20)])
+
+    def on_status(result):
+        # The cable comes out once the first buffer load is in the printer
+        if result["status"].formats_in_buffer:
+            state.unplugged = True
+
+    printed, failed = print_jobs.print_samples(conn, samples, address, batch_size=None, on_status=on_status)
+    codes = printed_codes(state)
+    assert printed == len(codes)
+    assert 0 < printed < 20 and failed == 20 - printed
+    assert codes == [code for _, code in samples[:printed]]
+    (outcome, error), = conn.execute("SELECT outcome, error FROM print_jobs").fetchall()
+    assert outcome == "partial" and "Connection lost" in error
+    assert print_jobs.unprinted(conn) == samples[printed:]
+
+
+def test_failed_labels_without_a_state_row_are_listed_unprinted(conn):
+    # Imported samples have no sample_print_state row until they are printed
+    samples = new_samples(conn, ["X1", "X2", "X3"], queued=False)
+    assert print_jobs.unprinted(conn) == []
+    address = dead_address()
+    assert print_jobs.print_samples(conn, samples, address, batch_size=2) == (0, 3)
+    # The first batch failed on the printer; the second was never sent
+    assert jobs(conn) == [(address, 2, "failed")]
+    assert print_jobs.unprinted(conn) == samples
+    statuses = conn.execute("SELECT status FROM sample_print_state ORDER BY sample_id").fetchall()
+    assert statuses == [("failed",), ("failed",), ("pending",)]
+
+
+def test_test_label_reports_failures(conn, standins):
+    state = zebra_standin.PrinterState(capacity=20, label_seconds=0.002)
+    print_jobs.set_printer(conn, standins(state))
+    assert print_jobs.print_test_label(conn) == (1, 0, "")
+    assert printed_codes(state) == ["Test"]
+    address = dead_address()
+    print_jobs.set_printer(conn, address)
+    printed, failed, detail = print_jobs.print_test_label(conn)
+    assert (printed, failed) == (0, 1) and detail.startswith(f"{address}: ")
+    # Test labels are not tracked
+    assert jobs(conn) == []
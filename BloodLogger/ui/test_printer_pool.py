@@ -0,0 +1,37 @@
+import pytest
+
+import printer_status
+from conftest import add_sample, zebra_standin
+
+pytest.importorskip("win32print")
+import print_jobs  # noqa: E402
+import printer_pool  # noqa: E402
+from test_print_jobs import printed_codes  # noqa: E402
+
+
+def test_run_fails_over_without_printing_twice(conn, standins, monkeypatch):
+    monkeypatch.setattr(printer_status, "STATUS_WAIT_TIMEOUT", 0.05)
+    left = zebra_standin.PrinterState(capacity=20, label_seconds=0.005)
+    right = zebra_standin.PrinterState(capacity=20, label_seconds=0.02)
+    addresses = {standins(left): left, standins(right): right}
+    for (address, _), name in zip(addresses.items(), ("left", "right")):
+        printer_pool.save_printer(conn, name, address, 300)
+    samples = [(add_sample(conn, f"S{n:02d}"), f"S{n:02d}") for n in range(40)]
+    print_jobs.queue_labels(conn, [sid for sid, _ in samples])
+    conn.commit()
+
+    def on_status(result):
+        # The right printer runs out of paper a few labels in; its queued
+        # labels are cancelled and the rest of its batch goes to the left one
+        if addresses[result["printer"]] is right and right.printed >= 3 and result["status"].formats_in_buffer:
+            right.paper_out = True
+
+    assert print_jobs.print_samples(conn, samples, batch_size=6, on_status=on_status) == (40, 0)
+    codes = printed_codes(left) + printed_codes(right)
+    assert sorted(codes) == [code for _, code in samples]
+    assert 0 < len(right.labels) < 40
+    assert print_jobs.unprinted(conn) == []
+    outcomes = conn.execute("SELECT printer, outcome FROM print_jobs WHERE outcome != 'printed'").fetchall()
+    assert outcomes == [("right", "partial")]
+    stats = printer_pool.printer_stats(conn)
+    assert stats["left"][1] + stats["right"][1] == 40 and stats["right"][2] > 0
@@ -0,0 +1,95 @@
+import threading
+import time
+
+import pytest
+
+import printer_status
+from conftest import zebra_standin
+
+SETUP = "^XA^MNW^XZ"
+LABEL = "^XA^FO10,10^FDS{n}^FS^PQ1^XZ"
+
+
+class PeakState(zebra_standin.PrinterState):
+    # Records the most formats ever queued at once
+    peak = 0
+
+    def add_format(self, text=""):
+        super().add_format(text)
+        with self.lock:
+            self.peak = max(self.peak, self.formats)
+
+
+@pytest.fixture
+def standin(standins):
+    state = PeakState(capacity=20, label_seconds=0.005)
+    return state, standins(state)
+
+
+def labels(count):
+    return [LABEL.format(n=n) for n in range(count)]
+
+
+def test_parse_host_status():
+    state = zebra_standin.PrinterState(capacity=3, label_seconds=1)
+    status = printer_status.parse_host_status(state.host_status())
+    assert not status.problems()
+    assert status.describe() == "ready"
+    state.formats, state.paused, state.head_open = 3, True, True
+    status = printer_status.parse_host_status(state.host_status())
+    assert (status.formats_in_buffer, status.labels_remaining, status.buffer_full) == (3, 3, True)
+    assert status.problems() == ["head open", "paused"]
+    state.paused = state.head_open = False
+    assert printer_status.parse_host_status(state.host_status()).describe() == "buffer full"
+    state.formats = 2
+    assert printer_status.parse_host_status(state.host_status()).describe() == "printing (2 queued)"
+    for bad in (b"", b"\x02030,0,0\x03\x02001\x03", b"garbage"):
+        with pytest.raises(ValueError):
+            printer_status.parse_host_status(bad)
+
+
+def test_addresses():
+    assert printer_status.is_socket_address("tcp://10.0.0.5")
+    assert not printer_status.is_socket_address("ZDesigner GX420t")
+    assert not printer_status.is_socket_address(None)
+    assert printer_status.parse_address("tcp://10.0.0.5") == ("10.0.0.5", 9100)
+    assert printer_status.parse_address("tcp://zebra:6101") == ("zebra", 6101)
+
+
+def test_paced_run_never_overfills_the_buffer(standin):
+    state, address = standin
+    seen = []
+    sent = printer_status.send_paced(address, SETUP, labels(30), on_status=seen.append, max_buffered=4)
+    assert sent == 30
+    assert state.printed == 30 and state.formats == 0
+    assert state.peak <= 4
+    assert all(status["printer"] == address for status in seen)
+    assert printer_status.read_status(address).describe() == "ready"
+
+
+def test_paced_run_waits_out_a_pause(standin):
+    state, address = standin
+    state.paused = True
+    threading.Timer(0.1, lambda: setattr(state, "paused", False)).start()
+    assert printer_status.send_paced(address, SETUP, labels(10), max_buffered=3, wait_timeout=5) == 10
+    assert state.printed == 10
+
+
+def test_stopped_printer_cancels_the_queued_labels(standin):
+    state, address = standin
+    state.label_seconds = 60
+    # The paper runs out once the first buffer load is queued
+
+    def on_status(result):
+        if result["status"].formats_in_buffer == 5:
+            state.paper_out = True
+
+    start = time.monotonic()
+    with pytest.raises(printer_status.PrinterStatusError, match="paper out; 5 queued label") as info:
+        printer_status.send_paced(address, SETUP, labels(12), on_status=on_status, max_buffered=5, wait_timeout=0.05)
+    assert time.monotonic() - start < 5
+    # printed counts what left the head before the stop (the head thread
+    # may finish one label from before the slowdown); ~JA emptied the
+    # buffer, so nothing more prints once the paper is back
+    assert info.value.printed == state.printed
+    assert state.formats == 0
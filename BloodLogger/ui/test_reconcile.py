@@ -0,0 +1,81 @@
+import pytest
+
+import reconcile
+from conftest import add_sample
+
+
+def setup_box(conn):
+    # Cohort 1 should hold S1-S4 and A5 (labelled BC5); OTHER belongs to cohort 2
+    conn.execute("INSERT INTO cohorts (name) VALUES ('Box study')")
+    conn.execute("INSERT INTO cohorts (name) VALUES ('Elsewhere')")
+    conn.commit()
+    ids = {code: add_sample(conn, code, cohort_id=1) for code in ("S1", "S2", "S3", "S4")}
+    conn.execute("INSERT INTO samples (animal_id, barcode_value, cohort_id) VALUES ('A5', 'BC5', 1)")
+    conn.commit()
+    add_sample(conn, "OTHER", cohort_id=2)
+    return ids
+
+
+def diff(session):
+    return session.missing(), session.unexpected(), session.duplicates(), session.matched_count()
+
+
+def test_diff_against_the_cohort(conn):
+    setup_box(conn)
+    session = reconcile.start_session(conn, 1)
+    reconcile.add_scans(conn, session, ["S1", " S2 ", "", "S2", "BC5", "X9", "OTHER"])
+    assert diff(session) == (["S3", "S4"], ["OTHER", "X9"], ["S2"], 3)
+    # The same tube scanned by its sample ID and by its barcode
+    reconcile.add_scans(conn, session, ["A5"])
+    assert diff(session) == (["S3", "S4"], ["OTHER", "X9"], ["A5", "BC5", "S2"], 3)
+    reconcile.finish_session(conn, session)
+    assert conn.execute(
+        "SELECT expected_count, missing_count, unexpected_count, duplicate_count FROM reconcile_sessions"
+    ).fetchone() == (5, 2, 2, 3)
+    assert reconcile.unfinished_sessions(conn) == []
+
+
+def test_a_failed_batch_leaves_the_diff_alone(conn, monkeypatch):
+    setup_box(conn)
+    session = reconcile.start_session(conn, 1)
+    reconcile.add_scans(conn, session, ["S1"])
+
+    def fail(conn, codes):
+        raise RuntimeError("scanner unplugged")
+
+    monkeypatch.setattr(reconcile, "resolve_codes", fail)
+    with pytest.raises(RuntimeError):
+        reconcile.add_scans(conn, session, ["S2", "S3"])
+    assert diff(session) == (["A5", "S2", "S3", "S4"], [], [], 1)
+    assert conn.execute("SELECT code FROM reconcile_scans").fetchall() == [("S1",)]
+
+
+def test_resume_rebuilds_the_session_from_saved_scans(conn):
+    ids = setup_box(conn)
+    session = reconcile.start_session(conn, 1)
+    reconcile.add_scans(conn, session, ["S1", "S2", "S2", "X9"])
+    (session_id, name, _, scans), = reconcile.unfinished_sessions(conn)
+    assert (session_id, name, scans) == (session.session_id, "Box study", 4)
+    resumed = reconcile.resume_session(conn, session_id)
+    assert diff(resumed) == diff(session)
+    # The expected set is the cohort as it is now
+    conn.execute("UPDATE samples SET cohort_id = 2 WHERE id = ?", (ids["S4"],))
+    conn.commit()
+    resumed = reconcile.resume_session(conn, session_id)
+    assert diff(resumed) == (["A5", "S3"], ["X9"], ["S2"], 2)
+    reconcile.add_scans(conn, resumed, ["S3"])
+    reconcile.finish_session(conn, resumed)
+    with pytest.raises(ValueError, match="already finished"):
+        reconcile.resume_session(conn, session_id)
+    with pytest.raises(ValueError, match="not found"):
+        reconcile.resume_session(conn, 99)
+
+
+def test_resume_after_the_cohort_was_deleted(conn):
+    setup_box(conn)
+    session = reconcile.start_session(conn, 2)
+    reconcile.add_scans(conn, session, ["OTHER"])
+    conn.execute("DELETE FROM cohorts WHERE id = 2")
+    conn.commit()
+    with pytest.raises(ValueError, match="has been deleted"):
+        reconcile.resume_session(conn, session.session_id)
@@ -0,0 +1,96 @@
+import sqlite3
+import threading
+
+import scanner
+
+
+def type_text(assembler, text, start, interval):
+    # Feeds text at a fixed key interval; returns codes finished on the way
+    # and the time of the last key
+    finished = []
+    now = start
+    for i, char in enumerate(text):
+        now = start + i * interval
+        result = assembler.add_char(char, now)
+        if result:
+            finished.append(result)
+    return finished, now
+
+
+def test_burst_with_terminator_is_a_scan():
+    assembler = scanner.ScanAssembler()
+    assert type_text(assembler, "M00123", 10.0, 0.004)[0] == []
+    assert assembler.terminate() == ("M00123", "scanner")
+    assert assembler.terminate() is None
+
+
+def test_typing_is_manual():
+    assembler = scanner.ScanAssembler()
+    type_text(assembler, "M00123", 10.0, 0.12)
+    assert assembler.terminate() == ("M00123", "manual")
+
+
+def test_short_codes_are_never_bursts():
+    assembler = scanner.ScanAssembler(min_length=3)
+    type_text(assembler, "AB", 10.0, 0.001)
+    assert not assembler.is_burst()
+    assert assembler.terminate() == ("AB", "manual")
+    # Nor is a short burst cut off by the next key
+    type_text(assembler, "AB", 20.0, 0.001)
+    assert assembler.add_char("C", 21.0) is None
+    assert assembler.terminate() == ("ABC", "manual")
+
+
+def test_editing_makes_a_burst_manual():
+    assembler = scanner.ScanAssembler()
+    type_text(assembler, "M00123", 10.0, 0.004)
+    assembler.mark_edited()
+    assert assembler.terminate() == ("M00123", "manual")
+    # The flag does not carry over to the next code
+    type_text(assembler, "M00124", 11.0, 0.004)
+    assert assembler.terminate() == ("M00124", "scanner")
+
+
+def test_terminatorless_bursts_end_at_the_next_key():
+    assembler = scanner.ScanAssembler()
+    type_text(assembler, "M00123", 10.0, 0.004)
+    finished, last = type_text(assembler, "M00124", 10.5, 0.004)
+    assert finished == [("M00123", "scanner")]
+    # The second one is picked up by the idle timer
+    assert assembler.flush_if_idle(last + scanner.SCANNER_END_GAP / 2) is None
+    assert assembler.flush_if_idle(last + scanner.SCANNER_END_GAP * 2) == ("M00124", "scanner")
+    assert assembler.flush_if_idle(last + 10) is None
+
+
+def test_slow_keys_after_typing_do_not_split_the_code():
+    assembler = scanner.ScanAssembler()
+    finished, last = type_text(assembler, "M001", 10.0, 0.15)
+    finished += type_text(assembler, "23", last + 1.0, 0.15)[0]
+    assert finished == []
+    assert assembler.flush_if_idle(last + 20) is None
+    assert assembler.terminate() == ("M00123", "manual")
+
+
+def test_worker_resolves_in_order_on_its_own_connection():
+    results = []
+    done = threading.Event()
+
+    def resolve(conn, code):
+        if code == "BAD":
+            raise ValueError("not found")
+        return conn.execute("SELECT ?", (code.lower(),)).fetchone()[0]
+
+    def on_result(seq, code, source, result):
+        results.append((seq, code, source, result))
+        if len(results) == 3:
+            done.set()
+
+    worker = scanner.ScanWorker(lambda: sqlite3.connect(":memory:"), resolve, on_result)
+    worker.start()
+    assert [worker.submit(code, source) for code, source in (("A1", "scanner"), ("BAD", "manual"), ("C3", "scanner"))] == [1, 2, 3]
+    assert done.wait(5)
+    worker.stop()
+    worker.join(5)
+    assert [(seq, code, source) for seq, code, source, _ in results] == [(1, "A1", "scanner"), (2, "BAD", "manual"), (3, "C3", "scanner")]
+    assert results[0][3] == "a1" and isinstance(results[1][3], ValueError)
+    assert not worker.is_alive()
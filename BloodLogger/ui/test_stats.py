@@ -0,0 +1,99 @@
+import datetime
+
+import pytest
+
+import archive
+import stats
+from conftest import add_sample
+
+
+def rollup(conn):
+    return conn.execute(
+        "SELECT sample_type_id, experimenter_id, cohort_id, collection_date, sample_count FROM sample_rollup ORDER BY 1, 2, 3, 4"
+    ).fetchall()
+
+
+def fresh(conn):
+    # What the rollup should hold, counted from samples
+    return conn.execute(
+        """
+        SELECT COALESCE(sample_type_id, 0), COALESCE(experimenter_id, 0), COALESCE(cohort_id, 0),
+            COALESCE(collection_date, ''), COUNT(*)
+        FROM samples GROUP BY 1, 2, 3, 4 ORDER BY 1, 2, 3, 4
+        """
+    ).fetchall()
+
+
+def setup_samples(conn):
+    for name in ("serum", "plasma"):
+        conn.execute("INSERT INTO sample_types (name) VALUES (?)", (name,))
+    for name in ("alice", "bob"):
+        conn.execute("INSERT INTO experimenters (name) VALUES (?)", (name,))
+    for name in ("Study", "Pilot"):
+        conn.execute("INSERT INTO cohorts (name) VALUES (?)", (name,))
+    conn.commit()
+    for n in range(24):
+        add_sample(
+            conn, f"S{n:02d}", cohort_id=(n % 3) or None, sample_type_id=(n % 2) + 1 if n % 5 else None,
+            experimenter_id=(n % 4 > 1) + 1, collection_date=f"2024-03-{1 + n % 6:02d}" if n % 7 else None
+        )
+
+
+def test_rollups_match_a_fresh_count_through_every_change(conn, tmp_path):
+    setup_samples(conn)
+    assert rollup(conn) == fresh(conn)
+    conn.execute("UPDATE samples SET sample_type_id = 2 WHERE id % 3 = 0")
+    conn.execute("UPDATE samples SET experimenter_id = NULL, collection_date = '2024-03-09' WHERE id % 4 = 1")
+    conn.execute("UPDATE samples SET cohort_id = 2 WHERE cohort_id IS NULL AND id < 10")
+    conn.execute("UPDATE samples SET notes = 'not a rollup column'")
+    conn.commit()
+    assert rollup(conn) == fresh(conn)
+    conn.execute("DELETE FROM samples WHERE id % 5 = 2")
+    conn.commit()
+    assert rollup(conn) == fresh(conn)
+    path = str(tmp_path / "archive.db")
+    archive.archive_cohort(conn, path, 1)
+    assert conn.execute("SELECT COUNT(*) FROM samples WHERE cohort_id = 1").fetchone()[0] == 0
+    assert rollup(conn) == fresh(conn)
+    archive.restore_cohort(conn, path, archive.list_archived_cohorts(path)[0][0])
+    assert rollup(conn) == fresh(conn)
+    conn.execute("DELETE FROM cohorts WHERE id = 2")
+    conn.commit()
+    assert rollup(conn) == fresh(conn)
+    # No emptied groups are left behind
+    assert conn.execute("SELECT COUNT(*) FROM sample_rollup WHERE sample_count <= 0").fetchone()[0] == 0
+    assert stats.total_samples(conn) == conn.execute("SELECT COUNT(*) FROM samples").fetchone()[0]
+
+
+def test_rebuild_matches_the_triggers(conn):
+    setup_samples(conn)
+    kept = rollup(conn)
+    conn.execute("DELETE FROM sample_rollup")
+    conn.execute("DELETE FROM app_meta WHERE key = ?", (stats.ROLLUP_BUILT_KEY,))
+    conn.commit()
+    stats.ensure_rollups(conn)
+    assert rollup(conn) == kept
+    # Built once; later calls leave the rollup alone
+    conn.execute("DELETE FROM sample_rollup")
+    conn.commit()
+    stats.ensure_rollups(conn)
+    assert rollup(conn) == []
+
+
+def test_dashboard_counts(conn):
+    setup_samples(conn)
+    by_type = dict(stats.counts_by(conn, 'sample_type'))
+    assert by_type == dict(conn.execute(
+        "SELECT COALESCE(t.name, ''), COUNT(*) FROM samples s LEFT JOIN sample_types t ON t.id = s.sample_type_id GROUP BY 1"
+    ).fetchall())
+    assert stats.cohort_counts(conn) == {0: 8, 1: 8, 2: 8}
+    # Samples with no collection date only count in the all-time figures
+    assert sum(n for _, n in stats.counts_by(conn, 'experimenter', since="2024-03-05")) == 8
+    pivot = stats.pivot(conn, "2024-03-01")
+    assert sum(sum(row.values()) for row in pivot.values()) == 20
+    assert pivot["bob"] == {"plasma": 4, "serum": 4, "": 2}
+    days = stats.daily_counts(conn, days=3, today=datetime.date(2024, 3, 7))
+    assert days == [("2024-03-05", 4), ("2024-03-06", 4), ("2024-03-07", 0)]
+    assert stats.week_start(datetime.date(2024, 3, 7)) == "2024-03-04"
+    with pytest.raises(ValueError):
+        stats.counts_by(conn, 'species')
@@ -0,0 +1,115 @@
+import time
+
+import pytest
+
+import storage
+from conftest import add_sample
+
+
+@pytest.fixture
+def boxes(conn):
+    freezer = storage.add_freezer(conn, "-80 A")
+    rack = storage.add_rack(conn, freezer, "Rack 1")
+    first = storage.add_box(conn, rack, "Box 1", rows=2, cols=3)
+    second = storage.add_box(conn, rack, "Box 2", rows=2, cols=3)
+    return first, second
+
+
+def samples(conn, count, prefix="S"):
+    return [add_sample(conn, f"{prefix}{n}") for n in range(count)]
+
+
+def occupancy(conn, box_id):
+    return conn.execute("SELECT occupancy, used FROM boxes WHERE id = ?", (box_id,)).fetchone()
+
+
+def test_positions_round_trip():
+    for position in range(81):
+        assert storage.parse_position(storage.position_label(position, 9), 9, 9) == position
+    assert storage.position_label(0, 9) == "A1"
+    assert storage.position_label(80, 9) == "I9"
+    assert storage.parse_position(" b2 ", 2, 3) == 4
+    for label in ("C1", "A0", "A4", "A", "1A", ""):
+        with pytest.raises(storage.StorageError):
+            storage.parse_position(label, 2, 3)
+
+
+def test_free_positions_lowest_first():
+    assert storage._free_positions(0b101101, 8, 3) == [1, 4, 6]
+    assert storage._free_positions(0b111, 3, 2) == []
+    assert storage._free_positions(0, 70, 2) == [0, 1]
+
+
+def test_store_fills_then_continues_into_the_next_box(conn, boxes):
+    first, second = boxes
+    ids = samples(conn, 8)
+    placements = storage.store(conn, ids, first)
+    assert placements == [(sid, first, n) for n, sid in enumerate(ids[:6])] + [
+        (ids[6], second, 0), (ids[7], second, 1)
+    ]
+    assert occupancy(conn, first) == (b"\x3f", 6)
+    assert occupancy(conn, second) == (b"\x03", 2)
+    assert storage.box_contents(conn, second) == {0: (ids[6], "S6"), 1: (ids[7], "S7")}
+    assert storage.location(conn, ids[7]) == ("-80 A", "Rack 1", "Box 2", "A2")
+
+
+def test_store_reuses_freed_slots_and_moves_stored_samples(conn, boxes):
+    first, _ = boxes
+    ids = samples(conn, 4)
+    storage.store(conn, ids, first)
+    storage.unstore(conn, [ids[1]])
+    # The bitmap was cleared by the trigger and is rebuilt on the next store
+    assert occupancy(conn, first) == (None, 3)
+    new = add_sample(conn, "NEW")
+    assert storage.store(conn, [new, ids[3]], first) == [(new, first, 1), (ids[3], first, 3)]
+    assert occupancy(conn, first) == (b"\x0f", 4)
+
+
+def test_bitmap_is_rebuilt_after_outside_changes(conn, boxes):
+    first, _ = boxes
+    ids = samples(conn, 3)
+    conn.executemany(
+        "INSERT INTO sample_locations (sample_id, box_id, position, placed_at) VALUES (?, ?, ?, ?)",
+        [(ids[0], first, 0, int(time.time())), (ids[1], first, 4, int(time.time()))]
+    )
+    conn.commit()
+    assert occupancy(conn, first) == (None, 2)
+    assert storage.store(conn, [ids[2]], first) == [(ids[2], first, 1)]
+    assert occupancy(conn, first) == (b"\x13", 3)
+
+
+def test_store_without_room_changes_nothing(conn, boxes):
+    first, second = boxes
+    ids = samples(conn, 13)
+    with pytest.raises(storage.StorageError, match="1 sample"):
+        storage.store(conn, ids, first)
+    assert conn.execute("SELECT COUNT(*) FROM sample_locations").fetchone()[0] == 0
+    assert occupancy(conn, first)[1] == occupancy(conn, second)[1] == 0
+
+
+def test_store_at_and_unstore(conn, boxes):
+    first, second = boxes
+    a, b = samples(conn, 2)
+    storage.store_at(conn, a, first, 5)
+    assert storage.location(conn, a)[3] == "B3"
+    with pytest.raises(storage.StorageError, match="taken"):
+        storage.store_at(conn, b, first, 5)
+    with pytest.raises(storage.StorageError, match="outside"):
+        storage.store_at(conn, b, first, 6)
+    with pytest.raises(storage.StorageError, match="not found"):
+        storage.store_at(conn, b, 999, 0)
+    # Moving keeps used exact in both boxes
+    storage.store_at(conn, a, second, 0)
+    assert occupancy(conn, first)[1] == 0 and occupancy(conn, second)[1] == 1
+    storage.unstore(conn, [a])
+    assert storage.location(conn, a) is None
+    assert occupancy(conn, second)[1] == 0
+
+
+def test_only_empty_storage_can_be_removed(conn, boxes):
+    first, second = boxes
+    storage.store(conn, samples(conn, 1), first)
+    with pytest.raises(storage.StorageError):
+        storage.remove(conn, 'boxes', first)
+    storage.remove(conn, 'boxes', second)
+    assert [row[4] for row in storage.tree(conn)] == [first]
@@ -0,0 +1,69 @@
+import itertools
+
+import pytest
+
+import subjects
+from conftest import add_sample
+
+DATES = [None, "2024-01-05", "2024-01-05", "2024-02-10", None, "2023-12-31"]
+TIME_POINTS = [None, "T0", "T1", None, "T2", "T0"]
+
+
+@pytest.fixture
+def subject(conn):
+    subject_id = subjects.get_or_create_id(conn, "Rat 7")
+    conn.execute("INSERT INTO cohorts (name) VALUES ('Study')")
+    # Every date/time point combination, NULLs included, several draws each
+    for n, (date, time_point) in enumerate(itertools.product(DATES, TIME_POINTS)):
+        add_sample(conn, f"R7-{n}", cohort_id=1, subject_id=subject_id,
+                   collection_date=date, time_point=time_point)
+    add_sample(conn, "OTHER", subject_id=subjects.get_or_create_id(conn, "Rat 8"), collection_date="2024-01-05")
+    return subject_id
+
+
+def expected_order(conn, subject_id):
+    # NULL sorts first in SQLite, so sort on (is not None, value)
+    rows = conn.execute(
+        "SELECT id, collection_date, time_point FROM samples WHERE subject_id = ?", (subject_id,)
+    ).fetchall()
+    key = lambda row: (row[1] is not None, row[1] or "", row[2] is not None, row[2] or "", row[0])
+    return [row[0] for row in sorted(rows, key=key)]
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 5, 7, 36, 100])
+def test_keyset_pages_cover_the_timeline_in_order(conn, subject, limit):
+    seen = []
+    cursor = None
+    while True:
+        page, cursor = subjects.timeline(conn, subject, after=cursor, limit=limit)
+        assert len(page) <= limit
+        seen.extend(row[0] for row in page)
+        if cursor is None:
+            break
+        assert len(page) == limit
+    assert seen == expected_order(conn, subject)
+
+
+def test_timeline_rows_carry_names(conn, subject):
+    page, cursor = subjects.timeline(conn, subject, limit=1)
+    assert page[0][1:] == ("R7-0", None, None, None, "Study")
+    assert cursor == (None, None, page[0][0])
+    assert subjects.timeline(conn, subjects.get_or_create_id(conn, "Nobody")) == ([], None)
+
+
+def test_cohort_timeline_pages_subjects_by_name(conn):
+    conn.execute("INSERT INTO cohorts (name) VALUES ('Study')")
+    for name in ("B", "A", "C"):
+        subject_id = subjects.get_or_create_id(conn, name)
+        add_sample(conn, f"{name}-1", cohort_id=1, subject_id=subject_id, collection_date="2024-01-01", time_point="T0")
+        add_sample(conn, f"{name}-2", cohort_id=1, subject_id=subject_id, collection_date="2024-01-08")
+    add_sample(conn, "UNLINKED", cohort_id=1)
+    page, columns, cells, after = subjects.cohort_timeline(conn, 1, limit=2)
+    assert [name for _, name in page] == ["A", "B"]
+    assert columns == ["T0", "2024-01-08"]
+    assert cells[(page[0][0], "T0")] == ["A-1"]
+    assert after == "B"
+    page, columns, cells, after = subjects.cohort_timeline(conn, 1, after_name=after, limit=2)
+    assert [name for _, name in page] == ["C"]
+    assert after is None
+    assert subjects.unlinked_count(conn, 1) == 1
@@ -0,0 +1,117 @@
+import pytest
+
+import sync
+from conftest import add_sample, open_db
+
+
+@pytest.fixture
+def benches(tmp_path):
+    # Two benches sharing one central file, as on a network share
+    central = str(tmp_path / "central.db")
+    a = open_db(str(tmp_path / "bench_a.db"))
+    b = open_db(str(tmp_path / "bench_b.db"))
+    for bench in (a, b):
+        sync.enable(bench, central)
+    yield a, b, central
+    a.close()
+    b.close()
+
+
+def notes(conn, code):
+    row = conn.execute("SELECT notes FROM samples WHERE barcode_value = ?", (code,)).fetchone()
+    return row[0] if row else None
+
+
+def edit(conn, code, value):
+    conn.execute("UPDATE samples SET notes = ?, row_version = row_version + 1 WHERE barcode_value = ?", (value, code))
+    conn.commit()
+
+
+def test_push_then_pull(benches):
+    a, b, central = benches
+    a.execute("INSERT INTO cohorts (name) VALUES ('Study')")
+    a.commit()
+    add_sample(a, "S1", cohort_id=1, notes="from a")
+    add_sample(a, "S2", cohort_id=1)
+    a.execute("INSERT INTO sample_types (name) VALUES ('serum')")
+    a.execute("UPDATE samples SET sample_type_id = 1 WHERE barcode_value = 'S2'")
+    a.commit()
+    # Several queued edits of one row go up as one change
+    assert sync.pending_count(a) == 4
+    assert sync.sync_once(a, central) == (3, 0, 0)
+    assert sync.pending_count(a) == 0
+    assert sync.sync_once(b, central) == (0, 0, 3)
+    assert notes(b, "S1") == "from a"
+    row = b.execute(
+        "SELECT c.name, t.name FROM samples s JOIN cohorts c ON c.id = s.cohort_id "
+        "LEFT JOIN sample_types t ON t.id = s.sample_type_id WHERE s.barcode_value = 'S2'"
+    ).fetchone()
+    assert row == ("Study", "serum")
+    # Applying the pull queued nothing on b, and its own changes come back
+    assert sync.pending_count(b) == 0
+    assert sync.sync_once(a, central) == (0, 0, 0)
+
+
+def test_deletes_travel_too(benches):
+    a, b, central = benches
+    add_sample(a, "S1")
+    sync.sync_once(a, central)
+    sync.sync_once(b, central)
+    b.execute("DELETE FROM samples WHERE barcode_value = 'S1'")
+    b.commit()
+    assert sync.sync_once(b, central)[:2] == (1, 0)
+    sync.sync_once(a, central)
+    assert a.execute("SELECT COUNT(*) FROM samples").fetchone()[0] == 0
+
+
+def conflicted(benches):
+    # S1 is edited on both benches before either syncs
+    a, b, central = benches
+    add_sample(a, "S1", notes="base")
+    sync.sync_once(a, central)
+    sync.sync_once(b, central)
+    edit(a, "S1", "edited on a")
+    edit(b, "S1", "edited on b")
+    assert sync.sync_once(a, central) == (1, 0, 0)
+    # b's pull skips the key it has a pending change for; the push conflicts
+    central_conn = sync.connect_central(central)
+    assert sync.pull(b, central_conn, sync.bench_id(b)) == 0
+    central_conn.close()
+    assert notes(b, "S1") == "edited on b"
+    assert sync.sync_once(b, central) == (0, 1, 0)
+    assert [row[:2] for row in sync.list_conflicts(b)] == [("sample", "S1")]
+    return a, b, central
+
+
+def test_conflict_take_theirs(benches):
+    a, b, central = conflicted(benches)
+    sync.resolve_conflict(b, central, "sample", "S1", keep_local=False)
+    assert notes(b, "S1") == "edited on a"
+    assert sync.list_conflicts(b) == [] and sync.pending_count(b) == 0
+    assert sync.sync_once(b, central) == (0, 0, 0)
+
+
+def test_conflict_keep_mine(benches):
+    a, b, central = conflicted(benches)
+    sync.resolve_conflict(b, central, "sample", "S1", keep_local=True)
+    assert sync.list_conflicts(b) == []
+    assert sync.sync_once(b, central) == (1, 0, 0)
+    assert sync.sync_once(a, central) == (0, 0, 1)
+    assert notes(a, "S1") == "edited on b"
+
+
+def test_pull_and_resolve_keep_capture_off(benches):
+    a, b, central = conflicted(benches)
+    sync.disable(b)
+    sync.resolve_conflict(b, central, "sample", "S1", keep_local=False)
+    assert sync.get_setting(b, 'sync_capture') == '0'
+    add_sample(a, "S2")
+    sync.sync_once(a, central)
+    central_conn = sync.connect_central(central)
+    assert sync.pull(b, central_conn, sync.bench_id(b)) == 1
+    central_conn.close()
+    assert sync.get_setting(b, 'sync_capture') == '0'
+    assert not sync.is_enabled(b)
+    # Edits made while off are not queued
+    edit(b, "S2", "local only")
+    assert sync.pending_count(b) == 0
@@ -0,0 +1,78 @@
+import pytest
+
+import versioning
+from conftest import add_sample
+
+COLUMNS = ['notes', 'time_point']
+
+
+def test_save_bumps_the_version(conn):
+    sample_id = add_sample(conn, "S1", notes="a")
+    values, version = versioning.load(conn, 'samples', sample_id, COLUMNS)
+    assert (values, version) == ({'notes': "a", 'time_point': None}, 1)
+    assert versioning.save(conn, 'samples', sample_id, version, {'notes': "b"}) == 2
+    assert versioning.load(conn, 'samples', sample_id, COLUMNS) == ({'notes': "b", 'time_point': None}, 2)
+
+
+def test_stale_save_raises_with_the_current_row(conn):
+    sample_id = add_sample(conn, "S1", notes="a")
+    _, version = versioning.load(conn, 'samples', sample_id, COLUMNS)
+    versioning.save(conn, 'samples', sample_id, version, {'time_point': "T2"})
+    with pytest.raises(versioning.ConflictError, match="changed") as info:
+        versioning.save(conn, 'samples', sample_id, version, {'notes': "mine", 'time_point': "T1"})
+    assert info.value.current == ({'notes': "a", 'time_point': "T2"}, 2)
+    assert (info.value.table, info.value.row_id) == ('samples', sample_id)
+    assert not conn.in_transaction
+
+
+def test_conflict_rolls_back_the_callers_writes(conn):
+    conn.execute("INSERT INTO cohorts (name) VALUES ('C')")
+    conn.commit()
+    conn.execute("UPDATE cohorts SET name = 'C2', row_version = row_version + 1 WHERE id = 1")
+    conn.commit()
+    add_sample(conn, "S1")
+    conn.execute("UPDATE samples SET notes = 'same transaction' WHERE animal_id = 'S1'")
+    with pytest.raises(versioning.ConflictError):
+        versioning.save(conn, 'cohorts', 1, 1, {'name': "mine"})
+    assert conn.execute("SELECT notes FROM samples WHERE animal_id = 'S1'").fetchone()[0] is None
+    assert conn.execute("SELECT name, row_version FROM cohorts WHERE id = 1").fetchone() == ("C2", 2)
+
+
+def test_deleted_row(conn):
+    sample_id = add_sample(conn, "S1")
+    conn.execute("DELETE FROM samples WHERE id = ?", (sample_id,))
+    conn.commit()
+    assert versioning.load(conn, 'samples', sample_id, COLUMNS) is None
+    with pytest.raises(versioning.ConflictError, match="deleted") as info:
+        versioning.save(conn, 'samples', sample_id, 1, {'notes': "x"})
+    assert info.value.current is None
+
+
+def test_only_versioned_tables():
+    with pytest.raises(ValueError):
+        versioning.load(None, 'boxes', 1, COLUMNS)
+
+
+def test_merge():
+    base = {'notes': "a", 'time_point': "T0", 'collection_date': "2024-01-01"}
+    mine = {'notes': "mine", 'time_point': "T0", 'collection_date': "2024-01-02"}
+    theirs = {'notes': "a", 'time_point': "T1", 'collection_date': "2024-01-03"}
+    merged, conflicts = versioning.merge(base, mine, theirs)
+    assert merged == {'notes': "mine", 'time_point': "T1", 'collection_date': "2024-01-02"}
+    assert conflicts == ['collection_date']
+    # Both sides making the same change is not a conflict
+    assert versioning.merge(base, mine, mine) == (mine, [])
+
+
+def test_merge_then_save_after_a_conflict(conn):
+    sample_id = add_sample(conn, "S1", notes="a")
+    base, version = versioning.load(conn, 'samples', sample_id, COLUMNS)
+    versioning.save(conn, 'samples', sample_id, version, {'time_point': "T1"})
+    mine = dict(base, notes="mine")
+    with pytest.raises(versioning.ConflictError) as info:
+        versioning.save(conn, 'samples', sample_id, version, mine)
+    theirs, current_version = info.value.current
+    merged, conflicts = versioning.merge(base, mine, theirs)
+    assert conflicts == []
+    versioning.save(conn, 'samples', sample_id, current_version, merged)
+    assert versioning.load(conn, 'samples', sample_id, COLUMNS) == ({'notes': "mine", 'time_point': "T1"}, 3)
@@ -0,0 +1,75 @@
+# Optimistic concurrency for samples and cohorts. Every row carries
+# row_version, which each UPDATE of the row bumps. An edit remembers the
+# version it loaded and saves with WHERE id = ? AND row_version = ?, so no
+# lock is held while a dialog is open. If another window or bench saved in
+# between nothing matches, and ConflictError carries the row as it is now
+# so the two edits can be merged and saved again.
+
+VERSIONED_TABLES = ('samples', 'cohorts')
+
+
+class ConflictError(Exception):
+    def __init__(self, table, row_id, current):
+        # current is ({column: value}, row_version) as stored now, or None
+        # when the row has been deleted
+        what = "deleted" if current is None else "changed"
+        super().__init__(f"This record was {what} by someone else after you opened it.")
+        self.table = table
+        self.row_id = row_id
+        self.current = current
+
+
+def _check_table(table):
+    if table not in VERSIONED_TABLES:
+        raise ValueError(f"Not a versioned table: {table}")
+
+
+def load(conn, table, row_id, columns):
+    # ({column: value}, row_version), or None if the row does not exist
+    _check_table(table)
+    cur = conn.execute(f"SELECT {', '.join(columns)}, row_version FROM {table} WHERE id = ?", (row_id,))
+    row = cur.fetchone()
+    if not row:
+        return None
+    return dict(zip(columns, row[:-1])), row[-1]
+
+
+def save(conn, table, row_id, version, values):
+    # Writes values ({column: value}) if the row is still at version and
+    # returns the new version; otherwise rolls back (including anything the
+    # caller wrote in the same transaction) and raises ConflictError
+    _check_table(table)
+    set_sql = ", ".join(f"{column} = ?" for column in values)
+    try:
+        cur = conn.execute(
+            f"UPDATE {table} SET {set_sql}, row_version = row_version + 1 WHERE id = ? AND row_version = ?",
+            tuple(values.values()) + (row_id, version)
+        )
+        if cur.rowcount == 0:
+            raise ConflictError(table, row_id, load(conn, table, row_id, list(values)))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return version + 1
+
+
+def merge(base, mine, theirs):
+    # Three-way merge of {column: value} dicts. A column changed on one side
+    # only takes that side's value. Returns (merged, conflicts): conflicts
+    # lists the columns both sides changed to different values, which keep
+    # mine in merged until the user picks.
+    merged = {}
+    conflicts = []
+    for column, value in mine.items():
+        ours = value != base.get(column)
+        other = theirs.get(column)
+        if other != base.get(column) and other != value:
+            if ours:
+                conflicts.append(column)
+                merged[column] = value
+            else:
+                merged[column] = other
+        else:
+            merged[column] = value
+    return merged, conflicts
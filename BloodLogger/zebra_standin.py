@@ -0,0 +1,142 @@
+import argparse
+import collections
+import socketserver
+import sys
+import threading
+import time
+
+# Stand-in for a network Zebra on the raw port, for testing paced printing
+# without a printer. It answers ~HS, queues every ^XA...^XZ format it
+# receives and "prints" one label every --label-seconds; ~JA cancels the
+# queued formats. Type commands on
+# stdin to simulate the printer: pause, resume, paperout, paperin, open,
+# close, unplug (drop connections), plug, status.
+#
+#   python zebra_standin.py --port 9100
+#   then set the printer to tcp://127.0.0.1:9100 in the app
+
+STX = "\x02"
+ETX = "\x03"
+
+
+class PrinterState:
+    def __init__(self, capacity, label_seconds):
+        self.lock = threading.Lock()
+        self.capacity = capacity
+        self.label_seconds = label_seconds
+        self.formats = 0
+        self.printed = 0
+        self.paused = False
+        self.paper_out = False
+        self.head_open = False
+        self.unplugged = False
+        # Texts of the queued formats and of the labels printed so far
+        self.queued = collections.deque()
+        self.labels = []
+
+    def host_status(self):
+        with self.lock:
+            buffer_full = int(self.formats >= self.capacity)
+            line1 = f"030,{int(self.paper_out)},{int(self.paused)},0150,{self.formats:03d},{buffer_full},0,0,000,0,0,0"
+            line2 = f"001,0,{int(self.head_open)},0,0,2,4,0,{self.formats:08d},1,000"
+            line3 = "1234,0"
+        return "".join(f"{STX}{line}{ETX}\r\n" for line in (line1, line2, line3)).encode("ascii")
+
+    def add_format(self, text=""):
+        with self.lock:
+            self.formats += 1
+            self.queued.append(text)
+
+    def cancel_all(self):
+        with self.lock:
+            self.formats = 0
+            self.queued.clear()
+
+    def run_head(self):
+        while True:
+            time.sleep(self.label_seconds)
+            with self.lock:
+                if self.formats and not (self.paused or self.paper_out or self.head_open):
+                    self.formats -= 1
+                    self.printed += 1
+                    if self.queued:
+                        self.labels.append(self.queued.popleft())
+
+
+class RawPortHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        state = self.server.state
+        pending = ""
+        while True:
+            data = self.request.recv(4096)
+            if not data:
+                break
+            pending += data.decode("ascii", errors="replace")
+            while True:
+                # Control commands (~) act at once, ahead of queued formats
+                found = [(pending.find(token), token) for token in ("~HS", "~JA", "^XZ")]
+                found = [(pos, token) for pos, token in found if pos >= 0]
+                if not found:
+                    break
+                pos, token = min(found)
+                if token != "^XZ":
+                    if token == "~HS":
+                        # Unplugged mid-run: what came before still prints
+                        if state.unplugged:
+                            return
+                        self.request.sendall(state.host_status())
+                    else:
+                        state.cancel_all()
+                    pending = pending[:pos] + pending[pos + 3:]
+                else:
+                    end = pos
+                    # The setup block is a format too, but it does not print
+                    if "^PQ" in pending[:end]:
+                        state.add_format(pending[:end + 3])
+                    pending = pending[end + 3:]
+
+
+def read_commands(state):
+    for line in sys.stdin:
+        command = line.strip().lower()
+        with state.lock:
+            if command == "pause":
+                state.paused = True
+            elif command == "resume":
+                state.paused = False
+            elif command == "paperout":
+                state.paper_out = True
+            elif command == "paperin":
+                state.paper_out = False
+            elif command == "open":
+                state.head_open = True
+            elif command == "close":
+                state.head_open = False
+            elif command == "unplug":
+                state.unplugged = True
+            elif command == "plug":
+                state.unplugged = False
+            print(
+                f"queued={state.formats} printed={state.printed} paused={state.paused} "
+                f"paper_out={state.paper_out} head_open={state.head_open}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Zebra ~HS stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--capacity", type=int, default=20, help="formats before the buffer reports full")
+    parser.add_argument("--label-seconds", type=float, default=0.5)
+    args = parser.parse_args()
+    state = PrinterState(args.capacity, args.label_seconds)
+    threading.Thread(target=state.run_head, daemon=True).start()
+    threading.Thread(target=read_commands, args=(state,), daemon=True).start()
+    server = socketserver.ThreadingTCPServer((args.host, args.port), RawPortHandler)
+    server.state = state
+    print(f"Zebra stand-in listening on {args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()